@@ -5,10 +5,29 @@
 使用蓝图（Blueprint）组织路由，分为主路由和API路由
 """
 
-from flask import Blueprint, render_template, request, jsonify, current_app, session, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Blueprint, render_template, request, jsonify, current_app, session, send_file, abort, Response, stream_with_context
+from werkzeug.security import safe_join
 import os
+import base64
+import logging
+import mimetypes
+import uuid
 from datetime import datetime
+from utils.resumable_upload import ResumableUploadStore, ResumableUploadError
+from utils.image_variants import get_variant, pick_variant_width
+from utils.image_validation import ImageValidationError, validate_image_bytes, validate_image_stream, SNIFF_SIZE
+from utils.file_utils import allowed_file, validate_uploaded_file, save_uploaded_file
+from utils.resilience import CircuitOpenError
+from utils import deadline
+from utils.deadline import DeadlineExceeded
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# tus 断点续传协议版本
+TUS_VERSION = '1.0.0'
+# 校验图片头部时读取的字节数，足以覆盖常见图片的尺寸信息（含JPEG的EXIF段）
+HEADER_PROBE_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
 
 # 创建蓝图实例
 main_bp = Blueprint('main', __name__)  # 主路由蓝图，处理页面请求
@@ -39,12 +58,61 @@ def upload():
 def uploaded_file(filename):
     """
     服务上传的文件
+    
+    上传文件名带时间戳，内容不会变化，因此返回长期有效的 immutable 缓存头和ETag。
+    传入 ?w=宽度 时返回缩放后的变体（浏览器支持时为WebP，否则为JPEG），变体按需生成并缓存在磁盘。
+    配置 UPLOADS_SENDFILE_MODE 后由 nginx/Apache 发送文件字节，Python进程只返回响应头
+    
+    Request:
+        - Method: GET
+        - Query: w=期望宽度（可选）
     """
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    # 隐藏目录（续传暂存、变体缓存）不对外提供
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    source_path = safe_join(upload_folder, filename)
+    if source_path is None or not os.path.isfile(source_path):
+        abort(404)
+    
+    width = request.args.get('w', type=int)
+    if not width or width <= 0:
+        return _send_upload(source_path, upload_folder, vary_accept=False)
+    
+    fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+    try:
+        variant_path = get_variant(source_path, current_app.config['IMAGE_VARIANT_FOLDER'],
+                                   pick_variant_width(width), fmt)
+    except (OSError, ValueError) as e:
+        # 无法解码的图片退回原图
+        logger.warning('生成图片变体失败: %s', e, extra={'source': source_path})
+        return _send_upload(source_path, upload_folder, vary_accept=False)
+    return _send_upload(variant_path, upload_folder, vary_accept=True)
 
 
 # ------------------------------ API路由 ------------------------------
 
+@main_bp.route('/metrics')
+def metrics():
+    """
+    Prometheus 指标
+    上游接口延迟/状态码/错误数、模型Token用量和各路由延迟
+    
+    Request:
+        - Method: GET
+        - Headers: Authorization: Bearer <METRICS_TOKEN>
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not current_app.config.get('METRICS_ENABLED') or not token:
+        abort(404)
+    import hmac
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+        abort(401)
+    from utils.metrics import render_prometheus
+    return current_app.response_class(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @api_bp.route('/upload', methods=['POST'])
 def upload_image():
     """
@@ -86,61 +154,18 @@ def upload_image():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    # 检查文件类型是否允许
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type'}), 400
+    # 检查文件类型、文件头和尺寸，不合法的图片不落盘也不送给模型
+    try:
+        validate_uploaded_file(file, current_app.config['MAX_IMAGE_PIXELS'], current_app.config['MAX_IMAGE_FRAMES'])
+    except ImageValidationError as e:
+        return jsonify({'error': str(e)}), e.status_code
     
     try:
         # 保存上传的文件
         file_path = save_uploaded_file(file, current_app.config['UPLOAD_FOLDER'])
-        
-        # 获取天气数据（如果提供了location_id）
-        weather_data = None
-        if location_id:
-            try:
-                from services.weather_service import WeatherService
-                weather_service = WeatherService()
-                weather_data = weather_service.get_weather_now(location_id)
-            except Exception as e:
-                print(f"获取天气失败: {str(e)}")
-        
-        # 调用图像识别服务
-        from services.image_recognition_service import ImageRecognitionService
-        image_service = ImageRecognitionService()
-        # 传入天气数据进行分析和推荐
-        analysis_result = image_service.analyze_image(file_path, weather_data)
-        
-        # 获取文件名用于生成URL
-        filename = os.path.basename(file_path)
-        file_url = f"/uploads/{filename}"
-        
-        # --- 优化：自动上传模特图到 OSS 并缓存 ---
-        oss_url = None
-        try:
-            from services.virtual_tryon_service import VirtualTryonService
-            tryon_service = VirtualTryonService()
-            print(f"Auto-uploading model to OSS: {file_path}")
-            oss_url = tryon_service._upload_file_to_oss(file_path)
-            
-            if oss_url:
-                # 存入 Session，供后续试穿复用
-                session['model_image_oss_url'] = oss_url
-                session['model_image_local_path'] = file_url
-                session.permanent = True  # 确保 Session 持久化
-                print(f"Model cached in session: {oss_url}")
-        except Exception as oss_e:
-            print(f"Auto-upload model failed: {str(oss_e)}")
-            # 不阻断主流程，前端可以降级处理
-        # ---------------------------------------
-        
-        # 返回成功响应
-        return jsonify({
-            'success': True,
-            'file_path': file_path,
-            'file_url': file_url,
-            'oss_url': oss_url, # 返回 OSS URL
-            'analysis': analysis_result
-        })
+        return _process_model_upload(file_path, location_id)
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
     except Exception as e:
         # 捕获并返回所有异常
         return jsonify({'error': str(e)}), 500
@@ -182,8 +207,6 @@ def city_lookup():
     keyword = request.args.get('keyword', '').strip()
     adm = request.args.get('adm', '').strip()
     
-    print(f"API Request: keyword='{keyword}', adm='{adm}'")  # 添加日志
-    
     if not keyword:
         return jsonify({'success': True, 'cities': []})
         
@@ -191,10 +214,10 @@ def city_lookup():
         from services.weather_service import WeatherService
         weather_service = WeatherService()
         cities = weather_service.search_city(keyword, adm)
-        print(f"API Response: found {len(cities)} cities") # 添加日志
+        logger.debug('城市搜索完成', extra={'keyword': keyword, 'adm': adm, 'count': len(cities)})
         return jsonify({'success': True, 'cities': cities})
     except Exception as e:
-        print(f"API Error: {str(e)}") # 添加日志
+        logger.exception('城市搜索失败')
         return jsonify({'success': False, 'error': str(e)})
 
 
@@ -275,11 +298,9 @@ def upload_to_oss_route():
     try:
         data = request.json
         if not data:
-            print("OSS Upload: No JSON data received")
             return jsonify({'success': False, 'error': 'No JSON data'}), 400
              
         local_path = data.get('local_path')
-        print(f"OSS Upload: Requested upload for local_path: {local_path}")
         
         if not local_path:
             return jsonify({'success': False, 'error': 'No local_path provided'}), 400
@@ -289,36 +310,168 @@ def upload_to_oss_route():
         
         # 确保路径是绝对路径
         if not os.path.isabs(local_path):
-            original_path = local_path
             local_path = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(local_path))
-            print(f"OSS Upload: Resolved relative path '{original_path}' to absolute path: {local_path}")
-        else:
-            print(f"OSS Upload: Path is already absolute: {local_path}")
              
         # 检查文件是否存在
         if not os.path.exists(local_path):
-            print(f"OSS Upload: File not found at {local_path}")
+            logger.warning('OSS上传的本地文件不存在', extra={'local_path': local_path})
             return jsonify({'success': False, 'error': f'File not found: {local_path}'}), 404
         
-        # 打印文件大小
-        file_size = os.path.getsize(local_path)
-        print(f"OSS Upload: File exists. Size: {file_size} bytes")
-             
         oss_url = service._upload_file_to_oss(local_path)
         
         if oss_url:
-            print(f"OSS Upload: Success! URL: {oss_url}")
             return jsonify({'success': True, 'url': oss_url})
         else:
-            print("OSS Upload: Failed (service returned None)")
             return jsonify({'success': False, 'error': 'Upload to OSS failed (Check server logs)'}), 500
             
     except Exception as e:
-        import traceback
-        print(f"OSS Upload Error: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception('OSS上传失败')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/oss/policy', methods=['POST'])
+def oss_upload_policy():
+    """
+    OSS直传策略API
+    
+    为浏览器签发短期有效的 PostObject 策略，对象Key由文件内容哈希决定，
+    浏览器拿到策略后直接把文件POST到Bucket，不再经过本服务中转
+    
+    Request:
+        - Method: POST
+        - Body: {
+            "content_hash": "文件内容的SHA-256十六进制摘要",
+            "extension": "jpg/png/gif"
+        }
+        
+    Response:
+        - Success: {
+            "success": true,
+            "exists": false,  # 为true时对象已存在且内容与Key一致，可跳过上传直接登记
+            "key": "对象Key",
+            "host": "上传地址",
+            "fields": {表单字段}
+        }
+    """
+    data = request.get_json(silent=True) or {}
+    
+    from services.oss_service import OssService
+    service = OssService(current_app.config)
+    if not service.is_configured():
+        return jsonify({'success': False, 'error': 'OSS direct upload is not configured'}), 503
+    
+    try:
+        policy = service.create_post_policy(data.get('content_hash'), data.get('extension'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        # 相同内容已上传且通过内容校验时无需再传；这里只查校验缓存和HEAD，下载校验留给 /oss/complete
+        exists = service.is_verified(policy['key'])
+    except Exception as e:
+        logger.warning('OSS对象存在性检查失败: %s', e)
+        exists = False
+    
+    return jsonify(dict(policy, success=True, exists=exists))
+
+
+def _check_direct_upload(service, key):
+    """
+    校验已上传的直传对象：对象存在、文件头是合法图片、内容与Key中的哈希一致
+    
+    Args:
+        service: OssService
+        key: 格式合法的直传对象Key
+        
+    Returns:
+        校验失败时的错误响应，通过时返回None
+    """
+    if not service.object_exists(key):
+        return jsonify({'success': False, 'error': 'Object not found'}), 404
+    
+    # 只读取对象开头部分校验文件头，不合法的图片不送给模型
+    try:
+        validate_image_bytes(service.read_head(key, HEADER_PROBE_SIZE), current_app.config['MAX_IMAGE_PIXELS'],
+                             current_app.config['MAX_IMAGE_FRAMES'])
+    except ImageValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    # 直传策略无法限定内容，内容与Key中的哈希一致后才能按内容哈希登记和复用
+    if not service.verify_object(key):
+        return jsonify({'success': False, 'error': 'Object content does not match its key'}), 400
+    return None
+
+
+@api_bp.route('/oss/complete', methods=['POST'])
+def oss_upload_complete():
+    """
+    OSS直传完成回调API
+    
+    浏览器直传成功后调用，登记对象并按需触发分析。
+    分析时直接把OSS URL交给模型，不再读取本地文件做base64编码
+    
+    Request:
+        - Method: POST
+        - Body: {
+            "key": "策略接口返回的对象Key",
+            "kind": "model/garment",
+            "location_id": "城市ID（可选，仅model）"
+        }
+        
+    Response:
+        - Success: 与 /api/upload（model）或 /api/upload-garment（garment）结构一致
+    """
+    data = request.get_json(silent=True) or {}
+    key = data.get('key', '')
+    kind = data.get('kind', 'model')
+    location_id = (data.get('location_id') or '').strip()
+    
+    if kind not in ('model', 'garment'):
+        return jsonify({'success': False, 'error': 'Invalid kind'}), 400
+    
+    from services.oss_service import OssService
+    service = OssService(current_app.config)
+    if not service.is_configured():
+        return jsonify({'success': False, 'error': 'OSS direct upload is not configured'}), 503
+    if not service.is_direct_upload_key(key):
+        return jsonify({'success': False, 'error': 'Invalid object key'}), 400
+    
+    try:
+        error = _check_direct_upload(service, key)
+        if error is not None:
+            return error
+        
+        oss_url = service.public_url(key)
+        
+        if kind == 'garment':
+            return jsonify({
+                'success': True,
+                'file_path': None,
+                'file_url': oss_url,
+                'oss_url': oss_url
+            })
+        
+        skipped = []
+        weather_data = _fetch_weather(location_id, skipped)
+        analysis_result = _analyze(oss_url, weather_data, skipped)
+        
+        # 存入 Session，供后续试穿复用
+        session['model_image_oss_url'] = oss_url
+        session['model_image_local_path'] = oss_url
+        session.permanent = True
+        
+        return _upload_response({
+            'success': True,
+            'file_path': None,
+            'file_url': oss_url,
+            'oss_url': oss_url,
+            'analysis': analysis_result
+        }, skipped, {})
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
 @api_bp.route('/try-on', methods=['POST'])
 def try_on():
     """
@@ -375,7 +528,7 @@ def try_on():
             top_garment_url=top_garment_url,
             bottom_garment_url=bottom_garment_url
         )
-        return jsonify(result)
+        return _tryon_response(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -391,6 +544,11 @@ def upload_garment():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'success': False, 'error': 'No selected file'}), 400
+    
+    try:
+        validate_uploaded_file(file, current_app.config['MAX_IMAGE_PIXELS'], current_app.config['MAX_IMAGE_FRAMES'])
+    except ImageValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
         
     if file:
         # 修正文件名处理逻辑：不依赖secure_filename处理中文名
@@ -403,8 +561,8 @@ def upload_garment():
         if not ext:
             ext = ".jpg"
             
-        # 加上时间戳生成新文件名
-        filename = f"garment_{datetime.now().strftime('%Y%m%d%H%M%S')}{ext}"
+        # 加上时间戳和随机后缀生成新文件名（同一秒内的上传不会互相覆盖，URL可以长期缓存）
+        filename = f"garment_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}{ext}"
         
         # 确保目录存在
         os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -413,30 +571,211 @@ def upload_garment():
         
         try:
             file.save(file_path)
-            file_url = f"/uploads/{filename}"
-            
-            # --- 优化：自动上传衣物到 OSS ---
-            oss_url = None
-            try:
-                from services.virtual_tryon_service import VirtualTryonService
-                service = VirtualTryonService()
-                print(f"Auto-uploading garment to OSS: {file_path}")
-                oss_url = service._upload_file_to_oss(file_path)
-            except Exception as oss_e:
-                print(f"Auto-upload garment failed: {str(oss_e)}")
-            # --------------------------------
-            
-            return jsonify({
-                'success': True,
-                'file_path': file_path,
-                'file_url': file_url,
-                'oss_url': oss_url
-            })
+            return _process_garment_upload(file_path)
         except Exception as e:
-            print(f"Upload failed: {str(e)}")
+            logger.exception('衣物图片保存失败')
             return jsonify({'success': False, 'error': f"Save failed: {str(e)}"}), 500
 
 
+@api_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    """
+    请求剖析结果索引
+    
+    Request:
+        - Method: GET
+        - Header: X-Profile-Token（或查询参数 _profile）
+        
+    Response:
+        - Success: {"success": true, "profiles": [{"id", "endpoint", "path", "duration_ms", "files"}, ...]}
+    """
+    from utils.profiler import verify_token, request_token, read_index
+    if not current_app.config.get('PROFILER_ENABLED'):
+        abort(404)
+    if not verify_token(current_app.config.get('PROFILER_SECRET'), request_token(request)):
+        abort(403)
+    return jsonify({'success': True, 'profiles': read_index(current_app.config['PROFILE_FOLDER'])})
+
+
+@api_bp.route('/profiles/<filename>', methods=['GET'])
+def download_profile(filename):
+    """
+    下载剖析文件（.pstats 或 .collapsed）
+    
+    Request:
+        - Method: GET
+        - Header: X-Profile-Token（或查询参数 _profile）
+    """
+    from utils.profiler import verify_token, request_token
+    if not current_app.config.get('PROFILER_ENABLED'):
+        abort(404)
+    if not verify_token(current_app.config.get('PROFILER_SECRET'), request_token(request)):
+        abort(403)
+    path = safe_join(current_app.config['PROFILE_FOLDER'], filename)
+    if path is None or not filename.endswith(('.pstats', '.collapsed')) or not os.path.isfile(path):
+        abort(404)
+    return send_file(path, as_attachment=True)
+
+
+@api_bp.route('/uploads', methods=['POST'])
+def resumable_create():
+    """
+    断点续传API - 创建上传（tus风格）
+    
+    Request:
+        - Method: POST
+        - Headers:
+            - Upload-Length: 文件总字节数
+            - Upload-Metadata: tus元数据，如 "filename <base64>"（可选）
+            
+    Response:
+        - 201，Location 头指向上传地址: {
+            "success": true,
+            "upload_id": "上传ID",
+            "location": "/api/uploads/<upload_id>"
+        }
+    """
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Upload-Length header is required'}), 400
+    
+    try:
+        upload_id = _get_resumable_store().create(length, _parse_upload_metadata(request.headers.get('Upload-Metadata', '')))
+    except ResumableUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    location = f"/api/uploads/{upload_id}"
+    response = jsonify({'success': True, 'upload_id': upload_id, 'location': location})
+    response.status_code = 201
+    response.headers['Location'] = location
+    response.headers['Tus-Resumable'] = TUS_VERSION
+    return response
+
+
+@api_bp.route('/uploads/<upload_id>', methods=['HEAD'])
+def resumable_status(upload_id):
+    """
+    断点续传API - 查询进度
+    
+    Response:
+        - 200，Headers: Upload-Offset（已接收字节数）、Upload-Length
+    """
+    try:
+        info = _get_resumable_store().get_info(upload_id)
+    except ResumableUploadError as e:
+        return '', e.status_code
+    
+    return '', 200, {
+        'Upload-Offset': str(info['offset']),
+        'Upload-Length': str(info['length']),
+        'Tus-Resumable': TUS_VERSION,
+        'Cache-Control': 'no-store'
+    }
+
+
+@api_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+def resumable_patch(upload_id):
+    """
+    断点续传API - 上传分片
+    
+    请求体以流的方式写入暂存文件，不会整体读入内存
+    
+    Request:
+        - Method: PATCH
+        - Headers:
+            - Upload-Offset: 本分片的起始偏移量，必须等于已接收字节数
+            - Content-Type: application/offset+octet-stream
+        - Body: 分片数据
+        
+    Response:
+        - 204，Headers: Upload-Offset（写入后的偏移量）
+        - 409: 偏移量不一致，客户端应先 HEAD 查询进度
+    """
+    if request.mimetype != 'application/offset+octet-stream':
+        return jsonify({'success': False, 'error': 'Content-Type must be application/offset+octet-stream'}), 415
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Upload-Offset header is required'}), 400
+    
+    store = _get_resumable_store()
+    try:
+        new_offset = store.append(upload_id, offset, request.stream, request.content_length)
+        if offset == 0 and new_offset >= SNIFF_SIZE:
+            # 首个分片到达后立即检查文件头，伪装文件不必等到传完才被拒绝
+            try:
+                validate_image_bytes(store.read_head(upload_id), current_app.config['MAX_IMAGE_PIXELS'],
+                                     current_app.config['MAX_IMAGE_FRAMES'])
+            except ImageValidationError as e:
+                # 头部不完整时（首个分片过小）留到完成时再校验
+                if e.status_code != 400 or new_offset >= HEADER_PROBE_SIZE:
+                    store.discard(upload_id)
+                    return jsonify({'success': False, 'error': str(e)}), e.status_code
+    except ResumableUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    return '', 204, {'Upload-Offset': str(new_offset), 'Tus-Resumable': TUS_VERSION}
+
+
+@api_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def resumable_finalize(upload_id):
+    """
+    断点续传API - 完成上传
+    
+    合并后的文件交给与普通上传相同的处理流程（分析 + 自动上传OSS）
+    
+    Request:
+        - Method: POST
+        - Body: {
+            "kind": "model/garment",
+            "location_id": "城市ID（可选，仅model）"
+        }
+        
+    Response:
+        - Success: 与 /api/upload（model）或 /api/upload-garment（garment）结构一致
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind', 'model')
+    location_id = (data.get('location_id') or '').strip()
+    if kind not in ('model', 'garment'):
+        return jsonify({'success': False, 'error': 'Invalid kind'}), 400
+    
+    store = _get_resumable_store()
+    try:
+        info = store.get_info(upload_id)
+        filename = info['metadata'].get('filename') or 'upload.jpg'
+        if not allowed_file(filename):
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+        
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # 仅保留扩展名（secure_filename会去掉中文文件名的主体和点号）
+        ext = os.path.splitext(filename)[1] or '.jpg'
+        prefix = 'garment_' if kind == 'garment' else ''
+        file_path = os.path.join(upload_folder, f"{prefix}{timestamp}_{upload_id[:8]}{ext}")
+        store.finalize(upload_id, file_path)
+    except ResumableUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    try:
+        with open(file_path, 'rb') as f:
+            validate_image_stream(f, current_app.config['MAX_IMAGE_PIXELS'], current_app.config['MAX_IMAGE_FRAMES'])
+    except ImageValidationError as e:
+        os.remove(file_path)
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    try:
+        if kind == 'garment':
+            return _process_garment_upload(file_path)
+        return _process_model_upload(file_path, location_id)
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api_bp.route('/try-on/status/<task_id>', methods=['GET'])
 def try_on_status(task_id):
     """
@@ -458,47 +797,475 @@ def try_on_status(task_id):
         from services.virtual_tryon_service import VirtualTryonService
         service = VirtualTryonService()
         result = service.check_task_status(task_id)
-        return jsonify(result)
+        return _tryon_response(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api_bp.route('/analyze', methods=['POST'])
+def analyze_submit():
+    """
+    异步分析API - 提交任务
+    
+    登记分析任务后立即返回任务ID，识别在后台（线程池或 Celery worker）执行，
+    请求不等待千问VL
+    
+    Request:
+        - Method: POST
+        - Content-Type: multipart/form-data
+            - file: 图片文件
+            - location_id: 城市ID (可选)
+        - 或 Content-Type: application/json
+            - key: OSS直传的对象Key（见 /api/oss/policy）
+            - location_id: 城市ID (可选)
+    
+    Response:
+        - Success (202): {
+            "success": true,
+            "job_id": "任务ID",
+            "status": "queued",
+            "status_url": "/api/analyze/<job_id>"
+        }
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        location_id = request.form.get('location_id', '').strip()
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        try:
+            validate_uploaded_file(file, current_app.config['MAX_IMAGE_PIXELS'], current_app.config['MAX_IMAGE_FRAMES'])
+        except ImageValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status_code
+        image = save_uploaded_file(file, current_app.config['UPLOAD_FOLDER'])
+    else:
+        data = request.get_json(silent=True) or {}
+        key = data.get('key', '')
+        location_id = (data.get('location_id') or '').strip()
+        if not key:
+            return jsonify({'success': False, 'error': 'No file or object key provided'}), 400
+        
+        from services.oss_service import OssService
+        service = OssService(current_app.config)
+        if not service.is_configured():
+            return jsonify({'success': False, 'error': 'OSS direct upload is not configured'}), 503
+        if not service.is_direct_upload_key(key):
+            return jsonify({'success': False, 'error': 'Invalid object key'}), 400
+        # 与登记直传对象相同的校验，不存在或不合法的对象不进入队列
+        try:
+            error = _check_direct_upload(service, key)
+        except CircuitOpenError as e:
+            return _upstream_unavailable(e)
+        except Exception as e:
+            logger.warning('OSS对象校验失败: %s', e)
+            return jsonify({'success': False, 'error': 'Object storage is unavailable'}), 503, {'Retry-After': '5'}
+        if error is not None:
+            return error
+        image = service.public_url(key)
+    
+    from services.analysis_jobs import submit_job, job_to_dict
+    try:
+        job = submit_job(image, location_id)
+    except Exception as e:
+        logger.warning('分析任务投递失败: %s', e)
+        return jsonify({'success': False, 'error': 'Analysis queue is unavailable'}), 503, {'Retry-After': '5'}
+    
+    body = dict(job_to_dict(job), success=True, status_url=f"/api/analyze/{job.id}")
+    return jsonify(body), 202, {'Location': body['status_url']}
+
+
+@api_bp.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    批量分析API
+
+    一次分析多张图片：并行预处理，相同内容的图片只调用一次模型，
+    最多 ANALYZE_BATCH_CONCURRENCY 张同时分析，每张完成后立即输出一行结果（NDJSON 流式响应）
+
+    Request:
+        - Method: POST
+        - Content-Type: multipart/form-data
+            - files: 图片文件（可重复多次）
+            - location_id: 城市ID (可选)
+        - 或 Content-Type: application/json
+            - keys: OSS直传的对象Key列表（见 /api/oss/policy），适合超过 MAX_CONTENT_LENGTH 的大批量
+            - location_id: 城市ID (可选)
+
+    Response (application/x-ndjson，每行一个JSON):
+        - {"type": "result", "index": 0, "name": "文件名", "status": "succeeded", "analysis": {...},
+           "elapsed_ms": 2310, "duplicate_of": null}
+        - {"type": "result", "index": 3, "name": "文件名", "status": "failed", "error": "错误信息"}
+          （超出限流额度未分析的图片另带 "retry_after": 秒数）
+        - 最后一行: {"type": "summary", "total": 20, "unique": 18, "duplicates": 2, "succeeded": 19,
+           "failed": 1, "elapsed_s": 12.4, "images_per_second": 1.53, ...}
+    """
+    from services import batch_analysis
+    config = current_app.config
+    max_pixels, max_frames = config['MAX_IMAGE_PIXELS'], config['MAX_IMAGE_FRAMES']
+
+    if request.files:
+        files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+        location_id = request.form.get('location_id', '').strip()
+        if not files:
+            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        if len(files) > config['ANALYZE_BATCH_MAX_IMAGES']:
+            return jsonify({'success': False, 'error': f"At most {config['ANALYZE_BATCH_MAX_IMAGES']} images per batch"}), 400
+        upload_folder = config['UPLOAD_FOLDER']
+        tasks = [lambda i=i, f=f: batch_analysis.prepare_upload(i, f, upload_folder, max_pixels, max_frames)
+                 for i, f in enumerate(files)]
+    else:
+        data = request.get_json(silent=True) or {}
+        keys = data.get('keys')
+        location_id = (data.get('location_id') or '').strip()
+        if not keys or not isinstance(keys, list):
+            return jsonify({'success': False, 'error': 'No files or object keys provided'}), 400
+        if len(keys) > config['ANALYZE_BATCH_MAX_IMAGES']:
+            return jsonify({'success': False, 'error': f"At most {config['ANALYZE_BATCH_MAX_IMAGES']} images per batch"}), 400
+
+        from services.oss_service import OssService
+        service = OssService(config)
+        if not service.is_configured():
+            return jsonify({'success': False, 'error': 'OSS direct upload is not configured'}), 503
+        tasks = [lambda i=i, k=k: batch_analysis.prepare_object(i, str(k), service, HEADER_PROBE_SIZE,
+                                                                  max_pixels, max_frames)
+                 for i, k in enumerate(keys)]
+
+    items = batch_analysis.preprocess(tasks, config['ANALYZE_BATCH_PREPROCESS_WORKERS'])
+
+    # 按图片计费：进入时已扣除一张图片的令牌，去重后其余每张需要调用模型的图片再扣一次，
+    # 令牌不足的图片不分析，结果中带 retry_after；并发的模型调用各占一个全局并发槽位，占不到时降低并发数
+    from utils import admission
+    unique = batch_analysis.unique_digests(items)
+    charged, rejection = admission.charge_request(len(unique) - 1)
+    if rejection is not None:
+        batch_analysis.reject_digests(items, unique[charged + 1:], admission.rejection_body(rejection)['error'],
+                                      int(rejection.retry_after_header))
+    concurrency = 1 + admission.acquire_request_slots(config['ANALYZE_BATCH_CONCURRENCY'] - 1)
+    # 天气对整批图片相同，只获取一次
+    weather_data = _fetch_weather(location_id)
+
+    from services.image_recognition_service import ImageRecognitionService
+    service = ImageRecognitionService(current_app.config)
+    events = batch_analysis.run_batch(items, lambda image: service.analyze_image(image, weather_data), concurrency)
+    dumps = current_app.json.dumps
+    return Response(stream_with_context(batch_analysis.to_ndjson(event, dumps) for event in events),
+                    mimetype=batch_analysis.NDJSON_MIMETYPE, headers={'Cache-Control': 'no-store'})
+
+
+@api_bp.route('/analyze/<job_id>', methods=['GET'])
+def analyze_status(job_id):
+    """
+    异步分析API - 查询任务
+    
+    Request:
+        - Method: GET
+        
+    Response:
+        - Success: {
+            "success": true,
+            "job_id": "任务ID",
+            "status": "queued/running/succeeded/failed",
+            "analysis": {...} (成功时，结构同 /api/upload 的 analysis),
+            "error": "失败原因" (失败时)
+        }
+        - 未结束的任务带 Retry-After 响应头
+    """
+    from database_models import db, AnalysisJob
+    from services.analysis_jobs import job_to_dict, FINISHED_STATUSES
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = jsonify(dict(job_to_dict(job), success=True))
+    if job.status not in FINISHED_STATUSES:
+        response.headers['Retry-After'] = '2'
+    return response
+
+
+@api_bp.route('/pending/<token>', methods=['GET'])
+def pending_result(token):
+    """
+    取回延后完成的结果
+    
+    上传分析在截止时间内没有完成的部分（响应中的 pending，如 {"oss_url": "<token>"}）在后台继续执行，
+    完成后通过该接口取回
+    
+    Request:
+        - Method: GET
+        
+    Response:
+        - 执行中: {"success": true, "status": "pending"}（带 Retry-After）
+        - 已完成: {"success": true, "status": "done", "oss_url": "..."}
+        - 失败: {"success": false, "status": "failed", "error": "错误信息"}
+    """
+    from utils.pending_results import get_pending_results, PENDING, DONE
+    record = get_pending_results(current_app.config).get(token)
+    if record is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired token'}), 404
+    if record['state'] == PENDING:
+        return jsonify({'success': True, 'status': PENDING}), 200, {'Retry-After': '1'}
+    if record['state'] != DONE:
+        return jsonify({'success': False, 'status': record['state'], 'error': record.get('error')})
+    
+    result = dict(record['result'])
+    updates = result.pop('session', None) or {}
+    for name, value in updates.items():
+        session[name] = value
+    if updates:
+        session.permanent = True
+    return jsonify(dict(result, success=True, status=DONE))
+
+
 # ------------------------------ 工具函数 ------------------------------
 
-def allowed_file(filename):
+def _upstream_unavailable(error):
+    """
+    上游熔断且没有降级结果时的响应：503 和 Retry-After
+    
+    Args:
+        error: CircuitOpenError
+        
+    Returns:
+        tuple: (Response, 503, headers)
+    """
+    return (jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after_header}),
+            503, {'Retry-After': error.retry_after_header})
+
+
+def _tryon_response(result):
+    """试穿服务的结果转为响应，熔断降级的结果（带 retry_after）返回503"""
+    if result.get('retry_after'):
+        return jsonify(result), 503, {'Retry-After': result['retry_after']}
+    return jsonify(result)
+
+
+def _process_model_upload(file_path, location_id):
+    """
+    处理已保存到本地的人物照片：获取天气、识别分析、自动上传OSS并缓存到Session
+    
+    上传OSS与天气、分析同时进行；请求有截止时间（utils/deadline.py）时，
+    截止前没有完成的天气和分析标记为 skipped，上传OSS在后台继续并标记为 pending
+    
+    Args:
+        file_path: 本地文件路径
+        location_id: 城市ID（可为空）
+        
+    Returns:
+        Response: 上传接口的JSON响应
+    """
+    # 获取文件名用于生成URL
+    filename = os.path.basename(file_path)
+    file_url = f"/uploads/{filename}"
+    
+    # --- 优化：自动上传模特图到 OSS 并缓存（后台执行，不受截止时间限制） ---
+    from utils import pending_results
+    oss_future = pending_results.run_in_background(_upload_model_to_oss, file_path, file_url)
+    
+    # 获取天气数据（如果提供了location_id），传入天气数据进行分析和推荐
+    skipped = []
+    weather_data = _fetch_weather(location_id, skipped)
+    analysis_result = _analyze(file_path, weather_data, skipped)
+    
+    oss_url = None
+    pending = {}
+    try:
+        uploaded = oss_future.result(timeout=deadline.remaining())
+    except FutureTimeoutError:
+        # 截止时间已到，OSS URL 稍后通过 /api/pending/<token> 取回
+        pending['oss_url'] = pending_results.get_pending_results(current_app.config).defer(oss_future)
+    else:
+        oss_url = uploaded['oss_url']
+        for name, value in uploaded['session'].items():
+            session[name] = value
+        if uploaded['session']:
+            session.permanent = True  # 确保 Session 持久化
+    # ---------------------------------------
+    
+    # 返回成功响应
+    return _upload_response({
+        'success': True,
+        'file_path': file_path,
+        'file_url': file_url,
+        'oss_url': oss_url, # 返回 OSS URL
+        'analysis': analysis_result
+    }, skipped, pending)
+
+
+def _upload_model_to_oss(file_path, file_url):
+    """
+    上传模特图到OSS（后台线程执行）
+    
+    Returns:
+        dict: {'oss_url': OSS URL或None, 'session': 需要写入 Session 的值}
+    """
+    try:
+        from services.virtual_tryon_service import VirtualTryonService
+        oss_url = VirtualTryonService()._upload_file_to_oss(file_path)
+    except Exception as oss_e:
+        logger.warning('模特图自动上传OSS失败: %s', oss_e)
+        # 不阻断主流程，前端可以降级处理
+        return {'oss_url': None, 'session': {}}
+    if not oss_url:
+        return {'oss_url': None, 'session': {}}
+    logger.debug('模特图已上传OSS', extra={'oss_url': oss_url})
+    # 存入 Session，供后续试穿复用
+    return {'oss_url': oss_url, 'session': {'model_image_oss_url': oss_url, 'model_image_local_path': file_url}}
+
+
+def _analyze(image, weather_data, skipped):
+    """
+    调用图像识别服务，请求的剩余时间用完时返回None并记入 skipped
+    
+    Args:
+        image: 本地文件路径或图片URL
+        weather_data: 天气数据（可为None）
+        skipped: 被放弃的部分列表
+        
+    Returns:
+        dict: 分析结果，或None
+    """
+    from services.image_recognition_service import ImageRecognitionService
+    try:
+        return ImageRecognitionService(current_app.config).analyze_image(image, weather_data)
+    except DeadlineExceeded:
+        logger.warning('请求截止时间已到，跳过图像分析')
+        skipped.append('analysis')
+        return None
+
+
+def _upload_response(body, skipped, pending):
+    """
+    上传分析接口的响应：skipped 为被放弃的部分，pending 为后台继续执行的部分及其取回令牌
+    
+    Returns:
+        Response
+    """
+    body['skipped'] = skipped
+    body['pending'] = pending
+    response = jsonify(body)
+    if skipped:
+        response.headers[deadline.PARTIAL_HEADER] = ','.join(skipped)
+    return response
+
+
+def _process_garment_upload(file_path):
     """
-    检查文件名是否为允许的图片类型
+    处理已保存到本地的衣物图片：自动上传OSS
     
     Args:
-        filename: 文件名
+        file_path: 本地文件路径
         
     Returns:
-        bool: True表示允许，False表示不允许
+        Response: 衣物上传接口的JSON响应
     """
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    file_url = f"/uploads/{os.path.basename(file_path)}"
+    
+    # --- 优化：自动上传衣物到 OSS ---
+    oss_url = None
+    try:
+        from services.virtual_tryon_service import VirtualTryonService
+        service = VirtualTryonService()
+        oss_url = service._upload_file_to_oss(file_path)
+    except Exception as oss_e:
+        logger.warning('衣物图自动上传OSS失败: %s', oss_e)
+    # --------------------------------
+    
+    return jsonify({
+        'success': True,
+        'file_path': file_path,
+        'file_url': file_url,
+        'oss_url': oss_url
+    })
 
 
-def save_uploaded_file(file, upload_folder):
+def _send_upload(path, upload_folder, vary_accept):
     """
-    保存上传的文件到指定目录
+    发送上传目录下的文件（原图或变体），带 immutable 缓存头并支持 If-None-Match → 304
     
     Args:
-        file: 上传的文件对象
-        upload_folder: 保存目录
+        path: 文件绝对路径，必须位于上传目录内
+        upload_folder: 上传目录
+        vary_accept: 响应内容是否随 Accept 头变化（WebP/JPEG 协商）
         
     Returns:
-        str: 保存的文件路径
+        Response: 文件响应或304响应
+    """
+    max_age = current_app.config['UPLOADS_CACHE_MAX_AGE']
+    mode = current_app.config.get('UPLOADS_SENDFILE_MODE')
+    
+    if mode == 'x-accel':
+        # nginx 通过 internal location 发送文件字节，这里只生成响应头
+        stat = os.stat(path)
+        relative_path = os.path.relpath(path, upload_folder).replace(os.sep, '/')
+        response = current_app.response_class(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOADS_ACCEL_PREFIX'] + relative_path
+        response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        response.last_modified = stat.st_mtime
+        response.make_conditional(request)
+    else:
+        # x-sendfile 模式由 Flask 的 USE_X_SENDFILE 处理（在 create_app 中开启）
+        response = send_file(path, etag=True, conditional=True, max_age=max_age)
+    
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    if vary_accept:
+        response.vary.add('Accept')
+    return response
+
+
+def _get_resumable_store():
+    """根据应用配置创建断点续传存储"""
+    return ResumableUploadStore(
+        current_app.config['RESUMABLE_UPLOAD_FOLDER'],
+        current_app.config['RESUMABLE_UPLOAD_MAX_SIZE'],
+        current_app.config['RESUMABLE_UPLOAD_EXPIRE_SECONDS'],
+        sweep_interval=current_app.config['RESUMABLE_UPLOAD_SWEEP_INTERVAL']
+    )
+
+
+def _parse_upload_metadata(header):
     """
-    # 生成安全的文件名
-    filename = secure_filename(file.filename)
-    # 添加时间戳前缀，避免文件名冲突
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'{timestamp}_{filename}'
+    解析 tus 的 Upload-Metadata 头
+    格式为逗号分隔的 "key base64(value)" 对
     
-    # 拼接完整的文件路径
-    file_path = os.path.join(upload_folder, filename)
-    # 保存文件
-    file.save(file_path)
+    Args:
+        header: Upload-Metadata 头的值
+        
+    Returns:
+        dict: 解码后的元数据
+    """
+    metadata = {}
+    for pair in header.split(','):
+        parts = pair.strip().split(' ', 1)
+        if not parts[0]:
+            continue
+        try:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode('utf-8') if len(parts) > 1 else ''
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return metadata
+
+
+def _fetch_weather(location_id, skipped=None):
+    """
+    获取实时天气，失败时返回None，不阻断主流程
     
-    return file_path
+    Args:
+        location_id: 城市ID，为空时直接返回None
+        skipped: 被放弃的部分列表（可选），获取失败时记入 'weather'
+        
+    Returns:
+        dict: 天气数据，或None
+    """
+    if not location_id:
+        return None
+    weather_data = None
+    try:
+        from services.weather_service import WeatherService
+        weather_service = WeatherService()
+        weather_data = weather_service.get_weather_now(location_id)
+    except Exception as e:
+        logger.warning('获取天气失败: %s', e)
+    if weather_data is None and skipped is not None:
+        skipped.append('weather')
+    return weather_data
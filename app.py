@@ -6,7 +6,6 @@ Flask应用的入口点，负责初始化应用、配置数据库、注册路由
 
 from flask import Flask
 from flask_cors import CORS  # 处理跨域请求
-from flask_migrate import Migrate  # 数据库迁移工具
 from config import config  # 导入配置
 import os
 from dotenv import load_dotenv
@@ -30,16 +29,65 @@ def create_app(config_name='default'):
     
     # 加载配置
     app.config.from_object(config[config_name])
+    # 上传文件交给 Apache/lighttpd 发送时启用 X-Sendfile
+    app.config['USE_X_SENDFILE'] = app.config.get('UPLOADS_SENDFILE_MODE') == 'x-sendfile'
+    # 缩略图变体和分片暂存目录未单独配置时放在（可能被覆盖的）UPLOAD_FOLDER 下
+    for key, name in (('IMAGE_VARIANT_FOLDER', '.variants'), ('RESUMABLE_UPLOAD_FOLDER', '.resumable')):
+        if not app.config.get(key):
+            app.config[key] = os.path.join(app.config['UPLOAD_FOLDER'], name)
+    
+    # jsonify 使用 orjson（未安装时为标准库 json），并支持 services/result_models.py 中的结果模型
+    from utils import json_provider
+    json_provider.init_app(app)
     
     # 初始化CORS，允许跨域请求
     CORS(app)
     
+    # 结构化日志和请求关联ID（X-Request-ID）
+    from utils import logging_utils
+    logging_utils.init_app(app)
+    
+    # 上传分析等接口的总耗时预算（REQUEST_DEADLINES），上游调用使用剩余时间作为超时，需在幂等键和准入控制之前注册
+    from utils import deadline
+    deadline.init_app(app)
+    
+    # 两级缓存（天气、分析结果、OSS URL），CACHE_BACKEND 选择L2
+    from utils import cache
+    cache.init_app(app)
+    
+    # 上游流量录制/回放（仅在 UPSTREAM_CASSETTE_MODE 设置时生效）
+    if app.config.get('UPSTREAM_CASSETTE_MODE'):
+        from utils import upstream_cassette
+        upstream_cassette.init_app(app)
+    
+    # 记录各路由的请求延迟（/metrics 输出）
+    if app.config.get('METRICS_ENABLED'):
+        from utils import metrics
+        metrics.init_app(app)
+    
+    # 只读接口的ETag/Cache-Control和JSON压缩，需在幂等处理之前注册（幂等缓存保存未压缩的响应体）
+    if app.config.get('HTTP_CACHE_ENABLED'):
+        from utils import http_cache
+        http_cache.init_app(app)
+
+    # 上传分析和试穿提交的幂等键（Idempotency-Key），需在准入控制之前注册
+    if app.config.get('IDEMPOTENCY_ENABLED'):
+        from utils import idempotency
+        idempotency.init_app(app)
+    
+    # 高成本接口的准入控制（令牌桶限流和全局并发上限）
+    if app.config.get('ADMISSION_ENABLED'):
+        from utils import admission
+        admission.init_app(app)
+    
     # 延迟导入模型，避免循环导入问题
     from database_models import db
     # 初始化数据库
     db.init_app(app)
-    # 初始化数据库迁移工具
-    migrate = Migrate(app, db)
+    # 初始化数据库迁移工具（flask_migrate 会导入 alembic，耗时较长，只在需要时加载）
+    if app.config.get('ENABLE_MIGRATIONS'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
     
     # 延迟导入路由蓝图，避免循环导入问题
     from api_routes import main_bp, api_bp
@@ -47,15 +95,18 @@ def create_app(config_name='default'):
     app.register_blueprint(main_bp)  # 注册主路由蓝图（无前缀）
     app.register_blueprint(api_bp, url_prefix='/api')  # 注册API路由蓝图（/api前缀）
     
+    # 按需请求剖析（未开启时不包装视图，没有额外开销）
+    from utils import profiler
+    profiler.init_app(app)
+    
     # 显式注册一个 /upload 路由到主蓝图，防止被 api_bp 的 /api/upload 覆盖或混淆
     # 虽然 main_bp 已经注册了 /upload，但为了保险起见，我们确保它工作正常
     # 注意：upload 页面路由已经在 api_routes.py 的 main_bp 中定义了
     
-    # 打印所有注册的路由，用于调试
-    print("=== Registered Routes ===")
-    for rule in app.url_map.iter_rules():
-        print(f"{rule} -> {rule.endpoint}")
-    print("=========================")
+    # 打印所有注册的路由，用于调试（仅开发环境）
+    if app.config.get('PRINT_ROUTES'):
+        for rule in app.url_map.iter_rules():
+            app.logger.debug('Registered route %s -> %s', rule, rule.endpoint)
     
     # 创建上传目录（如果不存在）
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
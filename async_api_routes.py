@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+异步路由文件
+异步服务模式（Quart）下的上游密集型API路由：图片上传分析、天气、城市搜索、虚拟试穿。
+请求和响应格式与 api_routes.py 中的同名路由完全一致，
+区别在于等待千问VL、DashScope、和风天气和OSS期间不占用工作线程
+"""
+
+import os
+import asyncio
+import logging
+
+from quart import Blueprint, request, jsonify, current_app, session
+
+from utils.file_utils import validate_uploaded_file, build_upload_path
+from utils.image_validation import ImageValidationError
+from utils.resilience import CircuitOpenError
+from utils import deadline
+from utils.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# 创建蓝图实例，名称与同步模式一致，保证 url_for('api.xxx') 等用法不变
+async_api_bp = Blueprint('api', __name__)
+
+
+@async_api_bp.route('/upload', methods=['POST'])
+async def upload_image():
+    """
+    图片上传API（异步版本）
+
+    Request/Response 同 api_routes.upload_image。
+    天气查询在保存文件的同时进行，上传OSS与分析同时进行
+    """
+    files = await request.files
+    form = await request.form
+
+    # 检查请求中是否包含文件
+    if 'file' not in files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = files['file']
+    location_id = form.get('location_id', '').strip()
+
+    # 检查文件是否被选择
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+
+    # 检查文件类型、文件头和尺寸（只读取文件头，耗时可忽略）
+    try:
+        validate_uploaded_file(file, current_app.config['MAX_IMAGE_PIXELS'], current_app.config['MAX_IMAGE_FRAMES'])
+    except ImageValidationError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+    try:
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        file_path = build_upload_path(file.filename, upload_folder)
+        file_url = f"/uploads/{os.path.basename(file_path)}"
+
+        # 保存文件与查询天气并行进行
+        skipped = []
+        _, weather_data = await asyncio.gather(
+            file.save(file_path),
+            _fetch_weather(location_id, skipped)
+        )
+
+        # 自动上传模特图到 OSS 并缓存，与分析同时进行（独立任务，不受截止时间限制）
+        from utils import pending_results
+        oss_task = pending_results.run_in_background_async(_upload_model_to_oss, file_path, file_url, upload_folder)
+
+        analysis_result = None
+        try:
+            from services.image_recognition_service import ImageRecognitionService
+            image_service = ImageRecognitionService(current_app.config)
+            analysis_result = await image_service.analyze_image_async(file_path, weather_data)
+        except DeadlineExceeded:
+            logger.warning('请求截止时间已到，跳过图像分析')
+            skipped.append('analysis')
+
+        oss_url = None
+        pending = {}
+        await asyncio.wait({oss_task}, timeout=deadline.remaining())
+        if not oss_task.done():
+            # 截止时间已到，OSS URL 稍后通过 /api/pending/<token> 取回
+            pending['oss_url'] = pending_results.get_pending_results(current_app.config).defer(oss_task)
+        else:
+            uploaded = oss_task.result()
+            oss_url = uploaded['oss_url']
+            if uploaded['session']:
+                # 存入 Session，供后续试穿复用（与同步模式的 Session Cookie 格式相同）
+                for name, value in uploaded['session'].items():
+                    session[name] = value
+                session.permanent = True
+
+        response = jsonify({
+            'success': True,
+            'file_path': file_path,
+            'file_url': file_url,
+            'oss_url': oss_url,
+            'analysis': analysis_result,
+            'skipped': skipped,
+            'pending': pending
+        })
+        if skipped:
+            response.headers[deadline.PARTIAL_HEADER] = ','.join(skipped)
+        return response
+    except CircuitOpenError as e:
+        return (jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after_header}),
+                503, {'Retry-After': e.retry_after_header})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@async_api_bp.route('/city-lookup', methods=['GET'])
+async def city_lookup():
+    """城市搜索API（异步版本），Request/Response 同 api_routes.city_lookup"""
+    keyword = request.args.get('keyword', '').strip()
+    adm = request.args.get('adm', '').strip()
+
+    if not keyword:
+        return jsonify({'success': True, 'cities': []})
+
+    try:
+        from services.weather_service import WeatherService
+        weather_service = WeatherService(current_app.config)
+        cities = await weather_service.search_city_async(keyword, adm)
+        return jsonify({'success': True, 'cities': cities})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@async_api_bp.route('/weather', methods=['GET'])
+async def get_weather():
+    """实时天气API（异步版本），Request/Response 同 api_routes.get_weather"""
+    location_id = request.args.get('location_id', '').strip()
+    if not location_id:
+        return jsonify({'error': 'Location ID is required'}), 400
+
+    try:
+        from services.weather_service import WeatherService
+        weather_service = WeatherService(current_app.config)
+        weather_data = await weather_service.get_weather_now_async(location_id)
+
+        if weather_data:
+            return jsonify({'success': True, 'weather': weather_data})
+        else:
+            return jsonify({'error': 'Failed to fetch weather data'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@async_api_bp.route('/try-on', methods=['POST'])
+async def try_on():
+    """虚拟试穿API - 提交任务（异步版本），Request/Response 同 api_routes.try_on"""
+    data = await request.get_json(silent=True)
+    if not data:
+        return jsonify({'success': False, 'error': 'No JSON data provided'}), 400
+
+    person_image_url = data.get('person_image_url')
+    clothing_type = data.get('clothing_type', 'top')
+
+    clothing_image_url = data.get('clothing_image_url')
+    top_garment_url = data.get('top_garment_url')
+    bottom_garment_url = data.get('bottom_garment_url')
+
+    if not person_image_url:
+        return jsonify({'success': False, 'error': 'Missing person image URL'}), 400
+
+    if clothing_type == 'full':
+        if not top_garment_url or not bottom_garment_url:
+            return jsonify({'success': False, 'error': 'Missing top or bottom garment URL for full try-on'}), 400
+    else:
+        if not clothing_image_url and not top_garment_url and not bottom_garment_url:
+            return jsonify({'success': False, 'error': 'Missing clothing image URL'}), 400
+
+    try:
+        from services.virtual_tryon_service import VirtualTryonService
+        service = VirtualTryonService(current_app.config['UPLOAD_FOLDER'])
+        result = await service.generate_tryon_async(
+            person_image_url=person_image_url,
+            clothing_image_url=clothing_image_url,
+            clothing_type=clothing_type,
+            top_garment_url=top_garment_url,
+            bottom_garment_url=bottom_garment_url
+        )
+        return _tryon_response(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@async_api_bp.route('/try-on/status/<task_id>', methods=['GET'])
+async def try_on_status(task_id):
+    """虚拟试穿API - 查询状态（异步版本），Request/Response 同 api_routes.try_on_status"""
+    try:
+        from services.virtual_tryon_service import VirtualTryonService
+        service = VirtualTryonService(current_app.config['UPLOAD_FOLDER'])
+        result = await service.check_task_status_async(task_id)
+        return _tryon_response(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ------------------------------ 工具函数 ------------------------------
+
+def _tryon_response(result):
+    """试穿服务的结果转为响应，熔断降级的结果（带 retry_after）返回503"""
+    if result.get('retry_after'):
+        return jsonify(result), 503, {'Retry-After': result['retry_after']}
+    return jsonify(result)
+
+
+async def _upload_model_to_oss(file_path, file_url, upload_folder):
+    """
+    上传模特图到OSS（独立任务执行），返回值同 api_routes._upload_model_to_oss
+    """
+    try:
+        from services.virtual_tryon_service import VirtualTryonService
+        oss_url = await VirtualTryonService(upload_folder)._upload_file_to_oss_async(file_path)
+    except Exception as oss_e:
+        logger.warning('模特图自动上传OSS失败: %s', oss_e)
+        return {'oss_url': None, 'session': {}}
+    if not oss_url:
+        return {'oss_url': None, 'session': {}}
+    return {'oss_url': oss_url, 'session': {'model_image_oss_url': oss_url, 'model_image_local_path': file_url}}
+
+
+async def _fetch_weather(location_id, skipped=None):
+    """
+    获取实时天气（异步版本），失败时返回None，不阻断主流程
+
+    Args:
+        location_id: 城市ID，为空时直接返回None
+        skipped: 被放弃的部分列表（可选），获取失败时记入 'weather'
+
+    Returns:
+        dict: 天气数据，或None
+    """
+    if not location_id:
+        return None
+    weather_data = None
+    try:
+        from services.weather_service import WeatherService
+        weather_data = await WeatherService(current_app.config).get_weather_now_async(location_id)
+    except Exception as e:
+        logger.warning('获取天气失败: %s', e)
+    if weather_data is None and skipped is not None:
+        skipped.append('weather')
+    return weather_data
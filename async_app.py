@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+异步应用入口
+提供与 create_app 对应的 Quart 应用工厂，用于异步服务模式：
+上游密集型路由（上传分析、天气、城市搜索、虚拟试穿）由 Quart 异步处理，
+等待上游响应时不占用工作线程，单进程可同时挂起数百个上游请求；
+其余路由（页面、静态文件、断点续传等）仍由同步的 Flask 应用处理
+
+运行方式（需要安装 requirements-async.txt 中的依赖）：
+    hypercorn "async_app:create_asgi_app('production')" --bind 0.0.0.0:5000
+"""
+
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from dotenv import load_dotenv
+
+from config import config
+
+# 加载环境变量
+load_dotenv()
+
+# 跨域预检允许的方法（与 Flask-CORS 的默认值相同）
+CORS_ALLOW_METHODS = 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+
+
+def create_async_app(config_name='default'):
+    """
+    创建并配置Quart应用实例
+
+    Args:
+        config_name: 配置名称，可选值：'development', 'production', 'testing', 'default'
+
+    Returns:
+        Quart应用实例，只包含异步API路由
+    """
+    from quart import Quart, request, g, session, jsonify
+
+    app = Quart(__name__)
+
+    # 与同步应用使用同一套配置，SECRET_KEY 相同时两者的 Session Cookie 可以互相读取
+    app.config.from_object(config[config_name])
+
+    # 与同步应用相同的 JSON Provider
+    from utils import json_provider
+    json_provider.init_app(app)
+
+    from async_api_routes import async_api_bp
+    app.register_blueprint(async_api_bp, url_prefix='/api')
+
+    from utils import logging_utils
+
+    # 日志与同步应用共用同一个队列处理器
+    logging_utils.configure_logging(app.config)
+
+    if app.config.get('UPSTREAM_CASSETTE_MODE'):
+        from utils import upstream_cassette
+        upstream_cassette.init_app(app)
+
+    @app.before_request
+    async def _bind_request_id():
+        # 每个请求运行在独立的任务中，上下文变量不会串到其他请求
+        logging_utils.request_id_var.set(
+            logging_utils.new_request_id(request.headers.get(logging_utils.REQUEST_ID_HEADER)))
+
+    # 上传分析等接口的总耗时预算（与同步应用相同的 REQUEST_DEADLINES）
+    from utils import deadline
+    deadline_budgets = app.config.get('REQUEST_DEADLINES', {})
+
+    @app.before_request
+    async def _start_deadline():
+        budget = deadline.request_budget(deadline_budgets.get(request.endpoint),
+                                         request.headers.get(deadline.TIMEOUT_HEADER))
+        if budget is not None:
+            deadline.start(budget)
+
+    # 两级缓存与同步应用共用同一个进程内实例
+    from utils import cache
+    cache.init_app(app)
+
+    @app.after_request
+    async def _add_request_id_header(response):
+        request_id = logging_utils.get_request_id()
+        if request_id:
+            response.headers[logging_utils.REQUEST_ID_HEADER] = request_id
+        return response
+
+    if app.config.get('METRICS_ENABLED'):
+        # 路由延迟与同步应用记录到同一组指标，/metrics 由同进程的Flask应用输出；
+        # 与同步应用相同，在缓存头、幂等和准入之前注册，延迟包含它们的处理时间
+        import time
+        from utils.metrics import record_request
+
+        @app.before_request
+        async def _start_request_timer():
+            g._metrics_start = time.perf_counter()
+
+        @app.after_request
+        async def _record_request_metrics(response):
+            start = g.pop('_metrics_start', None)
+            if start is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                record_request(route, request.method, response.status_code, time.perf_counter() - start)
+            return response
+
+    @app.before_request
+    async def _answer_cors_preflight():
+        # 与同步应用的 CORS(app) 相同：直接应答跨域预检，放行请求声明的请求头（如 Idempotency-Key、X-Request-Timeout），
+        # 不进入幂等、准入等后续处理（在指标计时之后，预检与同步应用一样计入路由延迟）
+        if request.method != 'OPTIONS' or 'Access-Control-Request-Method' not in request.headers:
+            return None
+        response = app.response_class('', status=200)
+        response.headers['Access-Control-Allow-Methods'] = CORS_ALLOW_METHODS
+        requested_headers = request.headers.get('Access-Control-Request-Headers')
+        if requested_headers:
+            response.headers['Access-Control-Allow-Headers'] = requested_headers
+        return response
+
+    if app.config.get('HTTP_CACHE_ENABLED'):
+        # 缓存头和压缩与同步应用相同，在幂等处理之前注册
+        from utils import http_cache
+
+        cache_policies = app.config.get('HTTP_CACHE_POLICIES', {})
+        compress_min_size = app.config.get('HTTP_COMPRESS_MIN_SIZE', 1024)
+
+        @app.after_request
+        async def _apply_http_cache(response):
+            body = http_cache.finalize_response(response, await response.get_data(), request,
+                                                cache_policies.get(request.endpoint), compress_min_size)
+            if body is not None:
+                response.set_data(body)
+            return response
+
+    if app.config.get('IDEMPOTENCY_ENABLED'):
+        # 幂等键处理与同步应用相同（在准入检查之前，重放的请求不消耗限流令牌）
+        from utils import idempotency
+
+        guard = idempotency.create_guard(app.config)
+
+        @app.before_request
+        async def _check_idempotency_key():
+            key = request.headers.get(idempotency.KEY_HEADER)
+            if key is None or request.method != 'POST' or request.endpoint not in guard.endpoints:
+                return None
+            if not idempotency.valid_key(key):
+                return idempotency.error_body('invalid')
+
+            files = await request.files
+            form = await request.form
+            fingerprint = idempotency.request_fingerprint(
+                await request.get_json(silent=True) if request.is_json else None,
+                form.items(multi=True),
+                files.items(multi=True)
+            )
+            scoped_key = guard.scoped_key(request.endpoint, key)
+            action, record = guard.start(scoped_key, fingerprint)
+            if action == 'pending':
+                record = await guard.wait_async(scoped_key)
+                action = 'replay' if record is not None else 'pending'
+            if action == 'replay':
+                for name, value in (record.get('session') or {}).items():
+                    session[name] = value
+                return app.response_class(record['body'], status=record['status'], headers={
+                    'Content-Type': record['content_type'], idempotency.REPLAYED_HEADER: 'true'})
+            if action != 'execute':
+                body, status = idempotency.error_body(action)
+                return jsonify(body), status, ({'Retry-After': '1'} if status == 409 else {})
+
+            g._idempotency = (scoped_key, fingerprint, dict(session))
+            return None
+
+        @app.after_request
+        async def _store_idempotent_response(response):
+            pending = g.pop('_idempotency', None)
+            if pending is not None:
+                scoped_key, fingerprint, session_before = pending
+                guard.finish(scoped_key, fingerprint, response.status_code, await response.get_data(),
+                             response.content_type, idempotency.session_changes(session_before, dict(session)),
+                             partial=deadline.PARTIAL_HEADER in response.headers)
+            return response
+
+        @app.teardown_request
+        async def _abandon_idempotency_key(exc):
+            pending = g.pop('_idempotency', None)
+            if pending is not None:
+                guard.abandon(pending[0])
+
+    if app.config.get('ADMISSION_ENABLED'):
+        # 准入检查与同步应用相同；后端为 redis 时两者共享限额
+        from utils import admission
+
+        controller = admission.create_controller(app.config)
+        trust_forwarded = app.config.get('ADMISSION_TRUST_FORWARDED_FOR', False)
+
+        @app.before_request
+        async def _admit_request():
+            if request.endpoint not in controller.costs:
+                return None
+            slot, rejection = controller.admit(request.endpoint, admission.client_session_id(session),
+                                               admission.client_ip(request, trust_forwarded))
+            if rejection is not None:
+                return jsonify(admission.rejection_body(rejection)), 429, {
+                    'Retry-After': rejection.retry_after_header}
+            g._admission_slot = slot
+            return None
+
+        @app.teardown_request
+        async def _release_admission_slot(exc):
+            controller.release(g.pop('_admission_slot', None))
+
+    from services.async_http import init_async_client, close_async_client
+
+    @app.before_serving
+    async def _start_http_client():
+        # 所有上游请求共享同一个连接池
+        init_async_client(app.config['ASYNC_HTTP_MAX_CONNECTIONS'], app.config['ASYNC_HTTP_TIMEOUT'])
+
+    @app.after_serving
+    async def _stop_http_client():
+        await close_async_client()
+
+    @app.after_request
+    async def _add_cors_headers(response):
+        # 与同步应用的 CORS(app) 保持一致
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        return response
+
+    return app
+
+
+def create_asgi_app(config_name='default'):
+    """
+    创建完整的ASGI应用：异步路由交给Quart，其余请求转交同步Flask应用
+
+    Args:
+        config_name: 配置名称
+
+    Returns:
+        ASGI应用（可直接交给 hypercorn/uvicorn 运行）
+    """
+    from hypercorn.middleware import AsyncioWSGIMiddleware
+    from app import create_app
+
+    async_app = create_async_app(config_name)
+    flask_app = create_app(config_name)
+    wsgi_app = AsyncioWSGIMiddleware(flask_app, max_body_size=flask_app.config['MAX_CONTENT_LENGTH'])
+    adapter = async_app.url_map.bind('')
+
+    async def application(scope, receive, send):
+        # 生命周期事件交给Quart，用于创建和关闭共享HTTP客户端
+        if scope['type'] == 'lifespan':
+            await async_app(scope, receive, send)
+            return
+        if scope['type'] == 'http':
+            try:
+                adapter.match(scope['path'], method=scope['method'])
+            except (NotFound, MethodNotAllowed):
+                await wsgi_app(scope, receive, send)
+                return
+        await async_app(scope, receive, send)
+
+    return application
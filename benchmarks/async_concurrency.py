@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+同步/异步服务模式并发上限对比压测
+
+启动一个固定延迟的和风天气桩服务，分别以
+    - 同步模式：gunicorn sync worker（默认8个进程）
+    - 异步模式：hypercorn 单进程运行 async_app.create_asgi_app
+运行应用，在递增的并发数下压测 /api/weather，统计吞吐量和延迟。
+并发上限定义为 p50 延迟仍低于桩服务延迟 1.5 倍时的最大并发数。
+
+用法：
+    python benchmarks/async_concurrency.py --latency 1.0 --duration 10 --output async_vs_sync.json
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+
+from stubs import QWeatherStub, LatencyDistribution, free_port
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_app(mode, port, workers, env):
+    """以指定模式启动应用进程"""
+    bind = f"127.0.0.1:{port}"
+    if mode == 'sync':
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', bind,
+               '--backlog', '2048', "app:create_app('production')"]
+    else:
+        cmd = [sys.executable, '-m', 'hypercorn', '-w', '1', '-b', bind,
+               '--backlog', '2048', "async_app:create_asgi_app('production')"]
+    proc = subprocess.Popen(cmd, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # 等待端口可用
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server failed to start')
+
+
+def run_level(url, concurrency, duration):
+    """在给定并发数下持续压测，返回延迟统计"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker():
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=120) as res:
+                    res.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - began
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 4) if latencies else None
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'p50_s': pct(0.50),
+        'p95_s': pct(0.95),
+        'p99_s': pct(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare concurrency ceilings of sync and async serving modes')
+    parser.add_argument('--latency', type=float, default=1.0, help='upstream stub latency in seconds')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--levels', default='8,16,32,64,128,256', help='comma separated concurrency levels')
+    parser.add_argument('--sync-workers', type=int, default=8, help='gunicorn sync worker count')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    stub = QWeatherStub('qweather', LatencyDistribution('fixed', [args.latency]), 0.0).start()
+    env = dict(os.environ, QWEATHER_API_KEY='bench-key', QWEATHER_API_HOST=stub.base_url)
+    levels = [int(x) for x in args.levels.split(',')]
+
+    report = {'upstream_latency_s': args.latency, 'sync_workers': args.sync_workers, 'modes': {}}
+    for mode in args.modes.split(','):
+        port = free_port()
+        proc = start_app(mode, port, args.sync_workers, env)
+        try:
+            url = f"http://127.0.0.1:{port}/api/weather?location_id=101010100"
+            # 预热：等所有工作进程加载完成、连接池建立后再计时
+            run_level(url, args.sync_workers, max(2.0, args.latency * 3))
+            results = []
+            for level in levels:
+                result = run_level(url, level, args.duration)
+                print(f"{mode:5s} c={level:4d} rps={result['throughput_rps']:8.2f} "
+                      f"p50={result['p50_s']} p99={result['p99_s']} errors={result['errors']}")
+                results.append(result)
+            ceiling = max([r['concurrency'] for r in results
+                           if r['p50_s'] is not None and r['p50_s'] < args.latency * 1.5] or [0])
+            report['modes'][mode] = {'levels': results, 'concurrency_ceiling': ceiling}
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+
+    stub.stop()
+    print(json.dumps({m: r['concurrency_ceiling'] for m, r in report['modes'].items()}))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动导入耗时预算检查
+使用 python -X importtime 在全新进程中执行 create_app，统计应用启动阶段的导入耗时，
+超出预算或启动阶段导入了应延迟加载的SDK时以非零状态码退出，可直接放在CI或构建步骤中
+
+用法：
+    python benchmarks/import_time_budget.py --budget-ms 600 --runs 5 --output import_time.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动阶段不允许导入的模块：这些SDK只应在首次调用对应服务时加载
+DEFERRED_MODULES = ('openai', 'dashscope', 'oss2', 'requests', 'alembic', 'flask_migrate', 'PIL', 'httpx')
+
+# 子进程输出已加载的延迟加载SDK时使用的行前缀（与应用日志区分）
+LOADED_PREFIX = 'DEFERRED_LOADED='
+
+# 子进程中执行的启动代码
+BOOT_CODE = (
+    "import sys, json\n"
+    "from app import create_app\n"
+    "create_app({config_name!r})\n"
+    "print({prefix!r} + json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({deferred!r}))))\n"
+)
+
+
+def parse_loaded(stdout):
+    """从子进程输出中取出已加载的延迟加载SDK列表"""
+    # 日志由后台线程写出，可能与报告行拼接在同一行，只解码前缀后的第一个JSON值
+    index = stdout.find(LOADED_PREFIX)
+    if index >= 0:
+        return json.JSONDecoder().raw_decode(stdout, index + len(LOADED_PREFIX))[0]
+    raise RuntimeError('boot script produced no module report')
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    Args:
+        stderr: 子进程的标准错误输出
+
+    Returns:
+        list: [(模块名, 自身耗时us, 累计耗时us, 嵌套层级)]
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # 格式：import time: <self> | <cumulative> | <两个空格一级的缩进><模块名>
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        name = name[1:]
+        level = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def run_once(config_name, baseline):
+    """
+    在全新进程中启动一次应用
+
+    Args:
+        config_name: 配置名称
+        baseline: 解释器自身启动时导入的顶层模块（不计入应用耗时）
+
+    Returns:
+        dict: 应用导入耗时、最慢的模块和启动阶段加载的延迟SDK
+    """
+    code = BOOT_CODE.format(config_name=config_name, deferred=DEFERRED_MODULES, prefix=LOADED_PREFIX)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'create_app failed:\n{proc.stderr[-2000:]}')
+
+    entries = parse_importtime(proc.stderr)
+    top_level = [e for e in entries if e[3] == 0 and e[0] not in baseline]
+    return {
+        'app_import_ms': round(sum(e[2] for e in top_level) / 1000, 1),
+        'slowest': [{'module': e[0], 'cumulative_ms': round(e[2] / 1000, 1)}
+                    for e in sorted(entries, key=lambda e: e[2], reverse=True)[:15]],
+        'deferred_loaded': parse_loaded(proc.stdout)
+    }
+
+
+def interpreter_baseline():
+    """解释器启动（site、encodings 等）时导入的顶层模块"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    return {e[0] for e in parse_importtime(proc.stderr) if e[3] == 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail when app start-up imports exceed the cold-start budget')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_TIME_BUDGET_MS', 600)),
+                        help='maximum cumulative import time of create_app in milliseconds')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh processes; the fastest run is compared')
+    parser.add_argument('--config', default='production', help='config name passed to create_app')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    baseline = interpreter_baseline()
+    runs = [run_once(args.config, baseline) for _ in range(args.runs)]
+    # 取最快一次，排除磁盘缓存和机器抖动的影响
+    best = min(runs, key=lambda r: r['app_import_ms'])
+
+    report = {
+        'config': args.config,
+        'budget_ms': args.budget_ms,
+        'app_import_ms': best['app_import_ms'],
+        'runs_ms': [r['app_import_ms'] for r in runs],
+        'deferred_loaded': best['deferred_loaded'],
+        'slowest': best['slowest']
+    }
+
+    for item in best['slowest']:
+        print(f"{item['cumulative_ms']:9.1f} ms  {item['module']}")
+    print(f"create_app import time: {best['app_import_ms']} ms (budget {args.budget_ms} ms)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if best['app_import_ms'] > args.budget_ms:
+        failures.append(f"import time {best['app_import_ms']} ms exceeds budget {args.budget_ms} ms")
+    if best['deferred_loaded']:
+        failures.append(f"modules loaded at start-up: {', '.join(best['deferred_loaded'])}")
+    if failures:
+        for failure in failures:
+            print(f'FAIL: {failure}', file=sys.stderr)
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+响应JSON序列化对比
+对典型的响应体（上传分析、城市搜索、实时天气、试穿状态、50张图片的批量分析）比较：
+    - stdlib：原先的路径，Flask 默认 Provider（标准库 json，ensure_ascii、sort_keys）序列化嵌套字典
+    - orjson：utils/json_provider.py 的 orjson Provider 序列化同样的字典
+    - orjson+models：结果使用 services/result_models.py 的 __slots__ 模型
+输出每次序列化的耗时（中位数）、分配的内存（tracemalloc）和响应体大小，
+以及构造10000个天气结果时字典与 __slots__ 模型的内存占用。不需要任何密钥或网络
+
+用法：
+    python benchmarks/json_serialization.py --repeat 2000 --output json_bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+WEATHER = {'temp': '18', 'text': '多云', 'icon': '101', 'feels_like': '16', 'humidity': '60',
+           'wind_dir': '东北风', 'obs_time': '2024-03-01T10:00+08:00'}
+
+ANALYSIS = {
+    'clothing_items': [
+        {'type': t, 'style': '圆领短袖', 'color': '白色', 'material': '棉', 'brand': '', 'confidence': 0.93}
+        for t in ('上衣', '下装', '外套', '鞋子', '配饰')
+    ],
+    'body_features': {'body_type': '矩形', 'height_proportion': '腿长', 'skin_tone': '暖白', 'posture': '挺拔'},
+    'overall_style': '休闲',
+    'recommendation': {
+        'weather_advice': '气温较低，建议在衬衫外搭配一件薄款针织开衫，早晚温差大时再加一件风衣。',
+        'style_advice': '整体风格偏休闲，可以用乐福鞋和皮带提升精致感。',
+        'color_advice': '白色和卡其色搭配干净利落，点缀一件藏青色单品更显层次。',
+        'occasion_advice': '适合日常通勤和周末出游。'
+    }
+}
+
+CITIES = [{'location': {'id': f'1010{i:05d}', 'name': f'城市{i}', 'adm1': '省份', 'lat': '39.90', 'lon': '116.40'}}
+          for i in range(10)]
+
+TRYON = {'success': True, 'status': 'SUCCEEDED', 'result_url': 'https://bucket.oss-cn-beijing.aliyuncs.com/temp/result.png'}
+
+
+def build_payloads(use_models):
+    """各接口的响应体；use_models 为 True 时结果部分使用结果模型"""
+    from services.result_models import AnalysisResult, City, TryonStatus, Weather
+
+    if use_models:
+        weather = Weather(**WEATHER)
+        analysis = lambda: AnalysisResult.from_dict(ANALYSIS)
+        cities = [City.from_qweather(item['location']) for item in CITIES]
+        tryon = TryonStatus(**TRYON)
+    else:
+        weather = dict(WEATHER)
+        analysis = lambda: dict(ANALYSIS)
+        cities = [City.from_qweather(item['location']).to_dict() for item in CITIES]
+        tryon = dict(TRYON)
+    return {
+        'upload': {'success': True, 'file_path': '/uploads/look.jpg', 'oss_url': None, 'analysis': analysis()},
+        'city_lookup': {'success': True, 'cities': cities},
+        'weather': {'success': True, 'weather': weather},
+        'tryon_status': tryon,
+        'batch_50': [{'type': 'result', 'index': i, 'name': f'{i}.jpg', 'status': 'succeeded',
+                      'analysis': analysis(), 'elapsed_ms': 2310, 'duplicate_of': None} for i in range(50)]
+    }
+
+
+def measure(serialize, payload, repeat):
+    """返回 (每次耗时中位数 µs, 每次分配的字节数, 响应体字节数)"""
+    body = serialize(payload)
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            serialize(payload)
+        samples.append((time.perf_counter() - start) / repeat * 1e6)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(100):
+        serialize(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak - before, len(body)
+
+
+def model_memory(count=10000):
+    """构造 count 个天气结果时字典与 __slots__ 模型占用的内存（字节）"""
+    from services.result_models import Weather
+
+    result = {}
+    for name, build in (('dict', lambda: dict(WEATHER)), ('slots', lambda: Weather(**WEATHER))):
+        tracemalloc.start()
+        items = [build() for _ in range(count)]
+        result[name] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del items
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare response JSON serialization paths')
+    parser.add_argument('--repeat', type=int, default=1000, help='serializations per timing sample')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    from flask import Flask
+    from utils import json_provider
+
+    stdlib_app = Flask('stdlib')
+    orjson_app = Flask('orjson')
+    orjson_app.config['JSON_PROVIDER'] = 'orjson'
+    json_provider.init_app(orjson_app)
+    if json_provider._orjson() is None:
+        print('orjson is not installed; the orjson columns use the stdlib fallback')
+
+    paths = {
+        'stdlib': (stdlib_app, build_payloads(False)),
+        'orjson': (orjson_app, build_payloads(False)),
+        'orjson+models': (orjson_app, build_payloads(True))
+    }
+    report = {'repeat': args.repeat, 'payloads': {}}
+    for payload_name in paths['stdlib'][1]:
+        rows = {}
+        for path_name, (app, payloads) in paths.items():
+            with app.app_context():
+                # 与 jsonify 相同：生成完整的响应对象
+                serialize = lambda obj, app=app: app.json.response(obj).get_data()
+                micros, allocated, size = measure(serialize, payloads[payload_name], args.repeat)
+            rows[path_name] = {'us_per_op': round(micros, 2), 'bytes_allocated_per_100': allocated, 'body_bytes': size}
+            print(f"{payload_name:14s} {path_name:14s} {micros:9.2f}µs  alloc/100={allocated:9d}B  body={size:7d}B")
+        baseline = rows['stdlib']['us_per_op']
+        for row in rows.values():
+            row['speedup_vs_stdlib'] = round(baseline / row['us_per_op'], 2)
+        report['payloads'][payload_name] = rows
+
+    report['weather_x10000_memory_bytes'] = model_memory()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+接口压测脚本
+启动上游桩服务（benchmarks/stubs.py）和应用进程，在固定并发数下依次压测
+/api/upload、/api/weather、/api/city-lookup、/api/try-on 和 /api/try-on/status/<task_id>，
+输出每个场景的 p50/p95/p99 延迟、吞吐量、状态码分布以及应用进程的峰值RSS（JSON），
+传入 --baseline 时与上一次结果比较，超出允许的退化幅度时以非零状态码退出
+
+用法：
+    python benchmarks/load_test.py --levels 1,8,32 --duration 10 --output bench.json
+    python benchmarks/load_test.py --latency chat=fixed:0.5 --error-rate chat=0.02 --baseline bench.json
+    python benchmarks/load_test.py --replay cassettes --time-scale 0.5   # 回放录制的真实上游流量
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import quote
+
+from stubs import StubUpstreams, StubConfig, free_port
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('upload', 'weather', 'city-lookup', 'try-on', 'status')
+
+# 回放模式下环境中没有配置时使用的占位值
+REPLAY_PLACEHOLDER_ENV = {
+    'DASHSCOPE_API_KEY': 'replay-dashscope-key',
+    'QWEATHER_API_KEY': 'replay-qweather-key',
+    'ALIYUN_OSS_ACCESS_KEY_ID': 'replay-oss-id',
+    'ALIYUN_OSS_ACCESS_KEY_SECRET': 'replay-oss-secret',
+    'ALIYUN_OSS_BUCKET_NAME': 'replay',
+    'ALIYUN_OSS_ENDPOINT': 'https://oss-cn-beijing.aliyuncs.com'
+}
+
+
+def make_upload_body(size=(1024, 768)):
+    """生成一张渐变JPEG的 multipart 请求体，返回 (body, content_type)"""
+    from PIL import Image
+
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=85)
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="location_id"\r\n\r\n101010100\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode('utf-8') + buffer.getvalue() + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def build_requests():
+    """
+    各场景的请求生成函数
+
+    Returns:
+        dict: 场景名 -> 无参函数，返回 (method, path, body, headers)
+    """
+    upload_body, upload_type = make_upload_body()
+    tryon_body = json.dumps({
+        'person_image_url': 'https://example.com/person.jpg',
+        'clothing_type': 'top',
+        'clothing_image_url': 'https://example.com/top.jpg',
+        'top_garment_url': 'https://example.com/top.jpg'
+    }).encode('utf-8')
+    json_headers = {'Content-Type': 'application/json'}
+    return {
+        'upload': lambda: ('POST', '/api/upload', upload_body, {'Content-Type': upload_type}),
+        'weather': lambda: ('GET', '/api/weather?location_id=101010100', None, {}),
+        'city-lookup': lambda: ('GET', '/api/city-lookup?keyword=' + quote('北京'), None, {}),
+        'try-on': lambda: ('POST', '/api/try-on', tryon_body, json_headers),
+        'status': lambda: ('GET', f'/api/try-on/status/{uuid.uuid4().hex}', None, {})
+    }
+
+
+def start_app(server, port, workers, env):
+    """以指定服务器启动应用进程，等待端口可用后返回进程对象"""
+    bind = f'127.0.0.1:{port}'
+    if server == 'sync':
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', bind,
+               '--backlog', '2048', '--timeout', '120', "app:create_app('production')"]
+    else:
+        cmd = [sys.executable, '-m', 'hypercorn', '-w', str(workers), '-b', bind,
+               '--backlog', '2048', "async_app:create_asgi_app('production')"]
+    proc = subprocess.Popen(cmd, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{server} server failed to start')
+
+
+def _process_tree(pid):
+    """进程及其所有子进程的PID（读取 /proc，仅Linux）"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for tid in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{tid}/children') as f:
+                    pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _status_kb(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """定时采样应用进程树的RSS总和，记录峰值"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if os.path.exists('/proc/self/status'):
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            total = sum(_status_kb(p, 'VmRSS') for p in _process_tree(self.pid))
+            self.peak_kb = max(self.peak_kb, total)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        # 各进程内核记录的峰值之和（上界）
+        hwm = sum(_status_kb(p, 'VmHWM') for p in _process_tree(self.pid))
+        return {
+            'peak_rss_mb': round(self.peak_kb / 1024, 1) if self.peak_kb else None,
+            'sum_vm_hwm_mb': round(hwm / 1024, 1) if hwm else None
+        }
+
+
+def run_level(port, make_request, concurrency, duration):
+    """在给定并发数下持续压测一个场景，返回统计结果"""
+    latencies = []
+    statuses = {}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=180)
+        local_latencies = []
+        local_statuses = {}
+        local_errors = 0
+        while time.time() < stop_at:
+            method, path, body, headers = make_request()
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                local_latencies.append(time.perf_counter() - start)
+                local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - began
+
+    latencies.sort()
+
+    def pct(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'status_counts': {str(k): v for k, v in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99)
+    }
+
+
+def compare(report, baseline, max_regression):
+    """
+    与基线结果比较 p95 延迟和吞吐量
+
+    Returns:
+        list: 超出允许退化幅度的条目说明
+    """
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if not old or not old.get('p95_ms') or not result.get('p95_ms'):
+            continue
+        name = f"{result['scenario']} c={result['concurrency']}"
+        if result['p95_ms'] > old['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {old['p95_ms']} -> {result['p95_ms']} ms")
+        if old['throughput_rps'] and result['throughput_rps'] < old['throughput_rps'] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {old['throughput_rps']} -> {result['throughput_rps']} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the API against local upstream stubs')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--levels', default='1,8,32', help='comma separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario and level')
+    parser.add_argument('--server', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', action='append', default=[], metavar='STUB=SPEC',
+                        help='stub latency, e.g. chat=lognormal:1.5,0.4 (stubs: chat, tryon, qweather, oss)')
+    parser.add_argument('--error-rate', action='append', default=[], metavar='STUB=RATE')
+    parser.add_argument('--admission', action='store_true', help='keep admission control enabled')
+    parser.add_argument('--replay', metavar='DIR', help='replay recorded upstream cassettes instead of the stubs')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='multiplier for recorded upstream timing')
+    parser.add_argument('--output', help='write JSON report to this file')
+    parser.add_argument('--baseline', help='previous JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='allowed relative p95/throughput regression against the baseline')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenario: {", ".join(sorted(unknown))}')
+    levels = [int(x) for x in args.levels.split(',')]
+
+    upload_dir = tempfile.mkdtemp(prefix='fashion-bench-')
+    # 压测客户端都来自同一IP且不带Cookie，默认关闭准入控制，--admission 时保留
+    env = dict(os.environ, UPLOAD_FOLDER=upload_dir, LOG_LEVEL='WARNING', SECRET_KEY='bench-secret',
+               ADMISSION_ENABLED='true' if args.admission else 'false')
+    if args.replay:
+        # 回放录制的真实上游流量，不启动桩服务；密钥只需非空，请求不会离开本机
+        stubs = None
+        env.update(UPSTREAM_CASSETTE_MODE='replay', UPSTREAM_CASSETTE_DIR=os.path.abspath(args.replay),
+                   UPSTREAM_REPLAY_TIME_SCALE=str(args.time_scale))
+        for name, placeholder in REPLAY_PLACEHOLDER_ENV.items():
+            env.setdefault(name, placeholder)
+    else:
+        stubs = StubUpstreams(StubConfig.parse(args.latency, args.error_rate)).start()
+        env.update(stubs.app_env())
+    requests = build_requests()
+
+    port = free_port()
+    proc = start_app(args.server, port, args.workers, env)
+    rss = RssSampler(proc.pid).start()
+    results = []
+    try:
+        # 预热：所有工作进程完成首次导入和连接建立
+        for scenario in scenarios:
+            run_level(port, requests[scenario], args.workers, 2.0)
+        for scenario in scenarios:
+            for level in levels:
+                result = dict(scenario=scenario, **run_level(port, requests[scenario], level, args.duration))
+                print(f"{scenario:12s} c={level:4d} rps={result['throughput_rps']:8.2f} "
+                      f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                      f"errors={result['errors']} status={result['status_counts']}")
+                results.append(result)
+    finally:
+        memory = rss.stop()
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+        if stubs is not None:
+            stubs.stop()
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'server': args.server,
+            'workers': args.workers,
+            'duration_s': args.duration,
+            'python': platform.python_version(),
+            'upstreams': {'replay': args.replay, 'time_scale': args.time_scale} if args.replay
+            else stubs.config.describe()
+        },
+        'results': results,
+        'memory': memory,
+        'stub_counters': stubs.counters() if stubs is not None else None
+    }
+    print(json.dumps(memory))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f'REGRESSION: {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
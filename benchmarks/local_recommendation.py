@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+本地穿搭推荐耗时
+对一组典型的识别结果和天气（不同体型、肤色、气温和天气现象）调用 services/recommendation_service.py 的 recommend，
+输出每次推荐耗时的中位数和p99（µs）。不需要任何密钥或网络
+
+用法：
+    python benchmarks/local_recommendation.py --repeat 20000
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+CASES = [
+    ([{'type': '上衣', 'color': '白色'}, {'type': '下装', 'color': '牛仔蓝'}],
+     {'body_type': '梨形', 'height_proportion': '腿长', 'skin_tone': '暖白'},
+     {'temp': '12', 'feels_like': '8', 'humidity': '85', 'text': '小雨'}, '休闲'),
+    ([{'type': '外套', 'color': '卡其色'}, {'type': '鞋子', 'color': '黑色'}],
+     {'body_type': 'H型', 'height_proportion': '上身偏长', 'skin_tone': '冷白皮'},
+     {'temp': '-2', 'feels_like': '-9', 'humidity': '40', 'text': '小雪'}, '通勤'),
+    ([{'type': '连衣裙', 'color': '雾霾蓝'}],
+     {'body_type': '沙漏形', 'height_proportion': '娇小', 'skin_tone': '小麦色'},
+     {'temp': '33', 'feels_like': '36', 'humidity': '82', 'text': '晴'}, '甜美'),
+    ([], {}, {'temp': '20', 'text': '多云'}, None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure local outfit recommendation latency')
+    parser.add_argument('--repeat', type=int, default=10000, help='recommendations per case')
+    args = parser.parse_args()
+
+    from services.recommendation_service import recommend
+
+    samples = []
+    for case in CASES:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            recommend(*case)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    print(f"recommend: n={len(samples)}  median={statistics.median(samples):.2f}µs  "
+          f"p99={samples[int(len(samples) * 0.99)]:.2f}µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+上游接口桩服务
+在压测进程内启动 DashScope（OpenAI兼容的chat接口、虚拟试穿任务接口）、和风天气和OSS的本地桩服务，
+每个桩服务可单独配置延迟分布和错误率，应用通过环境变量指向这些桩服务：
+
+    stubs = StubUpstreams(StubConfig.parse(['chat=lognormal:1.5,0.4', 'qweather=fixed:0.05'],
+                                           ['chat=0.01'])).start()
+    env = dict(os.environ, **stubs.app_env())
+
+延迟分布格式：
+    fixed:秒
+    uniform:最小,最大
+    lognormal:中位数,sigma
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import random
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# 各桩服务的默认延迟分布（接近线上实测的量级）
+DEFAULT_LATENCIES = {
+    'chat': 'lognormal:2.0,0.35',
+    'tryon': 'lognormal:0.4,0.3',
+    'qweather': 'lognormal:0.08,0.3',
+    'oss': 'lognormal:0.06,0.3'
+}
+
+# 虚拟试穿任务提交后多少秒变为 SUCCEEDED
+TRYON_READY_AFTER = 3.0
+
+# 千问VL桩返回的分析结果
+ANALYSIS_PAYLOAD = {
+    'clothing_items': [
+        {'type': '上衣', 'style': '衬衫', 'color': '白色', 'material': '棉', 'fit': '修身'},
+        {'type': '下装', 'style': '西裤', 'color': '深灰', 'material': '羊毛混纺', 'fit': '直筒'},
+        {'type': '鞋子', 'style': '乐福鞋', 'color': '棕色', 'material': '皮革', 'fit': ''}
+    ],
+    'body_features': {'body_type': '沙漏形', 'height_ratio': '上短下长', 'skin_tone': '暖调', 'posture': '挺拔'},
+    'overall_style': '商务休闲',
+    'recommendation': {
+        'weather_based': '气温适中，建议单穿衬衫外搭薄款西装外套',
+        'body_based': '高腰直筒裤拉长腿部线条',
+        'color_based': '暖调肤色适合米色、驼色等大地色系',
+        'style_based': '加入针织背心增加层次感'
+    }
+}
+
+CITY_PAYLOAD = {
+    'code': '200',
+    'location': [
+        {'name': '北京', 'id': '101010100', 'lat': '39.90499', 'lon': '116.40529', 'adm1': '北京市'},
+        {'name': '海淀', 'id': '101010200', 'lat': '39.95607', 'lon': '116.31032', 'adm1': '北京市'}
+    ]
+}
+
+WEATHER_PAYLOAD = {
+    'code': '200',
+    'now': {'temp': '22', 'text': '晴', 'icon': '100', 'feelsLike': '21',
+            'humidity': '40', 'windDir': '东风', 'obsTime': '2025-01-01T12:00+08:00'}
+}
+
+
+def free_port():
+    """获取一个空闲的本地端口"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class LatencyDistribution:
+    """延迟分布，sample() 返回一次请求的延迟（秒）"""
+
+    def __init__(self, kind, params):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        解析延迟分布
+
+        Args:
+            spec: 'fixed:0.1' / 'uniform:0.1,0.3' / 'lognormal:0.8,0.4'
+
+        Returns:
+            LatencyDistribution
+        """
+        kind, _, raw = spec.partition(':')
+        params = [float(x) for x in raw.split(',') if x]
+        expected = {'fixed': 1, 'uniform': 2, 'lognormal': 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f'invalid latency spec: {spec}')
+        return cls(kind, params)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return random.uniform(*self.params)
+        median, sigma = self.params
+        return random.lognormvariate(math.log(median), sigma)
+
+    def __str__(self):
+        return f"{self.kind}:{','.join(str(p) for p in self.params)}"
+
+
+class StubConfig:
+    """各桩服务的延迟分布和错误率"""
+
+    def __init__(self, latencies=None, error_rates=None):
+        self.latencies = {name: LatencyDistribution.parse(spec) for name, spec in DEFAULT_LATENCIES.items()}
+        self.latencies.update(latencies or {})
+        self.error_rates = dict.fromkeys(DEFAULT_LATENCIES, 0.0)
+        self.error_rates.update(error_rates or {})
+
+    @classmethod
+    def parse(cls, latency_args=(), error_args=()):
+        """
+        从命令行参数解析配置
+
+        Args:
+            latency_args: ['chat=lognormal:1.5,0.4', ...]
+            error_args: ['chat=0.01', ...]
+        """
+        latencies = {}
+        for arg in latency_args:
+            name, _, spec = arg.partition('=')
+            latencies[name] = LatencyDistribution.parse(spec)
+        errors = {}
+        for arg in error_args:
+            name, _, rate = arg.partition('=')
+            errors[name] = float(rate)
+        unknown = (set(latencies) | set(errors)) - set(DEFAULT_LATENCIES)
+        if unknown:
+            raise ValueError(f'unknown stub: {", ".join(sorted(unknown))}')
+        return cls(latencies, errors)
+
+    def describe(self):
+        return {name: {'latency': str(self.latencies[name]), 'error_rate': self.error_rates[name]}
+                for name in DEFAULT_LATENCIES}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """按请求路径分发到桩服务的处理函数"""
+
+    protocol_version = 'HTTP/1.1'
+    stub = None
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        time.sleep(self.stub.latency.sample())
+        self.stub.requests += 1
+        if random.random() < self.stub.error_rate:
+            self.stub.errors += 1
+            self._send(503, {'code': 'ServiceUnavailable', 'message': 'stub injected error'})
+            return
+        status, payload, headers = self.stub.route(self.command, self.path, body)
+        self._send(status, payload, headers)
+
+    def _send(self, status, payload, headers=None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if not isinstance(payload, bytes) else 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_HEAD = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """单个上游的桩服务"""
+
+    def __init__(self, name, latency, error_rate):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        handler = type(f'{self.name.title()}Handler', (_StubHandler,), {'stub': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', free_port()), handler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def route(self, method, path, body):
+        """返回 (状态码, 响应体, 额外响应头)"""
+        raise NotImplementedError
+
+
+class ChatStub(StubServer):
+    """OpenAI兼容的 chat/completions 接口（千问VL）"""
+
+    def route(self, method, path, body):
+        if method != 'POST' or not path.endswith('/chat/completions'):
+            return 404, {'error': {'message': 'not found'}}, None
+        request = json.loads(body or b'{}')
+        return 200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'qwen3-vl-plus'),
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': json.dumps(ANALYSIS_PAYLOAD, ensure_ascii=False)}
+            }],
+            # 图片按约1200个token计
+            'usage': {'prompt_tokens': 1200 + len(body) // 400, 'completion_tokens': 350, 'total_tokens': 1550 + len(body) // 400}
+        }, None
+
+
+class TryonStub(StubServer):
+    """DashScope 虚拟试穿任务提交和查询接口"""
+
+    def __init__(self, *args, ready_after=TRYON_READY_AFTER):
+        super().__init__(*args)
+        self.ready_after = ready_after
+        self._tasks = {}
+
+    def route(self, method, path, body):
+        if method == 'POST' and path.endswith('/image-synthesis'):
+            task_id = uuid.uuid4().hex
+            self._tasks[task_id] = time.time()
+            return 200, {'request_id': uuid.uuid4().hex, 'output': {'task_id': task_id, 'task_status': 'PENDING'}}, None
+        match = re.search(r'/tasks/([^/?]+)', path)
+        if method == 'GET' and match:
+            task_id = match.group(1)
+            # 未提交过的任务ID视为已完成，便于直接压测查询接口
+            submitted = self._tasks.get(task_id, 0)
+            if time.time() - submitted >= self.ready_after:
+                output = {'task_id': task_id, 'task_status': 'SUCCEEDED',
+                          'image_url': f'{self.base_url}/results/{task_id}.png'}
+            else:
+                output = {'task_id': task_id, 'task_status': 'RUNNING'}
+            return 200, {'request_id': uuid.uuid4().hex, 'output': output}, None
+        return 404, {'code': 'NotFound'}, None
+
+
+class QWeatherStub(StubServer):
+    """和风天气城市搜索和实时天气接口"""
+
+    def route(self, method, path, body):
+        url = urlparse(path)
+        if url.path.endswith('/city/lookup'):
+            if not parse_qs(url.query).get('key'):
+                return 401, {'code': '401'}, None
+            return 200, CITY_PAYLOAD, None
+        if url.path.endswith('/weather/now'):
+            return 200, WEATHER_PAYLOAD, None
+        return 404, {'code': '404'}, None
+
+
+class OssStub(StubServer):
+    """OSS 对象上传/读取接口（路径风格：/bucket/key）"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def route(self, method, path, body):
+        key = urlparse(path).path
+        if method == 'PUT':
+            with self._lock:
+                self._objects[key] = body
+            return 200, b'', {'ETag': f'"{uuid.uuid4().hex.upper()}"', 'x-oss-request-id': uuid.uuid4().hex}
+        if key in self._objects:
+            return 200, self._objects[key], {'x-oss-request-id': uuid.uuid4().hex}
+        return 404, b'', {'x-oss-request-id': uuid.uuid4().hex}
+
+
+class StubUpstreams:
+    """启动和管理全部桩服务"""
+
+    def __init__(self, config=None, tryon_ready_after=TRYON_READY_AFTER):
+        config = config or StubConfig()
+        self.config = config
+        self.stubs = {
+            'chat': ChatStub('chat', config.latencies['chat'], config.error_rates['chat']),
+            'tryon': TryonStub('tryon', config.latencies['tryon'], config.error_rates['tryon'],
+                               ready_after=tryon_ready_after),
+            'qweather': QWeatherStub('qweather', config.latencies['qweather'], config.error_rates['qweather']),
+            'oss': OssStub('oss', config.latencies['oss'], config.error_rates['oss'])
+        }
+
+    def start(self):
+        for stub in self.stubs.values():
+            stub.start()
+        return self
+
+    def stop(self):
+        for stub in self.stubs.values():
+            stub.stop()
+
+    def app_env(self):
+        """
+        让应用指向桩服务的环境变量
+
+        Returns:
+            dict: 环境变量
+        """
+        return {
+            'DASHSCOPE_API_KEY': 'bench-dashscope-key',
+            'DASHSCOPE_COMPATIBLE_BASE_URL': self.stubs['chat'].base_url + '/compatible-mode/v1',
+            'DASHSCOPE_API_BASE': self.stubs['tryon'].base_url + '/api/v1',
+            'QWEATHER_API_KEY': 'bench-qweather-key',
+            'QWEATHER_API_HOST': self.stubs['qweather'].base_url,
+            'ALIYUN_OSS_ACCESS_KEY_ID': 'bench-oss-id',
+            'ALIYUN_OSS_ACCESS_KEY_SECRET': 'bench-oss-secret',
+            'ALIYUN_OSS_BUCKET_NAME': 'bench',
+            'ALIYUN_OSS_ENDPOINT': self.stubs['oss'].base_url
+        }
+
+    def counters(self):
+        """各桩服务收到的请求数和注入的错误数"""
+        return {name: {'requests': stub.requests, 'errors': stub.errors} for name, stub in self.stubs.items()}
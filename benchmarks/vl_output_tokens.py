@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+千问VL输出格式对比
+在固定的图片集上分别用完整格式（full）和紧凑格式（compact）的提示词调用模型，
+统计 prompt/completion token、端到端耗时和JSON解析成功率。两种格式按图片交替调用，减少上游负载波动的影响。
+需要真实的 DASHSCOPE_API_KEY，每张图片每轮调用两次模型
+
+用法：
+    python benchmarks/vl_output_tokens.py --images samples/ --repeat 3 --weather --output vl_tokens.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+MODES = ('full', 'compact')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# 固定的天气数据，保证两种格式的推荐部分可比
+FIXED_WEATHER = {'text': '多云', 'temp': '18', 'feels_like': '16', 'humidity': '60'}
+
+
+def collect_images(sources):
+    """展开图片参数：目录取其中的图片文件，URL 和文件路径原样保留"""
+    images = []
+    for source in sources:
+        if os.path.isdir(source):
+            images.extend(sorted(os.path.join(source, name) for name in os.listdir(source)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            images.append(source)
+    return images
+
+
+def run_once(service, model, image_url, weather, mode):
+    """调用一次模型，返回 token 用量、耗时和解析结果"""
+    from services.vl_schema import expand_compact
+
+    service.response_mode = mode
+    messages = service._build_messages(image_url, weather)
+    start = time.perf_counter()
+    completion = service.client.chat.completions.create(model=model, messages=messages)
+    elapsed = time.perf_counter() - start
+    result = expand_compact(service._parse_json_response(completion.choices[0].message.content))
+    usage = completion.usage
+    return {
+        'seconds': elapsed,
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+        'parsed': 'raw_response' not in result,
+        'items': len(result.get('clothing_items') or [])
+    }
+
+
+def summarize(samples):
+    """汇总一种格式的所有调用"""
+    seconds = sorted(s['seconds'] for s in samples)
+    return {
+        'calls': len(samples),
+        'latency_mean_s': round(statistics.mean(seconds), 3),
+        'latency_p50_s': round(seconds[len(seconds) // 2], 3),
+        'latency_p95_s': round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3),
+        'prompt_tokens_mean': round(statistics.mean(s['prompt_tokens'] for s in samples), 1),
+        'completion_tokens_mean': round(statistics.mean(s['completion_tokens'] for s in samples), 1),
+        'parse_success_rate': round(sum(s['parsed'] for s in samples) / len(samples), 3),
+        'items_mean': round(statistics.mean(s['items'] for s in samples), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare VL completion tokens and latency of the full and compact prompts')
+    parser.add_argument('--images', nargs='+', required=True, help='image files, directories or URLs')
+    parser.add_argument('--model', default=None, help='model name (defaults to the service VL_MODEL)')
+    parser.add_argument('--repeat', type=int, default=1, help='rounds over the image set')
+    parser.add_argument('--weather', action='store_true', help='include a fixed weather block (adds recommendations)')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    from services.image_recognition_service import ImageRecognitionService, VL_MODEL
+
+    images = collect_images(args.images)
+    if not images:
+        parser.error('no images found')
+    model = args.model or VL_MODEL
+    weather = FIXED_WEATHER if args.weather else None
+    service = ImageRecognitionService()
+
+    samples = {mode: [] for mode in MODES}
+    for round_index in range(args.repeat):
+        for index, image in enumerate(images):
+            image_url = service._build_image_url(image)
+            # 每张图片交替先后顺序
+            order = MODES if (index + round_index) % 2 == 0 else tuple(reversed(MODES))
+            for mode in order:
+                sample = run_once(service, model, image_url, weather, mode)
+                samples[mode].append(sample)
+                print(f"{mode:8s} {os.path.basename(image)[:40]:40s} {sample['seconds']:6.2f}s "
+                      f"prompt={sample['prompt_tokens']:5d} completion={sample['completion_tokens']:5d}")
+
+    report = {'model': model, 'images': len(images), 'repeat': args.repeat, 'weather': bool(weather),
+              'modes': {mode: summarize(samples[mode]) for mode in MODES}}
+    full, compact = report['modes']['full'], report['modes']['compact']
+    report['compact_vs_full'] = {
+        'completion_tokens_ratio': round(compact['completion_tokens_mean'] / max(full['completion_tokens_mean'], 1), 3),
+        'prompt_tokens_ratio': round(compact['prompt_tokens_mean'] / max(full['prompt_tokens_mean'], 1), 3),
+        'latency_ratio': round(compact['latency_mean_s'] / max(full['latency_mean_s'], 1e-9), 3)
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
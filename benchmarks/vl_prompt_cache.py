@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+千问VL上下文缓存效果测量
+以流式方式连续调用模型，记录每次调用的首 token 耗时（TTFT）、总耗时和 usage 中命中缓存的 prompt token 数。
+系统消息对所有请求相同，第一次调用之后的请求应命中缓存、TTFT 下降。
+需要真实的 DASHSCOPE_API_KEY；--cache explicit 对应 VL_CONTEXT_CACHE=explicit
+
+用法：
+    python benchmarks/vl_prompt_cache.py --images samples/ --calls 10 --cache explicit --output vl_cache.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from vl_output_tokens import collect_images, FIXED_WEATHER
+
+
+def stream_once(service, model, messages):
+    """流式调用一次，返回 (TTFT, 总耗时, usage)"""
+    start = time.perf_counter()
+    ttft = None
+    usage = None
+    stream = service.client.chat.completions.create(
+        model=model, messages=messages, stream=True, stream_options={'include_usage': True})
+    for chunk in stream:
+        if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+            ttft = time.perf_counter() - start
+        if chunk.usage is not None:
+            usage = chunk.usage
+    return ttft, time.perf_counter() - start, usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure time-to-first-token and cached prompt tokens across repeated VL calls')
+    parser.add_argument('--images', nargs='+', required=True, help='image files, directories or URLs (used round-robin)')
+    parser.add_argument('--calls', type=int, default=10)
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--mode', choices=('full', 'compact'), default='full', help='response format')
+    parser.add_argument('--cache', choices=('implicit', 'explicit'), default='implicit')
+    parser.add_argument('--weather', action='store_true')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    from services.image_recognition_service import ImageRecognitionService, VL_MODEL
+
+    images = collect_images(args.images)
+    if not images:
+        parser.error('no images found')
+    model = args.model or VL_MODEL
+    service = ImageRecognitionService()
+    service.response_mode = args.mode
+    service.context_cache = args.cache
+
+    calls = []
+    for index in range(args.calls):
+        image = images[index % len(images)]
+        messages = service._build_messages(service._build_image_url(image), FIXED_WEATHER if args.weather else None)
+        ttft, total, usage = stream_once(service, model, messages)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        call = {
+            'ttft_s': round(ttft or total, 3),
+            'total_s': round(total, 3),
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+            'cached_tokens': getattr(details, 'cached_tokens', 0) or 0
+        }
+        calls.append(call)
+        print(f"#{index + 1:3d} {os.path.basename(image)[:32]:32s} ttft={call['ttft_s']:6.2f}s "
+              f"total={call['total_s']:6.2f}s prompt={call['prompt_tokens']:5d} cached={call['cached_tokens']:5d}")
+
+    report = {'model': model, 'mode': args.mode, 'cache': args.cache, 'calls': calls}
+    if len(calls) > 1:
+        rest = calls[1:]
+        report['summary'] = {
+            'first_ttft_s': calls[0]['ttft_s'],
+            'repeat_ttft_mean_s': round(statistics.mean(c['ttft_s'] for c in rest), 3),
+            'repeat_cached_ratio': round(sum(c['cached_tokens'] for c in rest) /
+                                         max(sum(c['prompt_tokens'] for c in rest), 1), 3)
+        }
+        print(json.dumps(report['summary'], ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Celery worker 入口
+执行 POST /api/analyze 登记的分析任务（ANALYSIS_JOB_BACKEND=celery 时使用）：
+
+    celery -A celery_worker.celery worker -Q analysis --concurrency 8
+
+worker 使用与Web应用相同的配置（FLASK_CONFIG，默认 production）和数据库，
+上传到本地的图片需放在 worker 可以访问的共享目录，或使用 OSS 直传
+"""
+
+import os
+
+from celery import Celery
+
+from app import create_app
+from services.analysis_jobs import TASK_NAME, TASK_QUEUE, run_job
+
+flask_app = create_app(os.environ.get('FLASK_CONFIG', 'production'))
+
+celery = Celery('fashion_ai',
+                broker=flask_app.config['CELERY_BROKER_URL'],
+                backend=flask_app.config.get('CELERY_RESULT_BACKEND'))
+celery.conf.update(
+    task_default_queue=TASK_QUEUE,
+    task_acks_late=True,  # worker 异常退出时任务重新投递（run_job 会跳过已结束的任务）
+    worker_prefetch_multiplier=1,  # 分析耗时较长，每个进程一次只取一个任务
+    task_ignore_result=True  # 状态和结果保存在 AnalysisJob 表中
+)
+
+
+@celery.task(name=TASK_NAME)
+def run_analysis_job(job_id):
+    """在应用上下文中执行分析任务"""
+    with flask_app.app_context():
+        run_job(job_id)
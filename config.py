@@ -25,17 +25,53 @@ class Config:
     SQLALCHEMY_ECHO = False
     
     # 文件上传配置
-    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')  # 上传文件保存目录
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(BASE_DIR, 'uploads')  # 上传文件保存目录
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大上传文件大小：16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}  # 允许的文件扩展名
+    MAX_IMAGE_PIXELS = 40 * 1000 * 1000  # 单张图片最大像素数（宽×高），防止解压炸弹
+    MAX_IMAGE_FRAMES = 30  # 动图最大帧数
+    # 上传图片服务配置
+    IMAGE_VARIANT_FOLDER = os.environ.get('IMAGE_VARIANT_FOLDER') or None  # 缩略图变体缓存目录，未设置时为 UPLOAD_FOLDER/.variants
+    UPLOADS_CACHE_MAX_AGE = 365 * 24 * 3600  # 上传文件名带时间戳，内容不可变，可长期缓存
+    # 文件字节交给前置Web服务器发送：None（由Flask发送）、'x-accel'（nginx）、'x-sendfile'（Apache/lighttpd）
+    UPLOADS_SENDFILE_MODE = os.environ.get('UPLOADS_SENDFILE_MODE') or None
+    # x-accel 模式下 nginx 中 internal location 的前缀，需映射到 UPLOAD_FOLDER
+    UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX', '/_protected_uploads/')
+    # 断点续传配置
+    RESUMABLE_UPLOAD_FOLDER = os.environ.get('RESUMABLE_UPLOAD_FOLDER') or None  # 分片暂存目录，未设置时为 UPLOAD_FOLDER/.resumable
+    RESUMABLE_UPLOAD_MAX_SIZE = 16 * 1024 * 1024  # 单个续传文件大小上限：16MB
+    RESUMABLE_UPLOAD_EXPIRE_SECONDS = 24 * 3600  # 未完成上传保留时间：24小时
+    RESUMABLE_UPLOAD_SWEEP_INTERVAL = 600  # 清理过期上传的最小间隔：10分钟
     
     # Redis和Celery配置
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+    # 异步分析任务（见 services/analysis_jobs.py）：thread（进程内线程池，开发/测试）或 celery（生产）
+    ANALYSIS_JOB_BACKEND = os.environ.get('ANALYSIS_JOB_BACKEND', 'thread')
+    ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))  # thread 后端的线程数
+    # 批量分析（POST /api/analyze/batch）
+    ANALYZE_BATCH_MAX_IMAGES = 50  # 单次批量的图片上限
+    ANALYZE_BATCH_CONCURRENCY = int(os.environ.get('ANALYZE_BATCH_CONCURRENCY', 4))  # 同时进行的千问VL调用数
+    ANALYZE_BATCH_PREPROCESS_WORKERS = 8  # 并行预处理（校验、哈希、落盘）的线程数
     
     # 外部API密钥配置
     DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY', '')  # 阿里云千问API密钥
+    # DashScope 接口地址（压测时指向本地桩服务，见 benchmarks/stubs.py）
+    DASHSCOPE_COMPATIBLE_BASE_URL = os.environ.get('DASHSCOPE_COMPATIBLE_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
+    DASHSCOPE_API_BASE = os.environ.get('DASHSCOPE_API_BASE', 'https://dashscope.aliyuncs.com/api/v1')
+    # 千问VL图像分析（见 services/image_recognition_service.py）
+    # 级联模式：先用快速模型识别，解析失败、识别出的衣物数量不足或任一衣物的 confidence 低于阈值时，再交给 qwen3-vl-plus 重新识别
+    VL_CASCADE = os.environ.get('VL_CASCADE', '').lower() in ('1', 'true', 'yes')
+    VL_FAST_MODEL = os.environ.get('VL_FAST_MODEL', 'qwen3-vl-flash')  # 级联模式的快速模型
+    VL_CASCADE_MIN_CONFIDENCE = float(os.environ.get('VL_CASCADE_MIN_CONFIDENCE', 0.8))  # 快速模型结果的 confidence 下限
+    VL_CASCADE_MIN_ITEMS = int(os.environ.get('VL_CASCADE_MIN_ITEMS', 1))  # 快速模型结果的衣物数量下限
+    # 输出格式：full 为中文键名的完整格式；compact 为短键名加码表编码（见 services/vl_schema.py），completion token 更少
+    VL_RESPONSE_MODE = os.environ.get('VL_RESPONSE_MODE', 'full').lower()
+    # 上下文缓存：默认依赖 DashScope 的隐式缓存；explicit 时为系统消息加上 cache_control 使用显式缓存
+    VL_CONTEXT_CACHE = os.environ.get('VL_CONTEXT_CACHE', '').lower()
+    # 穿搭推荐：model 由千问VL生成，没有给出时用本地规则补全；local 只使用本地规则（services/recommendation_service.py），请求中不带天气
+    VL_RECOMMENDATION_MODE = os.environ.get('VL_RECOMMENDATION_MODE', 'model').lower()
     # 兼容两种环境变量命名：QWEATHER_API_KEY 或 WEATHER_API_KEY
     QWEATHER_API_KEY = os.environ.get('QWEATHER_API_KEY') or os.environ.get('WEATHER_API_KEY', '')
     # 阿里云OSS配置
@@ -43,10 +79,113 @@ class Config:
     ALIYUN_OSS_ACCESS_KEY_SECRET = os.environ.get('ALIYUN_OSS_ACCESS_KEY_SECRET', '')
     ALIYUN_OSS_BUCKET_NAME = os.environ.get('ALIYUN_OSS_BUCKET_NAME', '')
     ALIYUN_OSS_ENDPOINT = os.environ.get('ALIYUN_OSS_ENDPOINT', '')
+    # OSS浏览器直传配置
+    OSS_DIRECT_UPLOAD_PREFIX = 'uploads/'  # 直传对象Key前缀（Key由内容哈希生成）
+    OSS_POST_POLICY_EXPIRE_SECONDS = 300  # 直传策略有效期：5分钟
+    OSS_DIRECT_UPLOAD_MAX_SIZE = 16 * 1024 * 1024  # 直传文件大小上限：16MB
 
     # 和风天气API Host（新版用户需要配置，例如：xxx.qweatherapi.com）
     QWEATHER_API_HOST = os.environ.get('QWEATHER_API_HOST', '')
     
+    # 异步服务模式配置（async_app.py）
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS', 500))  # 单进程上游连接池大小
+    ASYNC_HTTP_TIMEOUT = float(os.environ.get('ASYNC_HTTP_TIMEOUT', 60))  # 上游请求默认超时（秒）
+    
+    # 冷启动配置：Serverless（Vercel）部署时冷启动耗时直接计入用户请求延迟，
+    # 数据库迁移工具（会导入 alembic）和路由表打印只在开发环境启用，
+    # 需要在其他环境执行 flask db 命令时设置 ENABLE_MIGRATIONS=1
+    ENABLE_MIGRATIONS = os.environ.get('ENABLE_MIGRATIONS', '').lower() in ('1', 'true', 'yes')
+    PRINT_ROUTES = False  # 启动时打印所有注册的路由
+    
+    # 指标配置：开启后记录上游接口和路由延迟，并通过 /metrics 提供 Prometheus 格式输出
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # 抓取 /metrics 需要携带 Authorization: Bearer <令牌>，为空时不对外提供
+    
+    # 请求剖析配置：开启后带签名令牌的上传/试穿请求会被剖析（见 utils/profiler.py）
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILER_SECRET = os.environ.get('PROFILER_SECRET', '')  # 令牌签名密钥，为空时不接受任何令牌
+    PROFILE_FOLDER = os.path.join(BASE_DIR, 'profiles')  # 剖析结果保存目录
+    PROFILER_SAMPLE_INTERVAL = 0.005  # 调用栈采样间隔（秒）
+    
+    # 日志配置：JSON行输出到标准输出，由后台线程写出
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # 日志级别
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 输出格式：json / text
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))  # DEBUG日志按请求采样的比例
+    LOG_QUEUE_SIZE = 10000  # 日志队列长度，写满后丢弃新日志而不是阻塞请求
+
+    # 准入控制（见 utils/admission.py）：高成本接口按 Session/IP 令牌桶限流，并限制全局上游并发
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND', 'memory')  # memory：每个进程各自限流；redis：使用 REDIS_URL 跨进程共享
+    ADMISSION_TRUST_FORWARDED_FOR = os.environ.get('ADMISSION_TRUST_FORWARDED_FOR', '').lower() in ('1', 'true', 'yes')  # 部署在反向代理后时开启
+    ADMISSION_COSTS = {  # 每次请求扣除的令牌数，未列出的接口不限流
+        'api.upload_image': 5,  # 千问VL识别
+        'api.oss_upload_policy': 1,  # 签发直传策略（查询OSS对象）
+        'api.oss_upload_complete': 5,  # 千问VL识别
+        'api.resumable_finalize': 5,  # 千问VL识别（模特图）或OSS上传（衣物图）
+        'api.analyze_submit': 5,  # 异步任务中的千问VL识别
+        'api.analyze_batch': 5,  # 批量千问VL识别，按去重后的图片数计费（每张与单张上传相同）
+        'api.try_on': 10,  # 图像合成，按次计费
+        'api.upload_garment': 1,  # OSS上传
+        'api.upload_to_oss_route': 1  # OSS上传
+    }
+    ADMISSION_SESSION_BUCKET = (60, 0.5)  # 每个Session的令牌桶：(容量, 每秒补充数)
+    ADMISSION_IP_BUCKET = (300, 2.5)  # 每个IP的令牌桶，NAT后多个用户共用同一IP，因此更宽松
+    ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 64))  # 同时处理的高成本请求上限，0 表示不限制
+    VL_HEDGE_MAX_WORKERS = int(os.environ.get('VL_HEDGE_MAX_WORKERS', ADMISSION_MAX_CONCURRENCY // 4 or 16))  # 同步模式下同时在途的VL对冲请求上限（配置多个VL端点时），已满时不再对冲
+    ADMISSION_SLOT_LEASE = 300  # 并发槽位最长占用时间（秒），进程异常退出后自动回收
+    ADMISSION_BUSY_RETRY_AFTER = 2  # 并发已满时建议客户端等待的秒数
+
+    # 幂等键配置（见 utils/idempotency.py）：重试的上传分析/试穿提交直接返回第一次的结果
+    IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')  # memory：进程内LRU；redis：使用 REDIS_URL 跨进程共享
+    IDEMPOTENCY_TTL = 24 * 3600  # 响应保留时间（秒）
+    IDEMPOTENCY_MAX_ENTRIES = 2000  # memory 后端最多保留的响应数
+    IDEMPOTENCY_WAIT_TIMEOUT = 120  # 重复请求等待第一次请求完成的最长时间（秒）
+
+    # 请求截止时间（见 utils/deadline.py）：接口的总耗时预算（秒），客户端可用 X-Request-Timeout 请求头缩短；
+    # 截止前没有完成的天气和分析在响应中标记为 skipped，上传OSS在后台继续并标记为 pending
+    UPLOAD_DEADLINE = float(os.environ.get('UPLOAD_DEADLINE', 60))
+    REQUEST_DEADLINES = {
+        'api.upload_image': UPLOAD_DEADLINE,
+        'api.oss_upload_complete': UPLOAD_DEADLINE,
+        'api.resumable_finalize': UPLOAD_DEADLINE
+    }
+    PENDING_RESULTS_BACKEND = os.environ.get('PENDING_RESULTS_BACKEND', 'memory')  # memory：进程内；redis：使用 REDIS_URL 跨进程共享
+    PENDING_RESULTS_TTL = 3600  # 后台完成的结果保留时间（秒）
+
+    # 响应JSON序列化（见 utils/json_provider.py）：auto（安装了 orjson 时使用）、orjson 或 default（标准库 json）
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+    # 两级缓存（见 utils/cache.py）：天气、城市搜索、分析结果和OSS URL
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory：仅进程内；sqlite：本机 worker 共享；redis：使用 REDIS_URL 跨实例共享
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH') or os.path.join(BASE_DIR, 'cache.sqlite3')  # 放在 /dev/shm 下即为共享内存
+    CACHE_KEY_PREFIX = 'fashion:'  # 与同一 Redis 中的其他数据区分
+    CACHE_L1_MAX_BYTES = 32 * 1024 * 1024  # 每个进程的L1上限（序列化后的字节数）
+    CACHE_L1_MAX_ENTRIES = 10000
+    CACHE_L1_TTL = 60  # 有L2时L1条目的最长保留时间（秒）
+    CACHE_TTLS = {  # 命名空间: (保留时间, 负缓存时间)（秒）
+        'weather': (600, 60),  # 和风天气实况约10分钟更新一次；无效的城市ID负缓存1分钟
+        'city': (86400, 3600),  # 城市数据基本不变
+        'analysis': (7 * 86400, 0),  # 图片最近的分析结果，千问VL熔断时降级使用
+        'oss_url': (86400, 0),  # 本地文件上传OSS后的URL，需短于 Bucket 中 temp/ 的生命周期规则
+        'oss_verified': (30 * 86400, 0)  # 直传对象通过内容哈希校验时的ETag
+    }
+
+    # 只读接口的HTTP缓存与压缩（见 utils/http_cache.py）：弱ETag/304、Cache-Control，JSON超过阈值时 br/gzip 压缩
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    HTTP_CACHE_POLICIES = {
+        'api.get_weather': {'scope': 'public', 'max_age': 300, 'stale_while_revalidate': 60},  # 和风天气实况约10分钟更新一次
+        'api.city_lookup': {'scope': 'public', 'max_age': 86400, 'stale_while_revalidate': 3600},  # 城市数据基本不变
+        'api.image_search': {'scope': 'public', 'max_age': 600},  # 搜索结果
+        'api.get_current_model': {'scope': 'private', 'no_cache': True, 'max_age': 0, 'vary': ['Cookie']}  # 随Session变化，每次验证ETag
+    }
+    HTTP_COMPRESS_MIN_SIZE = 1024  # 超过该大小（字节）的JSON响应才压缩
+
+    # 上游流量录制/回放（见 utils/upstream_cassette.py）：record 录制真实上游响应，replay 离线回放
+    UPSTREAM_CASSETTE_MODE = os.environ.get('UPSTREAM_CASSETTE_MODE', '').lower()  # 空 / record / replay
+    UPSTREAM_CASSETTE_DIR = os.environ.get('UPSTREAM_CASSETTE_DIR') or os.path.join(BASE_DIR, 'cassettes')
+    UPSTREAM_REPLAY_TIME_SCALE = float(os.environ.get('UPSTREAM_REPLAY_TIME_SCALE', 1.0))  # 回放延迟倍率，0 表示不等待
+
     # Session配置
     SESSION_COOKIE_HTTPONLY = True  # Session Cookie仅HTTP可用
     SESSION_COOKIE_SAMESITE = 'Lax'  # Session Cookie SameSite策略
@@ -57,6 +196,11 @@ class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True  # 开启调试模式
     SQLALCHEMY_ECHO = True  # 输出SQL语句用于调试
+    ENABLE_MIGRATIONS = True  # 开发环境始终启用数据库迁移工具
+    PRINT_ROUTES = True  # 打印路由表用于调试
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')  # 开发环境输出调试日志
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 开发环境使用易读的文本格式
+    LOG_DEBUG_SAMPLE_RATE = 1.0  # 开发环境不采样
 
 
 class ProductionConfig(Config):
@@ -72,6 +216,7 @@ class TestingConfig(Config):
     # 使用内存数据库，每次测试后自动清理
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False  # 测试环境禁用CSRF保护
+    CACHE_BACKEND = 'memory'  # 每个测试应用使用新的进程内缓存
 
 
 # 配置映射字典，用于根据环境选择不同的配置
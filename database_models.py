@@ -135,3 +135,22 @@ class VirtualTryonResult(db.Model):
     result_image_path = db.Column(db.String(255))  # 试穿结果图片路径
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间
     status = db.Column(db.String(20), default='pending')  # 试穿状态：pending（待处理）、processing（处理中）、completed（已完成）、failed（失败）
+
+
+class AnalysisJob(db.Model):
+    """异步分析任务模型
+    存储 POST /api/analyze 登记的任务及其结果（见 services/analysis_jobs.py）
+    """
+    __tablename__ = 'analysis_jobs'  # 数据库表名
+    
+    id = db.Column(db.String(32), primary_key=True)  # 任务ID（UUID十六进制），主键
+    image = db.Column(db.String(500), nullable=False)  # 本地图片路径或OSS URL
+    location_id = db.Column(db.String(50))  # 城市ID（可选，用于获取天气）
+    status = db.Column(db.String(20), default='queued', index=True)  # 任务状态：queued（排队中）、running（执行中）、succeeded（成功）、failed（失败）
+    backend = db.Column(db.String(20))  # 执行后端：thread、celery
+    weather = db.Column(db.JSON)  # 分析时使用的天气数据
+    result = db.Column(db.JSON)  # 分析结果
+    error = db.Column(db.Text)  # 失败原因
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间
+    started_at = db.Column(db.DateTime)  # 开始执行时间
+    finished_at = db.Column(db.DateTime)  # 结束时间
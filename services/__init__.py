@@ -4,9 +4,26 @@
 包含应用的所有业务逻辑服务
 """
 
-# 从各服务模块导入类，方便外部直接调用
-from .image_recognition_service import ImageRecognitionService
-from .weather_service import WeatherService
+import importlib
+
+
+# 服务类与所在模块的对应关系
+# 服务模块会导入 openai、requests 等较重的SDK，改为首次访问时再导入，
+# 避免 import services.xxx 时连带加载所有SDK，缩短冷启动时间
+_LAZY_EXPORTS = {
+    'ImageRecognitionService': '.image_recognition_service',
+    'WeatherService': '.weather_service'
+}
+
+
+def __getattr__(name):
+    """按需导入服务类，支持 from services import WeatherService 的写法"""
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 __all__ = [
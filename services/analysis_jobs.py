@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+异步分析任务服务
+POST /api/analyze 只登记任务（AnalysisJob）并交给后台执行，立即返回任务ID，
+Web worker 不再等待千问VL；客户端通过 GET /api/analyze/<job_id> 查询状态和结果。
+
+执行后端（ANALYSIS_JOB_BACKEND）：
+    - thread：进程内线程池，开发和测试使用，不需要 Redis
+    - celery：通过 CELERY_BROKER_URL 发送到 Celery worker 执行（生产环境），
+      worker 启动方式：celery -A celery_worker.celery worker -Q analysis
+
+分析结果写入 AnalysisJob 表，同时经由 ImageRecognitionService 写入分析结果缓存
+"""
+
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+# Celery 任务名和队列
+TASK_NAME = 'analysis.run_job'
+TASK_QUEUE = 'analysis'
+
+
+def run_job(job_id):
+    """
+    执行一个分析任务（需在应用上下文中调用，线程池和 Celery worker 共用）
+
+    获取天气、调用图像识别服务，结果或错误写回任务记录；已结束的任务（如 Celery 重复投递）直接跳过
+
+    Args:
+        job_id: 任务ID
+    """
+    from flask import current_app
+    from database_models import db, AnalysisJob
+
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None:
+        logger.warning('分析任务不存在: %s', job_id)
+        return
+    if job.status in FINISHED_STATUSES:
+        return
+
+    job.status = RUNNING
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        weather_data = None
+        if job.location_id:
+            from services.weather_service import WeatherService
+            weather_data = WeatherService(current_app.config).get_weather_now(job.location_id)
+
+        from services.image_recognition_service import ImageRecognitionService
+        from services.result_models import to_plain
+        job.result = to_plain(ImageRecognitionService(current_app.config).analyze_image(job.image, weather_data))
+        job.weather = to_plain(weather_data)
+        job.status = SUCCEEDED
+    except Exception as e:
+        logger.warning('分析任务失败: %s', job_id, extra={'error': str(e)})
+        job.error = str(e) or type(e).__name__
+        job.status = FAILED
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+class ThreadPoolBackend:
+    """进程内线程池执行任务"""
+
+    name = 'thread'
+
+    def __init__(self, app, max_workers=4):
+        self._app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+
+    def submit(self, job_id):
+        return self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self._app.app_context():
+            try:
+                run_job(job_id)
+            except Exception:
+                logger.exception('分析任务执行异常: %s', job_id)
+
+
+class CeleryBackend:
+    """发送到 Celery worker 执行（Web 进程只负责投递，不导入 worker 端代码）"""
+
+    name = 'celery'
+
+    def __init__(self, broker_url, result_backend=None):
+        from celery import Celery
+
+        self._celery = Celery('fashion_ai', broker=broker_url, backend=result_backend)
+
+    def submit(self, job_id):
+        return self._celery.send_task(TASK_NAME, args=[job_id], queue=TASK_QUEUE)
+
+
+_backend_lock = threading.Lock()
+
+
+def get_backend(app):
+    """
+    应用的任务执行后端（首次使用时创建）
+
+    Args:
+        app: Flask应用实例
+    """
+    with _backend_lock:
+        backend = app.extensions.get('analysis_jobs')
+        if backend is None:
+            if app.config.get('ANALYSIS_JOB_BACKEND') == 'celery':
+                backend = CeleryBackend(app.config['CELERY_BROKER_URL'], app.config.get('CELERY_RESULT_BACKEND'))
+            else:
+                backend = ThreadPoolBackend(app, app.config.get('ANALYSIS_JOB_WORKERS', 4))
+            app.extensions['analysis_jobs'] = backend
+        return backend
+
+
+def submit_job(image, location_id=None):
+    """
+    登记分析任务并交给执行后端
+
+    Args:
+        image: 本地图片路径或OSS URL（celery 后端时本地路径需对 worker 可见）
+        location_id: 城市ID（可选），由 worker 获取天气
+
+    Returns:
+        AnalysisJob: 新建的任务记录
+    """
+    import uuid
+    from flask import current_app
+    from database_models import db, AnalysisJob
+
+    app = current_app._get_current_object()
+    backend = get_backend(app)
+    job = AnalysisJob(id=uuid.uuid4().hex, image=image, location_id=location_id or None,
+                      status=QUEUED, backend=backend.name)
+    db.session.add(job)
+    db.session.commit()
+    try:
+        backend.submit(job.id)
+    except Exception as e:
+        # 投递失败（如 broker 不可用）时任务不会被执行，直接标记为失败
+        job.status = FAILED
+        job.error = f'Failed to enqueue job: {e}'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        raise
+    return job
+
+
+def job_to_dict(job):
+    """
+    任务记录转为接口响应
+
+    Returns:
+        dict: 任务状态；成功时包含 analysis，失败时包含 error
+    """
+    data = {
+        'job_id': job.id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat() + 'Z' if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() + 'Z' if job.finished_at else None
+    }
+    if job.status == SUCCEEDED:
+        data['analysis'] = job.result
+    elif job.status == FAILED:
+        data['error'] = job.error
+    return data
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+异步HTTP客户端
+异步服务模式下所有上游调用（和风天气、DashScope、OSS）共享同一个 httpx.AsyncClient，
+复用连接池，单个进程即可同时挂起数百个上游请求
+"""
+
+import httpx
+
+
+_client = None
+
+
+def init_async_client(max_connections=500, timeout=30.0):
+    """
+    创建共享的异步HTTP客户端，在异步应用启动时（before_serving）调用
+
+    Args:
+        max_connections: 连接池最大连接数，即单进程可同时进行的上游请求数
+        timeout: 默认超时时间（秒），单次请求可以覆盖
+    """
+    global _client
+    _client = httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+    return _client
+
+
+def get_async_client():
+    """
+    获取共享的异步HTTP客户端，未初始化时按默认参数创建
+
+    Returns:
+        httpx.AsyncClient: 异步HTTP客户端
+    """
+    if _client is None:
+        return init_async_client()
+    return _client
+
+
+async def close_async_client():
+    """关闭共享的异步HTTP客户端，在异步应用停止时（after_serving）调用"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
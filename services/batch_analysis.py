@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+批量图片分析
+一次请求分析多张图片（如造型师为新客户导入20~50张衣橱照片）：
+    1. 预处理并行执行：multipart 图片校验、计算内容哈希并按哈希落盘；OSS 对象读取文件头校验
+    2. 按内容去重：相同的图片只调用一次千问VL，其余标记为 duplicate_of
+    3. 在 concurrency 个线程内并发调用模型，每张图片完成后立即输出一行 NDJSON，
+       最后一行为汇总统计（数量、成功/失败、耗时、吞吐量）
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.file_utils import validate_uploaded_file, get_file_extension
+from utils.image_validation import ImageValidationError, validate_image_bytes
+from services.result_models import to_plain
+
+logger = logging.getLogger(__name__)
+
+# NDJSON 的 Content-Type
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class BatchItem:
+    """批次中的一张图片"""
+
+    def __init__(self, index, name):
+        self.index = index  # 在请求中的序号
+        self.name = name  # 文件名或对象Key
+        self.image = None  # 交给模型的本地路径或OSS URL
+        self.digest = None  # 内容标识，用于去重
+        self.error = None  # 预处理失败的原因
+        self.retry_after = None  # 因限流未分析时建议等待的秒数
+
+
+def prepare_upload(index, file, upload_folder, max_pixels, max_frames):
+    """
+    预处理一张 multipart 图片：校验、计算内容哈希，按哈希保存（相同内容只保存一份）
+
+    Returns:
+        BatchItem
+    """
+    item = BatchItem(index, file.filename)
+    try:
+        validate_uploaded_file(file, max_pixels, max_frames)
+        data = file.stream.read()
+    except ImageValidationError as e:
+        item.error = str(e)
+        return item
+    item.digest = hashlib.sha256(data).hexdigest()
+    item.image = os.path.join(upload_folder, f"batch_{item.digest[:32]}.{get_file_extension(file.filename)}")
+    if not os.path.exists(item.image):
+        temp_path = f"{item.image}.{index}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, item.image)
+    return item
+
+
+def prepare_object(index, key, oss_service, probe_size, max_pixels, max_frames):
+    """
+    预处理一个OSS直传对象：校验Key，读取文件头校验图片，并校验内容与Key中的哈希一致后按哈希去重
+
+    Returns:
+        BatchItem
+    """
+    item = BatchItem(index, key)
+    if not oss_service.is_direct_upload_key(key):
+        item.error = 'Invalid object key'
+        return item
+    try:
+        validate_image_bytes(oss_service.read_head(key, probe_size), max_pixels, max_frames)
+        if not oss_service.verify_object(key):
+            item.error = 'Object content does not match its key'
+            return item
+    except ImageValidationError as e:
+        item.error = str(e)
+        return item
+    except Exception as e:
+        logger.warning('读取OSS对象失败: %s', key, extra={'error': str(e)})
+        item.error = 'Object not found or unreadable'
+        return item
+    item.digest = oss_service.key_hash(key)
+    item.image = oss_service.public_url(key)
+    return item
+
+
+def preprocess(tasks, workers=8):
+    """
+    并行执行预处理
+
+    Args:
+        tasks: 无参函数列表，每个返回一个 BatchItem
+        workers: 线程数
+
+    Returns:
+        list: 按原顺序排列的 BatchItem
+    """
+    if len(tasks) <= 1:
+        return [task() for task in tasks]
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks)), thread_name_prefix='batch-prep') as executor:
+        futures = [executor.submit(contextvars.copy_context().run, task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def unique_digests(items):
+    """预处理成功的图片去重后的内容标识（按首次出现的顺序），每个对应一次模型调用"""
+    return list(dict.fromkeys(item.digest for item in items if item.error is None))
+
+
+def reject_digests(items, digests, error, retry_after):
+    """
+    内容标识在 digests 中的图片不再分析（如超出限流额度），结果中输出失败原因和建议等待的秒数
+    """
+    digests = set(digests)
+    for item in items:
+        if item.error is None and item.digest in digests:
+            item.error = error
+            item.retry_after = retry_after
+
+
+def run_batch(items, analyze, concurrency=4):
+    """
+    去重后并发分析，按完成顺序逐条产出结果
+
+    Args:
+        items: 预处理后的 BatchItem 列表
+        analyze: 分析函数 analyze(image) -> dict
+        concurrency: 同时进行的模型调用数
+
+    Yields:
+        dict: {'type': 'result', ...}（每张图片一条），最后一条为 {'type': 'summary', ...}
+    """
+    start = time.perf_counter()
+    counts = {'succeeded': 0, 'failed': 0}
+    latencies = []
+
+    def event(item, status, **fields):
+        counts[status] += 1
+        return dict({'type': 'result', 'index': item.index, 'name': item.name, 'status': status}, **fields)
+
+    groups = {}
+    for item in items:
+        if item.retry_after is not None:
+            yield event(item, 'failed', error=item.error, retry_after=item.retry_after)
+        elif item.error is not None:
+            yield event(item, 'failed', error=item.error)
+        else:
+            groups.setdefault(item.digest, []).append(item)
+
+    def timed(image):
+        began = time.perf_counter()
+        return analyze(image), time.perf_counter() - began
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='batch-vl')
+    try:
+        futures = {executor.submit(contextvars.copy_context().run, timed, group[0].image): group
+                   for group in groups.values()}
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                result, elapsed = future.result()
+            except Exception as e:
+                logger.warning('批量分析失败: %s', group[0].name, extra={'error': str(e)})
+                for item in group:
+                    yield event(item, 'failed', error=str(e) or type(e).__name__,
+                                duplicate_of=None if item is group[0] else group[0].index)
+                continue
+            latencies.append(elapsed)
+            for item in group:
+                yield event(item, 'succeeded', analysis=result, elapsed_ms=round(elapsed * 1000),
+                            duplicate_of=None if item is group[0] else group[0].index)
+    finally:
+        # 客户端断开时不再发起排队中的模型调用
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    yield {
+        'type': 'summary',
+        'total': len(items),
+        'unique': len(groups),
+        'duplicates': sum(len(group) - 1 for group in groups.values()),
+        'succeeded': counts['succeeded'],
+        'failed': counts['failed'],
+        'model_calls': len(groups),
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'images_per_second': round(counts['succeeded'] / elapsed, 3) if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+            'max': round(latencies[-1] * 1000) if latencies else None
+        }
+    }
+
+
+def to_ndjson(event, dumps=None):
+    """
+    一条结果序列化为一行 NDJSON
+
+    Args:
+        event: run_batch 产出的结果
+        dumps: 序列化函数（缺省为标准库 json），路由中传入应用的 JSON Provider（app.json.dumps）
+    """
+    if dumps is None:
+        return json.dumps(event, ensure_ascii=False, default=to_plain) + '\n'
+    return dumps(event) + '\n'
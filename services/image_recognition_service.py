@@ -6,68 +6,49 @@
 
 import os
 import json
+import time
+import asyncio
 import base64
-from openai import OpenAI
+import logging
+import mimetypes
 
+from utils.metrics import track_upstream, record_token_usage, record_cascade_tier, RECOMMENDATIONS
+from utils.cache import get_cache, MISS, NEGATIVE
+from utils.file_utils import file_sha256
+from utils.logging_utils import upstream_headers
+from services.vl_endpoints import get_pool, REQUEST_TIMEOUT, MAX_HEDGE_WORKERS
+from services.vl_schema import COMPACT_SYSTEM_PROMPT, expand_compact
+from services.result_models import AnalysisResult
+from services.recommendation_service import recommend
+from utils import resilience, deadline
+from utils.deadline import DeadlineExceeded
+from utils.resilience import CircuitOpenError
 
-class ImageRecognitionService:
-    """
-    图像识别服务类
-    使用阿里云通义千问VL模型（Qwen3-VL）提供图片分析功能
-    """
-    
-    def __init__(self):
-        """
-        初始化服务，加载API密钥
-        """
-        # 从环境变量获取API密钥
-        self.api_key = os.environ.get('DASHSCOPE_API_KEY', '')
-        if not self.api_key:
-            raise ValueError('DASHSCOPE_API_KEY环境变量未设置')
-        
-        # 初始化OpenAI客户端（使用兼容模式）
-        self.client = OpenAI(
-            api_key=self.api_key,
-            # 北京地域base_url
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
-    
-    def analyze_image(self, image_path, weather_data=None):
-        """
-        分析图片，识别衣物和人物特征，并根据天气生成推荐
-        
-        Args:
-            image_path: 图片文件路径
-            weather_data: 天气数据字典（可选）
-            
-        Returns:
-            dict: 包含衣物识别结果、人物特征、整体风格和推荐建议的字典
-        """
-        try:
-            # 将图片转换为base64格式，用于API调用
-            with open(image_path, 'rb') as f:
-                image_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # 构建Prompt
-            prompt_text = """请分析这张照片中人物的穿搭，提取以下信息：
+logger = logging.getLogger(__name__)
+
+
+# 图像分析使用的模型
+VL_MODEL = "qwen3-vl-plus"
+
+# 级联模式的快速模型和升级阈值、输出格式、上下文缓存、推荐模式的默认值，
+# 应用中由 Config 的 VL_CASCADE、VL_FAST_MODEL、VL_CASCADE_MIN_*、VL_RESPONSE_MODE、VL_CONTEXT_CACHE、VL_RECOMMENDATION_MODE 配置
+VL_FAST_MODEL = 'qwen3-vl-flash'
+CASCADE_MIN_CONFIDENCE = 0.8
+CASCADE_MIN_ITEMS = 1
+
+# 完整格式的系统提示词（固定不变，天气和图片放在用户消息中）
+FULL_SYSTEM_PROMPT = """你是服装穿搭分析助手。请分析用户照片中人物的穿搭，提取以下信息：
 1. 衣物识别：上衣、下装、外套、鞋子的款式、颜色、材质、风格
 2. 人物特征：体型（如梨形、苹果形、沙漏形等）、身高比例、肤色类型
 3. 体态特点：姿态、气质等
 4. 整体风格：休闲、商务、运动、复古等
-"""
-            
-            # 如果提供了天气数据，增加推荐要求
-            if weather_data:
-                weather_info = f"当前天气：{weather_data.get('text', '未知')}，温度：{weather_data.get('temp', '未知')}°C，体感：{weather_data.get('feels_like', '未知')}°C，湿度：{weather_data.get('humidity', '未知')}%"
-                prompt_text += f"""
-5. 穿搭推荐：结合识别出的人物特征（体型、肤色、气质）和{weather_info}，给出具体的穿搭建议。建议应包括：
+5. 穿搭推荐：仅在用户提供了天气时给出，结合识别出的人物特征（体型、肤色、气质）和天气，给出具体的穿搭建议。建议应包括：
    - 适合当前天气的衣物搭配（保暖/透气/防雨等）
    - 适合人物体型的款式建议（扬长避短）
    - 适合肤色的颜色建议
    - 整体风格的优化建议
-"""
+   未提供天气时 recommendation 返回空对象
 
-            prompt_text += """
 请以JSON格式返回结果，包含以下字段：
 {
     "clothing_items": [
@@ -95,41 +76,398 @@ class ImageRecognitionService:
     }
 }"""
 
-            # 构建API请求消息
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt_text
-                        }
-                    ]
-                }
-            ]
-            
-            # 调用阿里云通义千问VL模型
-            completion = self.client.chat.completions.create(
-                model="qwen3-vl-plus",  # 使用的模型
-                messages=messages      # 请求消息
+
+def cascade_escalation_reason(result, min_confidence=None, min_items=None):
+    """
+    判断快速模型的识别结果是否需要升级到 plus 模型
+    
+    Args:
+        result: 解析后的识别结果
+        min_confidence: 衣物 confidence 下限，缺省使用 CASCADE_MIN_CONFIDENCE
+        min_items: 衣物数量下限，缺省使用 CASCADE_MIN_ITEMS
+        
+    Returns:
+        str: 升级原因（'parse_error'、'too_few_items'、'low_confidence'），结果可用时返回None
+    """
+    min_confidence = CASCADE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    min_items = CASCADE_MIN_ITEMS if min_items is None else min_items
+    if 'raw_response' in result:
+        return 'parse_error'
+    items = result.get('clothing_items') or []
+    if len(items) < min_items:
+        return 'too_few_items'
+    for item in items:
+        try:
+            confidence = float(item.get('confidence'))
+        except (AttributeError, TypeError, ValueError):
+            # 缺少 confidence 的结果视为不可信
+            return 'low_confidence'
+        if confidence < min_confidence:
+            return 'low_confidence'
+    return None
+
+
+def _within_deadline(client):
+    """
+    请求设置了截止时间时，单次请求的超时不超过剩余时间（客户端本身不使用SDK自带的重试，重试由端点池和熔断器负责）
+    """
+    left = deadline.remaining()
+    if left is None:
+        return client
+    return client.with_options(timeout=min(REQUEST_TIMEOUT, left))
+
+
+def with_recommendation(result, weather_data, mode='model'):
+    """
+    为识别结果补全穿搭推荐：本地推荐模式下总是使用本地规则，否则只在模型没有给出推荐时补全
+
+    Args:
+        result: 识别结果（AnalysisResult 或字典），原地修改
+        weather_data: 天气数据，没有天气时不生成推荐
+        mode: 推荐模式（见 Config.VL_RECOMMENDATION_MODE）
+
+    Returns:
+        识别结果本身
+    """
+    if not weather_data:
+        return result
+    existing = result.get('recommendation')
+    if mode != 'local' and isinstance(existing, dict) and any(existing.values()):
+        RECOMMENDATIONS.inc('model')
+        return result
+    recommendation = recommend(result.get('clothing_items'), result.get('body_features'), weather_data,
+                               result.get('overall_style'))
+    if isinstance(result, AnalysisResult):
+        result.recommendation = recommendation
+    else:
+        result['recommendation'] = recommendation
+    RECOMMENDATIONS.inc('local' if mode == 'local' else 'local_fallback')
+    return result
+
+
+def image_key(image_path):
+    """
+    图片的缓存键：远程URL（OSS 直传的对象登记前已校验内容与Key中的哈希一致）直接使用，本地文件使用内容的 SHA-256
+    """
+    if image_path.startswith(('http://', 'https://')):
+        return image_path
+    return file_sha256(image_path)
+
+
+def remember_result(key, result):
+    """保存图片最近成功的分析结果（各 worker 共享，见 utils/cache.py），千问VL熔断时作为降级结果"""
+    # 解析失败的结果不保存
+    if 'raw_response' not in result:
+        get_cache().namespace('analysis').set(key, result)
+
+
+def recent_result(key):
+    """图片最近的分析结果（带 from_cache 标记），没有时返回None"""
+    result = get_cache().namespace('analysis').get(key)
+    if result is MISS or result is NEGATIVE:
+        return None
+    result = AnalysisResult.from_dict(result)
+    result.from_cache = True
+    return result
+
+
+class ImageRecognitionService:
+    """
+    图像识别服务类
+    使用阿里云通义千问VL模型（Qwen3-VL）提供图片分析功能
+    """
+    
+    def __init__(self, config=None):
+        """
+        初始化服务，加载API密钥
+
+        Args:
+            config: 配置字典（可选，通常传入 current_app.config），缺省时使用默认值
+        """
+        config = config or {}
+        # 从环境变量获取API密钥
+        self.api_key = os.environ.get('DASHSCOPE_API_KEY', '')
+        if not self.api_key:
+            raise ValueError('DASHSCOPE_API_KEY环境变量未设置')
+        
+        # 北京地域base_url（可通过 DASHSCOPE_COMPATIBLE_BASE_URL 指向本地桩服务）
+        self.base_url = os.environ.get('DASHSCOPE_COMPATIBLE_BASE_URL', "https://dashscope.aliyuncs.com/compatible-mode/v1")
+        
+        # 级联模式：先用快速模型识别，结果不可信时再交给 VL_MODEL
+        self.cascade_enabled = config.get('VL_CASCADE', False)
+        self.fast_model = config.get('VL_FAST_MODEL', VL_FAST_MODEL)
+        self.cascade_min_confidence = config.get('VL_CASCADE_MIN_CONFIDENCE', CASCADE_MIN_CONFIDENCE)
+        self.cascade_min_items = config.get('VL_CASCADE_MIN_ITEMS', CASCADE_MIN_ITEMS)
+        
+        # 输出格式：full / compact
+        self.response_mode = config.get('VL_RESPONSE_MODE', 'full').lower()
+        
+        # 上下文缓存：隐式（默认）/ explicit
+        self.context_cache = config.get('VL_CONTEXT_CACHE', '').lower()
+        
+        # 穿搭推荐：model / local
+        self.recommendation_mode = config.get('VL_RECOMMENDATION_MODE', 'model').lower()
+        
+        # 端点池（DASHSCOPE_VL_ENDPOINTS 配置多个地域时按健康度选择端点并对冲慢请求）
+        self.pool = get_pool(self.base_url, config.get('VL_HEDGE_MAX_WORKERS', MAX_HEDGE_WORKERS))
+        
+        # OpenAI客户端（使用兼容模式）按端点在首次使用时创建，
+        # openai SDK 导入耗时较长，延迟导入以缩短冷启动时间
+        self._clients = {}
+        self._async_clients = {}
+    
+    @property
+    def client(self):
+        """当前健康度最好的端点的同步OpenAI客户端"""
+        return self._client_for(self.pool.ranked()[0])
+    
+    @property
+    def async_client(self):
+        """当前健康度最好的端点的异步OpenAI客户端"""
+        return self._async_client_for(self.pool.ranked()[0])
+    
+    def _client_for(self, endpoint):
+        """端点对应的同步OpenAI客户端"""
+        if endpoint.name not in self._clients:
+            from openai import OpenAI
+            self._clients[endpoint.name] = OpenAI(
+                api_key=endpoint.api_key or self.api_key,
+                base_url=endpoint.base_url,
+                timeout=REQUEST_TIMEOUT,
+                # 重试和故障转移由端点池和熔断器负责，SDK不再重试
+                max_retries=0
+            )
+        return self._clients[endpoint.name]
+    
+    def _async_client_for(self, endpoint):
+        """端点对应的异步OpenAI客户端，复用异步服务模式的共享连接池"""
+        if endpoint.name not in self._async_clients:
+            from openai import AsyncOpenAI
+            from services.async_http import get_async_client
+            self._async_clients[endpoint.name] = AsyncOpenAI(
+                api_key=endpoint.api_key or self.api_key,
+                base_url=endpoint.base_url,
+                timeout=REQUEST_TIMEOUT,
+                max_retries=0,
+                http_client=get_async_client()
             )
+        return self._async_clients[endpoint.name]
+    
+    def analyze_image(self, image_path, weather_data=None):
+        """
+        分析图片，识别衣物和人物特征，并根据天气生成推荐
+        
+        Args:
+            image_path: 图片文件路径，或可公开访问的图片URL（如OSS直传后的地址）
+            weather_data: 天气数据字典（可选）
             
-            # 处理API响应
-            result_text = completion.choices[0].message.content
-            # 解析JSON响应
-            result_json = self._parse_json_response(result_text)
-            return result_json
-                
-        except Exception as e:
-            print(f'图像识别错误: {str(e)}')
+        Returns:
+            dict: 包含衣物识别结果、人物特征、整体风格和推荐建议的字典
+            
+        Raises:
+            CircuitOpenError: 千问VL处于熔断状态，且没有该图片最近的分析结果
+            DeadlineExceeded: 请求的剩余时间用完（见 utils/deadline.py）
+        """
+        try:
+            # 本地文件转换为base64，远程URL直接交给模型拉取
+            messages = self._build_messages(self._build_image_url(image_path), weather_data)
+            
+            if not self.cascade_enabled:
+                result = self._complete(messages, VL_MODEL)
+            else:
+                result = self._cascade(messages)
+            remember_result(image_key(image_path), result)
+            return with_recommendation(result, weather_data, self.recommendation_mode)
+        
+        except CircuitOpenError:
+            # 降级：熔断期间只返回该图片最近的分析结果
+            cached = recent_result(image_key(image_path))
+            if cached is None:
+                logger.warning('千问VL熔断中，且没有可用的分析结果')
+                raise
+            return with_recommendation(cached, weather_data, self.recommendation_mode)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            logger.exception('图像识别错误')
+            raise
+    
+    def _cascade(self, messages):
+        """级联模式：先用快速模型识别，结果不可信时再交给 plus 模型"""
+        start = time.perf_counter()
+        try:
+            result = self._complete(messages, self.fast_model)
+            reason = cascade_escalation_reason(result, self.cascade_min_confidence, self.cascade_min_items)
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception:
+            logger.warning('快速模型识别失败，升级到 %s', VL_MODEL, exc_info=True)
+            reason = 'error'
+        record_cascade_tier('fast', reason, time.perf_counter() - start)
+        if reason is None:
+            return result
+        
+        start = time.perf_counter()
+        result = self._complete(messages, VL_MODEL)
+        record_cascade_tier('plus', None, time.perf_counter() - start)
+        return result
+    
+    async def analyze_image_async(self, image_path, weather_data=None):
+        """
+        分析图片（异步版本，供异步服务模式使用）
+        等待模型响应期间不占用线程，读取文件和base64编码放到线程池执行
+        
+        Args/Returns/Raises 同 analyze_image
+        """
+        try:
+            image_url = await asyncio.to_thread(self._build_image_url, image_path)
+            messages = self._build_messages(image_url, weather_data)
+            
+            if not self.cascade_enabled:
+                result = await self._complete_async(messages, VL_MODEL)
+            else:
+                result = await self._cascade_async(messages)
+            await asyncio.to_thread(remember_result, await asyncio.to_thread(image_key, image_path), result)
+            return with_recommendation(result, weather_data, self.recommendation_mode)
+        except CircuitOpenError:
+            cached = await asyncio.to_thread(recent_result, await asyncio.to_thread(image_key, image_path))
+            if cached is None:
+                logger.warning('千问VL熔断中，且没有可用的分析结果')
+                raise
+            return with_recommendation(cached, weather_data, self.recommendation_mode)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            logger.exception('图像识别错误')
             raise
     
+    async def _cascade_async(self, messages):
+        """级联模式（异步版本）"""
+        start = time.perf_counter()
+        try:
+            result = await self._complete_async(messages, self.fast_model)
+            reason = cascade_escalation_reason(result, self.cascade_min_confidence, self.cascade_min_items)
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception:
+            logger.warning('快速模型识别失败，升级到 %s', VL_MODEL, exc_info=True)
+            reason = 'error'
+        record_cascade_tier('fast', reason, time.perf_counter() - start)
+        if reason is None:
+            return result
+        
+        start = time.perf_counter()
+        result = await self._complete_async(messages, VL_MODEL)
+        record_cascade_tier('plus', None, time.perf_counter() - start)
+        return result
+    
+    def _complete(self, messages, model):
+        """
+        调用千问VL模型并解析JSON结果（多个端点时由端点池对冲慢请求）
+        
+        Args:
+            messages: 请求消息
+            model: 模型名称
+            
+        Returns:
+            dict: 解析后的识别结果
+        """
+        def request(endpoint):
+            with track_upstream('qwen_vl', 'chat'):
+                return _within_deadline(self._client_for(endpoint)).chat.completions.create(
+                    model=model,           # 使用的模型
+                    messages=messages,     # 请求消息
+                    extra_headers=upstream_headers()  # 携带请求关联ID
+                )
+        # 整个端点池连续失败时熔断，不再等待超时
+        completion = resilience.call('qwen_vl', lambda: self.pool.call(request))
+        record_token_usage(model, completion.usage)
+        
+        # 处理API响应，解析JSON（紧凑格式展开为完整格式）
+        return AnalysisResult.from_dict(expand_compact(self._parse_json_response(completion.choices[0].message.content)))
+    
+    async def _complete_async(self, messages, model):
+        """调用千问VL模型并解析JSON结果（异步版本）"""
+        async def request(endpoint):
+            with track_upstream('qwen_vl', 'chat'):
+                return await _within_deadline(self._async_client_for(endpoint)).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    extra_headers=upstream_headers()
+                )
+        completion = await resilience.call_async('qwen_vl', lambda: self.pool.call_async(request))
+        record_token_usage(model, completion.usage)
+        return AnalysisResult.from_dict(expand_compact(self._parse_json_response(completion.choices[0].message.content)))
+    
+    def _build_messages(self, image_url, weather_data=None):
+        """
+        构建API请求消息
+        固定的系统消息（输出格式和分析要求）在前，每次请求不同的天气和图片在后，
+        相同的前缀可以命中上游的上下文缓存
+        
+        Args:
+            image_url: 图片地址（http(s) URL 或 base64 data URL）
+            weather_data: 天气数据字典（可选）
+            
+        Returns:
+            list: chat.completions 的 messages 参数
+        """
+        system_prompt = COMPACT_SYSTEM_PROMPT if self.response_mode == 'compact' else FULL_SYSTEM_PROMPT
+        system_content = {"type": "text", "text": system_prompt}
+        if self.context_cache == 'explicit':
+            # 显式缓存：标记系统消息为可缓存的前缀
+            system_content["cache_control"] = {"type": "ephemeral"}
+        
+        # 本地推荐模式下推荐由服务端生成，不把天气交给模型
+        if weather_data and self.recommendation_mode != 'local':
+            weather_info = f"当前天气：{weather_data.get('text', '未知')}，温度：{weather_data.get('temp', '未知')}°C，体感：{weather_data.get('feels_like', '未知')}°C，湿度：{weather_data.get('humidity', '未知')}%"
+            user_text = f"{weather_info}。请分析这张照片并给出穿搭推荐。"
+        else:
+            user_text = "请分析这张照片，未提供天气，不需要穿搭推荐。"
+        
+        # 构建API请求消息
+        messages = [
+            {
+                "role": "system",
+                "content": [system_content]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": user_text
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            }
+        ]
+        return messages
+    
+    def _build_image_url(self, image_path):
+        """
+        生成传给模型的图片地址
+        
+        Args:
+            image_path: 本地文件路径或 http(s) URL
+            
+        Returns:
+            str: 远程URL原样返回，本地文件返回 base64 data URL
+        """
+        if image_path.startswith(('http://', 'https://')):
+            return image_path
+        
+        # 将图片转换为base64格式，用于API调用
+        with open(image_path, 'rb') as f:
+            image_data = base64.b64encode(f.read()).decode('utf-8')
+        mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
+        return f"data:{mime_type};base64,{image_data}"
+    
     def _parse_json_response(self, response_text):
         """
         解析API返回的JSON响应
@@ -151,7 +489,7 @@ class ImageRecognitionService:
                 raise ValueError("未找到JSON内容")
         except Exception as e:
             # 如果解析失败，返回包含原始响应的默认结构
-            print(f'JSON解析错误: {str(e)}')
+            logger.warning('JSON解析错误: %s', e)
             return {
                 'clothing_items': [],
                 'body_features': {},
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+OSS直传服务
+为浏览器签发短期有效的 OSS PostObject 上传策略，使图片直接上传到 Bucket，
+不再经过 Flask 中转；同时提供对象存在性校验和公网URL拼装
+"""
+
+import os
+import re
+import json
+import hmac
+import base64
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from urllib.parse import quote
+
+from utils import resilience
+from utils.cache import get_cache
+from utils.metrics import track_upstream
+from utils.logging_utils import upstream_headers
+
+logger = logging.getLogger(__name__)
+
+
+# 内容哈希（SHA-256 十六进制）格式
+CONTENT_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# 扩展名与 Content-Type 的对应关系
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif'
+}
+
+# 校验对象内容哈希时每次读取的字节数
+VERIFY_CHUNK_SIZE = 1024 * 1024
+
+
+class OssService:
+    """
+    阿里云OSS服务类
+    负责签发直传策略、校验已上传对象以及生成公网访问URL
+    """
+
+    def __init__(self, config=None):
+        """
+        初始化服务，加载OSS配置
+
+        Args:
+            config: 配置字典（可选，通常传入 current_app.config），缺省时读取环境变量
+        """
+        config = config or {}
+        self.access_key_id = config.get('ALIYUN_OSS_ACCESS_KEY_ID') or os.environ.get('ALIYUN_OSS_ACCESS_KEY_ID', '')
+        self.access_key_secret = config.get('ALIYUN_OSS_ACCESS_KEY_SECRET') or os.environ.get('ALIYUN_OSS_ACCESS_KEY_SECRET', '')
+        self.bucket_name = config.get('ALIYUN_OSS_BUCKET_NAME') or os.environ.get('ALIYUN_OSS_BUCKET_NAME', '')
+        self.endpoint = config.get('ALIYUN_OSS_ENDPOINT') or os.environ.get('ALIYUN_OSS_ENDPOINT', '')
+
+        # 直传相关参数
+        self.key_prefix = config.get('OSS_DIRECT_UPLOAD_PREFIX', 'uploads/')
+        self.policy_expire_seconds = config.get('OSS_POST_POLICY_EXPIRE_SECONDS', 300)
+        self.max_upload_size = config.get('OSS_DIRECT_UPLOAD_MAX_SIZE', 16 * 1024 * 1024)
+
+        self._bucket = None
+
+    def is_configured(self):
+        """判断OSS配置是否完整"""
+        return all([self.access_key_id, self.access_key_secret, self.bucket_name, self.endpoint])
+
+    @property
+    def bucket(self):
+        """延迟创建的 oss2.Bucket 实例（oss2 在此时才导入，签发直传策略不需要它）"""
+        if self._bucket is None:
+            import oss2
+            endpoint = self.endpoint
+            if not endpoint.startswith('http'):
+                endpoint = f"https://{endpoint}"
+            auth = oss2.Auth(self.access_key_id, self.access_key_secret)
+            self._bucket = oss2.Bucket(auth, endpoint, self.bucket_name, connect_timeout=resilience.timeout('oss'))
+        return self._bucket
+
+    def _clean_endpoint(self):
+        """去掉协议头的Endpoint"""
+        return self.endpoint.replace("http://", "").replace("https://", "")
+
+    def upload_host(self):
+        """浏览器表单直传的目标地址"""
+        return f"https://{self.bucket_name}.{self._clean_endpoint()}"
+
+    def public_url(self, key):
+        """
+        生成对象的公网访问URL（Bucket为公共读）
+
+        Args:
+            key: 对象Key
+
+        Returns:
+            str: 公网URL
+        """
+        return f"{self.upload_host()}/{key}"
+
+    def build_object_key(self, content_hash, extension):
+        """
+        根据内容哈希生成对象Key，相同内容总是映射到同一个Key
+
+        Args:
+            content_hash: 文件内容的 SHA-256 十六进制摘要
+            extension: 文件扩展名（不含点号）
+
+        Returns:
+            str: 对象Key，例如 uploads/ab/ab12...ef.jpg
+
+        Raises:
+            ValueError: 哈希或扩展名不合法
+        """
+        content_hash = (content_hash or '').lower()
+        extension = (extension or '').lower().lstrip('.')
+        if not CONTENT_HASH_PATTERN.match(content_hash):
+            raise ValueError('Invalid content hash')
+        if extension not in CONTENT_TYPES:
+            raise ValueError('Invalid file type')
+        return f"{self.key_prefix}{content_hash[:2]}/{content_hash}.{extension}"
+
+    def is_direct_upload_key(self, key):
+        """校验Key是否为本服务签发的内容哈希Key，防止客户端登记任意对象"""
+        if not key or not key.startswith(self.key_prefix):
+            return False
+        rest = key[len(self.key_prefix):]
+        parts = rest.split('/')
+        if len(parts) != 2:
+            return False
+        name, _, extension = parts[1].partition('.')
+        return (CONTENT_HASH_PATTERN.match(name) is not None
+                and parts[0] == name[:2]
+                and extension in CONTENT_TYPES)
+
+    def key_hash(self, key):
+        """直传对象Key中的内容哈希"""
+        return key.rsplit('/', 1)[-1].split('.', 1)[0]
+
+    def _call(self, operation, attempt):
+        """
+        通过熔断/重试策略调用 oss2 接口并记录上游指标（与上传对象相同的 'oss' 策略）
+
+        Args:
+            operation: 接口名称，如 'head'、'get'、'delete'
+            attempt: 无参函数，执行一次 oss2 调用并返回结果
+
+        Returns:
+            最后一次调用的结果
+        """
+        def tracked():
+            with track_upstream('oss', operation) as call:
+                result = attempt()
+                status = getattr(result, 'status', None)
+                if isinstance(status, int):
+                    call.status = status
+            return result
+
+        return resilience.call('oss', tracked)
+
+    def is_verified(self, key):
+        """
+        对象是否已通过内容校验且之后没有被替换：只查询ETag缓存和一次HEAD，不下载对象
+
+        Args:
+            key: 直传对象Key
+
+        Returns:
+            bool: 已校验且ETag未变化返回True；未校验过或对象不存在返回False
+        """
+        etag = get_cache().namespace('oss_verified').get(key)
+        if not isinstance(etag, str):
+            return False
+        try:
+            return self._call('head', lambda: self.bucket.head_object(key)).etag == etag
+        except Exception as e:
+            if getattr(e, 'status', None) == 404:
+                return False
+            raise
+
+    def verify_object(self, key):
+        """
+        校验对象内容的 SHA-256 与Key中的内容哈希一致
+
+        直传策略只限定了Key，无法限定上传的内容，任何人都可以把任意内容传到别人图片的哈希下。
+        只有校验通过的对象才能按内容哈希使用（跳过重复上传、批量去重、按URL缓存分析结果）。
+        校验结果按对象的ETag缓存，对象被替换后重新校验；内容不一致的对象被删除，正确的内容可以重新上传
+
+        Args:
+            key: 直传对象Key
+
+        Returns:
+            bool: 内容与Key一致返回True
+        """
+        verified = get_cache().namespace('oss_verified')
+        etag = self._call('head', lambda: self.bucket.head_object(key)).etag
+        if verified.get(key) == etag:
+            return True
+
+        def read_digest():
+            # 读取过程中断开时整体重试，不会得到不完整的摘要
+            digest = hashlib.sha256()
+            with track_upstream('oss', 'get'):
+                stream = self.bucket.get_object(key)
+                for chunk in iter(lambda: stream.read(VERIFY_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            return digest.hexdigest()
+
+        hexdigest = resilience.call('oss', read_digest)
+        if hexdigest != self.key_hash(key):
+            logger.warning('OSS对象内容与Key中的哈希不一致，已删除', extra={'key': key})
+            self._call('delete', lambda: self.bucket.delete_object(key))
+            return False
+        verified.set(key, etag)
+        return True
+
+    def create_post_policy(self, content_hash, extension):
+        """
+        签发 PostObject 表单直传策略
+
+        策略限定了对象Key、Content-Type 和文件大小范围，过期时间较短，
+        浏览器只能用它上传这一个内容哈希对应的对象；已存在的对象不能被覆盖。
+        策略无法限定内容，上传后需由 verify_object 校验
+
+        Args:
+            content_hash: 文件内容的 SHA-256 十六进制摘要
+            extension: 文件扩展名
+
+        Returns:
+            dict: 包含上传地址和表单字段的字典
+        """
+        key = self.build_object_key(content_hash, extension)
+        content_type = CONTENT_TYPES[key.rsplit('.', 1)[1]]
+
+        expire = int(time.time()) + self.policy_expire_seconds
+        policy_dict = {
+            'expiration': datetime.fromtimestamp(expire, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'conditions': [
+                {'bucket': self.bucket_name},
+                ['eq', '$key', key],
+                ['eq', '$Content-Type', content_type],
+                ['eq', '$x-oss-forbid-overwrite', 'true'],
+                ['content-length-range', 1, self.max_upload_size]
+            ]
+        }
+        policy = base64.b64encode(json.dumps(policy_dict).encode('utf-8')).decode('utf-8')
+        signature = base64.b64encode(
+            hmac.new(self.access_key_secret.encode('utf-8'), policy.encode('utf-8'), hashlib.sha1).digest()
+        ).decode('utf-8')
+
+        return {
+            'host': self.upload_host(),
+            'key': key,
+            'expire': expire,
+            'fields': {
+                'key': key,
+                'policy': policy,
+                'OSSAccessKeyId': self.access_key_id,
+                'Signature': signature,
+                'Content-Type': content_type,
+                'x-oss-forbid-overwrite': 'true',
+                'success_action_status': '200'
+            }
+        }
+
+    def object_exists(self, key):
+        """
+        检查对象是否已存在于Bucket中
+
+        Args:
+            key: 对象Key
+
+        Returns:
+            bool: 存在返回True
+        """
+        return self._call('exists', lambda: self.bucket.object_exists(key))
+
+    def read_head(self, key, size):
+        """
+        按范围读取对象开头的若干字节
+
+        Args:
+            key: 对象Key
+            size: 读取的字节数
+
+        Returns:
+            bytes: 对象开头的数据
+        """
+        return self._call('get', lambda: self.bucket.get_object(key, byte_range=(0, size - 1)).read())
+
+    def _object_url(self, key):
+        """
+        对象的请求地址：IP/localhost Endpoint（如本地桩服务）使用路径风格，其余使用虚拟主机风格
+        """
+        endpoint = self.endpoint if self.endpoint.startswith('http') else f"https://{self.endpoint}"
+        scheme, _, netloc = endpoint.partition('://')
+        from oss2.utils import is_ip_or_localhost
+        if is_ip_or_localhost(netloc):
+            return f"{scheme}://{netloc}/{self.bucket_name}/{quote(key)}"
+        return f"{scheme}://{self.bucket_name}.{netloc}/{quote(key)}"
+
+    def _sign_v1(self, method, key, content_type, date):
+        """
+        计算 OSS V1 签名的 Authorization 头
+        签名串为 VERB\nContent-MD5\nContent-Type\nDate\nCanonicalizedResource
+        """
+        string_to_sign = f"{method}\n\n{content_type}\n{date}\n/{self.bucket_name}/{key}"
+        signature = base64.b64encode(
+            hmac.new(self.access_key_secret.encode('utf-8'), string_to_sign.encode('utf-8'), hashlib.sha1).digest()
+        ).decode('utf-8')
+        return f"OSS {self.access_key_id}:{signature}"
+
+    async def put_object_async(self, key, data, content_type=None):
+        """
+        通过共享的异步HTTP客户端上传对象（异步服务模式使用，oss2 SDK 只有同步接口）
+
+        Args:
+            key: 对象Key
+            data: 文件内容
+            content_type: Content-Type（可选）
+
+        Returns:
+            str: 上传成功返回公网URL，失败返回None
+        """
+        from services.async_http import get_async_client
+
+        content_type = content_type or 'application/octet-stream'
+        date = formatdate(usegmt=True)
+        headers = {
+            'Content-Type': content_type,
+            'Date': date,
+            'Authorization': self._sign_v1('PUT', key, content_type, date)
+        }
+
+        async def put():
+            with track_upstream('oss', 'put') as call:
+                response = await get_async_client().put(self._object_url(key), content=data, headers=upstream_headers(headers),
+                                                        timeout=resilience.timeout('oss'))
+                call.status = response.status_code
+            return response
+
+        response = await resilience.call_async('oss', put)
+        if response.status_code != 200:
+            logger.error('OSS async upload failed with status %s', response.status_code, extra={'key': key})
+            return None
+        return self.public_url(key)
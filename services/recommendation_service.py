@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+推荐服务
+根据识别出的衣物、人物特征和和风天气实况，用本地规则生成穿搭推荐，不调用任何模型：
+    - 天气建议：按体感温度分档给出分层穿法，再按湿度、温差和天气现象（雨、雪、沙尘等）补充
+    - 体型与风格建议：按体型给出扬长避短的廓形规则，按身高比例和整体风格补充
+    - 肤色配色建议：按肤色冷暖给出适合的颜色，并结合现有衣物的颜色给出搭配色
+
+所有规则都是预先计算好的查表，文本归类的结果有缓存，一次推荐只需几微秒。
+输出与千问VL的 recommendation 字段结构相同，用于模型没有给出推荐时补全，或在本地推荐模式下代替模型
+（见 config.py 的 VL_RECOMMENDATION_MODE）
+"""
+
+from bisect import bisect_right
+from functools import lru_cache
+
+# 体感温度分档：(上限°C, 建议, 内搭, 外套, 鞋子)，外套为空表示不需要
+TEMPERATURE_BANDS = (
+    (-10, '体感极寒，需要保暖内衣、毛衣和长款羽绒服三层保暖，戴好帽子、围巾和手套', '高领毛衣', '长款羽绒服', '雪地靴'),
+    (0, '体感寒冷，羽绒服或厚呢大衣内搭毛衣，下装选择加绒款', '毛衣', '羽绒服', '短靴'),
+    (10, '体感较冷，大衣或棉服内搭针织衫、卫衣，注意颈部保暖', '针织衫', '呢大衣', '短靴'),
+    (18, '体感偏凉，长袖外加风衣或夹克，早晚温差大时多带一层', '长袖T恤', '风衣', '乐福鞋'),
+    (24, '体感舒适，长袖衬衫或薄卫衣单穿即可，可备一件薄开衫', '长袖衬衫', '', '乐福鞋'),
+    (29, '体感温暖，短袖等轻薄款式为主，选择透气面料', '短袖T恤', '', '帆布鞋'),
+    (None, '体感炎热，选择轻薄透气的棉麻面料和浅色，注意防晒', '棉麻短袖', '', '凉鞋'),
+)
+_BAND_LIMITS = [band[0] for band in TEMPERATURE_BANDS[:-1]]
+# 没有气温数据时使用的档位
+DEFAULT_BAND = TEMPERATURE_BANDS[4]
+
+# 天气现象：(关键字, 名称, 建议, 替换的鞋子)，按顺序匹配
+WEATHER_CONDITIONS = (
+    (('雷', '雨'), 'rain', '有雨，外层选择防水面料，带好雨伞', '防水短靴'),
+    (('雪',), 'snow', '有雪，选择防滑保暖的鞋子', '防滑雪地靴'),
+    (('沙', '尘'), 'dust', '有沙尘，外层选择防风面料并佩戴口罩', None),
+    (('雾', '霾'), 'haze', '空气质量较差，出门佩戴口罩', None),
+    (('风',), 'wind', '风力较大，外层选择防风面料', None),
+    (('晴',), 'sunny', '', None),
+)
+
+# 体型：(建议, 推荐下装)
+BODY_TYPE_RULES = {
+    '梨形': ('上身选择亮色或有肩部细节的款式，下身选择深色A字裙或直筒裤，弱化胯部', 'A字裙'),
+    '苹果形': ('选择V领和垂坠感面料，避免腰部堆叠，高腰直筒裤配长款外套拉长线条', '高腰直筒裤'),
+    '沙漏形': ('选择收腰款式突出腰线，如裹身裙、高腰裤，或系一条腰带', '高腰包臀裙'),
+    '矩形': ('用腰带、叠穿或荷叶边制造曲线，避免过于直筒宽松的款式', '高腰阔腿裤'),
+    '倒三角形': ('上身保持简洁，避免垫肩和泡泡袖，下身选择阔腿裤或A字裙平衡比例', '阔腿裤'),
+}
+# 体型的其他常见说法，按顺序匹配
+BODY_TYPE_ALIASES = (
+    ('梨', '梨形'), ('A型', '梨形'), ('苹果', '苹果形'), ('O型', '苹果形'), ('沙漏', '沙漏形'), ('X型', '沙漏形'),
+    ('倒三角', '倒三角形'), ('V型', '倒三角形'), ('Y型', '倒三角形'), ('矩形', '矩形'), ('H型', '矩形'), ('直筒', '矩形'),
+)
+DEFAULT_BODY_RULE = ('选择合身的剪裁，高腰下装可以拉长比例', '高腰直筒裤')
+
+# 身高比例：(关键字, 建议)，按顺序匹配
+_RAISE_WAIST = '选择高腰下装和短款上衣提高腰线'
+_PETITE = '选择短款外套和同色系上下装，避免过长的款式'
+PROPORTION_RULES = (
+    ('上身长', _RAISE_WAIST), ('上身偏长', _RAISE_WAIST), ('上长下短', _RAISE_WAIST), ('腿短', _RAISE_WAIST),
+    ('腰线低', _RAISE_WAIST), ('娇小', _PETITE), ('偏矮', _PETITE),
+)
+
+# 整体风格的优化建议
+STYLE_TIPS = {
+    '休闲': '休闲风格可以用乐福鞋或皮带提升精致感',
+    '商务': '商务风格注意剪裁合身，配饰保持简洁',
+    '运动': '运动风格可以用一件有质感的外套平衡随意感',
+    '复古': '复古风格选择一件主角单品，其余保持简单',
+    '街头': '街头风格注意宽松单品的上下比例，避免整体过于臃肿',
+    '优雅': '优雅风格选择垂坠面料，用低饱和度颜色提升质感',
+    '甜美': '甜美风格搭配一件利落的单品，避免元素过多',
+    '简约': '简约风格可以用一件配饰增加亮点',
+    '通勤': '通勤风格选择免烫面料，搭配一件可以叠穿的外套',
+    '波西米亚': '波西米亚风格控制花纹单品的数量，其余选择素色',
+}
+
+# 肤色冷暖：(关键字, 类型)，按顺序匹配
+SKIN_TONE_KEYWORDS = (
+    ('冷', 'cool'), ('粉', 'cool'), ('小麦', 'deep'), ('古铜', 'deep'), ('深', 'deep'), ('黑', 'deep'),
+    ('暖', 'warm'), ('黄', 'warm'), ('橄榄', 'warm'),
+)
+# 肤色类型：(名称, 适合的颜色, 靠近脸部时避免的颜色)
+SKIN_TONE_PALETTES = {
+    'warm': ('暖色调肤色', ('米色', '卡其色', '棕色', '酒红色', '绿色'), ('灰色', '紫色')),
+    'cool': ('冷色调肤色', ('白色', '藏青色', '灰色', '粉色', '蓝色'), ('橙色', '黄色', '卡其色')),
+    'deep': ('小麦色或较深的肤色', ('白色', '蓝色', '红色', '黄色', '绿色'), ('棕色', '卡其色')),
+    'neutral': ('中性肤色', ('白色', '藏青色', '米色', '黑色', '红色'), ()),
+}
+
+# 配色：颜色 -> 与其协调的颜色
+COLOR_HARMONY = {
+    '黑色': ('白色', '红色'), '白色': ('藏青色', '卡其色'), '灰色': ('粉色', '藏青色'), '米色': ('棕色', '藏青色'),
+    '卡其色': ('白色', '藏青色'), '棕色': ('米色', '绿色'), '红色': ('黑色', '白色'), '酒红色': ('灰色', '米色'),
+    '粉色': ('灰色', '白色'), '橙色': ('藏青色', '白色'), '黄色': ('蓝色', '白色'), '绿色': ('米色', '棕色'),
+    '蓝色': ('白色', '卡其色'), '藏青色': ('白色', '卡其色'), '紫色': ('灰色', '白色'),
+}
+# 颜色描述（如“雾霾蓝”“深咖”）归入 COLOR_HARMONY 中的颜色，按顺序匹配
+COLOR_KEYWORDS = (
+    ('藏青', '藏青色'), ('酒红', '酒红色'), ('卡其', '卡其色'), ('黑', '黑色'), ('白', '白色'), ('灰', '灰色'),
+    ('米', '米色'), ('棕', '棕色'), ('咖', '棕色'), ('红', '红色'), ('粉', '粉色'), ('橙', '橙色'), ('黄', '黄色'),
+    ('绿', '绿色'), ('蓝', '蓝色'), ('紫', '紫色'),
+)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _match(keywords, text, default=None):
+    """返回第一个出现在 text 中的关键字对应的值"""
+    for keyword, value in keywords:
+        if keyword in text:
+            return value
+    return default
+
+
+@lru_cache(maxsize=256)
+def weather_conditions(text):
+    """天气现象（和风天气的 text，如“小雨”“雷阵雨”）对应的 WEATHER_CONDITIONS 条目，没有时返回None"""
+    for condition in WEATHER_CONDITIONS:
+        if any(keyword in text for keyword in condition[0]):
+            return condition
+    return None
+
+
+@lru_cache(maxsize=256)
+def body_type_rule(body_type):
+    """体型描述对应的 (建议, 推荐下装)"""
+    name = body_type.strip()
+    if name not in BODY_TYPE_RULES:
+        name = _match(BODY_TYPE_ALIASES, name)
+    return BODY_TYPE_RULES.get(name, DEFAULT_BODY_RULE)
+
+
+@lru_cache(maxsize=256)
+def skin_tone_palette(skin_tone):
+    """肤色描述对应的 (名称, 适合的颜色, 避免的颜色)"""
+    return SKIN_TONE_PALETTES[_match(SKIN_TONE_KEYWORDS, skin_tone, 'neutral')]
+
+
+@lru_cache(maxsize=512)
+def color_family(color):
+    """颜色描述归入的颜色，无法归类时返回None"""
+    if color in COLOR_HARMONY:
+        return color
+    return _match(COLOR_KEYWORDS, color)
+
+
+def _weather_advice(weather):
+    """返回 (天气建议, 档位, 天气现象)"""
+    temp = _to_float(weather.get('temp'))
+    feels_like = _to_float(weather.get('feels_like'))
+    humidity = _to_float(weather.get('humidity'))
+    condition = weather_conditions(weather.get('text') or '')
+    felt = feels_like if feels_like is not None else temp
+
+    if felt is None:
+        band = DEFAULT_BAND
+        parts = []
+    else:
+        band = TEMPERATURE_BANDS[bisect_right(_BAND_LIMITS, felt)]
+        parts = [band[1]]
+        if temp is not None and temp - felt >= 3:
+            parts.append(f'体感比气温低{temp - felt:.0f}°C，外层注意防风')
+    if humidity is not None and felt is not None:
+        if humidity >= 80 and felt >= 24:
+            parts.append('湿度高，选择棉麻等吸湿透气的面料，避免化纤')
+        elif humidity >= 80 and felt < 10:
+            parts.append('湿冷天气，内层选择羊毛等保暖面料')
+        elif humidity <= 30:
+            parts.append('空气干燥，少穿容易起静电的化纤面料')
+    if condition is not None:
+        if condition[1] == 'sunny':
+            if felt is not None and felt >= 24:
+                parts.append('日照强，可以戴遮阳帽或穿防晒外套')
+        else:
+            parts.append(condition[2])
+    return '；'.join(parts), band, condition
+
+
+def _style_advice(body_features, overall_style):
+    """返回 (体型与风格建议, 推荐下装)"""
+    advice, bottom = body_type_rule(body_features.get('body_type') or '')
+    parts = [advice]
+    proportion = _match(PROPORTION_RULES, body_features.get('height_proportion') or '')
+    if proportion:
+        parts.append(proportion)
+    tip = STYLE_TIPS.get((overall_style or '').strip())
+    if tip:
+        parts.append(tip)
+    return '；'.join(parts), bottom
+
+
+def _color_advice(clothing_items, skin_tone):
+    """返回 (肤色配色建议, 主色)"""
+    name, suits, avoid = skin_tone_palette(skin_tone)
+    parts = [f"{name}适合{'、'.join(suits[:4])}"]
+
+    # 上衣靠近脸部，优先按上衣的颜色给出搭配
+    items = sorted((item for item in clothing_items or () if isinstance(item, dict)),
+                   key=lambda item: item.get('type') != '上衣')
+    for item in items:
+        family = color_family(item.get('color') or '')
+        if family is None:
+            continue
+        if family in avoid and item.get('type') in ('上衣', '外套', '连衣裙'):
+            parts.append(f"{item['color']}靠近脸部会显得气色暗淡，可以换到下装或用{suits[0]}内搭过渡")
+        else:
+            parts.append(f"现有的{item['color']}{item.get('type') or '单品'}可以搭配{'或'.join(COLOR_HARMONY[family])}")
+        break
+    return '，'.join(parts), suits[0]
+
+
+def recommend(clothing_items, body_features, weather, overall_style=None):
+    """
+    用本地规则生成穿搭推荐
+
+    Args:
+        clothing_items: 识别出的衣物列表（type、color 等字段）
+        body_features: 人物特征（body_type、height_proportion、skin_tone）
+        weather: 和风天气实况（temp、feels_like、humidity、text），字典或 Weather 结果模型
+        overall_style: 整体风格（可选）
+
+    Returns:
+        dict: 与千问VL的 recommendation 相同结构
+            (weather_advice, style_advice, color_advice, outfit_suggestion)
+    """
+    body_features = body_features if isinstance(body_features, dict) else {}
+    weather_advice, band, condition = _weather_advice(weather or {})
+    style_advice, bottom = _style_advice(body_features, overall_style)
+    color_advice, main_color = _color_advice(clothing_items, body_features.get('skin_tone') or '')
+
+    _, _, top, outer, shoes = band
+    if condition is not None and condition[3]:
+        shoes = condition[3]
+    first, second = COLOR_HARMONY[main_color]
+    pieces = [f'{main_color}{top}']
+    if outer:
+        pieces.append(f'{second}{outer}')
+    pieces.extend((f'{first}{bottom}', shoes))
+    return {
+        'weather_advice': weather_advice,
+        'style_advice': style_advice,
+        'color_advice': color_advice,
+        'outfit_suggestion': '+'.join(pieces)
+    }
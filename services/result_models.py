@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+接口结果模型
+分析结果、实时天气、城市和试穿状态使用带 __slots__ 的类代替嵌套字典：
+    - 字段固定，每个实例没有 __dict__，内存占用更小，属性访问更快
+    - 实现只读的 Mapping 接口（result['temp']、result.get('text')、'x' in result、dict(result)），
+      原先按字典使用结果的调用方无需改动
+    - to_dict() 得到与原先完全相同的字典结构：可选字段为None时不输出
+
+JSON 序列化由 utils/json_provider.py 的 default 钩子调用 to_dict()；
+写入数据库JSON列或缓存等不经过应用 JSON Provider 的地方使用 to_plain()
+"""
+
+from operator import attrgetter
+from collections.abc import Mapping
+
+
+class ResultModel(Mapping):
+    """结果模型基类"""
+
+    __slots__ = ()
+    # 值为None时不输出的字段
+    _optional = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 一次取出所有字段，序列化时 to_dict 是热点路径
+        cls._values = attrgetter(*cls.__slots__)
+
+    def _items(self):
+        optional = self._optional
+        return [(name, value) for name, value in zip(self.__slots__, self._values(self))
+                if value is not None or name not in optional]
+
+    def to_dict(self):
+        """转换为字典（与原先接口返回的结构一致）"""
+        if not self._optional:
+            return dict(zip(self.__slots__, self._values(self)))
+        return dict(self._items())
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict() 的结果（如缓存中的值）还原"""
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            value = getattr(self, key)
+            if value is not None or key not in self._optional:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (name for name, _ in self._items())
+
+    def __len__(self):
+        return sum(1 for _ in self._items())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class Weather(ResultModel):
+    """和风天气实况"""
+
+    __slots__ = ('temp', 'text', 'icon', 'feels_like', 'humidity', 'wind_dir', 'obs_time')
+
+    def __init__(self, temp: str = None, text: str = None, icon: str = None, feels_like: str = None,
+                 humidity: str = None, wind_dir: str = None, obs_time: str = None):
+        self.temp = temp
+        self.text = text
+        self.icon = icon
+        self.feels_like = feels_like
+        self.humidity = humidity
+        self.wind_dir = wind_dir
+        self.obs_time = obs_time
+
+    @classmethod
+    def from_qweather(cls, now):
+        """由实时天气接口返回的 now 字段构造"""
+        return cls(now.get('temp'), now.get('text'), now.get('icon'), now.get('feelsLike'),
+                   now.get('humidity'), now.get('windDir'), now.get('obsTime'))
+
+
+class City(ResultModel):
+    """城市搜索结果"""
+
+    __slots__ = ('id', 'name', 'lat', 'lon')
+
+    def __init__(self, id: str = None, name: str = None, lat: str = None, lon: str = None):
+        self.id = id
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+
+    @classmethod
+    def from_qweather(cls, location):
+        """由城市搜索接口返回的 location 条目构造，名称格式为 城市, 省份"""
+        name = location['name']
+        if location.get('adm1') and location['adm1'] != location['name']:
+            name = f"{location['name']}, {location['adm1']}"
+        return cls(location['id'], name, location['lat'], location['lon'])
+
+
+class TryonStatus(ResultModel):
+    """试穿任务的提交结果或状态"""
+
+    __slots__ = ('success', 'status', 'task_id', 'result_url', 'error', 'retry_after')
+    _optional = ('status', 'task_id', 'result_url', 'error', 'retry_after')
+
+    def __init__(self, success: bool = False, status: str = None, task_id: str = None, result_url: str = None,
+                 error: str = None, retry_after: str = None):
+        self.success = success
+        self.status = status
+        self.task_id = task_id
+        self.result_url = result_url
+        self.error = error
+        self.retry_after = retry_after
+
+
+class AnalysisResult(ResultModel):
+    """
+    图像分析结果
+    字段内容由模型输出决定，缺少的字段不输出；模型输出中的其他顶层字段保存在 extra 中，输出时与固定字段合并
+    """
+
+    __slots__ = ('clothing_items', 'body_features', 'overall_style', 'recommendation',
+                 'raw_response', 'from_cache', 'extra')
+    _optional = __slots__
+
+    def __init__(self, clothing_items: list = None, body_features: dict = None, overall_style: str = None,
+                 recommendation: dict = None, raw_response: str = None, from_cache: bool = None, extra: dict = None):
+        self.clothing_items = clothing_items
+        self.body_features = body_features
+        self.overall_style = overall_style
+        self.recommendation = recommendation
+        self.raw_response = raw_response
+        self.from_cache = from_cache
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """由解析后的模型输出（或 to_dict() 的结果）构造"""
+        fields = {name: data[name] for name in cls.__slots__ if name != 'extra' and name in data}
+        extra = {key: value for key, value in data.items() if key not in cls.__slots__}
+        return cls(**fields, extra=extra or None)
+
+    def _items(self):
+        # extra 是最后一个字段，zip 到倒数第二个字段为止
+        items = [(name, value) for name, value in zip(self.__slots__[:-1], self._values(self)) if value is not None]
+        if self.extra:
+            items.extend(self.extra.items())
+        return items
+
+    def __getitem__(self, key):
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key == 'extra':
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+
+def to_plain(value):
+    """
+    把结果模型（包括列表中的模型）转换为普通字典，其他值原样返回
+
+    用于写入数据库JSON列、缓存等使用标准库 json 序列化的地方
+    """
+    if isinstance(value, ResultModel):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
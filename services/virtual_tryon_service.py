@@ -1,27 +1,44 @@
 import os
-import dashscope
-from dashscope import ImageSynthesis
+import json
+import hashlib
+import asyncio
 from http import HTTPStatus
 import time
 import logging
-import requests
 from pathlib import Path
 from flask import current_app
 from urllib.parse import unquote
 import mimetypes
-import oss2
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from utils import resilience
+from utils.cache import get_cache, MISS
+from utils.file_utils import file_sha256
+from utils.resilience import CircuitOpenError
+from services.result_models import TryonStatus
+from utils.metrics import track_upstream
+from utils.logging_utils import upstream_headers
+
+# Handlers are configured once by the app (utils.logging_utils), not at import time
 logger = logging.getLogger(__name__)
 
+# DashScope 接口地址（DASHSCOPE_API_BASE 可指向本地桩服务）
+DASHSCOPE_API_BASE = os.environ.get('DASHSCOPE_API_BASE', "https://dashscope.aliyuncs.com/api/v1").rstrip('/')
+TRYON_SUBMIT_URL = f"{DASHSCOPE_API_BASE}/services/aigc/image2image/image-synthesis"
+TASK_STATUS_URL = DASHSCOPE_API_BASE + "/tasks/{task_id}"
+
+
 class VirtualTryonService:
-    def __init__(self):
+    def __init__(self, upload_folder=None):
+        """
+        upload_folder: local upload directory used to resolve /uploads/ URLs.
+        Defaults to current_app.config['UPLOAD_FOLDER'] (Flask); the async app passes it explicitly.
+        """
+        self.upload_folder = upload_folder
         self.api_key = os.environ.get("DASHSCOPE_API_KEY")
         if not self.api_key:
             logger.warning("DASHSCOPE_API_KEY is not set. Virtual Try-on will fail.")
-        else:
-            dashscope.api_key = self.api_key
+        # The DashScope endpoints are called over plain HTTP with the key in the
+        # Authorization header, so the dashscope SDK is not imported at all.
         
         # OSS Config
         self.oss_access_key_id = os.environ.get('ALIYUN_OSS_ACCESS_KEY_ID')
@@ -32,26 +49,31 @@ class VirtualTryonService:
     def _upload_file_to_oss(self, file_path):
         """将文件上传到阿里云OSS"""
         try:
-            print(f"DEBUG: Starting OSS upload for {file_path}")
             if not os.path.exists(file_path):
-                logger.error(f"File not found for upload: {file_path}")
-                print(f"DEBUG: File not found: {file_path}")
+                logger.error("File not found for upload: %s", file_path)
                 return None
             
             if not all([self.oss_access_key_id, self.oss_access_key_secret, self.oss_bucket_name, self.oss_endpoint]):
                 logger.error("OSS credentials not fully configured.")
-                print("DEBUG: OSS credentials missing")
                 return None
 
+            # The same file (e.g. a model photo reused across try-ons) is uploaded once;
+            # the URL is shared by all workers through utils.cache
+            urls = get_cache().namespace('oss_url')
+            digest = file_sha256(file_path)
+            cached = urls.get(digest)
+            if cached is not MISS:
+                return cached
+
             # Initialize OSS Bucket
             endpoint = self.oss_endpoint
             if not endpoint.startswith('http'):
                 endpoint = f"https://{endpoint}"
             
-            print(f"DEBUG: OSS Endpoint: {endpoint}, Bucket: {self.oss_bucket_name}")
-            
+            # Imported on first upload to keep cold start fast
+            import oss2
             auth = oss2.Auth(self.oss_access_key_id, self.oss_access_key_secret)
-            bucket = oss2.Bucket(auth, endpoint, self.oss_bucket_name)
+            bucket = oss2.Bucket(auth, endpoint, self.oss_bucket_name, connect_timeout=resilience.timeout('oss'))
 
             file_name = Path(file_path).name
             # Use a 'temp/' prefix to keep bucket organized
@@ -62,17 +84,21 @@ class VirtualTryonService:
             headers = {}
             if content_type:
                 headers['Content-Type'] = content_type
-                logger.info(f"Detected Content-Type: {content_type}")
             
-            logger.info(f"Uploading {file_path} to OSS bucket {self.oss_bucket_name} with key {key}")
-            print(f"DEBUG: Uploading to key {key} with headers {headers}")
+            logger.debug("Uploading %s to OSS", file_path, extra={'bucket': self.oss_bucket_name, 'key': key})
             
             # Upload with headers
-            result = bucket.put_object_from_file(key, file_path, headers=headers)
-            print(f"DEBUG: Upload finished. Status: {result.status}")
+            def put():
+                with track_upstream('oss', 'put') as call:
+                    result = bucket.put_object_from_file(key, file_path, headers=upstream_headers(headers))
+                    call.status = result.status
+                return result
+            
+            # OSS 熔断或上传失败时返回None，调用方继续使用本地URL
+            result = resilience.call('oss', put)
             
             if result.status != 200:
-                print(f"DEBUG: Upload failed with status {result.status}")
+                logger.error("OSS upload failed with status %s", result.status, extra={'key': key})
                 return None
             
             # Construct public URL
@@ -88,15 +114,11 @@ class VirtualTryonService:
             # oss_url = bucket.sign_url('GET', key, 172800)
             # if '%' in oss_url: ...
             
-            logger.info(f"File uploaded successfully: {oss_url}")
-            print(f"DEBUG: OSS URL generated: {oss_url}")
+            logger.info("File uploaded to OSS", extra={'oss_url': oss_url})
+            urls.set(digest, oss_url)
             return oss_url
-        except Exception as e:
-            logger.error(f"Error uploading file to OSS: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            print(f"DEBUG: Exception in _upload_file_to_oss: {str(e)}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error uploading file to OSS")
             return None
 
     def _resolve_local_url(self, url):
@@ -107,8 +129,7 @@ class VirtualTryonService:
         if not url:
             return url
             
-        logger.info(f"Resolving URL: {url}")
-        print(f"DEBUG: Resolving URL: {url}")
+        logger.debug("Resolving URL: %s", url)
         
         # Check if it's a local URL (e.g., /uploads/xxx or http://localhost...)
         local_path = None
@@ -122,37 +143,28 @@ class VirtualTryonService:
                 if '?' in filename:
                     filename = filename.split('?')[0]
                 
-                candidate_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                print(f"DEBUG: Candidate local path: {candidate_path}")
+                candidate_path = os.path.join(self.upload_folder or current_app.config['UPLOAD_FOLDER'], filename)
                 
                 if os.path.exists(candidate_path):
                     local_path = candidate_path
             
             if local_path:
-                logger.info(f"Identified local path: {local_path}")
-                print(f"DEBUG: Identified local file: {local_path}")
+                logger.debug("Identified local path: %s", local_path)
                 
-                # Check if we should upload
-                print(f"DEBUG: Uploading local file to OSS...")
                 oss_url = self._upload_file_to_oss(local_path)
                 
                 if oss_url:
-                    print(f"DEBUG: Resolved to OSS URL: {oss_url}")
                     return oss_url
                 else:
                     logger.warning("Failed to upload local file, using original URL (likely will fail)")
-                    print("DEBUG: Upload failed, returning original URL")
                     return url
             else:
                 # Not a local file or file not found
                 # If it's a remote URL (http/https), we assume it's accessible or already on OSS
                 return url
                     
-        except Exception as e:
-             logger.error(f"Error resolving local url: {str(e)}")
-             print(f"DEBUG: Error resolving local url: {str(e)}")
-             import traceback
-             traceback.print_exc()
+        except Exception:
+             logger.exception("Error resolving local url")
         
         return url
 
@@ -163,9 +175,9 @@ class VirtualTryonService:
         try:
             # Check if API key is set
             if not self.api_key:
-                return {"success": False, "error": "API Key missing"}
+                return TryonStatus(success=False, error="API Key missing")
 
-            logger.info(f"Submitting OutfitAnyone task. Type: {clothing_type}")
+            logger.info("Submitting OutfitAnyone task. Type: %s", clothing_type)
             
             # Resolve local URLs to OSS URLs
             person_image_url = self._resolve_local_url(person_image_url)
@@ -179,108 +191,242 @@ class VirtualTryonService:
             if bottom_garment_url:
                 bottom_garment_url = self._resolve_local_url(bottom_garment_url)
 
-            # 构造参数
-            # 使用原生 HTTP 请求替代 SDK，以确保 Header 正确传递
-            url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/image2image/image-synthesis"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "X-DashScope-OssResourceResolve": "enable",
-                "X-DashScope-Async": "enable"
-            }
-            
-            payload = {
-                "model": "aitryon-plus",
-                "input": {
-                    "person_image_url": person_image_url
-                },
-                "parameters": {
-                    "resolution": -1,
-                    "restore_face": True,
-                    "prompt": "virtual try on"
-                }
-            }
-            
-            if clothing_type == 'top':
-                payload["input"]["top_garment_url"] = clothing_image_url
-            elif clothing_type == 'bottom':
-                payload["input"]["bottom_garment_url"] = clothing_image_url
-            elif clothing_type == 'full':
-                payload["input"]["top_garment_url"] = top_garment_url
-                payload["input"]["bottom_garment_url"] = bottom_garment_url
-            
-            logger.info(f"Sending request to DashScope API: {url}")
-            # print(f"DEBUG: Payload: {json.dumps(payload, indent=2)}")
+            url, headers, payload = self._build_tryon_request(
+                person_image_url, clothing_image_url, clothing_type, top_garment_url, bottom_garment_url
+            )
             
-            response = requests.post(url, headers=headers, json=payload)
+            logger.debug("Sending request to DashScope API: %s", url)
             
-            if response.status_code == HTTPStatus.OK:
-                resp_data = response.json()
-                if 'output' in resp_data and 'task_id' in resp_data['output']:
-                    task_id = resp_data['output']['task_id']
-                    logger.info(f"Task submitted successfully. Task ID: {task_id}")
-                    return {
-                        "success": True, 
-                        "task_id": task_id,
-                        "status": "PENDING"
-                    }
-                else:
-                    logger.error(f"Unexpected response format: {resp_data}")
-                    return {"success": False, "error": "Unknown response format from API"}
-            else:
-                logger.error(f"Failed to submit task: {response.status_code}, {response.text}")
-                return {
-                    "success": False, 
-                    "error": f"{response.status_code}: {response.text}"
-                }
+            import requests  # imported on first use to keep cold start fast
+
+            def submit():
+                with track_upstream('dashscope_tryon', 'submit') as call:
+                    response = requests.post(url, headers=upstream_headers(headers), json=payload,
+                                             timeout=resilience.timeout('dashscope_tryon'))
+                    call.status = response.status_code
+                return response
+
+            # Submitting is billed and not idempotent, so it is never retried here
+            response = resilience.call('dashscope_tryon', submit, retries=0)
+            return self._parse_submit_response(response.status_code, response.text)
                 
+        except CircuitOpenError as e:
+            return self._unavailable(e)
         except Exception as e:
-            logger.error(f"Exception in generate_tryon: {str(e)}")
-            return {"success": False, "error": str(e)}
+            logger.exception("Exception in generate_tryon")
+            return TryonStatus(success=False, error=str(e))
 
     def check_task_status(self, task_id):
         """
         Check the status of a submitted task.
         """
         if task_id == "direct_result":
-             return {"success": True, "status": "SUCCEEDED"}
+             return TryonStatus(success=True, status="SUCCEEDED")
 
         try:
-            url = f"https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}"
+            url = TASK_STATUS_URL.format(task_id=task_id)
             headers = {
                 "Authorization": f"Bearer {self.api_key}"
             }
             
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == HTTPStatus.OK:
-                resp_data = response.json()
-                task_status = resp_data.get('output', {}).get('task_status', 'UNKNOWN')
-                
-                logger.info(f"Task status check: {task_status}")
-                result = {
-                    "success": True,
-                    "status": task_status,
-                }
+            import requests  # imported on first use to keep cold start fast
+
+            def query():
+                with track_upstream('dashscope_tryon', 'status') as call:
+                    response = requests.get(url, headers=upstream_headers(headers),
+                                            timeout=resilience.timeout('dashscope_tryon'))
+                    call.status = response.status_code
+                return response
+
+            response = resilience.call('dashscope_tryon', query)
+            return self._parse_task_response(response.status_code, response.text)
                 
-                if task_status == 'SUCCEEDED':
-                    output = resp_data.get('output', {})
-                    # 优先获取 image_url (官方文档标准字段)
-                    # 其次尝试 result_image_url (部分旧模型字段)
-                    # 最后尝试 results 列表 (通用格式)
-                    result["result_url"] = (
-                        output.get('image_url') or 
-                        output.get('result_image_url') or 
-                        (output.get('results', [{}])[0].get('url'))
-                    )
-                    logger.info(f"Task succeeded. Result URL: {result['result_url']}")
-                elif task_status == 'FAILED':
-                    result["error"] = resp_data.get('output', {}).get('message', 'Unknown error')
-                    
-                return result
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception as e:
+            logger.exception("Exception in check_task_status")
+            return TryonStatus(success=False, error=str(e))
+
+    def _unavailable(self, error):
+        """Degraded result while the try-on upstream circuit is open; routes answer 503 + Retry-After."""
+        logger.warning("Try-on upstream unavailable, retry after %ss", error.retry_after_header)
+        return TryonStatus(success=False, error="Virtual try-on is temporarily unavailable",
+                           retry_after=error.retry_after_header)
+
+    def _build_tryon_request(self, person_image_url, clothing_image_url, clothing_type, top_garment_url, bottom_garment_url):
+        """
+        Build the OutfitAnyone submit request. URLs must already be resolved to public URLs.
+
+        Returns:
+            tuple: (url, headers, payload)
+        """
+        # 构造参数
+        # 使用原生 HTTP 请求替代 SDK，以确保 Header 正确传递
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "X-DashScope-OssResourceResolve": "enable",
+            "X-DashScope-Async": "enable"
+        }
+        
+        payload = {
+            "model": "aitryon-plus",
+            "input": {
+                "person_image_url": person_image_url
+            },
+            "parameters": {
+                "resolution": -1,
+                "restore_face": True,
+                "prompt": "virtual try on"
+            }
+        }
+        
+        if clothing_type == 'top':
+            payload["input"]["top_garment_url"] = clothing_image_url
+        elif clothing_type == 'bottom':
+            payload["input"]["bottom_garment_url"] = clothing_image_url
+        elif clothing_type == 'full':
+            payload["input"]["top_garment_url"] = top_garment_url
+            payload["input"]["bottom_garment_url"] = bottom_garment_url
+        
+        return TRYON_SUBMIT_URL, headers, payload
+
+    def _parse_submit_response(self, status_code, text):
+        """Convert the submit response into the API result dict."""
+        if status_code == HTTPStatus.OK:
+            resp_data = json.loads(text)
+            if 'output' in resp_data and 'task_id' in resp_data['output']:
+                task_id = resp_data['output']['task_id']
+                logger.info("Task submitted successfully. Task ID: %s", task_id)
+                return TryonStatus(success=True, status="PENDING", task_id=task_id)
             else:
-                return {"success": False, "error": f"{response.status_code}: {response.text}"}
+                logger.error("Unexpected response format: %s", resp_data)
+                return TryonStatus(success=False, error="Unknown response format from API")
+        else:
+            logger.error("Failed to submit task: %s, %s", status_code, text)
+            return TryonStatus(success=False, error=f"{status_code}: {text}")
+
+    def _parse_task_response(self, status_code, text):
+        """Convert the task query response into the API result dict."""
+        if status_code == HTTPStatus.OK:
+            resp_data = json.loads(text)
+            task_status = resp_data.get('output', {}).get('task_status', 'UNKNOWN')
+            
+            logger.debug("Task status check: %s", task_status)
+            result = TryonStatus(success=True, status=task_status)
+            
+            if task_status == 'SUCCEEDED':
+                output = resp_data.get('output', {})
+                # 优先获取 image_url (官方文档标准字段)
+                # 其次尝试 result_image_url (部分旧模型字段)
+                # 最后尝试 results 列表 (通用格式)
+                result.result_url = (
+                    output.get('image_url') or 
+                    output.get('result_image_url') or 
+                    (output.get('results', [{}])[0].get('url'))
+                )
+                logger.info("Task succeeded. Result URL: %s", result.result_url)
+            elif task_status == 'FAILED':
+                result.error = resp_data.get('output', {}).get('message', 'Unknown error')
                 
+            return result
+        else:
+            return TryonStatus(success=False, error=f"{status_code}: {text}")
+
+    # ------------------------------ async variants ------------------------------
+
+    async def _upload_file_to_oss_async(self, file_path):
+        """Async counterpart of _upload_file_to_oss using the shared httpx client."""
+        from services.oss_service import OssService
+        oss = OssService()
+        if not os.path.exists(file_path) or not oss.is_configured():
+            logger.error("Cannot upload %s: file missing or OSS not configured", file_path)
+            return None
+        try:
+            data = await asyncio.to_thread(Path(file_path).read_bytes)
+            urls = get_cache().namespace('oss_url')
+            digest = hashlib.sha256(data).hexdigest()
+            cached = await asyncio.to_thread(urls.get, digest)
+            if cached is not MISS:
+                return cached
+            key = f"temp/{int(time.time())}_{Path(file_path).name}"
+            content_type, _ = mimetypes.guess_type(file_path)
+            oss_url = await oss.put_object_async(key, data, content_type)
+            if oss_url:
+                await asyncio.to_thread(urls.set, digest, oss_url)
+            return oss_url
+        except Exception:
+            logger.exception("Error uploading file to OSS")
+            return None
+
+    async def _resolve_local_url_async(self, url):
+        """Async counterpart of _resolve_local_url."""
+        if not url or '/uploads/' not in url:
+            return url
+        filename = unquote(url.split('/uploads/')[-1]).split('?')[0]
+        local_path = os.path.join(self.upload_folder or current_app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.exists(local_path):
+            return url
+        oss_url = await self._upload_file_to_oss_async(local_path)
+        return oss_url or url
+
+    async def generate_tryon_async(self, person_image_url, clothing_image_url=None, clothing_type='top', top_garment_url=None, bottom_garment_url=None):
+        """
+        Async counterpart of generate_tryon: the submit request does not hold a thread while waiting.
+        """
+        try:
+            if not self.api_key:
+                return TryonStatus(success=False, error="API Key missing")
+
+            person_image_url, clothing_image_url, top_garment_url, bottom_garment_url = await asyncio.gather(
+                self._resolve_local_url_async(person_image_url),
+                self._resolve_local_url_async(clothing_image_url),
+                self._resolve_local_url_async(top_garment_url),
+                self._resolve_local_url_async(bottom_garment_url)
+            )
+            url, headers, payload = self._build_tryon_request(
+                person_image_url, clothing_image_url, clothing_type, top_garment_url, bottom_garment_url
+            )
+
+            from services.async_http import get_async_client
+
+            async def submit():
+                with track_upstream('dashscope_tryon', 'submit') as call:
+                    response = await get_async_client().post(url, headers=upstream_headers(headers), json=payload,
+                                                             timeout=resilience.timeout('dashscope_tryon'))
+                    call.status = response.status_code
+                return response
+
+            response = await resilience.call_async('dashscope_tryon', submit, retries=0)
+            return self._parse_submit_response(response.status_code, response.text)
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception as e:
+            logger.exception("Exception in generate_tryon_async")
+            return TryonStatus(success=False, error=str(e))
+
+    async def check_task_status_async(self, task_id):
+        """Async counterpart of check_task_status."""
+        if task_id == "direct_result":
+            return TryonStatus(success=True, status="SUCCEEDED")
+
+        try:
+            from services.async_http import get_async_client
+
+            async def query():
+                with track_upstream('dashscope_tryon', 'status') as call:
+                    response = await get_async_client().get(
+                        TASK_STATUS_URL.format(task_id=task_id),
+                        headers=upstream_headers({"Authorization": f"Bearer {self.api_key}"}),
+                        timeout=resilience.timeout('dashscope_tryon')
+                    )
+                    call.status = response.status_code
+                return response
+
+            response = await resilience.call_async('dashscope_tryon', query)
+            return self._parse_task_response(response.status_code, response.text)
+        except CircuitOpenError as e:
+            return self._unavailable(e)
         except Exception as e:
-            logger.error(f"Exception in check_task_status: {str(e)}")
-            return {"success": False, "error": str(e)}
+            logger.exception("Exception in check_task_status_async")
+            return TryonStatus(success=False, error=str(e))
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+千问VL接口的端点池与对冲请求
+同一个模型可以通过多个地域的兼容模式端点调用（如北京、新加坡国际站），单个上游实例变慢时
+整次分析会卡住一分钟以上。端点池按健康度选择主端点，并对尾延迟做对冲：
+    - 每个端点记录最近的耗时，主端点在其 p90 耗时内没有返回时，向下一个端点发送相同的请求。
+      异步模式下先返回的结果生效，另一个请求被取消；同步模式下主请求在调用线程中执行（线程无法中断），
+      对冲请求在有上限的线程池中提前发出，主请求失败时直接使用它的结果，不用再从头等待一次，
+      线程池已满时不再对冲
+    - 连接失败、超时、429 和 5xx 立即切换到下一个端点；4xx 等请求本身的错误直接抛出
+    - 连续失败的端点暂停使用一段时间，健康度按耗时的指数移动平均和连续失败次数计算
+
+端点通过环境变量配置（未配置时只使用 DASHSCOPE_COMPATIBLE_BASE_URL）：
+    DASHSCOPE_VL_ENDPOINTS="beijing=https://dashscope.aliyuncs.com/compatible-mode/v1,intl=https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
+各地域的账号和密钥互相独立，端点 intl 的密钥从 DASHSCOPE_API_KEY_INTL 读取，未设置时使用 DASHSCOPE_API_KEY
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import VL_ENDPOINT_ATTEMPTS
+from utils.resilience import is_transient_error, timeout
+
+logger = logging.getLogger(__name__)
+
+
+# 北京地域的兼容模式端点
+DEFAULT_BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+
+# 单次请求超时（秒），默认使用 utils/resilience.py 中 qwen_vl 的策略
+REQUEST_TIMEOUT = float(os.environ.get('VL_REQUEST_TIMEOUT', timeout('qwen_vl')))
+
+# 对冲：主端点超过该分位耗时仍未返回时向下一个端点发送请求
+HEDGE_QUANTILE = 0.9
+# 样本不足时的对冲等待时间，以及等待时间的下限（秒）
+HEDGE_INITIAL_DELAY = float(os.environ.get('VL_HEDGE_INITIAL_DELAY', 15))
+HEDGE_MIN_DELAY = float(os.environ.get('VL_HEDGE_MIN_DELAY', 2))
+# 计算分位数的样本窗口和最少样本数
+LATENCY_WINDOW = 50
+MIN_SAMPLES = 10
+
+# 健康度：耗时的指数移动平均系数，每次连续失败折算的耗时（秒）；连续失败达到阈值后暂停使用的时间（秒）
+EWMA_ALPHA = 0.2
+FAILURE_PENALTY = 10
+FAILURE_THRESHOLD = 3
+FAILURE_COOLDOWN = 30
+
+# 同步模式对冲请求的线程数上限（默认值，应用中使用 Config.VL_HEDGE_MAX_WORKERS）
+MAX_HEDGE_WORKERS = 16
+
+
+class Endpoint:
+    """一个兼容模式端点及其健康状态"""
+
+    def __init__(self, name, base_url, api_key=None):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.ewma = None
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """记录耗时（包括被取消的请求已经等待的时间，慢端点不会因为总被取消而显得健康）"""
+        with self._lock:
+            self._latencies.append(seconds)
+            self.ewma = seconds if self.ewma is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.ewma
+
+    def record_success(self, seconds):
+        self.observe(seconds)
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.cooldown_until = time.monotonic() + FAILURE_COOLDOWN
+
+    def available(self, now=None):
+        return (now or time.monotonic()) >= self.cooldown_until
+
+    def score(self):
+        """健康度得分（秒），越小越好；没有样本的端点得分为0，会被优先尝试"""
+        return (self.ewma or 0.0) + self.consecutive_failures * FAILURE_PENALTY
+
+    def quantile(self, q):
+        """最近耗时的分位数，样本不足时返回None"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class EndpointPool:
+    """端点池：按健康度排序端点，对尾延迟发送对冲请求"""
+
+    def __init__(self, endpoints, hedge=True, max_hedge_workers=MAX_HEDGE_WORKERS):
+        self.endpoints = list(endpoints)
+        self.hedge = hedge
+        self.max_hedge_workers = max_hedge_workers
+        self._executor = None
+        self._hedges_in_flight = 0
+        self._hedge_lock = threading.Lock()
+
+    def ranked(self):
+        """
+        按健康度排序的端点，暂停使用中的端点排在最后（全部不可用时仍会尝试）
+
+        Returns:
+            list: Endpoint 列表
+        """
+        now = time.monotonic()
+        return sorted(self.endpoints, key=lambda e: (not e.available(now), e.score()))
+
+    def hedge_delay(self, endpoint):
+        """主端点的对冲等待时间：p90 耗时，限制在 [HEDGE_MIN_DELAY, REQUEST_TIMEOUT] 之间"""
+        delay = endpoint.quantile(HEDGE_QUANTILE)
+        if delay is None:
+            delay = HEDGE_INITIAL_DELAY
+        return min(max(delay, HEDGE_MIN_DELAY), REQUEST_TIMEOUT)
+
+    @staticmethod
+    def _run(endpoint, call):
+        start = time.monotonic()
+        try:
+            result = call(endpoint)
+        except Exception as e:
+            if is_transient_error(e):
+                endpoint.record_failure()
+            raise
+        endpoint.record_success(time.monotonic() - start)
+        return result
+
+    def _launch_hedge(self, endpoint, call, context, hedges):
+        """
+        在线程池中发出对冲请求；在途的对冲请求已达上限时跳过，不排队
+
+        Args:
+            endpoint: 对冲的端点
+            call: 接收 Endpoint、返回结果的函数
+            context: 调用线程的上下文（保留请求关联ID等上下文变量）
+            hedges: 发出的请求以 (endpoint, future) 追加到该列表
+        """
+        with self._hedge_lock:
+            if self._hedges_in_flight >= self.max_hedge_workers:
+                VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, 'hedge', 'skipped')
+                return
+            self._hedges_in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_hedge_workers, thread_name_prefix='vl-hedge')
+        future = self._executor.submit(context.run, self._run, endpoint, call)
+        future.add_done_callback(self._hedge_done)
+        hedges.append((endpoint, future))
+
+    def _hedge_done(self, future):
+        with self._hedge_lock:
+            self._hedges_in_flight -= 1
+
+    def call(self, call):
+        """
+        同步调用：call(endpoint) 在调用线程中向主端点执行；超过对冲等待时间仍未返回时，
+        在线程池中向下一个端点发出对冲请求，主请求失败时使用对冲请求的结果，其余端点依次切换
+
+        Args:
+            call: 接收 Endpoint、返回结果的函数
+
+        Returns:
+            最先成功返回的结果
+        """
+        ranked = self.ranked()
+        if len(ranked) == 1:
+            return self._run(ranked[0], call)
+
+        primary = ranked[0]
+        hedges = []
+        timer = None
+        if self.hedge:
+            # 从主请求开始计时（主请求不排队，等待时间就是主端点的实际耗时）
+            timer = threading.Timer(self.hedge_delay(primary), self._launch_hedge,
+                                    (ranked[1], call, contextvars.copy_context(), hedges))
+            timer.daemon = True
+            timer.start()
+
+        try:
+            result = self._run(primary, call)
+        except Exception as e:
+            VL_ENDPOINT_ATTEMPTS.inc(primary.name, 'primary', 'error')
+            error = e
+        else:
+            VL_ENDPOINT_ATTEMPTS.inc(primary.name, 'primary', 'win')
+            error = None
+        finally:
+            if timer is not None:
+                timer.cancel()
+                # 计时器可能正在发出对冲请求，等待它结束后 hedges 才确定
+                timer.join()
+
+        if error is None or not is_transient_error(error):
+            for endpoint, _ in hedges:
+                VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, 'hedge', 'abandoned')
+            if error is not None:
+                raise error
+            return result
+
+        logger.warning('VL端点请求失败，切换端点: %s', primary.name, extra={'error': str(error)})
+        attempts = [(endpoint, 'hedge', future.result) for endpoint, future in hedges]
+        attempts += [(endpoint, 'failover', lambda endpoint=endpoint: self._run(endpoint, call))
+                     for endpoint in ranked[1 + len(hedges):]]
+        for endpoint, role, attempt in attempts:
+            try:
+                result = attempt()
+            except Exception as e:
+                VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, role, 'error')
+                if not is_transient_error(e):
+                    raise
+                logger.warning('VL端点请求失败，切换端点: %s', endpoint.name, extra={'error': str(e)})
+                error = e
+                continue
+            VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, role, 'win')
+            return result
+        raise error
+
+    async def call_async(self, call):
+        """
+        异步调用：call(endpoint) 返回协程，对冲规则与 call 相同，输掉的请求被取消
+
+        Args:
+            call: 接收 Endpoint、返回协程的函数
+
+        Returns:
+            最先成功返回的结果
+        """
+        ranked = self.ranked()
+        tasks = {}
+        launched = []
+        hedged = False
+        error = None
+
+        async def attempt(endpoint):
+            start = time.monotonic()
+            try:
+                result = await call(endpoint)
+            except asyncio.CancelledError:
+                endpoint.observe(time.monotonic() - start)
+                raise
+            except Exception as e:
+                if is_transient_error(e):
+                    endpoint.record_failure()
+                raise
+            endpoint.record_success(time.monotonic() - start)
+            return result
+
+        def launch(role):
+            endpoint = ranked[len(launched)]
+            launched.append(endpoint)
+            tasks[asyncio.ensure_future(attempt(endpoint))] = (endpoint, role)
+
+        launch('primary')
+        try:
+            while tasks:
+                timeout = None
+                if self.hedge and not hedged and len(launched) < len(ranked):
+                    timeout = self.hedge_delay(launched[0])
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch('hedge')
+                    continue
+                for task in done:
+                    endpoint, role = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, role, 'error')
+                        if not is_transient_error(e):
+                            raise
+                        logger.warning('VL端点请求失败，切换端点: %s', endpoint.name, extra={'error': str(e)})
+                        error = e
+                        if len(launched) < len(ranked):
+                            launch('failover')
+                        continue
+                    VL_ENDPOINT_ATTEMPTS.inc(endpoint.name, role, 'win')
+                    for loser in tasks.values():
+                        VL_ENDPOINT_ATTEMPTS.inc(loser[0].name, loser[1], 'cancelled')
+                    return result
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def parse_endpoints(spec, default_base_url=DEFAULT_BASE_URL):
+    """
+    解析端点配置
+
+    Args:
+        spec: "名称=URL,名称=URL"，为空时只使用默认端点
+        default_base_url: 默认端点地址
+
+    Returns:
+        list: Endpoint 列表
+    """
+    endpoints = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition('=')
+        if not sep or not url.strip():
+            raise ValueError(f'无效的VL端点配置: {item}（格式为 名称=URL）')
+        name = name.strip()
+        api_key = os.environ.get(f'DASHSCOPE_API_KEY_{name.upper()}')
+        endpoints.append(Endpoint(name, url.strip().rstrip('/'), api_key))
+    if not endpoints:
+        endpoints.append(Endpoint('default', default_base_url.rstrip('/')))
+    return endpoints
+
+
+def get_pool(default_base_url=DEFAULT_BASE_URL, max_hedge_workers=MAX_HEDGE_WORKERS):
+    """
+    获取进程内共享的端点池（健康状态跨请求保留），配置变化时重新创建
+
+    Args:
+        default_base_url: 未配置 DASHSCOPE_VL_ENDPOINTS 时使用的端点
+        max_hedge_workers: 同步模式对冲请求的线程数上限
+
+    Returns:
+        EndpointPool
+    """
+    spec = os.environ.get('DASHSCOPE_VL_ENDPOINTS', '')
+    key = (spec, default_base_url, max_hedge_workers)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = EndpointPool(parse_endpoints(spec, default_base_url),
+                                              max_hedge_workers=max_hedge_workers)
+        return pool
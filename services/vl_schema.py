@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+千问VL识别结果的紧凑输出格式
+完整格式中每个字段都是中文键名和描述性文字，completion token 占了图像分析的大部分耗时。
+紧凑格式使用短键名，衣物类型、颜色、材质、体型和风格使用码表中的编码，码表随提示词一起发送，
+服务端再用 expand_compact 展开成与完整格式相同的结构，调用方无需任何改动。
+
+紧凑格式示例：
+    {"i": [{"t": "T", "s": "圆领短袖", "c": "wh", "m": "co", "b": "", "p": 95}],
+     "f": {"bt": "H", "hp": "腿长", "sk": "暖白", "po": "挺拔"},
+     "st": "CA",
+     "r": {"w": "...", "s": "...", "c": "...", "o": "..."}}
+码表中没有合适的编码时模型直接填写简短的中文，展开时原样保留
+"""
+
+# 码表：编码 -> 中文（与完整格式中的取值一致）
+GARMENT_TYPES = {
+    'T': '上衣', 'B': '下装', 'O': '外套', 'S': '鞋子', 'D': '连衣裙', 'A': '配饰'
+}
+COLOR_FAMILIES = {
+    'bk': '黑色', 'wh': '白色', 'gy': '灰色', 'bg': '米色', 'kh': '卡其色', 'br': '棕色',
+    'rd': '红色', 'wr': '酒红色', 'pk': '粉色', 'or': '橙色', 'yl': '黄色', 'gn': '绿色',
+    'bl': '蓝色', 'nv': '藏青色', 'pp': '紫色', 'mx': '多色/拼色'
+}
+MATERIALS = {
+    'co': '棉', 'li': '亚麻', 'si': '丝绸', 'wo': '羊毛', 'kn': '针织', 'dn': '牛仔',
+    'le': '皮革', 'sd': '麂皮', 'ch': '雪纺', 'pl': '聚酯纤维', 'ny': '尼龙', 'dw': '羽绒', 'fl': '抓绒'
+}
+BODY_TYPES = {
+    'P': '梨形', 'A': '苹果形', 'X': '沙漏形', 'H': '矩形', 'V': '倒三角形'
+}
+STYLES = {
+    'CA': '休闲', 'BU': '商务', 'SP': '运动', 'RE': '复古', 'ST': '街头', 'EL': '优雅',
+    'SW': '甜美', 'MI': '简约', 'CO': '通勤', 'BO': '波西米亚'
+}
+
+
+def _codebook_line(name, codes):
+    return f"{name}: " + ' '.join(f'{code}={label}' for code, label in codes.items())
+
+
+# 随提示词发送的码表文本
+CODEBOOK = '\n'.join([
+    _codebook_line('t(类型)', GARMENT_TYPES),
+    _codebook_line('c(颜色)', COLOR_FAMILIES),
+    _codebook_line('m(材质)', MATERIALS),
+    _codebook_line('bt(体型)', BODY_TYPES),
+    _codebook_line('st(风格)', STYLES)
+])
+
+
+# 紧凑格式的系统提示词（固定不变，可被上游的前缀/上下文缓存命中）
+COMPACT_SYSTEM_PROMPT = f"""你是服装穿搭分析助手。分析照片中人物的穿搭，只输出一行紧凑JSON，不要解释。
+码表（优先使用编码，没有合适的编码时填写简短中文）：
+{CODEBOOK}
+字段：
+i: 衣物列表，每项 {{"t":类型,"s":款式(≤8字),"c":颜色,"m":材质,"b":可见品牌或"","p":置信度0-100整数}}
+f: 人物特征 {{"bt":体型,"hp":身高比例(≤6字),"sk":肤色(≤6字),"po":体态(≤6字)}}
+st: 整体风格
+r: 仅在用户提供了天气时输出，结合人物特征和天气的穿搭推荐，每项不超过40字 {{"w":天气建议,"s":体型与风格建议,"c":肤色配色建议,"o":一套推荐搭配}}"""
+
+
+def _expand_code(codes, value):
+    """编码展开为中文，码表中没有的值原样返回"""
+    if isinstance(value, str):
+        return codes.get(value.strip(), value)
+    return value
+
+
+def _confidence(value):
+    """置信度：0-100 的整数转换为 0-1 的小数"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return round(value / 100, 2) if value > 1 else value
+
+
+def is_compact(result):
+    """结果是否为紧凑格式（模型没有按要求输出时可能直接返回完整格式）"""
+    return isinstance(result, dict) and 'clothing_items' not in result and ('i' in result or 'f' in result)
+
+
+def expand_compact(result):
+    """
+    把紧凑格式的识别结果展开为完整格式
+
+    Args:
+        result: 解析后的紧凑格式JSON
+
+    Returns:
+        dict: 与完整格式相同结构的识别结果；不是紧凑格式时原样返回
+    """
+    if not is_compact(result):
+        return result
+
+    items = []
+    for item in result.get('i') or []:
+        if not isinstance(item, dict):
+            continue
+        items.append({
+            'type': _expand_code(GARMENT_TYPES, item.get('t', '')),
+            'style': item.get('s', ''),
+            'color': _expand_code(COLOR_FAMILIES, item.get('c', '')),
+            'material': _expand_code(MATERIALS, item.get('m', '')),
+            'brand': item.get('b', ''),
+            'confidence': _confidence(item.get('p'))
+        })
+
+    features = result.get('f') or {}
+    expanded = {
+        'clothing_items': items,
+        'body_features': {
+            'body_type': _expand_code(BODY_TYPES, features.get('bt', '')),
+            'height_proportion': features.get('hp', ''),
+            'skin_tone': features.get('sk', ''),
+            'posture': features.get('po', '')
+        },
+        'overall_style': _expand_code(STYLES, result.get('st', '')),
+        'recommendation': {}
+    }
+
+    recommendation = result.get('r')
+    if isinstance(recommendation, dict):
+        expanded['recommendation'] = {
+            'weather_advice': recommendation.get('w', ''),
+            'style_advice': recommendation.get('s', ''),
+            'color_advice': recommendation.get('c', ''),
+            'outfit_suggestion': recommendation.get('o', '')
+        }
+    return expanded
@@ -5,21 +5,48 @@
 """
 
 import os
-import requests
+import asyncio
+import logging
 from flask import current_app
 
+from utils import resilience
+from utils.cache import get_cache, MISS, NEGATIVE
+from services.result_models import Weather, City
+from utils.metrics import track_upstream
+from utils.logging_utils import upstream_headers
+
+logger = logging.getLogger(__name__)
+
+# 和风天气表示地点不存在或没有数据的状态码，结果写入负缓存
+NOT_FOUND_CODES = ('204', '400', '404')
+
+
+def _remember(namespace, key, code, value):
+    """按接口状态码缓存结果：成功时缓存结果，地点不存在时负缓存，其他错误（如密钥无效、限流）不缓存"""
+    if code == '200' and value is not None:
+        namespace.set(key, value)
+    elif code in NOT_FOUND_CODES:
+        namespace.set_negative(key)
+
 
 class WeatherService:
     """
     和风天气服务类
     """
     
-    def __init__(self):
+    def __init__(self, config=None):
         """
         初始化服务，加载API密钥
+        
+        Args:
+            config: 配置字典（可选），缺省时使用 Flask 的 current_app.config；
+                    异步模式下由调用方传入 Quart 应用的配置
         """
+        if config is None:
+            config = current_app.config
+        
         # 1. 优先从配置中获取（Config类已经处理了兼容性）
-        self.api_key = current_app.config.get('QWEATHER_API_KEY')
+        self.api_key = config.get('QWEATHER_API_KEY')
         
         # 2. 如果配置中没有，尝试直接从环境变量获取 WEATHER_API_KEY
         if not self.api_key:
@@ -30,16 +57,70 @@ class WeatherService:
             self.api_key = os.environ.get('QWEATHER_API_KEY', '')
             
         if not self.api_key:
-            print('严重警告: 未找到任何天气API密钥 (WEATHER_API_KEY/QWEATHER_API_KEY)')
+            logger.warning('未找到任何天气API密钥 (WEATHER_API_KEY/QWEATHER_API_KEY)')
             
         # API基础URL
-        # 用户使用的是私有/商业版Host: k94jab77cb.yun.qweatherapi.com
-        user_host = "k94jab77cb.yun.qweatherapi.com"
-        self.geo_base_url = f"https://{user_host}/geo/v2"
-        self.weather_base_url = f"https://{user_host}/v7"
+        # 优先使用配置的 QWEATHER_API_HOST，默认是用户的私有/商业版Host: k94jab77cb.yun.qweatherapi.com
+        # 配置值可以带协议头（如本地压测桩服务 http://127.0.0.1:9000）
+        user_host = config.get('QWEATHER_API_HOST') or "k94jab77cb.yun.qweatherapi.com"
+        if not user_host.startswith(('http://', 'https://')):
+            user_host = f"https://{user_host}"
+        self.geo_base_url = f"{user_host}/geo/v2"
+        self.weather_base_url = f"{user_host}/v7"
+        
+    def _get(self, requests, op, url, params):
+        """发送一次和风天气请求（超时见 utils.resilience 中的 qweather 策略）"""
+        with track_upstream('qweather', op) as call:
+            response = requests.get(url, params=params, headers=upstream_headers(), timeout=resilience.timeout('qweather'))
+            call.status = response.status_code
+        return response
+    
+    async def _get_async(self, client, op, url, params):
+        """发送一次和风天气请求（异步版本）"""
+        with track_upstream('qweather', op) as call:
+            response = await client.get(url, params=params, headers=upstream_headers(), timeout=resilience.timeout('qweather'))
+            call.status = response.status_code
+        return response
+    
+    def _city_lookup_request(self, keyword, adm=None):
+        """
+        构造城市搜索请求
+        
+        Returns:
+            tuple: (url, params)
+        """
+        url = f"{self.geo_base_url}/city/lookup"
+        params = {
+            'location': keyword,
+            'key': self.api_key,
+            'range': 'cn',  # 限制在中国范围内，根据需求可调整
+            'number': 10
+        }
+        
+        # 如果提供了adm参数，添加到请求中
+        if adm:
+            params['adm'] = adm
+        return url, params
+    
+    def _parse_city_response(self, data):
+        """
+        解析城市搜索接口的返回数据
         
-        print(f"WeatherService initialized with Key: {self.api_key[:6]}****** if self.api_key else 'None'") # 调试日志
+        Args:
+            data: 接口返回的JSON字典
+            
+        Returns:
+            list: 城市列表（City）
+        """
+        logger.debug('城市搜索返回', extra={'code': data.get('code'), 'location_count': len(data.get('location', []))})
         
+        if data.get('code') == '200':
+            cities = [City.from_qweather(item) for item in data.get('location', [])]
+            return cities
+        else:
+            logger.warning('城市搜索API返回错误代码: %s', data.get('code'))
+            return []
+    
     def search_city(self, keyword, adm=None):
         """
         搜索城市
@@ -53,50 +134,67 @@ class WeatherService:
         """
         if not keyword or not self.api_key:
             return []
+        
+        cache, cache_key = get_cache().namespace('city'), f"{keyword}|{adm or ''}"
+        cached = cache.get(cache_key)
+        if cached is not MISS:
+            return [] if cached is NEGATIVE else [City.from_dict(city) for city in cached]
             
         try:
-            url = f"{self.geo_base_url}/city/lookup"
-            params = {
-                'location': keyword,
-                'key': self.api_key,
-                'range': 'cn',  # 限制在中国范围内，根据需求可调整
-                'number': 10
-            }
-            
-            # 如果提供了adm参数，添加到请求中
-            if adm:
-                params['adm'] = adm
-            
-            print(f"WeatherService Request: URL={url}, Params={params}") # 详细调试日志
-            
-            response = requests.get(url, params=params, timeout=5)
+            url, params = self._city_lookup_request(keyword, adm)
+            import requests  # 首次请求时再导入，缩短冷启动时间
+            response = resilience.call('qweather', lambda: self._get(requests, 'geo', url, params))
             data = response.json()
-            
-            print(f"WeatherService Response: Code={data.get('code')}, LocationCount={len(data.get('location', []))}") # 详细调试日志
-            
-            if data.get('code') == '200':
-                cities = []
-                for item in data.get('location', []):
-                    # 格式化城市名称：城市-省份 (上级行政区)
-                    display_name = item['name']
-                    if item.get('adm1') and item['adm1'] != item['name']:
-                        display_name = f"{item['name']}, {item['adm1']}"
-                        
-                    cities.append({
-                        'id': item['id'],
-                        'name': display_name,
-                        'lat': item['lat'],
-                        'lon': item['lon']
-                    })
-                return cities
-            else:
-                print(f"城市搜索API返回错误代码: {data.get('code')}")
-                return []
+            cities = self._parse_city_response(data)
+            _remember(cache, cache_key, data.get('code'), cities)
+            return cities
                 
         except Exception as e:
-            print(f"城市搜索失败: {str(e)}")
+            logger.warning('城市搜索失败: %s', e)
             return []
+    
+    async def search_city_async(self, keyword, adm=None):
+        """
+        搜索城市（异步版本，供异步服务模式使用）
+        
+        Args/Returns 同 search_city
+        """
+        if not keyword or not self.api_key:
+            return []
+        
+        cache, cache_key = get_cache().namespace('city'), f"{keyword}|{adm or ''}"
+        cached = await asyncio.to_thread(cache.get, cache_key)
+        if cached is not MISS:
+            return [] if cached is NEGATIVE else [City.from_dict(city) for city in cached]
+            
+        try:
+            from services.async_http import get_async_client
+            url, params = self._city_lookup_request(keyword, adm)
+            response = await resilience.call_async('qweather', lambda: self._get_async(get_async_client(), 'geo', url, params))
+            data = response.json()
+            cities = self._parse_city_response(data)
+            await asyncio.to_thread(_remember, cache, cache_key, data.get('code'), cities)
+            return cities
+        except Exception as e:
+            logger.warning('城市搜索失败: %s', e)
+            return []
+            
+    def _parse_weather_response(self, data):
+        """
+        解析实时天气接口的返回数据
+        
+        Args:
+            data: 接口返回的JSON字典
             
+        Returns:
+            Weather: 天气数据，失败时返回None
+        """
+        if data.get('code') == '200':
+            return Weather.from_qweather(data.get('now', {}))
+        else:
+            logger.warning('实时天气API返回错误代码: %s', data.get('code'))
+            return None
+    
     def get_weather_now(self, location_id):
         """
         获取实时天气
@@ -109,6 +207,12 @@ class WeatherService:
         """
         if not location_id or not self.api_key:
             return None
+        
+        # 各 worker 共享缓存（见 utils/cache.py），无效的城市ID负缓存
+        cache = get_cache().namespace('weather')
+        cached = cache.get(location_id)
+        if cached is not MISS:
+            return None if cached is NEGATIVE else Weather.from_dict(cached)
             
         try:
             url = f"{self.weather_base_url}/weather/now"
@@ -117,24 +221,44 @@ class WeatherService:
                 'key': self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            import requests  # 首次请求时再导入，缩短冷启动时间
+            # 熔断时直接抛出 CircuitOpenError，按失败处理，调用方不带天气继续
+            response = resilience.call('qweather', lambda: self._get(requests, 'now', url, params))
             data = response.json()
-            
-            if data.get('code') == '200':
-                now = data.get('now', {})
-                return {
-                    'temp': now.get('temp'),
-                    'text': now.get('text'),
-                    'icon': now.get('icon'),
-                    'feels_like': now.get('feelsLike'),
-                    'humidity': now.get('humidity'),
-                    'wind_dir': now.get('windDir'),
-                    'obs_time': now.get('obsTime')
-                }
-            else:
-                print(f"实时天气API返回错误代码: {data.get('code')}")
-                return None
+            weather = self._parse_weather_response(data)
+            _remember(cache, location_id, data.get('code'), weather)
+            return weather
                 
         except Exception as e:
-            print(f"获取天气失败: {str(e)}")
+            logger.warning('获取天气失败: %s', e)
+            return None
+    
+    async def get_weather_now_async(self, location_id):
+        """
+        获取实时天气（异步版本，供异步服务模式使用）
+        
+        Args/Returns 同 get_weather_now
+        """
+        if not location_id or not self.api_key:
+            return None
+        
+        cache = get_cache().namespace('weather')
+        cached = await asyncio.to_thread(cache.get, location_id)
+        if cached is not MISS:
+            return None if cached is NEGATIVE else Weather.from_dict(cached)
+            
+        try:
+            from services.async_http import get_async_client
+            url = f"{self.weather_base_url}/weather/now"
+            params = {
+                'location': location_id,
+                'key': self.api_key
+            }
+            response = await resilience.call_async('qweather', lambda: self._get_async(get_async_client(), 'now', url, params))
+            data = response.json()
+            weather = self._parse_weather_response(data)
+            await asyncio.to_thread(_remember, cache, location_id, data.get('code'), weather)
+            return weather
+        except Exception as e:
+            logger.warning('获取天气失败: %s', e)
             return None
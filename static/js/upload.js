@@ -250,12 +250,12 @@ document.addEventListener('DOMContentLoaded', function() {
     imageInput.addEventListener('change', function(e) {
         const file = e.target.files[0];
         if (file) {
-            const reader = new FileReader();
-            reader.onload = function(e) {
-                imagePreview.src = e.target.result;
-                previewContainer.style.display = 'block';
-            };
-            reader.readAsDataURL(file);
+            // 使用 Object URL 直接引用本地文件，避免把整张原图编码成 base64 字符串
+            if (imagePreview.src.startsWith('blob:')) {
+                URL.revokeObjectURL(imagePreview.src);
+            }
+            imagePreview.src = URL.createObjectURL(file);
+            previewContainer.style.display = 'block';
         }
     });
 
@@ -282,12 +282,15 @@ document.addEventListener('DOMContentLoaded', function() {
         uploadBtnText.textContent = '分析中...';
 
         try {
-            const response = await fetch('/api/upload', {
-                method: 'POST',
-                body: formData
-            });
-
-            const data = await response.json();
+            // 优先直传OSS，未配置或失败时回退到经由服务器的上传
+            let data = await directUploadToOss(file, 'model', {location_id: selectedCityId});
+            if (!data) {
+                const response = await fetch('/api/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                data = await response.json();
+            }
 
             if (data.success) {
                 // 保存图片URL
@@ -300,7 +303,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // --- 新增逻辑：处理自动上传的模特 OSS URL ---
                 if (data.oss_url) {
                     modelOssUrlInput.value = data.oss_url;
-                    currentModelPreview.src = data.file_url; // 使用本地预览更快
+                    currentModelPreview.src = thumbnailUrl(data.file_url, 160); // 只需80px缩略图
                     virtualTryOnSection.style.display = 'block'; // 显示试穿区域
                     checkTryOnReady(); // 检查是否就绪
                 } else {
@@ -323,6 +326,72 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    /**
+     * 生成缩略图地址：本地上传走 /uploads 的 ?w= 变体，OSS 对象走图片处理参数
+     */
+    function thumbnailUrl(url, width) {
+        if (url.startsWith('/uploads/')) {
+            return `${url}?w=${width}`;
+        }
+        if (url.includes('.aliyuncs.com/')) {
+            return `${url}?x-oss-process=image/resize,w_${width}/format,webp`;
+        }
+        return url;
+    }
+
+    /**
+     * 计算文件内容的 SHA-256 十六进制摘要，用于生成OSS对象Key
+     */
+    async function sha256Hex(file) {
+        const buffer = await file.arrayBuffer();
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * 浏览器直传OSS
+     * 1. 向服务器申请短期直传策略（对象Key由内容哈希决定）
+     * 2. 文件直接POST到Bucket（相同内容已存在时跳过）
+     * 3. 调用完成接口登记对象并触发分析
+     * 返回与原上传接口相同结构的结果；直传不可用时返回 null 由调用方回退
+     */
+    async function directUploadToOss(file, kind, extra = {}) {
+        if (!window.crypto || !crypto.subtle) return null;
+        try {
+            const extension = (file.name.split('.').pop() || 'jpg').toLowerCase();
+            const contentHash = await sha256Hex(file);
+
+            const policyRes = await fetch('/api/oss/policy', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({content_hash: contentHash, extension: extension})
+            });
+            if (!policyRes.ok) return null;
+            const policy = await policyRes.json();
+
+            if (!policy.exists) {
+                const form = new FormData();
+                for (const [name, value] of Object.entries(policy.fields)) {
+                    form.append(name, value);
+                }
+                // file 字段必须是表单的最后一个字段
+                form.append('file', file);
+                const ossRes = await fetch(policy.host, {method: 'POST', body: form});
+                if (!ossRes.ok) return null;
+            }
+
+            const completeRes = await fetch('/api/oss/complete', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify(Object.assign({key: policy.key, kind: kind}, extra))
+            });
+            return await completeRes.json();
+        } catch (e) {
+            console.warn('OSS直传失败，回退到服务器上传', e);
+            return null;
+        }
+    }
+
     /**
      * 显示分析结果
      */
@@ -407,11 +476,14 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('file', file);
         
         try {
-            const res = await fetch('/api/upload-garment', {
-                method: 'POST',
-                body: formData
-            });
-            const data = await res.json();
+            let data = await directUploadToOss(file, 'garment');
+            if (!data) {
+                const res = await fetch('/api/upload-garment', {
+                    method: 'POST',
+                    body: formData
+                });
+                data = await res.json();
+            }
             
             if (data.success && data.oss_url) {
                 urlInput.value = data.oss_url;
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+准入控制测试脚本
+验证令牌桶、按Session/IP区分限流、全局并发上限以及429响应
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from utils.admission import MemoryBackend, RedisBackend, AdmissionController, Bucket
+
+
+def test_token_bucket_refills_over_time():
+    """
+    测试令牌桶扣除、不足时返回等待时间，以及按速率补充
+    """
+    backend = MemoryBackend()
+    bucket = Bucket('session:a', 10, 2)
+    assert backend.take([bucket], 6, now=100) == (0.0, None)
+    wait, limiting = backend.take([bucket], 6, now=100)
+    assert limiting == 0 and wait == 1.0
+    # 1秒后补充2个令牌，刚好够扣
+    assert backend.take([bucket], 6, now=101) == (0.0, None)
+
+
+def test_controller_limits_session_ip_and_concurrency():
+    """
+    测试Session桶先耗尽时按Session拒绝，换Session后仍受IP桶限制；并发占满时拒绝
+    """
+    controller = AdmissionController(MemoryBackend(), {'api.try_on': 10, 'api.upload_image': 5},
+                                     session_bucket=(20, 0.01), ip_bucket=(30, 0.01), max_concurrency=0)
+    assert controller.admit('api.try_on', 's1', '1.1.1.1') == (None, None)
+    assert controller.admit('api.try_on', 's1', '1.1.1.1') == (None, None)
+    _, rejection = controller.admit('api.try_on', 's1', '1.1.1.1')
+    assert rejection.reason == 'session' and int(rejection.retry_after_header) > 0
+
+    assert controller.admit('api.try_on', 's2', '1.1.1.1') == (None, None)
+    _, rejection = controller.admit('api.try_on', 's3', '1.1.1.1')
+    assert rejection.reason == 'ip'
+    # 未配置成本的接口不受限制
+    assert controller.admit('api.weather', 's1', '1.1.1.1') == (None, None)
+
+    controller = AdmissionController(MemoryBackend(), {'api.try_on': 1}, (100, 1), (100, 1), max_concurrency=2)
+    first, _ = controller.admit('api.try_on', 'a', '1.1.1.1')
+    second, _ = controller.admit('api.try_on', 'b', '2.2.2.2')
+    _, rejection = controller.admit('api.try_on', 'c', '3.3.3.3')
+    assert first and second and rejection.reason == 'concurrency'
+    controller.release(first)
+    slot, rejection = controller.admit('api.try_on', 'c', '3.3.3.3')
+    assert slot and rejection is None
+
+
+def test_unavailable_redis_fails_open():
+    """
+    测试Redis不可用时放行请求
+    """
+    controller = AdmissionController(RedisBackend('redis://127.0.0.1:1/0'), {'api.try_on': 10},
+                                     (20, 1), (20, 1), max_concurrency=4)
+    assert controller.admit('api.try_on', 's1', '1.1.1.1') == (None, None)
+
+
+def test_try_on_returns_429_with_retry_after():
+    """
+    测试同一Session超出限额后返回429和Retry-After，并发槽位在请求结束后释放
+    """
+    app = create_app('testing')
+    controller = app.extensions['admission']
+    controller.session_bucket = (10, 0.01)
+    client = app.test_client()
+
+    # 缺少参数的请求同样消耗令牌（准入检查在视图之前）
+    assert client.post('/api/try-on', json={}).status_code == 400
+    res = client.post('/api/try-on', json={})
+    assert res.status_code == 429
+    assert int(res.headers['Retry-After']) >= 1
+    assert res.get_json()['reason'] == 'session'
+    assert not controller.backend._slots
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+异步分析任务测试脚本
+验证提交任务后立即返回任务ID，后台线程池执行识别，结果写入任务表并可通过状态接口查询
+"""
+
+import io
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import TestingConfig
+from database_models import db, AnalysisJob
+from services.image_recognition_service import ImageRecognitionService
+
+
+def _client(monkeypatch, tmp_path):
+    # 后台线程和状态查询同时访问数据库，内存数据库只有一个共享连接，使用临时文件数据库
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'jobs.db'}")
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        db.create_all()
+    return app, app.test_client()
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+
+def _wait_for(client, job_id):
+    for _ in range(100):
+        response = client.get(f'/api/analyze/{job_id}')
+        body = response.get_json()
+        if body['status'] in ('succeeded', 'failed'):
+            return response
+        assert response.headers['Retry-After']
+        time.sleep(0.02)
+    raise AssertionError('job did not finish')
+
+
+def test_submit_returns_before_analysis_finishes(monkeypatch, tmp_path):
+    """
+    测试提交接口不等待模型，任务完成后状态接口返回分析结果，结果保存在任务表中
+    """
+    release = threading.Event()
+
+    def slow_analysis(self, image_path, weather_data=None):
+        assert os.path.exists(image_path)
+        release.wait(5)
+        return {'clothing_items': [{'type': '上衣'}], 'overall_style': '休闲'}
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    monkeypatch.setattr(ImageRecognitionService, 'analyze_image', slow_analysis)
+    app, client = _client(monkeypatch, tmp_path)
+
+    response = client.post('/api/analyze', data={'file': (_image(), 'look.png')})
+    body = response.get_json()
+    assert response.status_code == 202
+    assert body['status'] in ('queued', 'running') and response.headers['Location'] == body['status_url']
+
+    release.set()
+    result = _wait_for(client, body['job_id']).get_json()
+    assert result['status'] == 'succeeded' and result['analysis']['overall_style'] == '休闲'
+    with app.app_context():
+        job = db.session.get(AnalysisJob, body['job_id'])
+        assert job.result['overall_style'] == '休闲' and job.backend == 'thread'
+        assert job.finished_at >= job.started_at >= job.created_at
+
+
+def test_failed_job_and_bad_requests(monkeypatch, tmp_path):
+    """
+    测试识别失败时任务标记为失败；缺少图片或任务不存在时返回错误
+    """
+    def broken_analysis(self, image_path, weather_data=None):
+        raise RuntimeError('model unavailable')
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    monkeypatch.setattr(ImageRecognitionService, 'analyze_image', broken_analysis)
+    _, client = _client(monkeypatch, tmp_path)
+
+    job_id = client.post('/api/analyze', data={'file': (_image(), 'look.png')}).get_json()['job_id']
+    result = _wait_for(client, job_id).get_json()
+    assert result['status'] == 'failed' and result['error'] == 'model unavailable'
+
+    assert client.post('/api/analyze', json={}).status_code == 400
+    assert client.get('/api/analyze/unknown').status_code == 404
+
+
+def test_object_key_is_checked_before_queueing(monkeypatch, tmp_path):
+    """
+    测试提交OSS直传Key时先校验对象存在且是合法图片，不合法的Key返回错误且不登记任务
+    """
+    import hashlib
+    from services.oss_service import OssService
+
+    app, client = _client(monkeypatch, tmp_path)
+    app.config.update(ALIYUN_OSS_ACCESS_KEY_ID='test-id', ALIYUN_OSS_ACCESS_KEY_SECRET='test-secret',
+                      ALIYUN_OSS_BUCKET_NAME='fashion-bucket', ALIYUN_OSS_ENDPOINT='oss-cn-beijing.aliyuncs.com')
+    objects = {}
+    bucket = SimpleNamespace(object_exists=lambda key: key in objects,
+                             get_object=lambda key, byte_range=None: io.BytesIO(objects[key]))
+    monkeypatch.setattr(OssService, 'bucket', property(lambda self: bucket))
+
+    content = b'not an image'
+    key = OssService(app.config).build_object_key(hashlib.sha256(content).hexdigest(), 'png')
+    assert client.post('/api/analyze', json={'key': key}).status_code == 404
+    objects[key] = content
+    assert client.post('/api/analyze', json={'key': key}).status_code == 415
+    with app.app_context():
+        assert AnalysisJob.query.count() == 0
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+批量分析测试脚本
+验证相同图片只分析一次、模型调用并发数不超过配置、按图片数计入准入限额，以及 NDJSON 流式结果和汇总统计
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.batch_analysis import BatchItem, run_batch
+from services.image_recognition_service import ImageRecognitionService
+
+
+def _image(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_streams_results_and_dedupes(monkeypatch, tmp_path):
+    """
+    测试相同内容的图片只分析一次并标记 duplicate_of，非法文件输出失败行，最后一行为汇总统计
+    """
+    analyzed = []
+
+    def fake_analysis(self, image_path, weather_data=None):
+        analyzed.append(image_path)
+        return {'overall_style': os.path.basename(image_path)}
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    monkeypatch.setattr(ImageRecognitionService, 'analyze_image', fake_analysis)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    client = app.test_client()
+
+    response = client.post('/api/analyze/batch', data={'files': [
+        (_image('red'), 'a.png'), (_image('blue'), 'b.png'), (_image('red'), 'copy.png'),
+        (io.BytesIO(b'not an image'), 'c.png')
+    ]})
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+
+    lines = _lines(response)
+    results = {line['index']: line for line in lines[:-1]}
+    summary = lines[-1]
+    assert len(analyzed) == 2 and len(results) == 4
+    assert results[3]['status'] == 'failed' and results[3]['name'] == 'c.png'
+    assert results[2]['duplicate_of'] == 0 and results[2]['analysis'] == results[0]['analysis']
+    assert results[1]['analysis'] != results[0]['analysis']
+    assert summary['type'] == 'summary'
+    assert (summary['total'], summary['unique'], summary['duplicates'], summary['succeeded'], summary['failed']) == (4, 2, 1, 3, 1)
+    assert summary['images_per_second'] > 0
+
+
+def test_concurrency_limit():
+    """
+    测试同时进行的分析数不超过 concurrency，结果按完成顺序输出
+    """
+    lock = threading.Lock()
+    state = {'active': 0, 'peak': 0}
+
+    def analyze(image):
+        with lock:
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        time.sleep(0.05 if image == 'slow' else 0.01)
+        with lock:
+            state['active'] -= 1
+        return {'image': image}
+
+    items = []
+    for index, name in enumerate(['slow'] + [f'img{i}' for i in range(9)]):
+        item = BatchItem(index, name)
+        item.image = item.digest = name
+        items.append(item)
+
+    events = list(run_batch(items, analyze, concurrency=3))
+    assert state['peak'] == 3
+    assert events[-1]['succeeded'] == 10 and events[-1]['concurrency'] == 3
+    assert events[0]['name'] != 'slow'
+
+
+def test_batch_rejects_bad_requests(monkeypatch, tmp_path):
+    """
+    测试没有图片或超过单次上限时返回 400
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['ANALYZE_BATCH_MAX_IMAGES'] = 2
+    client = app.test_client()
+
+    assert client.post('/api/analyze/batch', json={}).status_code == 400
+    response = client.post('/api/analyze/batch', data={'files': [(_image('red'), f'{i}.png') for i in range(3)]})
+    assert response.status_code == 400
+
+
+def test_batch_is_charged_per_image(monkeypatch, tmp_path):
+    """
+    测试准入令牌按去重后的图片数扣除，超出额度的图片不分析并带 retry_after；并发调用计入全局并发上限
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    monkeypatch.setattr(ImageRecognitionService, 'analyze_image', lambda self, image_path, weather_data=None: {})
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['ANALYZE_BATCH_CONCURRENCY'] = 4
+    controller = app.extensions['admission']
+    # 每张图片5个令牌：进入时扣一张，剩余的令牌只够再分析一张
+    controller.session_bucket = (12, 0.01)
+    controller.max_concurrency = 2
+    client = app.test_client()
+
+    response = client.post('/api/analyze/batch', data={'files': [
+        (_image('red'), 'a.png'), (_image('red'), 'copy.png'), (_image('blue'), 'b.png'), (_image('green'), 'c.png')
+    ]})
+    lines = _lines(response)
+    results = {line['index']: line for line in lines[:-1]}
+    assert [results[i]['status'] for i in range(4)] == ['succeeded', 'succeeded', 'succeeded', 'failed']
+    assert results[3]['retry_after'] >= 1
+    assert lines[-1]['model_calls'] == 2 and lines[-1]['concurrency'] == 2
+    assert not controller.backend._slots
+
+    # 令牌耗尽后整批被拒绝
+    assert client.post('/api/analyze/batch', data={'files': [(_image('red'), 'a.png')]}).status_code == 429
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+两级缓存测试脚本
+验证L1按字节数和过期时间淘汰、多个进程通过SQLite L2共享缓存、负缓存，以及天气服务使用缓存
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import cache
+from utils.cache import LRUCache, TieredCache, SQLiteBackend, MISS, NEGATIVE, dumps, loads
+from services.weather_service import WeatherService
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    cache.reset()
+    yield
+    cache.reset()
+
+
+def test_lru_byte_accounting_and_ttl():
+    """
+    测试L1超过字节上限时淘汰最久未使用的条目，过期条目不返回，大值压缩且可以还原
+    """
+    lru = LRUCache(max_bytes=1000, max_entries=100)
+    for key in ('a', 'b', 'c'):
+        lru.set(key, b'x' * 200, ttl=60)
+    lru.get('a')
+    lru.set('d', b'x' * 300, ttl=60)
+    assert lru.get('b') is None and lru.get('a') is not None
+    assert lru.size_bytes <= 1000 and len(lru) == 3
+
+    lru.set('big', b'x' * 2000, ttl=60)
+    assert lru.get('big') is None and len(lru) == 3
+
+    lru.set('short', b'x', ttl=0.01)
+    time.sleep(0.02)
+    assert lru.get('short') is None
+
+    value = {'items': ['白色衬衫'] * 200}
+    blob = dumps(value)
+    assert blob[:1] == b'z' and len(blob) < len(str(value)) and loads(blob) == value
+    assert loads(dumps(NEGATIVE)) is NEGATIVE
+
+
+def test_sqlite_l2_shared_between_workers(tmp_path):
+    """
+    测试两个进程各自的L1通过同一个SQLite L2共享值和负缓存，命名空间之间互不影响
+    """
+    path = str(tmp_path / 'cache.sqlite3')
+    ttls = {'weather': (600, 60)}
+    worker_a = TieredCache(LRUCache(), SQLiteBackend(path), 'fashion:', ttls=ttls)
+    worker_b = TieredCache(LRUCache(), SQLiteBackend(path), 'fashion:', ttls=ttls)
+
+    worker_a.namespace('weather').set('101010100', {'temp': '22'})
+    worker_a.namespace('weather').set_negative('000')
+    assert worker_b.namespace('weather').get('101010100') == {'temp': '22'}
+    assert worker_b.namespace('weather').get('000') is NEGATIVE
+    assert worker_b.namespace('city').get('101010100') is MISS
+    assert worker_b.namespace('weather').key('101010100') == 'fashion:weather:101010100'
+
+    # 没有负缓存时间的命名空间不记录负缓存
+    worker_a.namespace('city').set_negative('unknown')
+    assert worker_b.namespace('city').get('unknown') is MISS
+
+
+def test_weather_service_uses_cache(monkeypatch):
+    """
+    测试实时天气命中缓存时不请求和风天气，无效的城市ID负缓存，上游错误不缓存
+    """
+    calls = []
+    responses = {
+        '101010100': {'code': '200', 'now': {'temp': '22', 'text': '晴'}},
+        '000': {'code': '404'},
+        '101020100': {'code': '429'}
+    }
+
+    def fake_get(self, requests, op, url, params):
+        calls.append(params['location'])
+        return SimpleNamespace(json=lambda: responses[params['location']])
+
+    monkeypatch.setattr(WeatherService, '_get', fake_get)
+    cache.configure({'CACHE_TTLS': {'weather': (600, 60)}})
+    weather = WeatherService({'QWEATHER_API_KEY': 'test-key'})
+
+    for _ in range(2):
+        assert weather.get_weather_now('101010100')['temp'] == '22'
+        assert weather.get_weather_now('000') is None
+        assert weather.get_weather_now('101020100') is None
+    assert calls == ['101010100', '000', '101020100', '101020100']
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动测试脚本
+在全新进程中创建应用，验证启动阶段不会加载应延迟导入的SDK
+"""
+
+import os
+import sys
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 添加项目根目录到Python路径
+sys.path.append(ROOT_DIR)
+
+from benchmarks.import_time_budget import DEFERRED_MODULES, LOADED_PREFIX, parse_loaded
+
+
+def _loaded_after(code):
+    """在新进程中执行代码，返回其中已加载的延迟导入模块"""
+    script = (
+        "import sys, json\n"
+        f"{code}\n"
+        f"print({LOADED_PREFIX!r} + json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({DEFERRED_MODULES!r}))))\n"
+    )
+    proc = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    return parse_loaded(proc.stdout)
+
+
+def test_production_boot_defers_heavy_imports():
+    """
+    测试生产配置下创建应用、访问服务包时不导入任何SDK，也不打印路由表
+    """
+    loaded = _loaded_after(
+        "from app import create_app\n"
+        "app = create_app('production')\n"
+        "import services, services.oss_service, services.virtual_tryon_service\n"
+        "assert 'migrate' not in app.extensions"
+    )
+    assert loaded == []
+
+
+def test_development_keeps_migrations():
+    """
+    测试开发环境仍然启用迁移工具，导入服务类本身不会加载 requests
+    """
+    loaded = _loaded_after(
+        "from app import create_app\n"
+        "app = create_app('development')\n"
+        "assert 'migrate' in app.extensions\n"
+        "from services import WeatherService"
+    )
+    assert 'alembic' in loaded
+    assert 'requests' not in loaded
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+请求截止时间测试脚本
+验证预算的计算、上游超时不超过剩余时间，以及上传分析在截止时间到达时返回部分结果、稍后取回OSS URL
+"""
+
+import io
+import os
+import sys
+import time
+
+import pytest
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from utils import deadline, resilience
+from utils.deadline import DeadlineExceeded, TIMEOUT_HEADER, PARTIAL_HEADER
+from services.image_recognition_service import ImageRecognitionService
+from services.virtual_tryon_service import VirtualTryonService
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+def test_request_budget():
+    """
+    测试请求头只能缩短预算，非法值忽略；没有配置预算的接口不受请求头影响
+    """
+    assert deadline.request_budget(60, '5') == 5
+    assert deadline.request_budget(60, '600') == 60
+    assert deadline.request_budget(60, '0.01') == deadline.MIN_BUDGET
+    assert deadline.request_budget(60, 'soon') == 60
+    assert deadline.request_budget(60, 'nan') == 60
+    assert deadline.request_budget(None, '5') is None
+
+
+def test_upstream_timeout_uses_remaining_budget():
+    """
+    测试上游超时不超过剩余时间；剩余时间用完后的超时抛出 DeadlineExceeded，且不计入熔断失败次数
+    """
+    token = deadline.start(0.05)
+    try:
+        assert resilience.timeout('qweather') <= 0.05
+
+        def slow():
+            time.sleep(0.06)
+            raise TimeoutError()
+
+        with pytest.raises(DeadlineExceeded):
+            resilience.call('qweather', slow)
+        assert resilience.get_breaker('qweather').failures == 0
+        # 用完后不再发起调用
+        with pytest.raises(DeadlineExceeded):
+            resilience.call('qweather', lambda: pytest.fail('called after the deadline'))
+    finally:
+        deadline.finish(token)
+    assert resilience.timeout('qweather') == resilience.policy('qweather')['timeout']
+
+
+def test_upload_returns_partial_result(monkeypatch, tmp_path):
+    """
+    测试截止时间到达时分析标记为 skipped，上传OSS在后台完成后通过 /api/pending/<token> 取回
+    """
+    def slow_analysis(self, image_path, weather_data=None):
+        time.sleep(deadline.remaining() + 0.05)
+        deadline.check()
+
+    def slow_oss(self, file_path):
+        assert deadline.remaining() is None
+        time.sleep(1.3)
+        return 'https://bucket.oss-cn-beijing.aliyuncs.com/temp/look.png'
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    monkeypatch.setattr(ImageRecognitionService, 'analyze_image', slow_analysis)
+    monkeypatch.setattr(VirtualTryonService, '_upload_file_to_oss', slow_oss)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    client = app.test_client()
+
+    image = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(image, 'PNG')
+    image.seek(0)
+    start = time.monotonic()
+    response = client.post('/api/upload', data={'file': (image, 'look.png')}, headers={TIMEOUT_HEADER: '1'})
+    assert time.monotonic() - start < 1.25
+
+    body = response.get_json()
+    assert response.status_code == 200 and body['success'] is True
+    assert body['analysis'] is None and body['skipped'] == ['analysis']
+    assert response.headers[PARTIAL_HEADER] == 'analysis'
+    assert body['oss_url'] is None and set(body['pending']) == {'oss_url'}
+
+    token = body['pending']['oss_url']
+    assert client.get(f'/api/pending/{token}').get_json()['status'] == 'pending'
+    for _ in range(50):
+        result = client.get(f'/api/pending/{token}').get_json()
+        if result['status'] != 'pending':
+            break
+        time.sleep(0.05)
+    assert result == {'success': True, 'status': 'done',
+                      'oss_url': 'https://bucket.oss-cn-beijing.aliyuncs.com/temp/look.png'}
+    with client.session_transaction() as sess:
+        assert sess['model_image_oss_url'] == result['oss_url']
+    assert client.get('/api/pending/unknown').status_code == 404
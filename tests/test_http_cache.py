@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP缓存测试脚本
+验证只读接口的弱ETag、If-None-Match 返回304、Cache-Control，以及JSON响应的压缩阈值
+"""
+
+import os
+import sys
+import gzip
+import json
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.weather_service import WeatherService
+
+
+def test_city_lookup_etag_and_not_modified(monkeypatch):
+    """
+    测试成功的城市搜索带有弱ETag和公共缓存头，匹配的 If-None-Match 返回空的304；失败结果不缓存
+    """
+    monkeypatch.setattr(WeatherService, 'search_city', lambda self, keyword, adm='': [{'id': '101010100', 'name': '北京'}])
+    client = create_app('testing').test_client()
+
+    res = client.get('/api/city-lookup?keyword=bj')
+    assert res.status_code == 200
+    etag = res.headers['ETag']
+    assert etag.startswith('W/"')
+    assert res.headers['Cache-Control'] == 'public, max-age=86400, stale-while-revalidate=3600'
+
+    cached = client.get('/api/city-lookup?keyword=bj', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+
+    def fail(self, keyword, adm=''):
+        raise RuntimeError('quota exceeded')
+
+    monkeypatch.setattr(WeatherService, 'search_city', fail)
+    res = client.get('/api/city-lookup?keyword=bj')
+    assert res.get_json()['success'] is False
+    assert res.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in res.headers
+
+
+def test_large_json_is_gzipped(monkeypatch):
+    """
+    测试超过阈值的JSON按 Accept-Encoding 压缩，ETag与未压缩时相同；小响应不压缩
+    """
+    cities = [{'id': str(i), 'name': f'城市{i}', 'adm1': '某省'} for i in range(200)]
+    monkeypatch.setattr(WeatherService, 'search_city', lambda self, keyword, adm='': cities)
+    client = create_app('testing').test_client()
+
+    plain = client.get('/api/city-lookup?keyword=big')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    res = client.get('/api/city-lookup?keyword=big', headers={'Accept-Encoding': 'gzip'})
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert int(res.headers['Content-Length']) == len(res.data) < len(plain.data)
+    assert json.loads(gzip.decompress(res.data))['cities'] == cities
+    assert res.headers['ETag'] == plain.headers['ETag']
+
+    small = client.get('/api/city-lookup', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
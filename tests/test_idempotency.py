@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+幂等键测试脚本
+验证重复提交试穿任务时只调用一次上游，并发的重复请求等待第一次的结果
+"""
+
+import os
+import sys
+import time
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.virtual_tryon_service import VirtualTryonService
+from utils.idempotency import KEY_HEADER, REPLAYED_HEADER
+
+TRYON_BODY = {'person_image_url': 'https://example.com/p.jpg', 'clothing_image_url': 'https://example.com/c.jpg'}
+
+
+def _count_tryon_calls(monkeypatch, delay=0.0, fail=False):
+    calls = []
+
+    def fake_generate_tryon(self, **kwargs):
+        calls.append(kwargs)
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError('upstream unavailable')
+        return {'success': True, 'task_id': f'task-{len(calls)}'}
+
+    monkeypatch.setattr(VirtualTryonService, 'generate_tryon', fake_generate_tryon)
+    return calls
+
+
+def test_repeated_key_replays_first_response(monkeypatch):
+    """
+    测试相同幂等键只提交一次任务；内容不同返回422；非法的键返回400
+    """
+    calls = _count_tryon_calls(monkeypatch)
+    client = create_app('testing').test_client()
+
+    first = client.post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'retry-1'})
+    second = client.post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'retry-1'})
+    assert len(calls) == 1
+    assert second.get_json() == first.get_json() == {'success': True, 'task_id': 'task-1'}
+    assert second.headers[REPLAYED_HEADER] == 'true'
+    assert REPLAYED_HEADER not in first.headers
+
+    other = dict(TRYON_BODY, clothing_image_url='https://example.com/other.jpg')
+    assert client.post('/api/try-on', json=other, headers={KEY_HEADER: 'retry-1'}).status_code == 422
+    assert client.post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'x' * 300}).status_code == 400
+
+    # 不带幂等键的请求照常执行
+    client.post('/api/try-on', json=TRYON_BODY)
+    assert len(calls) == 2
+
+
+def test_concurrent_duplicates_wait_for_first(monkeypatch):
+    """
+    测试并发的重复请求等待进行中的请求，并拿到相同结果
+    """
+    calls = _count_tryon_calls(monkeypatch, delay=0.3)
+    app = create_app('testing')
+    results = []
+
+    def submit():
+        res = app.test_client().post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'concurrent'})
+        results.append(res.get_json())
+
+    threads = [threading.Thread(target=submit) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{'success': True, 'task_id': 'task-1'}] * 3
+
+
+def test_server_errors_are_not_cached(monkeypatch):
+    """
+    测试5xx响应不缓存，使用同一幂等键重试时重新执行
+    """
+    calls = _count_tryon_calls(monkeypatch, fail=True)
+    client = create_app('testing').test_client()
+    assert client.post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'fails'}).status_code == 500
+    assert client.post('/api/try-on', json=TRYON_BODY, headers={KEY_HEADER: 'fails'}).status_code == 500
+    assert len(calls) == 2
+
+
+def test_async_app_answers_cors_preflight():
+    """
+    测试异步应用应答跨域预检：放行幂等键等自定义请求头，预检不消耗准入令牌（试穿每次10个令牌，桶容量60）
+    """
+    import asyncio
+    from async_app import create_async_app
+
+    app = create_async_app('testing')
+    headers = {'Origin': 'https://example.com', 'Access-Control-Request-Method': 'POST',
+               'Access-Control-Request-Headers': 'content-type, idempotency-key, x-request-timeout'}
+
+    async def preflight():
+        return [await app.test_client().options('/api/try-on', headers=headers) for _ in range(10)]
+
+    for res in asyncio.run(preflight()):
+        assert res.status_code == 200
+        assert res.headers['Access-Control-Allow-Origin'] == '*'
+        assert 'POST' in res.headers['Access-Control-Allow-Methods']
+        assert res.headers['Access-Control-Allow-Headers'] == headers['Access-Control-Request-Headers']
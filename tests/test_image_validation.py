@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+图片上传校验测试脚本
+验证魔数识别、尺寸和帧数限制以及上传接口的提前拒绝
+"""
+
+import io
+import os
+import sys
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_validation import ImageValidationError, validate_image_stream, sniff_image_type
+
+
+def _encode(img, fmt, **kwargs):
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **kwargs)
+    buffer.seek(0)
+    return buffer
+
+
+def _expect_error(stream, status_code, max_pixels=10 ** 6, max_frames=5):
+    try:
+        validate_image_stream(stream, max_pixels, max_frames)
+    except ImageValidationError as e:
+        assert e.status_code == status_code
+        return
+    raise AssertionError('validation should fail')
+
+
+def test_sniff_image_type():
+    """
+    测试根据魔数识别图片类型
+    """
+    assert sniff_image_type(b'\xff\xd8\xff\xe0' + b'\x00' * 12) == 'jpeg'
+    assert sniff_image_type(b'\x89PNG\r\n\x1a\n' + b'\x00' * 8) == 'png'
+    assert sniff_image_type(b'GIF89a') == 'gif'
+    assert sniff_image_type(b'%PDF-1.7') is None
+
+
+def test_valid_image_passes_and_stream_is_rewound():
+    """
+    测试合法图片通过校验，且流位置复原以便后续保存
+    """
+    stream = _encode(Image.new('RGB', (64, 32)), 'PNG')
+    info = validate_image_stream(stream, 10 ** 6, 5)
+    assert info == {'format': 'png', 'width': 64, 'height': 32, 'frames': 1}
+    assert stream.tell() == 0
+
+
+def test_renamed_and_oversized_images_are_rejected():
+    """
+    测试伪装文件、超大尺寸和帧数过多的动图被拒绝
+    """
+    _expect_error(io.BytesIO(b'%PDF-1.7 not an image'), 415)
+    _expect_error(_encode(Image.new('L', (2000, 1000)), 'PNG'), 413)
+
+    frames = [Image.new('RGB', (8, 8), (color * 20, 0, 0)) for color in range(10)]
+    gif = _encode(frames[0], 'GIF', save_all=True, append_images=frames[1:])
+    _expect_error(gif, 413)
+
+
+def test_upload_route_rejects_disguised_file():
+    """
+    测试上传接口在保存文件和调用模型之前拒绝伪装文件
+    """
+    from app import create_app
+
+    client = create_app('testing').test_client()
+    res = client.post('/api/upload', data={
+        'file': (io.BytesIO(b'%PDF-1.7 not an image'), 'photo.jpg')
+    }, content_type='multipart/form-data')
+    assert res.status_code == 415
+
+
+def test_upload_paths_are_unique(tmp_path):
+    """
+    测试同一秒内同名上传生成不同的保存路径（上传文件URL按不可变资源缓存，不能被覆盖）
+    """
+    from utils.file_utils import build_upload_path
+
+    paths = {build_upload_path('photo.jpg', str(tmp_path)) for _ in range(20)}
+    assert len(paths) == 20
+    assert all(p.endswith('_photo.jpg') for p in paths)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+图片变体测试脚本
+验证宽度档位选择，以及不同原图（同名不同扩展名、不同目录下的同名文件）各自生成变体
+"""
+
+import os
+import sys
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_variants import get_variant, pick_variant_width
+
+
+def test_pick_variant_width():
+    """
+    测试请求宽度向上取整到档位，超过最大档位时使用最大档位
+    """
+    assert pick_variant_width(100) == 160
+    assert pick_variant_width(320) == 320
+    assert pick_variant_width(5000) == 1280
+
+
+def test_variants_do_not_collide(tmp_path):
+    """
+    测试 a.jpg 与 a.png、不同目录下的 a.jpg 生成不同的变体，每个变体来自对应的原图
+    """
+    sources = {
+        'red': tmp_path / 'a.jpg',
+        'blue': tmp_path / 'a.png',
+        'green': tmp_path / 'sub' / 'a.jpg',
+    }
+    os.makedirs(tmp_path / 'sub')
+    for color, path in sources.items():
+        Image.new('RGB', (400, 200), color).save(path)
+
+    variants = {color: get_variant(str(path), str(tmp_path / '.variants'), 160, 'jpeg')
+                for color, path in sources.items()}
+    assert len(set(variants.values())) == 3
+    for color, variant in variants.items():
+        expected = Image.new('RGB', (1, 1), color).getpixel((0, 0))
+        with Image.open(variant) as img:
+            assert img.width == 160
+            # JPEG 有损压缩，颜色允许少量偏差
+            assert max(abs(a - b) for a, b in zip(img.getpixel((80, 40)), expected)) < 8
+
+
+def test_cache_folders_follow_upload_folder(tmp_path, monkeypatch):
+    """
+    测试覆盖 UPLOAD_FOLDER 后，未单独配置的变体目录和分片暂存目录位于新的上传目录下；单独配置时保持不变
+    """
+    from app import create_app
+    from config import TestingConfig
+
+    monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    app = create_app('testing')
+    assert app.config['IMAGE_VARIANT_FOLDER'] == str(tmp_path / 'uploads' / '.variants')
+    assert app.config['RESUMABLE_UPLOAD_FOLDER'] == str(tmp_path / 'uploads' / '.resumable')
+
+    monkeypatch.setattr(TestingConfig, 'RESUMABLE_UPLOAD_FOLDER', str(tmp_path / 'chunks'))
+    assert create_app('testing').config['RESUMABLE_UPLOAD_FOLDER'] == str(tmp_path / 'chunks')
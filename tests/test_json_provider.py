@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+JSON Provider 与结果模型测试脚本
+验证 __slots__ 结果模型与原先的字典结构一致且可按字典读取，orjson Provider 与标准库实现的输出等价
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from services.result_models import AnalysisResult, TryonStatus, Weather, to_plain
+from services.weather_service import WeatherService
+
+
+def test_models_keep_dict_shape():
+    """
+    测试结果模型的输出与原先的字典一致：可选字段为None时不输出，分析结果保留模型输出的其他字段
+    """
+    weather = WeatherService({'QWEATHER_API_KEY': 'test-key'})._parse_weather_response(
+        {'code': '200', 'now': {'temp': '22', 'text': '晴', 'feelsLike': '20'}})
+    assert isinstance(weather, Weather) and not hasattr(weather, '__dict__')
+    assert weather['temp'] == '22' and weather.get('feels_like') == '20' and weather.get('icon') is None
+    assert dict(weather) == {'temp': '22', 'text': '晴', 'icon': None, 'feels_like': '20',
+                             'humidity': None, 'wind_dir': None, 'obs_time': None}
+
+    status = TryonStatus(success=True, status='PENDING', task_id='task-1')
+    assert status.to_dict() == {'success': True, 'status': 'PENDING', 'task_id': 'task-1'}
+    assert 'error' not in status and status.get('retry_after') is None
+
+    raw = {'clothing_items': [{'type': '上衣'}], 'overall_style': '休闲', 'notes': '其他字段'}
+    analysis = AnalysisResult.from_dict(raw)
+    assert analysis == raw and 'recommendation' not in analysis and analysis['notes'] == '其他字段'
+    assert to_plain([analysis, weather]) == [raw, dict(weather)]
+    assert AnalysisResult.from_dict(json.loads(json.dumps(to_plain(analysis)))) == analysis
+
+
+def test_orjson_provider_matches_stdlib(monkeypatch):
+    """
+    测试 orjson Provider 与标准库 Provider 的输出解析后相同（含结果模型、日期和超大整数），请求体解析正常
+    """
+    payload = {'weather': Weather(temp='22', text='晴'), 'status': TryonStatus(success=False, error='失败'),
+               'when': datetime(2024, 1, 1), 'big': 2 ** 70, 'b': 1, 'a': [1.5, None]}
+
+    bodies = {}
+    for provider in ('orjson', 'default'):
+        monkeypatch.setattr(Config, 'JSON_PROVIDER', provider)
+        app = create_app('testing')
+        with app.app_context():
+            bodies[provider] = app.json.response(payload).get_data()
+
+            @app.route('/echo', methods=['POST'])
+            def echo():
+                from flask import request, jsonify
+                return jsonify(request.get_json())
+
+        assert app.test_client().post('/echo', json={'城市': '北京'}).get_json() == {'城市': '北京'}
+
+    assert '晴'.encode('utf-8') in bodies['orjson']
+    assert json.loads(bodies['orjson']) == json.loads(bodies['default'])
+    assert json.loads(bodies['orjson'])['when'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert list(json.loads(bodies['orjson'])) == sorted(payload)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+结构化日志测试脚本
+验证JSON格式、脱敏、DEBUG采样以及请求关联ID的传递
+"""
+
+import os
+import sys
+import json
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify
+
+from app import create_app
+from utils.logging_utils import (
+    Redactor, JsonFormatter, DebugSamplingFilter, upstream_headers, REQUEST_ID_HEADER
+)
+
+
+def _record(level=logging.INFO, msg='hello %s', args=('world',), **extra):
+    record = logging.LogRecord('test', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redactor_masks_secrets():
+    """
+    测试配置中的密钥原文和常见凭证格式都会被替换
+    """
+    redact = Redactor(['my-weather-key-123'])
+    text = redact("GET /v7/weather/now?location=101&key=abcdef123 token my-weather-key-123 "
+                  "Authorization: Bearer sk-0123456789abcdef {'key': 'zzz999'}")
+    assert 'abcdef123' not in text
+    assert 'my-weather-key-123' not in text
+    assert 'sk-0123456789abcdef' not in text
+    assert 'zzz999' not in text
+    assert 'location=101' in text
+
+
+def test_json_formatter_includes_context_and_extra():
+    """
+    测试JSON格式包含消息、关联ID和extra字段，并对输出脱敏
+    """
+    line = JsonFormatter(Redactor(['secret-value'])).format(
+        _record(request_id='req-1', oss_url='https://a/b?Signature=secret-value'))
+    entry = json.loads(line)
+    assert entry['msg'] == 'hello world'
+    assert entry['request_id'] == 'req-1'
+    assert entry['level'] == 'INFO'
+    assert 'secret-value' not in entry['oss_url']
+
+
+def test_debug_sampling_keeps_whole_requests():
+    """
+    测试DEBUG日志按请求采样，INFO及以上不受影响
+    """
+    sampler = DebugSamplingFilter(0.5)
+    assert sampler.filter(_record(level=logging.INFO, request_id='x'))
+
+    decisions = {}
+    for i in range(200):
+        rid = f'req-{i}'
+        decisions[rid] = sampler.filter(_record(level=logging.DEBUG, request_id=rid))
+        # 同一请求的多条DEBUG日志去留一致
+        assert sampler.filter(_record(level=logging.DEBUG, request_id=rid)) == decisions[rid]
+    kept = sum(decisions.values())
+    assert 50 < kept < 150
+
+    assert not DebugSamplingFilter(0).filter(_record(level=logging.DEBUG, request_id='x'))
+
+
+def test_request_id_is_echoed_and_propagated():
+    """
+    测试关联ID写入响应头，并附加到上游请求头中；非法的传入值会被替换
+    """
+    app = create_app('testing')
+    app.add_url_rule('/_upstream_headers', 'upstream_headers', lambda: jsonify(upstream_headers()))
+    client = app.test_client()
+
+    res = client.get('/_upstream_headers', headers={REQUEST_ID_HEADER: 'abc-123'})
+    assert res.headers[REQUEST_ID_HEADER] == 'abc-123'
+    assert res.get_json() == {REQUEST_ID_HEADER: 'abc-123'}
+
+    res = client.get('/_upstream_headers', headers={REQUEST_ID_HEADER: 'bad id {"forged": 1}'})
+    generated = res.headers[REQUEST_ID_HEADER]
+    assert len(generated) == 32 and res.get_json()[REQUEST_ID_HEADER] == generated
+
+    # 请求结束后不再携带关联ID
+    assert upstream_headers() == {}
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+指标采集测试脚本
+验证分片计数器的汇总、上游调用记录和 /metrics 输出
+"""
+
+import os
+import sys
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from utils import metrics
+
+
+def test_counter_sums_thread_shards():
+    """
+    测试多线程并发计数后汇总结果准确，已退出线程的计数不丢失
+    """
+    counter = metrics.Counter('test_shard_total', 'test', ('kind',))
+    metrics.REGISTRY.remove(counter)
+
+    def worker():
+        for _ in range(1000):
+            counter.inc('a')
+
+    threads = [threading.Thread(target=worker) for _ in range(metrics.MAX_SHARDS + 8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc('b', amount=5)
+
+    assert counter.value('a') == 1000 * (metrics.MAX_SHARDS + 8)
+    assert counter.value('b') == 5
+
+
+def test_track_upstream_records_status_and_errors():
+    """
+    测试上游调用的状态码、异常和Token用量记录
+    """
+    with metrics.track_upstream('test_upstream', 'ok'):
+        pass
+    with metrics.track_upstream('test_upstream', 'fail') as call:
+        call.status = 503
+
+    class UpstreamError(Exception):
+        status_code = 429
+
+    try:
+        with metrics.track_upstream('test_upstream', 'raise'):
+            raise UpstreamError('rate limited')
+    except UpstreamError:
+        pass
+
+    assert metrics.UPSTREAM_REQUESTS.value('test_upstream', 'ok', 200) == 1
+    assert metrics.UPSTREAM_ERRORS.value('test_upstream', 'fail', 'http_503') == 1
+    assert metrics.UPSTREAM_REQUESTS.value('test_upstream', 'raise', 429) == 1
+    assert metrics.UPSTREAM_ERRORS.value('test_upstream', 'raise', 'UpstreamError') == 1
+    assert metrics.UPSTREAM_LATENCY.count('test_upstream', 'raise') == 1
+
+
+def test_metrics_endpoint_exposes_route_latency():
+    """
+    测试 /metrics 需要令牌，输出 Prometheus 格式的路由延迟直方图
+    """
+    app = create_app('testing')
+    client = app.test_client()
+    client.get('/api/weather')
+
+    # 未配置令牌时不对外提供，令牌错误时拒绝
+    assert client.get('/metrics').status_code == 404
+    app.config['METRICS_TOKEN'] = 'scrape-token'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    res = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert res.status_code == 200
+    assert res.mimetype == 'text/plain'
+    body = res.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{route="/api/weather",method="GET",status="400"}' in body
+    assert 'http_request_duration_seconds_bucket{route="/api/weather",method="GET",le="+Inf"}' in body
+
+
+def test_async_request_timer_runs_before_idempotency_and_admission():
+    """
+    测试异步应用与同步应用一样先开始路由计时，幂等和准入的处理时间计入路由延迟，两者的直方图可以对比
+    """
+    from async_app import create_async_app
+
+    for factory in (create_app, create_async_app):
+        names = [f.__name__ for f in factory('testing').before_request_funcs[None]]
+        assert names.index('_start_request_timer') < names.index('_check_idempotency_key') < names.index('_admit_request')
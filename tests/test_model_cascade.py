@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+模型级联测试脚本
+验证快速模型结果可信时直接采用，置信度不足、解析失败或调用出错时升级到 plus 模型，并记录各层级的结果
+"""
+
+import os
+import sys
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import image_recognition_service
+from services.image_recognition_service import ImageRecognitionService, cascade_escalation_reason, VL_MODEL
+from utils.metrics import VL_CASCADE_RESULTS, VL_CASCADE_LATENCY
+
+
+def _item(confidence):
+    return {'type': '上衣', 'color': '白色', 'confidence': confidence}
+
+
+def test_escalation_reason():
+    """
+    测试升级条件：解析失败、衣物数量不足、置信度低于阈值或缺失
+    """
+    assert cascade_escalation_reason({'clothing_items': [_item(0.9), _item(0.85)]}, 0.8, 1) is None
+    assert cascade_escalation_reason({'clothing_items': [], 'raw_response': '...'}, 0.8, 1) == 'parse_error'
+    assert cascade_escalation_reason({'clothing_items': [_item(0.9)]}, 0.8, 2) == 'too_few_items'
+    assert cascade_escalation_reason({'clothing_items': [_item(0.9), _item(0.6)]}, 0.8, 1) == 'low_confidence'
+    assert cascade_escalation_reason({'clothing_items': [{'type': '上衣'}]}, 0.8, 1) == 'low_confidence'
+
+
+def test_cascade_escalates_only_when_needed(monkeypatch):
+    """
+    测试快速模型结果可信时只调用一次；置信度不足或快速模型出错时再调用 plus 模型
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    fast_results = [{'clothing_items': [_item(0.95)]}, {'clothing_items': [_item(0.3)]}, RuntimeError('model not found')]
+    calls = []
+
+    def fake_complete(self, messages, model):
+        calls.append(model)
+        if model == VL_MODEL:
+            return {'clothing_items': [_item(0.99)], 'overall_style': 'plus'}
+        result = fast_results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(ImageRecognitionService, '_complete', fake_complete)
+    service = ImageRecognitionService({'VL_CASCADE': True})
+    accepted = VL_CASCADE_RESULTS.value('fast', 'accepted')
+    escalated = VL_CASCADE_RESULTS.value('fast', 'escalated_low_confidence')
+    plus_count = VL_CASCADE_LATENCY.count('plus')
+
+    assert service.analyze_image('https://example.com/a.jpg')['clothing_items'][0]['confidence'] == 0.95
+    assert len(calls) == 1
+    assert service.analyze_image('https://example.com/b.jpg')['overall_style'] == 'plus'
+    assert service.analyze_image('https://example.com/c.jpg')['overall_style'] == 'plus'
+    assert calls[1:] == [image_recognition_service.VL_FAST_MODEL, VL_MODEL] * 2
+
+    assert VL_CASCADE_RESULTS.value('fast', 'accepted') == accepted + 1
+    assert VL_CASCADE_RESULTS.value('fast', 'escalated_low_confidence') == escalated + 1
+    assert VL_CASCADE_LATENCY.count('plus') == plus_count + 2
+
+
+def test_cascade_async(monkeypatch):
+    """
+    测试异步版本的级联与同步版本一致
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    calls = []
+
+    async def fake_complete_async(self, messages, model):
+        calls.append(model)
+        return {'clothing_items': [], 'raw_response': 'not json'} if model != VL_MODEL else {'clothing_items': [_item(0.9)]}
+
+    monkeypatch.setattr(ImageRecognitionService, '_complete_async', fake_complete_async)
+    result = asyncio.run(ImageRecognitionService({'VL_CASCADE': True}).analyze_image_async('https://example.com/a.jpg'))
+    assert result == {'clothing_items': [_item(0.9)]}
+    assert calls == [image_recognition_service.VL_FAST_MODEL, VL_MODEL]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+OSS直传服务测试脚本
+验证直传策略签发、对象Key校验和对象内容哈希校验逻辑（不访问真实OSS）
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import base64
+import calendar
+import hashlib
+from io import BytesIO
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from utils import cache
+from utils.metrics import UPSTREAM_REQUESTS
+from services.oss_service import OssService
+
+CONTENT_HASH = hashlib.sha256(b'fake image bytes').hexdigest()
+
+
+OSS_CONFIG = {
+    'ALIYUN_OSS_ACCESS_KEY_ID': 'test-id',
+    'ALIYUN_OSS_ACCESS_KEY_SECRET': 'test-secret',
+    'ALIYUN_OSS_BUCKET_NAME': 'fashion-bucket',
+    'ALIYUN_OSS_ENDPOINT': 'oss-cn-beijing.aliyuncs.com'
+}
+
+
+def _make_service():
+    return OssService(OSS_CONFIG)
+
+
+class FakeBucket:
+    """内存中的 Bucket，记录完整读取对象的次数"""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.reads = 0
+
+    def object_exists(self, key):
+        return key in self.objects
+
+    def head_object(self, key):
+        return SimpleNamespace(etag=hashlib.md5(self.objects[key]).hexdigest().upper())
+
+    def get_object(self, key, byte_range=None):
+        if byte_range is not None:
+            return BytesIO(self.objects[key][byte_range[0]:byte_range[1] + 1])
+        self.reads += 1
+        return BytesIO(self.objects[key])
+
+    def delete_object(self, key):
+        del self.objects[key]
+
+
+def test_post_policy_is_signed_and_scoped_to_key():
+    """
+    测试签发的策略限定了对象Key且签名正确
+    """
+    service = _make_service()
+    policy = service.create_post_policy(CONTENT_HASH, 'JPG')
+
+    assert policy['key'] == f"uploads/{CONTENT_HASH[:2]}/{CONTENT_HASH}.jpg"
+    assert policy['host'] == 'https://fashion-bucket.oss-cn-beijing.aliyuncs.com'
+
+    fields = policy['fields']
+    expected = base64.b64encode(
+        hmac.new(b'test-secret', fields['policy'].encode('utf-8'), hashlib.sha1).digest()
+    ).decode('utf-8')
+    assert fields['Signature'] == expected
+    assert fields['Content-Type'] == 'image/jpeg'
+
+    # 过期时间与主机时区无关
+    policy_dict = json.loads(base64.b64decode(fields['policy']))
+    assert abs(policy['expire'] - time.time() - service.policy_expire_seconds) < 5
+    assert calendar.timegm(time.strptime(policy_dict['expiration'], '%Y-%m-%dT%H:%M:%S.000Z')) == policy['expire']
+    conditions = policy_dict['conditions']
+    assert ['eq', '$key', policy['key']] in conditions
+    # 已存在的对象不能被覆盖
+    assert ['eq', '$x-oss-forbid-overwrite', 'true'] in conditions and fields['x-oss-forbid-overwrite'] == 'true'
+
+
+def test_invalid_hash_or_extension_is_rejected():
+    """
+    测试非法哈希和扩展名会被拒绝
+    """
+    service = _make_service()
+    for content_hash, extension in [('not-a-hash', 'jpg'), (CONTENT_HASH, 'pdf')]:
+        try:
+            service.create_post_policy(content_hash, extension)
+        except ValueError:
+            continue
+        raise AssertionError(f'{content_hash}.{extension} should be rejected')
+
+
+def test_direct_upload_key_validation():
+    """
+    测试只有本服务签发格式的Key才能登记
+    """
+    service = _make_service()
+    key = service.build_object_key(CONTENT_HASH, 'png')
+
+    assert service.is_direct_upload_key(key)
+    assert not service.is_direct_upload_key('temp/123_model.png')
+    assert not service.is_direct_upload_key(f"uploads/zz/{CONTENT_HASH}.png")
+    assert not service.is_direct_upload_key(f"uploads/{CONTENT_HASH[:2]}/{CONTENT_HASH}.exe")
+
+
+def test_verify_object_content_hash():
+    """
+    测试对象内容与Key中的哈希一致时校验通过且按ETag缓存（OSS调用记录上游指标）；内容被替换后重新校验，不一致时删除对象
+    """
+    cache.reset()
+    service = _make_service()
+    key = service.build_object_key(CONTENT_HASH, 'jpg')
+    service._bucket = bucket = FakeBucket({key: b'fake image bytes'})
+
+    gets = UPSTREAM_REQUESTS.value('oss', 'get', 200)
+    assert service.verify_object(key) and service.verify_object(key)
+    assert bucket.reads == 1 and UPSTREAM_REQUESTS.value('oss', 'get', 200) == gets + 1
+    assert service.is_verified(key)
+
+    bucket.objects[key] = b'someone else\'s content'
+    assert not service.is_verified(key)
+    assert not service.verify_object(key)
+    assert key not in bucket.objects
+
+
+def test_unverified_object_is_not_registered(monkeypatch, tmp_path):
+    """
+    测试内容与Key不一致的直传对象不能登记，也不会让之后的上传跳过上传；/oss/complete 校验通过后策略接口才返回 exists
+    """
+    import io
+    from PIL import Image
+
+    cache.reset()
+    image = io.BytesIO()
+    Image.new('RGB', (8, 8), 'white').save(image, 'PNG')
+    content = image.getvalue()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    app = create_app('testing')
+    app.config.update(OSS_CONFIG, UPLOAD_FOLDER=str(tmp_path))
+    service = _make_service()
+    key = service.build_object_key(content_hash, 'png')
+    bucket = FakeBucket({key: b'\x89PNG\r\n\x1a\n' + content[8:-1] + b'!'})
+    monkeypatch.setattr(OssService, 'bucket', property(lambda self: bucket))
+    client = app.test_client()
+
+    policy = client.post('/api/oss/policy', json={'content_hash': content_hash, 'extension': 'png'}).get_json()
+    # 策略接口不下载对象校验，只有 /oss/complete 校验
+    assert policy['exists'] is False and bucket.reads == 0 and key in bucket.objects
+
+    bucket.objects[key] = content[:-1] + b'!'
+    response = client.post('/api/oss/complete', json={'key': key, 'kind': 'garment'})
+    assert response.status_code == 400 and key not in bucket.objects
+
+    bucket.objects[key] = content
+    assert client.post('/api/oss/complete', json={'key': key, 'kind': 'garment'}).get_json()['success']
+    assert client.post('/api/oss/policy', json={'content_hash': content_hash, 'extension': 'png'}).get_json()['exists']
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+请求剖析测试脚本
+验证令牌校验、单个请求的剖析结果落盘以及索引接口
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from utils import profiler
+
+
+def _make_app(tmp_path, enabled=True):
+    app = create_app('testing')
+    app.config.update(PROFILER_ENABLED=enabled, PROFILER_SECRET='test-secret', PROFILE_FOLDER=str(tmp_path))
+    profiler.init_app(app)
+    return app
+
+
+def test_token_signature_and_expiry():
+    """
+    测试令牌签名校验和过期判断
+    """
+    token = profiler.make_token('test-secret', ttl=60, now=1000)
+    assert profiler.verify_token('test-secret', token, now=1030)
+    assert not profiler.verify_token('test-secret', token, now=1100)
+    assert not profiler.verify_token('other-secret', token, now=1030)
+    assert not profiler.verify_token('', token, now=1030)
+    assert not profiler.verify_token('test-secret', token[:-1] + '0', now=1030)
+
+
+def test_signed_request_is_profiled(tmp_path):
+    """
+    测试带令牌的请求保存 pstats 与折叠栈文件，并出现在索引中
+    """
+    app = _make_app(tmp_path)
+    client = app.test_client()
+    token = profiler.make_token('test-secret')
+
+    # 不带令牌时不剖析
+    res = client.post('/api/try-on', json={})
+    assert 'X-Profile-Id' not in res.headers
+
+    res = client.post('/api/try-on', json={}, headers={profiler.TOKEN_HEADER: token})
+    assert res.status_code == 400
+    profile_id = res.headers['X-Profile-Id']
+    assert os.path.exists(tmp_path / f'{profile_id}.pstats')
+    assert os.path.exists(tmp_path / f'{profile_id}.collapsed')
+
+    assert client.get('/api/profiles').status_code == 403
+    index = client.get('/api/profiles', query_string={'_profile': token}).get_json()
+    assert index['profiles'][0]['id'] == profile_id
+    assert index['profiles'][0]['endpoint'] == 'api.try_on'
+
+    res = client.get(f'/api/profiles/{profile_id}.pstats', headers={profiler.TOKEN_HEADER: token})
+    assert res.status_code == 200
+
+
+def test_disabled_profiler_leaves_views_untouched(tmp_path):
+    """
+    测试未开启时视图函数不被包装，索引接口不可访问
+    """
+    app = _make_app(tmp_path, enabled=False)
+    assert 'request_profiler' not in app.extensions
+    assert not hasattr(app.view_functions['api.try_on'], '__wrapped__')
+    client = app.test_client()
+    assert client.get('/api/profiles', headers={profiler.TOKEN_HEADER: profiler.make_token('test-secret')}).status_code == 404
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+本地推荐测试脚本
+验证天气分档、体型和肤色规则生成的推荐，模型没有给出推荐时本地补全，以及本地推荐模式
+"""
+
+import os
+import sys
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recommendation_service import recommend
+from services.result_models import AnalysisResult, Weather
+from services.image_recognition_service import ImageRecognitionService
+from utils.metrics import RECOMMENDATIONS
+
+ITEMS = [{'type': '下装', 'color': '雾霾蓝'}, {'type': '上衣', 'color': '浅灰'}]
+FEATURES = {'body_type': '梨形身材', 'height_proportion': '上身偏长', 'skin_tone': '暖黄皮', 'posture': '挺拔'}
+
+
+def test_rules():
+    """
+    测试按体感温度分档并按湿度和天气现象补充，体型和身高比例规则，按肤色和上衣颜色配色；缺少数据时也能给出推荐
+    """
+    result = recommend(ITEMS, FEATURES, Weather(temp='12', text='小雨', feels_like='8', humidity='85'), '休闲')
+    assert set(result) == {'weather_advice', 'style_advice', 'color_advice', 'outfit_suggestion'}
+    assert result['weather_advice'].startswith('体感较冷')
+    assert '体感比气温低4°C' in result['weather_advice'] and '湿冷' in result['weather_advice']
+    assert '有雨' in result['weather_advice'] and result['outfit_suggestion'].endswith('防水短靴')
+    assert '弱化胯部' in result['style_advice'] and '提高腰线' in result['style_advice']
+    assert '乐福鞋' in result['style_advice']
+    # 暖色调肤色靠近脸部避免灰色（上衣优先于下装）
+    assert result['color_advice'].startswith('暖色调肤色') and '浅灰靠近脸部' in result['color_advice']
+    assert result['outfit_suggestion'] == '米色针织衫+藏青色呢大衣+棕色A字裙+防水短靴'
+
+    hot = recommend([{'type': '上衣', 'color': '雾霾蓝'}], {'skin_tone': '冷白'}, {'temp': '33', 'text': '晴'})
+    assert hot['weather_advice'].startswith('体感炎热') and '防晒外套' in hot['weather_advice']
+    assert '雾霾蓝上衣可以搭配白色或卡其色' in hot['color_advice']
+    assert hot['outfit_suggestion'] == '白色棉麻短袖+藏青色高腰直筒裤+凉鞋'
+
+    empty = recommend(None, None, {'text': '多云'})
+    assert empty['weather_advice'] == '' and empty['color_advice'].startswith('中性肤色')
+
+
+def test_fallback_when_model_gives_none(monkeypatch):
+    """
+    测试模型没有给出推荐（JSON解析失败）时用本地规则补全，模型给出的推荐原样保留，没有天气时不生成推荐
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    outputs = {
+        'https://example.com/broken.jpg': {'clothing_items': [], 'body_features': {}, 'overall_style': '',
+                                           'recommendation': {}, 'raw_response': 'not json'},
+        'https://example.com/good.jpg': {'clothing_items': ITEMS, 'body_features': FEATURES,
+                                         'recommendation': {'weather_advice': '模型的建议'}},
+    }
+    monkeypatch.setattr(ImageRecognitionService, '_complete',
+                        lambda self, messages, model: AnalysisResult.from_dict(outputs[messages[1]['content'][1]['image_url']['url']]))
+    service = ImageRecognitionService()
+    service.recommendation_mode = 'model'
+    weather = {'temp': '20', 'text': '阴', 'feels_like': '20', 'humidity': '50'}
+    local, model = RECOMMENDATIONS.value('local_fallback'), RECOMMENDATIONS.value('model')
+
+    broken = service.analyze_image('https://example.com/broken.jpg', weather)
+    assert broken['recommendation']['weather_advice'].startswith('体感舒适') and 'raw_response' in broken
+    assert service.analyze_image('https://example.com/good.jpg', weather)['recommendation'] == {'weather_advice': '模型的建议'}
+    assert service.analyze_image('https://example.com/broken.jpg')['recommendation'] == {}
+    assert RECOMMENDATIONS.value('local_fallback') == local + 1 and RECOMMENDATIONS.value('model') == model + 1
+
+
+def test_local_mode(monkeypatch):
+    """
+    测试本地推荐模式：请求中不带天气，推荐总是由本地规则生成（异步版本相同）
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    sent = []
+
+    async def fake_complete_async(self, messages, model):
+        sent.append(messages[1]['content'][0]['text'])
+        return AnalysisResult(clothing_items=ITEMS, body_features=FEATURES, recommendation={})
+
+    monkeypatch.setattr(ImageRecognitionService, '_complete_async', fake_complete_async)
+    service = ImageRecognitionService()
+    service.recommendation_mode = 'local'
+    weather = Weather(temp='-3', text='小雪', feels_like='-8', humidity='40')
+
+    result = asyncio.run(service.analyze_image_async('https://example.com/a.jpg', weather))
+    assert '当前天气' not in sent[0]
+    assert result['recommendation']['weather_advice'].startswith('体感寒冷')
+    assert result['recommendation']['outfit_suggestion'].endswith('防滑雪地靴')
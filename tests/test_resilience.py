@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+熔断与重试测试脚本
+验证熔断器的打开、半开探测和恢复，可重试错误的判断，以及熔断时天气、图像分析和试穿的降级结果
+"""
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, is_transient_error
+from utils.metrics import CIRCUIT_REJECTED
+from services.weather_service import WeatherService
+from services.image_recognition_service import ImageRecognitionService
+from services.virtual_tryon_service import VirtualTryonService
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    resilience.reset()
+    monkeypatch.setattr(resilience, '_backoff', lambda settings, attempt: 0)
+    yield
+    resilience.reset()
+
+
+def _open(upstream):
+    breaker = resilience.get_breaker(upstream)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_and_recovers():
+    """
+    测试连续失败达到阈值后熔断，到期后只放行一个探测请求，探测成功后恢复
+    """
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=10)
+    breaker.record_failure(now=100)
+    breaker.before_call(now=100)
+    breaker.record_failure(now=100)
+    assert breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call(now=105)
+    assert info.value.retry_after_header == '5'
+
+    breaker.before_call(now=111)
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(now=111)
+
+    # 探测失败重新熔断，探测成功恢复
+    breaker.record_failure(now=111)
+    assert breaker.state == 'open'
+    breaker.before_call(now=122)
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_retry_only_transient_failures():
+    """
+    测试 5xx 响应和连接错误按策略重试，4xx 等其他错误直接抛出且不计入熔断
+    """
+    responses = [SimpleNamespace(status_code=503), SimpleNamespace(status_code=200)]
+    assert resilience.call('qweather', lambda: responses.pop(0)).status_code == 200
+    assert resilience.get_breaker('qweather').failures == 0
+
+    calls = []
+
+    def refused():
+        calls.append(1)
+        raise ConnectionRefusedError()
+
+    with pytest.raises(ConnectionRefusedError):
+        resilience.call('oss', refused)
+    assert len(calls) == 1 + resilience.policy('oss')['retries']
+
+    with pytest.raises(UpstreamError):
+        resilience.call('dashscope_tryon', lambda: (_ for _ in ()).throw(UpstreamError(400)))
+    assert resilience.get_breaker('dashscope_tryon').failures == 0
+
+    assert is_transient_error(UpstreamError(429)) and is_transient_error(TimeoutError())
+    assert not is_transient_error(UpstreamError(404)) and not is_transient_error(ValueError())
+
+
+def test_weather_degrades_when_open(monkeypatch):
+    """
+    测试和风天气熔断时不发出请求，直接返回None / 空列表
+    """
+    _open('qweather')
+    weather = WeatherService({'QWEATHER_API_KEY': 'test-key', 'QWEATHER_API_HOST': 'http://127.0.0.1:9'})
+    monkeypatch.setattr(weather, '_get', lambda *args: pytest.fail('request sent while circuit is open'))
+
+    rejected = CIRCUIT_REJECTED.value('qweather')
+    assert weather.get_weather_now('101010100') is None
+    assert weather.search_city('北京') == []
+    assert CIRCUIT_REJECTED.value('qweather') == rejected + 2
+
+
+def test_analysis_served_from_recent_results(monkeypatch):
+    """
+    测试千问VL熔断时返回同一张图片最近的分析结果，没有结果时抛出 CircuitOpenError
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    service = ImageRecognitionService()
+    content = json.dumps({'clothing_items': [{'type': '上衣', 'color': '白色'}], 'overall_style': '休闲'})
+    completion = SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    service.pool = SimpleNamespace(call=lambda request: completion)
+
+    url = 'https://example.com/recent.jpg'
+    assert 'from_cache' not in service.analyze_image(url)
+
+    _open('qwen_vl')
+    cached = service.analyze_image(url)
+    assert cached['from_cache'] is True and cached['overall_style'] == '休闲'
+    with pytest.raises(CircuitOpenError):
+        service.analyze_image('https://example.com/unseen.jpg')
+
+
+def test_tryon_returns_retry_after_when_open(monkeypatch):
+    """
+    测试试穿接口熔断时返回带 retry_after 的失败结果，不提交任务
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    _open('dashscope_tryon')
+    result = VirtualTryonService().check_task_status('task-1')
+    assert result['success'] is False and int(result['retry_after']) >= 1
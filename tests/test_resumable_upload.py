@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+断点续传测试脚本
+通过测试客户端验证 创建 → 分片 → 查询进度 → 完成 的完整流程
+"""
+
+import os
+import io
+import sys
+import time
+import base64
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+
+
+def _make_client(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['RESUMABLE_UPLOAD_FOLDER'] = str(tmp_path / '.resumable')
+    return app.test_client()
+
+
+def _make_jpeg(size=(600, 400)):
+    """生成一张随机噪点JPEG，保证文件足够大以便分片"""
+    img = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def _patch(client, location, offset, data):
+    return client.patch(location, data=data, headers={
+        'Upload-Offset': str(offset),
+        'Content-Type': 'application/offset+octet-stream'
+    })
+
+
+def test_resumable_upload_flow(tmp_path):
+    """
+    测试分片上传、断线后查询进度续传以及完成合并
+    """
+    client = _make_client(tmp_path)
+    payload = _make_jpeg()
+    assert len(payload) > 100000
+
+    res = client.post('/api/uploads', headers={
+        'Upload-Length': str(len(payload)),
+        'Upload-Metadata': 'filename ' + base64.b64encode(b'shirt.jpg').decode()
+    })
+    assert res.status_code == 201
+    location = res.headers['Location']
+
+    res = _patch(client, location, 0, payload[:70000])
+    assert res.status_code == 204
+    assert res.headers['Upload-Offset'] == '70000'
+
+    # 偏移量不一致时拒绝写入
+    assert _patch(client, location, 0, payload[:10]).status_code == 409
+
+    # 未完成时不能合并
+    assert client.post(location + '/finalize', json={'kind': 'garment'}).status_code == 409
+
+    res = client.head(location)
+    offset = int(res.headers['Upload-Offset'])
+    assert _patch(client, location, offset, payload[offset:]).status_code == 204
+
+    res = client.post(location + '/finalize', json={'kind': 'garment'})
+    data = res.get_json()
+    assert data['success']
+    with open(data['file_path'], 'rb') as f:
+        assert f.read() == payload
+
+    # 完成后上传记录被清理
+    assert client.head(location).status_code == 404
+
+
+def test_chunk_beyond_declared_length_is_rejected(tmp_path):
+    """
+    测试超出声明长度的分片会被拒绝且不改变进度
+    """
+    client = _make_client(tmp_path)
+    res = client.post('/api/uploads', headers={'Upload-Length': '10'})
+    location = res.headers['Location']
+
+    assert _patch(client, location, 0, b'x' * 11).status_code == 413
+    assert client.head(location).headers['Upload-Offset'] == '0'
+
+
+def test_disguised_file_is_rejected_on_first_chunk(tmp_path):
+    """
+    测试伪装成图片的文件在首个分片到达时即被拒绝
+    """
+    client = _make_client(tmp_path)
+    payload = b'%PDF-1.7\n' + os.urandom(4096)
+    res = client.post('/api/uploads', headers={
+        'Upload-Length': str(len(payload)),
+        'Upload-Metadata': 'filename ' + base64.b64encode(b'photo.jpg').decode()
+    })
+    location = res.headers['Location']
+
+    assert _patch(client, location, 0, payload[:1024]).status_code == 415
+    assert client.head(location).status_code == 404
+
+
+def test_model_finalize_keeps_extension_of_chinese_name(tmp_path, monkeypatch):
+    """
+    测试中文文件名的人物照片合并后保留扩展名（secure_filename('模特.jpg') 只剩 'jpg'）
+    """
+    import api_routes
+    saved = []
+    monkeypatch.setattr(api_routes, '_process_model_upload',
+                        lambda file_path, location_id: saved.append(file_path) or ('', 200))
+    client = _make_client(tmp_path)
+    payload = _make_jpeg((64, 64))
+    res = client.post('/api/uploads', headers={
+        'Upload-Length': str(len(payload)),
+        'Upload-Metadata': 'filename ' + base64.b64encode('模特.jpg'.encode('utf-8')).decode()
+    })
+    location = res.headers['Location']
+    assert _patch(client, location, 0, payload).status_code == 204
+
+    assert client.post(location + '/finalize', json={'kind': 'model'}).status_code == 200
+    assert saved and saved[0].endswith('.jpg') and os.path.exists(saved[0])
+
+
+def test_expired_uploads_are_swept_by_last_chunk(tmp_path):
+    """
+    测试过期清理按上传ID以最后一次收到分片的时间为准，元数据和数据一起删除，且清理有最小间隔
+    """
+    from utils.resumable_upload import ResumableUploadStore
+
+    store = ResumableUploadStore(str(tmp_path), 1024, expire_seconds=100, sweep_interval=600)
+    stale, active = store.create(10), store.create(10)
+    old = time.time() - 1000
+    for upload_id in (stale, active):
+        os.utime(store._meta_path(upload_id), (old, old))
+    os.utime(store._part_path(stale), (old, old))
+    # active 刚收到分片：.part 的修改时间是新的
+    store.append(active, 0, io.BytesIO(b'abc'))
+
+    # 距上次清理不足间隔时不遍历目录
+    assert not store.maybe_cleanup_expired()
+    assert os.path.exists(store._meta_path(stale))
+
+    os.utime(os.path.join(str(tmp_path), store.SWEEP_MARKER), (old, old))
+    assert store.maybe_cleanup_expired()
+    assert not os.path.exists(store._meta_path(stale)) and not os.path.exists(store._part_path(stale))
+    assert store.get_info(active)['offset'] == 3
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+上游流量录制/回放测试脚本
+对本地桩服务录制天气和图像识别请求，验证录制文件已脱敏，且关闭桩服务后可以离线回放
+"""
+
+import os
+import sys
+import json
+import glob
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 添加项目根目录和压测目录到Python路径
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'benchmarks'))
+
+from stubs import StubUpstreams, StubConfig
+from services.weather_service import WeatherService
+from services.image_recognition_service import ImageRecognitionService
+from utils import upstream_cassette
+
+
+def test_record_then_replay(tmp_path, monkeypatch):
+    """
+    测试录制内容不含密钥，回放时不访问网络并返回与录制一致的结果
+    """
+    fast = [f'{name}=fixed:0.05' for name in ('chat', 'tryon', 'qweather', 'oss')]
+    stubs = StubUpstreams(StubConfig.parse(fast)).start()
+    env = stubs.app_env()
+    monkeypatch.setenv('DASHSCOPE_API_KEY', env['DASHSCOPE_API_KEY'])
+    monkeypatch.setenv('DASHSCOPE_COMPATIBLE_BASE_URL', env['DASHSCOPE_COMPATIBLE_BASE_URL'])
+    secrets = [env['QWEATHER_API_KEY'], env['DASHSCOPE_API_KEY']]
+
+    try:
+        upstream_cassette.install('record', str(tmp_path), secrets=secrets)
+        weather = WeatherService(env).get_weather_now('101010100')
+        analysis = ImageRecognitionService().analyze_image('https://example.com/look.jpg')
+    finally:
+        upstream_cassette.uninstall()
+        stubs.stop()
+
+    recorded = ''.join(open(p, encoding='utf-8').read() for p in glob.glob(str(tmp_path / '*.jsonl')))
+    entries = [json.loads(line) for line in recorded.splitlines()]
+    assert len(entries) == 2
+    assert all(entry['elapsed'] >= 0.05 for entry in entries)
+    for secret in secrets:
+        assert secret not in recorded
+
+    try:
+        player = upstream_cassette.install('replay', str(tmp_path), time_scale=0, secrets=secrets)
+        assert WeatherService(env).get_weather_now('101010100') == weather
+        assert ImageRecognitionService().analyze_image('https://example.com/look.jpg') == analysis
+        # 没有录制的请求按连接失败处理
+        assert WeatherService(env).search_city('北京') == []
+        assert player.match('GET', env['QWEATHER_API_HOST'] + '/v7/weather/now?location=1&key=other')
+    finally:
+        upstream_cassette.uninstall()
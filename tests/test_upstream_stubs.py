@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+上游桩服务测试脚本
+验证压测用的桩服务能被服务层直接调用，以及延迟分布和错误注入配置
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 添加项目根目录和压测目录到Python路径
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'benchmarks'))
+
+from stubs import StubUpstreams, StubConfig, LatencyDistribution
+from utils import cache, resilience
+from services.weather_service import WeatherService
+from services.image_recognition_service import ImageRecognitionService
+
+
+def test_latency_distribution_parse():
+    """
+    测试延迟分布解析，非法格式报错
+    """
+    assert LatencyDistribution.parse('fixed:0.25').sample() == 0.25
+    assert 0.1 <= LatencyDistribution.parse('uniform:0.1,0.2').sample() <= 0.2
+    assert LatencyDistribution.parse('lognormal:0.5,0.3').sample() > 0
+    for spec in ('fixed', 'uniform:0.1', 'normal:1,2'):
+        with pytest.raises(ValueError):
+            LatencyDistribution.parse(spec)
+
+    config = StubConfig.parse(['chat=fixed:0'], ['qweather=0.5'])
+    assert str(config.latencies['chat']) == 'fixed:0.0'
+    assert config.error_rates['qweather'] == 0.5
+
+
+def test_services_against_stubs(monkeypatch):
+    """
+    测试天气和图像识别服务指向桩服务后可以正常解析响应，错误率为1时返回上游错误
+    """
+    fast = [f'{name}=fixed:0' for name in ('chat', 'tryon', 'qweather', 'oss')]
+    stubs = StubUpstreams(StubConfig.parse(fast)).start()
+    try:
+        env = stubs.app_env()
+        weather = WeatherService(env)
+        assert weather.search_city('北京')[0]['id'] == '101010100'
+        assert weather.get_weather_now('101010100')['temp'] == '22'
+
+        monkeypatch.setenv('DASHSCOPE_API_KEY', env['DASHSCOPE_API_KEY'])
+        monkeypatch.setenv('DASHSCOPE_COMPATIBLE_BASE_URL', env['DASHSCOPE_COMPATIBLE_BASE_URL'])
+        result = ImageRecognitionService().analyze_image('https://example.com/look.jpg')
+        assert 'clothing_items' in result
+
+        # 503 按和风天气的策略重试（先清空缓存，确保请求发送到上游）
+        cache.reset()
+        stubs.stubs['qweather'].error_rate = 1.0
+        assert weather.get_weather_now('101010100') is None
+        assert stubs.counters()['qweather']['errors'] == 1 + resilience.policy('qweather')['retries']
+    finally:
+        stubs.stop()
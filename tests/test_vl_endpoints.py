@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+VL端点池测试脚本
+验证对冲请求、失败切换端点、按健康度排序，以及异步模式下取消输掉的请求
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import vl_endpoints
+from services.vl_endpoints import Endpoint, EndpointPool, parse_endpoints
+from utils.metrics import VL_ENDPOINT_ATTEMPTS
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(vl_endpoints, 'HEDGE_INITIAL_DELAY', 0.05)
+    monkeypatch.setattr(vl_endpoints, 'HEDGE_MIN_DELAY', 0.01)
+
+
+def test_slow_primary_is_hedged():
+    """
+    测试主请求在调用线程中执行，超过对冲等待时间后在线程池中向备用端点发出请求，
+    主请求失败时直接使用已发出的对冲请求的结果，不再从头等待一次
+    """
+    pool = EndpointPool([Endpoint('beijing', 'https://a'), Endpoint('intl', 'https://b')])
+    threads = {}
+
+    def request(endpoint):
+        threads[endpoint.name] = threading.current_thread()
+        if endpoint.name == 'beijing':
+            time.sleep(0.3)
+            raise UpstreamError(503)
+        time.sleep(0.2)
+        return endpoint.name
+
+    start = time.monotonic()
+    assert pool.call(request) == 'intl'
+    assert time.monotonic() - start < 0.45
+    assert threads['beijing'] is threading.current_thread()
+    assert threads['intl'] is not threading.current_thread()
+
+
+def test_hedges_are_bounded():
+    """
+    测试在途的对冲请求达到上限时不再对冲（不排队），主请求成功时已发出的对冲请求被放弃
+    """
+    def request(endpoint):
+        time.sleep(0.1 if endpoint.name == 'beijing' else 0.2)
+        return endpoint.name
+
+    skipped = VL_ENDPOINT_ATTEMPTS.value('intl', 'hedge', 'skipped')
+    pool = EndpointPool([Endpoint('beijing', 'https://a'), Endpoint('intl', 'https://b')], max_hedge_workers=0)
+    assert pool.call(request) == 'beijing'
+    assert VL_ENDPOINT_ATTEMPTS.value('intl', 'hedge', 'skipped') == skipped + 1
+
+    abandoned = VL_ENDPOINT_ATTEMPTS.value('intl', 'hedge', 'abandoned')
+    pool = EndpointPool([Endpoint('beijing', 'https://a'), Endpoint('intl', 'https://b')], max_hedge_workers=1)
+    assert pool.call(request) == 'beijing'
+    assert VL_ENDPOINT_ATTEMPTS.value('intl', 'hedge', 'abandoned') == abandoned + 1
+
+
+def test_failover_and_health_ranking():
+    """
+    测试可重试的错误立即切换端点并降低健康度；4xx 直接抛出，不切换端点
+    """
+    pool = EndpointPool([Endpoint('beijing', 'https://a'), Endpoint('intl', 'https://b')])
+
+    def request(endpoint):
+        if endpoint.name == 'beijing':
+            raise UpstreamError(503)
+        return endpoint.name
+
+    assert pool.call(request) == 'intl'
+    assert [e.name for e in pool.ranked()] == ['intl', 'beijing']
+
+    def bad_request(endpoint):
+        raise UpstreamError(400)
+
+    with pytest.raises(UpstreamError):
+        pool.call(bad_request)
+    assert pool.endpoints[1].consecutive_failures == 0
+
+
+def test_async_loser_is_cancelled():
+    """
+    测试异步模式下备用端点先返回后，主端点的请求被取消
+    """
+    pool = EndpointPool([Endpoint('beijing', 'https://a'), Endpoint('intl', 'https://b')])
+    cancelled = []
+
+    async def request(endpoint):
+        try:
+            await asyncio.sleep(1.0 if endpoint.name == 'beijing' else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(endpoint.name)
+            raise
+        return endpoint.name
+
+    async def run():
+        result = await pool.call_async(request)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == 'intl'
+    assert cancelled == ['beijing']
+    # 被取消的请求已等待的时间计入耗时样本
+    assert pool.endpoints[0].ewma is not None
+
+
+def test_parse_endpoints(monkeypatch):
+    """
+    测试端点配置解析和按地域读取密钥
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY_INTL', 'intl-key')
+    endpoints = parse_endpoints('beijing=https://a/v1/, intl=https://b/v1')
+    assert [(e.name, e.base_url, e.api_key) for e in endpoints] == [
+        ('beijing', 'https://a/v1', None), ('intl', 'https://b/v1', 'intl-key')]
+    assert [e.base_url for e in parse_endpoints('', 'https://default')] == ['https://default']
+    with pytest.raises(ValueError):
+        parse_endpoints('https://missing-name')
+
+
+def test_clients_do_not_retry(monkeypatch):
+    """
+    测试各端点的同步和异步客户端不使用SDK自带的重试，失败立即交给端点池切换端点
+    """
+    from services.image_recognition_service import ImageRecognitionService
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    service = ImageRecognitionService()
+    endpoint = Endpoint('beijing', 'https://a/v1')
+    assert service._client_for(endpoint).max_retries == 0
+    assert service._async_client_for(endpoint).max_retries == 0
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+VL提示词与输出格式测试脚本
+验证码表编码展开为完整格式、未知取值原样保留，固定的系统消息前缀，以及缓存命中的token统计
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vl_schema import expand_compact, COMPACT_SYSTEM_PROMPT, CODEBOOK
+from services.image_recognition_service import ImageRecognitionService, FULL_SYSTEM_PROMPT
+from utils.metrics import LLM_TOKENS, record_token_usage
+
+
+def test_expand_compact_to_full_shape():
+    """
+    测试紧凑格式展开后与完整格式结构一致，置信度换算为0-1，码表外的取值原样保留
+    """
+    compact = {
+        'i': [{'t': 'T', 's': '圆领短袖', 'c': 'wh', 'm': 'co', 'b': '', 'p': 95},
+              {'t': 'B', 's': '阔腿裤', 'c': '雾霾蓝', 'm': 'dn', 'b': 'Levi\'s', 'p': 70}],
+        'f': {'bt': 'X', 'hp': '腿长', 'sk': '暖白', 'po': '挺拔'},
+        'st': 'CA',
+        'r': {'w': '带一件薄外套', 's': '高腰显腿长', 'c': '浅色提亮', 'o': '白T+牛仔阔腿裤'}
+    }
+    assert expand_compact(compact) == {
+        'clothing_items': [
+            {'type': '上衣', 'style': '圆领短袖', 'color': '白色', 'material': '棉', 'brand': '', 'confidence': 0.95},
+            {'type': '下装', 'style': '阔腿裤', 'color': '雾霾蓝', 'material': '牛仔', 'brand': 'Levi\'s', 'confidence': 0.7}
+        ],
+        'body_features': {'body_type': '沙漏形', 'height_proportion': '腿长', 'skin_tone': '暖白', 'posture': '挺拔'},
+        'overall_style': '休闲',
+        'recommendation': {'weather_advice': '带一件薄外套', 'style_advice': '高腰显腿长',
+                           'color_advice': '浅色提亮', 'outfit_suggestion': '白T+牛仔阔腿裤'}
+    }
+    # 完整格式和解析失败的结果原样返回
+    full = {'clothing_items': [], 'body_features': {}, 'overall_style': '', 'recommendation': {}, 'raw_response': 'x'}
+    assert expand_compact(full) is full
+
+
+def test_stable_system_prefix(monkeypatch):
+    """
+    测试系统消息固定不变（只随输出格式变化），天气和图片放在用户消息中；显式缓存时带 cache_control
+    """
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    service = ImageRecognitionService()
+    service.response_mode = 'compact'
+
+    plain = service._build_messages('https://example.com/a.jpg')
+    with_weather = service._build_messages('https://example.com/b.jpg', {'text': '晴', 'temp': '25'})
+    assert plain[0] == with_weather[0]
+    assert plain[0]['content'][0]['text'] == COMPACT_SYSTEM_PROMPT and CODEBOOK in COMPACT_SYSTEM_PROMPT
+    assert 'cache_control' not in plain[0]['content'][0]
+    assert '当前天气：晴，温度：25°C' in with_weather[1]['content'][0]['text']
+    assert with_weather[1]['content'][1]['image_url']['url'] == 'https://example.com/b.jpg'
+
+    service.response_mode = 'full'
+    assert service._build_messages('https://example.com/a.jpg')[0]['content'][0]['text'] == FULL_SYSTEM_PROMPT
+
+    service.context_cache = 'explicit'
+    assert service._build_messages('https://example.com/a.jpg')[0]['content'][0]['cache_control'] == {'type': 'ephemeral'}
+
+
+def test_cached_tokens_are_recorded():
+    """
+    测试 usage 中命中缓存和新建缓存的 token 数计入指标
+    """
+    usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=300,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1024, cache_creation_input_tokens=0))
+    before = LLM_TOKENS.value('test-model', 'cached')
+    record_token_usage('test-model', usage)
+    assert LLM_TOKENS.value('test-model', 'cached') == before + 1024
+    assert LLM_TOKENS.value('test-model', 'cache_creation') == 0
+
+
+def test_modes_are_read_from_app_config(monkeypatch):
+    """
+    测试输出格式、上下文缓存、推荐模式和级联设置从传入的应用配置读取，不同应用可以使用不同的设置
+    """
+    from app import create_app
+
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test-key')
+    app = create_app('testing')
+    app.config.update(VL_RESPONSE_MODE='compact', VL_CONTEXT_CACHE='explicit', VL_RECOMMENDATION_MODE='local',
+                      VL_CASCADE=True, VL_FAST_MODEL='fast-model', VL_CASCADE_MIN_ITEMS=2)
+    service = ImageRecognitionService(app.config)
+    assert (service.response_mode, service.context_cache, service.recommendation_mode) == ('compact', 'explicit', 'local')
+    assert service.cascade_enabled and service.fast_model == 'fast-model' and service.cascade_min_items == 2
+
+    default = ImageRecognitionService(create_app('testing').config)
+    assert (default.response_mode, default.recommendation_mode, default.cascade_enabled) == ('full', 'model', False)
@@ -7,17 +7,32 @@
 # 从各工具模块导入函数，方便外部直接调用
 from .file_utils import (
     allowed_file,
+    validate_uploaded_file,
     save_uploaded_file,
+    build_upload_path,
     get_file_extension,
     ensure_directory_exists,
     get_file_size
 )
+from .image_validation import ImageValidationError, validate_image_stream, validate_image_bytes
+from .resumable_upload import ResumableUploadStore, ResumableUploadError
+from .image_variants import get_variant, pick_variant_width, VARIANT_WIDTHS
 
 
 __all__ = [
     'allowed_file',
+    'validate_uploaded_file',
     'save_uploaded_file',
+    'build_upload_path',
     'get_file_extension',
     'ensure_directory_exists',
-    'get_file_size'
+    'get_file_size',
+    'ImageValidationError',
+    'validate_image_stream',
+    'validate_image_bytes',
+    'ResumableUploadStore',
+    'ResumableUploadError',
+    'get_variant',
+    'pick_variant_width',
+    'VARIANT_WIDTHS'
 ]
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+高成本接口的准入控制
+上传分析（千问VL）、虚拟试穿（图像合成）等接口在进入视图前需要通过两道检查：
+    1. 全局并发上限：同时处理中的上游密集型请求数不超过 ADMISSION_MAX_CONCURRENCY
+    2. 令牌桶：按 Session 和客户端IP 各一个桶，按接口扣除不同的令牌数（ADMISSION_COSTS），
+       两个桶都有足够令牌时才同时扣除
+任一检查不通过返回 429 和 Retry-After。
+
+后端可选：
+    - memory：进程内计数，gunicorn 的每个 worker 各自限流
+    - redis：使用 REDIS_URL，令牌桶和并发槽位由 Lua 脚本原子更新，所有 worker 共享限额；
+      Redis 不可用时放行请求（记录告警），不因限流组件故障拒绝服务
+"""
+
+import math
+import time
+import uuid
+import logging
+import threading
+
+from utils.metrics import ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# 并发槽位的集合名
+CONCURRENCY_KEY = 'concurrency'
+
+# Session 中保存限流ID的键（不依赖登录，首次访问高成本接口时生成）
+SESSION_ID_KEY = 'admission_id'
+
+
+class Bucket:
+    """令牌桶参数：capacity 为突发上限，rate 为每秒补充的令牌数"""
+
+    __slots__ = ('key', 'capacity', 'rate')
+
+    def __init__(self, key, capacity, rate):
+        self.key = key
+        self.capacity = capacity
+        self.rate = rate
+
+
+class MemoryBackend:
+    """进程内后端"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost, now=None):
+        """
+        从所有桶中扣除 cost 个令牌，任一桶不足时都不扣
+
+        Returns:
+            tuple: (需要等待的秒数, 等待最久的桶的下标)，已扣除时为 (0.0, None)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            levels = []
+            wait, limiting = 0.0, None
+            for index, bucket in enumerate(buckets):
+                tokens, updated = self._buckets.get(bucket.key, (bucket.capacity, now))
+                tokens = min(bucket.capacity, tokens + max(0.0, now - updated) * bucket.rate)
+                levels.append(tokens)
+                if tokens < cost and (cost - tokens) / bucket.rate > wait:
+                    wait, limiting = (cost - tokens) / bucket.rate, index
+            if limiting is not None:
+                return wait, limiting
+            for bucket, tokens in zip(buckets, levels):
+                self._buckets[bucket.key] = (tokens - cost, now)
+            self._prune(now)
+            return 0.0, None
+
+    def _prune(self, now, limit=10000):
+        # 桶数量过多时清理已回满的桶（回满的桶与不存在的桶等价）
+        if len(self._buckets) > limit:
+            self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < 3600}
+
+    def acquire_slot(self, limit, lease, now=None):
+        """
+        占用一个并发槽位
+
+        Returns:
+            str: 槽位ID，已满时返回None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._slots = {k: t for k, t in self._slots.items() if t > now - lease}
+            if len(self._slots) >= limit:
+                return None
+            slot = uuid.uuid4().hex
+            self._slots[slot] = now
+            return slot
+
+    def release_slot(self, slot):
+        with self._lock:
+            self._slots.pop(slot, None)
+
+
+# KEYS: 各个桶；ARGV: 当前时间, 扣除数, 然后每个桶的 capacity, rate
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+local wait = 0
+local limiting = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[1 + 2 * i])
+    local rate = tonumber(ARGV[2 + 2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < cost and (cost - tokens) / rate > wait then
+        wait = (cost - tokens) / rate
+        limiting = i
+    end
+end
+if limiting > 0 then
+    return {tostring(wait), limiting}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[1 + 2 * i])
+    local rate = tonumber(ARGV[2 + 2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {'0', 0}
+"""
+
+# KEYS[1]: 槽位有序集合；ARGV: 当前时间, 租期, 上限, 槽位ID
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease))
+return 1
+"""
+
+
+class RedisBackend:
+    """Redis 后端，所有 worker 共享令牌桶和并发槽位"""
+
+    def __init__(self, url, prefix='admission:'):
+        import redis
+
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._acquire = self._redis.register_script(_ACQUIRE_SCRIPT)
+
+    def take(self, buckets, cost, now=None):
+        now = time.time() if now is None else now
+        args = [now, cost]
+        for bucket in buckets:
+            args.extend((bucket.capacity, bucket.rate))
+        wait, limiting = self._take(keys=[self.prefix + b.key for b in buckets], args=args)
+        # Lua 的下标从1开始，0 表示已扣除
+        return float(wait), (int(limiting) - 1 if int(limiting) else None)
+
+    def acquire_slot(self, limit, lease, now=None):
+        now = time.time() if now is None else now
+        slot = uuid.uuid4().hex
+        if self._acquire(keys=[self.prefix + CONCURRENCY_KEY], args=[now, lease, limit, slot]):
+            return slot
+        return None
+
+    def release_slot(self, slot):
+        self._redis.zrem(self.prefix + CONCURRENCY_KEY, slot)
+
+
+class Rejection:
+    """准入被拒绝：reason 为 'concurrency' / 'session' / 'ip' 之一"""
+
+    __slots__ = ('reason', 'retry_after')
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        """Retry-After 头的值（整数秒，至少1秒）"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    """按配置执行准入检查"""
+
+    def __init__(self, backend, costs, session_bucket, ip_bucket, max_concurrency,
+                 slot_lease=300, busy_retry_after=2):
+        """
+        Args:
+            backend: MemoryBackend 或 RedisBackend
+            costs: {端点名: 每次请求扣除的令牌数}
+            session_bucket: (capacity, rate)
+            ip_bucket: (capacity, rate)
+            max_concurrency: 全局并发上限，0 表示不限制
+            slot_lease: 并发槽位的最长占用时间（秒），进程异常退出时槽位到期自动回收
+            busy_retry_after: 并发已满时返回的 Retry-After（秒）
+        """
+        for endpoint, cost in costs.items():
+            if cost > min(session_bucket[0], ip_bucket[0]):
+                raise ValueError(f'admission cost of {endpoint} exceeds bucket capacity')
+        self.backend = backend
+        self.costs = dict(costs)
+        self.session_bucket = session_bucket
+        self.ip_bucket = ip_bucket
+        self.max_concurrency = max_concurrency
+        self.slot_lease = slot_lease
+        self.busy_retry_after = busy_retry_after
+
+    def admit(self, endpoint, session_id, client_ip):
+        """
+        检查请求能否进入
+
+        Args:
+            endpoint: 端点名（如 'api.try_on'）
+            session_id: 限流用的 Session ID
+            client_ip: 客户端IP
+
+        Returns:
+            tuple: (槽位ID或None, Rejection或None)
+        """
+        cost = self.costs.get(endpoint)
+        if not cost:
+            return None, None
+
+        try:
+            slot = None
+            if self.max_concurrency:
+                slot = self.backend.acquire_slot(self.max_concurrency, self.slot_lease)
+                if slot is None:
+                    return None, self._reject(endpoint, 'concurrency', self.busy_retry_after)
+
+            session_key = Bucket(f'session:{session_id}', *self.session_bucket)
+            ip_key = Bucket(f'ip:{client_ip}', *self.ip_bucket)
+            wait, limiting = self.backend.take([session_key, ip_key], cost)
+            if limiting is not None:
+                if slot is not None:
+                    self.backend.release_slot(slot)
+                return None, self._reject(endpoint, ('session', 'ip')[limiting], wait)
+            return slot, None
+        except Exception:
+            logger.warning('准入控制后端不可用，放行请求', exc_info=True)
+            return None, None
+
+    def release(self, slot):
+        """请求结束后释放并发槽位"""
+        if slot is None:
+            return
+        try:
+            self.backend.release_slot(slot)
+        except Exception:
+            logger.warning('释放并发槽位失败', exc_info=True)
+
+    def charge(self, endpoint, session_id, client_ip, units):
+        """
+        为已准入的请求再扣除 units 份该接口的令牌（如批量接口按图片数计费），逐份扣除直到令牌不足
+
+        Args:
+            endpoint: 端点名
+            session_id: 限流用的 Session ID
+            client_ip: 客户端IP
+            units: 份数
+
+        Returns:
+            tuple: (扣除成功的份数, 令牌不足时的 Rejection，否则为None)
+        """
+        cost = self.costs.get(endpoint)
+        if not cost or units <= 0:
+            return max(units, 0), None
+
+        buckets = [Bucket(f'session:{session_id}', *self.session_bucket), Bucket(f'ip:{client_ip}', *self.ip_bucket)]
+        try:
+            for charged in range(units):
+                wait, limiting = self.backend.take(buckets, cost)
+                if limiting is not None:
+                    return charged, self._reject(endpoint, ('session', 'ip')[limiting], wait)
+        except Exception:
+            logger.warning('准入控制后端不可用，放行请求', exc_info=True)
+        return units, None
+
+    def acquire_slots(self, count):
+        """
+        为一个请求内的并发上游调用再占用最多 count 个并发槽位（占满为止，不等待）
+
+        Returns:
+            list: 占到的槽位ID，不限制并发时为 count 个None
+        """
+        if not self.max_concurrency:
+            return [None] * max(count, 0)
+        slots = []
+        try:
+            for _ in range(count):
+                slot = self.backend.acquire_slot(self.max_concurrency, self.slot_lease)
+                if slot is None:
+                    break
+                slots.append(slot)
+        except Exception:
+            logger.warning('准入控制后端不可用，放行请求', exc_info=True)
+            slots.extend([None] * (count - len(slots)))
+        return slots
+
+    def _reject(self, endpoint, reason, retry_after):
+        ADMISSION_REJECTED.inc(endpoint, reason)
+        logger.info('准入控制拒绝请求', extra={'endpoint': endpoint, 'reason': reason,
+                                          'retry_after': round(retry_after, 2)})
+        return Rejection(reason, retry_after)
+
+
+def create_controller(config):
+    """
+    根据应用配置创建准入控制器
+
+    Args:
+        config: Flask/Quart 应用配置
+
+    Returns:
+        AdmissionController
+    """
+    if config.get('ADMISSION_BACKEND') == 'redis':
+        backend = RedisBackend(config['REDIS_URL'])
+    else:
+        backend = MemoryBackend()
+    return AdmissionController(
+        backend,
+        config['ADMISSION_COSTS'],
+        config['ADMISSION_SESSION_BUCKET'],
+        config['ADMISSION_IP_BUCKET'],
+        config.get('ADMISSION_MAX_CONCURRENCY', 0),
+        config.get('ADMISSION_SLOT_LEASE', 300),
+        config.get('ADMISSION_BUSY_RETRY_AFTER', 2)
+    )
+
+
+def client_session_id(session):
+    """Session 中的限流ID，没有时生成（写入 Session Cookie）"""
+    session_id = session.get(SESSION_ID_KEY)
+    if not session_id:
+        session_id = session[SESSION_ID_KEY] = uuid.uuid4().hex
+    return session_id
+
+
+def client_ip(request, trust_forwarded=False):
+    """
+    客户端IP
+
+    Args:
+        request: Flask/Quart 请求对象
+        trust_forwarded: 部署在反向代理之后时为True，使用 X-Forwarded-For 的第一跳
+    """
+    if trust_forwarded and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+
+def rejection_body(rejection):
+    """429 响应体，与其他接口的错误格式一致"""
+    return {
+        'success': False,
+        'error': 'Too many requests, please retry later',
+        'reason': rejection.reason,
+        'retry_after': int(rejection.retry_after_header)
+    }
+
+
+def charge_request(units):
+    """
+    在视图中为当前请求再扣除 units 份令牌（见 AdmissionController.charge），未启用准入控制时全部放行
+
+    Returns:
+        tuple: (扣除成功的份数, Rejection或None)
+    """
+    from flask import current_app, request, session
+
+    controller = current_app.extensions.get('admission')
+    if controller is None:
+        return max(units, 0), None
+    return controller.charge(request.endpoint, client_session_id(session),
+                             client_ip(request, current_app.config.get('ADMISSION_TRUST_FORWARDED_FOR', False)), units)
+
+
+def acquire_request_slots(count):
+    """
+    为当前请求内的并发上游调用再占用最多 count 个并发槽位，请求结束时与请求本身的槽位一起释放
+
+    Returns:
+        int: 占到的槽位数，未启用准入控制时为 count
+    """
+    from flask import current_app, g
+
+    controller = current_app.extensions.get('admission')
+    if controller is None:
+        return max(count, 0)
+    slots = controller.acquire_slots(count)
+    g.setdefault('_admission_extra_slots', []).extend(slots)
+    return len(slots)
+
+
+def init_app(app):
+    """
+    为Flask应用注册准入检查：高成本接口进入视图前检查，请求结束后释放并发槽位
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request, session, g, jsonify
+
+    controller = create_controller(app.config)
+    app.extensions['admission'] = controller
+    trust_forwarded = app.config.get('ADMISSION_TRUST_FORWARDED_FOR', False)
+
+    @app.before_request
+    def _admit_request():
+        if request.endpoint not in controller.costs:
+            return None
+        slot, rejection = controller.admit(request.endpoint, client_session_id(session),
+                                           client_ip(request, trust_forwarded))
+        if rejection is not None:
+            response = jsonify(rejection_body(rejection))
+            response.status_code = 429
+            response.headers['Retry-After'] = rejection.retry_after_header
+            return response
+        g._admission_slot = slot
+        return None
+
+    @app.teardown_request
+    def _release_admission_slot(exc):
+        controller.release(g.pop('_admission_slot', None))
+        for slot in g.pop('_admission_extra_slots', ()):
+            controller.release(slot)
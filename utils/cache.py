@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+两级缓存
+进程内缓存在每个 gunicorn worker 中各有一份且各自冷启动，Vercel 实例之间也不共享任何状态，因此缓存分两级：
+    - L1：进程内 LRU，按条目数（CACHE_L1_MAX_ENTRIES）和字节数（CACHE_L1_MAX_BYTES）淘汰，条目带过期时间；
+      L1 的过期时间不超过 CACHE_L1_TTL，其他 worker 写入 L2 的新值很快可见
+    - L2（CACHE_BACKEND）：
+        - memory：不使用 L2，只有进程内缓存（默认）
+        - sqlite：本机 SQLite 文件（CACHE_SQLITE_PATH），同一主机的 worker 共享；
+          文件放在 /dev/shm 下即为共享内存，单机部署和测试使用
+        - redis：使用 REDIS_URL，所有实例共享
+
+键按命名空间区分：<CACHE_KEY_PREFIX><namespace>:<key>，超长的键使用 SHA-256。
+值序列化为无空白的紧凑JSON，超过 COMPRESS_MIN_SIZE 时 zlib 压缩，首字节标记格式。
+负缓存：确定不存在的结果（如无效的城市ID）写入 NEGATIVE，在 negative_ttl 内不再请求上游。
+L2 出错时只记录日志并按未命中处理，缓存故障不会让请求失败。
+
+用法：
+    weather = get_cache().namespace('weather')
+    value = weather.get(location_id)   # 未命中返回 MISS，负缓存返回 NEGATIVE
+    weather.set(location_id, data)
+    weather.set_negative(location_id)
+"""
+
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 超过该大小（字节）的值压缩后保存
+COMPRESS_MIN_SIZE = 1024
+
+# 超过该长度的键使用 SHA-256
+MAX_KEY_LENGTH = 200
+
+# 每个L1条目在值之外的估计内存开销（字节）
+ENTRY_OVERHEAD = 96
+
+# 序列化格式标记
+_JSON = b'j'
+_ZLIB = b'z'
+_NEGATIVE = b'n'
+
+
+class _Marker:
+    def __init__(self, name):
+        self._name = name
+
+    def __repr__(self):
+        return self._name
+
+
+# 未命中
+MISS = _Marker('MISS')
+# 负缓存命中（已知不存在的结果）
+NEGATIVE = _Marker('NEGATIVE')
+
+
+def _default(o):
+    """结果模型（services/result_models.py）按 to_dict() 序列化"""
+    to_dict = getattr(o, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+    return to_dict()
+
+
+def dumps(value):
+    """
+    序列化缓存值
+
+    Args:
+        value: 可JSON序列化的值（可包含结果模型），或 NEGATIVE
+
+    Returns:
+        bytes: 首字节为格式标记
+    """
+    if value is NEGATIVE:
+        return _NEGATIVE
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_SIZE:
+        return _ZLIB + zlib.compress(raw, 6)
+    return _JSON + raw
+
+
+def loads(blob):
+    """dumps 的逆操作"""
+    tag, body = blob[:1], blob[1:]
+    if tag == _NEGATIVE:
+        return NEGATIVE
+    if tag == _ZLIB:
+        body = zlib.decompress(body)
+    return json.loads(body)
+
+
+class LRUCache:
+    """进程内 L1：保存序列化后的字节（读取时得到新对象，调用方修改结果不会影响缓存）"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entries=10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """返回未过期的字节，没有时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, blob, ttl):
+        size = len(key) + len(blob) + ENTRY_OVERHEAD
+        with self._lock:
+            self._remove(key)
+            # 单个值超过总容量时不缓存，避免清空整个L1
+            if size > self.max_bytes or ttl <= 0:
+                return
+            self._entries[key] = (time.monotonic() + ttl, size, blob)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+class SQLiteBackend:
+    """本机 SQLite L2，同一主机的多个进程共享（每个线程一个连接）"""
+
+    # 每写入多少次清理一次过期条目
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute('SELECT value FROM cache WHERE key = ? AND expires_at > ?',
+                                      (key, time.time())).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(self, key, blob, ttl):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, blob, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+class RedisBackend:
+    """Redis L2，所有实例共享"""
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, blob, ttl):
+        self._redis.set(key, blob, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+
+class Namespace:
+    """一个命名空间内的缓存操作"""
+
+    def __init__(self, cache, name, ttl, negative_ttl):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def key(self, key):
+        """完整的缓存键"""
+        key = str(key)
+        if len(key) > MAX_KEY_LENGTH:
+            key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return f'{self.cache.prefix}{self.name}:{key}'
+
+    def get(self, key):
+        """
+        Returns:
+            缓存的值；没有时返回 MISS，负缓存时返回 NEGATIVE
+        """
+        return self.cache.get(self.key(key), self.name)
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(self.key(key), value, self.ttl if ttl is None else ttl)
+
+    def set_negative(self, key):
+        """记录结果不存在（negative_ttl 为0时不缓存）"""
+        if self.negative_ttl:
+            self.cache.set(self.key(key), NEGATIVE, self.negative_ttl)
+
+    def delete(self, key):
+        self.cache.delete(self.key(key))
+
+
+class TieredCache:
+    """L1 进程内 LRU + 可选的 L2"""
+
+    def __init__(self, l1, l2=None, prefix='', l1_ttl=60, ttls=None):
+        """
+        Args:
+            l1: LRUCache
+            l2: SQLiteBackend / RedisBackend，None 表示只使用 L1
+            prefix: 所有键的前缀
+            l1_ttl: L1 条目的最长保留时间（秒）
+            ttls: {命名空间: (ttl, negative_ttl)}，未列出的命名空间保留1小时、不做负缓存
+        """
+        self.l1 = l1
+        self.l2 = l2
+        self.prefix = prefix
+        self.l1_ttl = l1_ttl
+        self.ttls = ttls or {}
+        self._namespaces = {}
+
+    def namespace(self, name):
+        """命名空间 name 的缓存操作对象"""
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            ttl, negative_ttl = self.ttls.get(name, (3600, 0))
+            namespace = self._namespaces[name] = Namespace(self, name, ttl, negative_ttl)
+        return namespace
+
+    def get(self, key, namespace=''):
+        blob = self.l1.get(key)
+        if blob is not None:
+            return self._hit(blob, namespace, 'l1')
+        if self.l2 is not None:
+            try:
+                blob = self.l2.get(key)
+            except Exception as e:
+                logger.warning('读取L2缓存失败: %s', e)
+                blob = None
+            if blob is not None:
+                # 不知道L2中的剩余时间，L1只保留 l1_ttl
+                self.l1.set(key, blob, self.l1_ttl)
+                return self._hit(blob, namespace, 'l2')
+        CACHE_REQUESTS.inc(namespace, 'miss')
+        return MISS
+
+    def _hit(self, blob, namespace, tier):
+        value = loads(blob)
+        CACHE_REQUESTS.inc(namespace, 'negative_hit' if value is NEGATIVE else f'{tier}_hit')
+        return value
+
+    def set(self, key, value, ttl):
+        blob = dumps(value)
+        self.l1.set(key, blob, min(ttl, self.l1_ttl) if self.l2 is not None else ttl)
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, blob, ttl)
+            except Exception as e:
+                logger.warning('写入L2缓存失败: %s', e)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.l2 is not None:
+            try:
+                self.l2.delete(key)
+            except Exception as e:
+                logger.warning('删除L2缓存失败: %s', e)
+
+
+def create_cache(config):
+    """
+    按配置创建缓存
+
+    Args:
+        config: Flask/Quart 应用配置（或普通字典）
+    """
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'redis':
+        l2 = RedisBackend(config['REDIS_URL'])
+    elif backend == 'sqlite':
+        l2 = SQLiteBackend(config['CACHE_SQLITE_PATH'])
+    else:
+        l2 = None
+    l1 = LRUCache(config.get('CACHE_L1_MAX_BYTES', 32 * 1024 * 1024), config.get('CACHE_L1_MAX_ENTRIES', 10000))
+    return TieredCache(l1, l2, config.get('CACHE_KEY_PREFIX', ''), config.get('CACHE_L1_TTL', 60),
+                       config.get('CACHE_TTLS'))
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def configure(config):
+    """按应用配置创建进程内共享的缓存（同一进程中的 Flask 和 Quart 应用使用同一个实例）"""
+    global _instance
+    cache = create_cache(config)
+    with _instance_lock:
+        _instance = cache
+    return cache
+
+
+def init_app(app):
+    """
+    初始化缓存
+
+    Args:
+        app: Flask/Quart 应用实例
+    """
+    configure(app.config)
+
+
+def get_cache():
+    """进程内共享的缓存；应用未初始化时（如脚本中直接使用服务）为只有L1的默认缓存"""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = create_cache({})
+        return _instance
+
+
+def reset():
+    """丢弃进程内的缓存（测试用）"""
+    global _instance
+    with _instance_lock:
+        _instance = None
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+请求截止时间
+上传分析等接口有一个总耗时预算（REQUEST_DEADLINES，按视图配置，单位秒），客户端可以用
+X-Request-Timeout 请求头缩短预算（不能超过配置值）。请求开始时预算换算为截止时间存入上下文变量：
+    - 调用上游时取剩余时间作为超时（utils.resilience.timeout、千问VL的单次请求）
+    - 剩余时间用完后不再发起新的上游调用，抛出 DeadlineExceeded
+    - 视图返回已完成的部分，没有完成的部分在响应中标记为 skipped（放弃）或 pending（后台继续，
+      稍后通过 GET /api/pending/<token> 取回，见 utils/pending_results.py）
+
+没有配置预算的视图不受影响，上游超时仍按各自的调用策略
+"""
+
+import time
+import contextvars
+
+# 客户端指定预算的请求头（秒）
+TIMEOUT_HEADER = 'X-Request-Timeout'
+# 部分步骤被放弃时的响应头，值为放弃的部分（如 analysis,weather），此类响应不作为幂等结果缓存
+PARTIAL_HEADER = 'X-Partial-Result'
+
+# 客户端指定的预算下限（秒）
+MIN_BUDGET = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """请求的耗时预算已用完，没有发起（或放弃了）上游调用"""
+
+
+class Deadline:
+    """一次请求的截止时间"""
+
+    def __init__(self, budget, now=None):
+        self.budget = budget
+        self.expires_at = (time.monotonic() if now is None else now) + budget
+
+    def remaining(self, now=None):
+        """剩余时间（秒），不小于0"""
+        return max(0.0, self.expires_at - (time.monotonic() if now is None else now))
+
+    def expired(self, now=None):
+        return self.remaining(now) <= 0
+
+
+_current = contextvars.ContextVar('request_deadline', default=None)
+
+
+def start(budget):
+    """
+    为当前请求设置截止时间
+
+    Returns:
+        contextvars.Token: 用于请求结束时恢复
+    """
+    return _current.set(Deadline(budget))
+
+
+def finish(token):
+    """请求结束时清除截止时间"""
+    _current.reset(token)
+
+
+def detach():
+    """
+    清除当前上下文的截止时间，用于请求返回后在后台继续执行的步骤
+    （后台线程或任务复制了请求的上下文，只影响复制后的上下文）
+    """
+    _current.set(None)
+
+
+def current():
+    """当前请求的截止时间，没有时返回None"""
+    return _current.get()
+
+
+def remaining():
+    """当前请求的剩余时间（秒），没有截止时间时返回None"""
+    deadline = _current.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def expired():
+    deadline = _current.get()
+    return deadline is not None and deadline.expired()
+
+
+def clamp(timeout):
+    """
+    上游调用的超时：不超过当前请求的剩余时间
+
+    Args:
+        timeout: 上游自身的超时（秒）
+
+    Returns:
+        float: 实际使用的超时
+    """
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
+
+
+def check():
+    """
+    剩余时间用完时抛出 DeadlineExceeded
+
+    Raises:
+        DeadlineExceeded
+    """
+    if expired():
+        raise DeadlineExceeded('request deadline exceeded')
+
+
+def request_budget(configured, header_value=None):
+    """
+    计算请求的耗时预算
+
+    Args:
+        configured: 视图配置的预算（秒），None 表示不限制
+        header_value: X-Request-Timeout 请求头的值，只能缩短预算，非法值忽略
+
+    Returns:
+        float: 预算（秒），或None
+    """
+    if configured is None:
+        return None
+    try:
+        requested = float(header_value) if header_value else None
+    except ValueError:
+        requested = None
+    if requested is None or requested != requested or requested <= 0:
+        return float(configured)
+    return max(MIN_BUDGET, min(float(configured), requested))
+
+
+def init_app(app):
+    """
+    为Flask应用注册截止时间
+
+    预算从本钩子执行时开始计算，需在幂等键和准入控制之前注册，使它们的处理时间也计入预算；
+    请求关联ID等不耗时的钩子可以在它之前（异步应用在 async_app.py 中按相同的顺序注册）
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request, g
+
+    budgets = app.config.get('REQUEST_DEADLINES', {})
+
+    @app.before_request
+    def _start_deadline():
+        budget = request_budget(budgets.get(request.endpoint), request.headers.get(TIMEOUT_HEADER))
+        if budget is not None:
+            g._deadline_token = start(budget)
+
+    @app.teardown_request
+    def _finish_deadline(exc):
+        token = g.pop('_deadline_token', None)
+        if token is not None:
+            finish(token)
@@ -5,9 +5,17 @@
 """
 
 import os
+import uuid
+import hashlib
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
+from .image_validation import validate_image_stream, ImageValidationError
+
+
+# 允许的文件扩展名列表
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
 
 def allowed_file(filename: str) -> bool:
     """
@@ -19,33 +27,65 @@ def allowed_file(filename: str) -> bool:
     Returns:
         bool: True表示文件类型允许，False表示不允许
     """
-    # 允许的文件扩展名列表
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    
     # 检查文件名是否包含点号，且扩展名在允许列表中
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def save_uploaded_file(file, upload_folder: str) -> str:
+def validate_uploaded_file(file, max_pixels: int, max_frames: int) -> dict:
     """
-    保存上传的文件到指定目录
+    校验上传的图片文件：扩展名、文件头魔数、尺寸和帧数
+    只读取文件头部，校验通过后文件流复原到开头，可以直接保存
     
     Args:
         file: 上传的文件对象（Flask request.files['file']返回的对象）
+        max_pixels: 允许的最大像素数
+        max_frames: 允许的最大帧数
+        
+    Returns:
+        dict: 图片信息 {'format', 'width', 'height', 'frames'}
+        
+    Raises:
+        ImageValidationError: 校验失败
+    """
+    if not allowed_file(file.filename or ''):
+        raise ImageValidationError('Invalid file type', 400)
+    return validate_image_stream(file.stream, max_pixels, max_frames)
+
+
+def build_upload_path(original_filename: str, upload_folder: str) -> str:
+    """
+    为上传文件生成保存路径
+    
+    Args:
+        original_filename: 客户端提供的原始文件名
         upload_folder: 文件保存目录
         
     Returns:
-        str: 保存后的文件路径
+        str: 保存路径（时间戳和随机前缀 + 安全文件名）
     """
     # 生成安全的文件名（去除特殊字符，避免安全问题）
-    filename = secure_filename(file.filename)
+    filename = secure_filename(original_filename)
     
-    # 添加时间戳前缀，避免文件名冲突
+    # 添加时间戳和随机前缀，避免同一秒内同名上传互相覆盖（URL按不可变资源缓存）
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'{timestamp}_{filename}'
+    filename = f'{timestamp}_{uuid.uuid4().hex[:8]}_{filename}'
+    
+    return os.path.join(upload_folder, filename)
+
+
+def save_uploaded_file(file, upload_folder: str) -> str:
+    """
+    保存上传的文件到指定目录
     
+    Args:
+        file: 上传的文件对象（Flask request.files['file']返回的对象）
+        upload_folder: 文件保存目录
+        
+    Returns:
+        str: 保存后的文件路径
+    """
     # 拼接完整的文件路径
-    file_path = os.path.join(upload_folder, filename)
+    file_path = build_upload_path(file.filename, upload_folder)
     
     # 保存文件到指定路径
     file.save(file_path)
@@ -92,3 +132,20 @@ def get_file_size(file_path: str) -> int:
         int: 文件大小，单位为字节
     """
     return os.path.getsize(file_path)
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    计算文件内容的SHA-256（分块读取，不把整个文件读入内存）
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+只读接口的HTTP缓存与JSON压缩
+按路由配置缓存策略（HTTP_CACHE_POLICIES）：
+    - 成功的响应按响应体计算弱ETag，请求带匹配的 If-None-Match 时返回 304（不含响应体）
+    - 按策略输出 Cache-Control 和 Vary；失败的响应（非200或 "success": false）输出 no-store，
+      避免浏览器和CDN缓存错误结果
+超过 HTTP_COMPRESS_MIN_SIZE 的JSON响应按 Accept-Encoding 压缩：安装了 brotli 时优先 br，否则 gzip。
+ETag 按压缩前的内容计算，弱ETag在不同编码间保持一致，304 判断不受压缩影响
+"""
+
+import gzip
+import json
+import hashlib
+
+# 压缩级别：动态响应每次都要压缩，取压缩率和CPU开销的折中
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# 可以压缩的响应类型
+COMPRESSIBLE_MIMETYPES = ('application/json',)
+
+
+def _brotli():
+    """brotli 为可选依赖，未安装时只使用 gzip"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def weak_etag(body):
+    """按响应体计算弱ETag的值（不含 W/ 前缀和引号）"""
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def cache_control(policy):
+    """
+    根据策略生成 Cache-Control
+
+    Args:
+        policy: {'scope': 'public'/'private', 'max_age': 秒, 'stale_while_revalidate': 秒, 'no_cache': bool}
+
+    Returns:
+        str: Cache-Control 头的值
+    """
+    parts = [policy.get('scope', 'public')]
+    if policy.get('no_cache'):
+        parts.append('no-cache')
+    parts.append(f"max-age={policy.get('max_age', 0)}")
+    if policy.get('stale_while_revalidate'):
+        parts.append(f"stale-while-revalidate={policy['stale_while_revalidate']}")
+    return ', '.join(parts)
+
+
+def is_successful_payload(response, body):
+    """200 且JSON中没有 "success": false 的响应才允许缓存"""
+    if response.status_code != 200:
+        return False
+    if response.mimetype == 'application/json':
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return False
+        if isinstance(payload, dict) and payload.get('success') is False:
+            return False
+    return True
+
+
+def choose_encoding(request):
+    """按 Accept-Encoding 的权重选择压缩方式，客户端不支持时返回None"""
+    offered = ['br', 'gzip'] if _brotli() is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return _brotli().compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def finalize_response(response, body, request, policy, min_size):
+    """
+    为响应设置缓存头、处理条件请求并压缩（Flask 和 Quart 共用）
+
+    Args:
+        response: 响应对象
+        body: 响应体（bytes）
+        request: 请求对象
+        policy: 当前路由的缓存策略，没有策略时为None
+        min_size: 压缩阈值（字节）
+
+    Returns:
+        bytes: 需要写回的新响应体，不需要修改时返回None
+    """
+    if getattr(response, 'direct_passthrough', False) or 'Content-Encoding' in response.headers:
+        return None
+
+    if policy is not None and request.method in ('GET', 'HEAD'):
+        if is_successful_payload(response, body):
+            etag = weak_etag(body)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control(policy)
+            for header in policy.get('vary', ()):
+                response.vary.add(header)
+            if request.if_none_match.contains_weak(etag):
+                response.status_code = 304
+                response.headers.pop('Content-Type', None)
+                return b''
+        else:
+            response.headers['Cache-Control'] = 'no-store'
+
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or len(body) < min_size:
+        return None
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return None
+    response.headers['Content-Encoding'] = encoding
+    return compress(body, encoding)
+
+
+def init_app(app):
+    """
+    为Flask应用注册缓存和压缩处理（需在幂等处理之前注册，使幂等缓存保存的是未压缩的响应体）
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request
+
+    policies = app.config.get('HTTP_CACHE_POLICIES', {})
+    min_size = app.config.get('HTTP_COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def _apply_http_cache(response):
+        if response.is_streamed:
+            return response
+        body = finalize_response(response, response.get_data(), request,
+                                 policies.get(request.endpoint), min_size)
+        if body is not None:
+            response.set_data(body)
+        return response
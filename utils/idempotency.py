@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+幂等键支持
+客户端超时重试上传分析或试穿提交时，携带相同的 Idempotency-Key 请求头即可拿到第一次的结果，
+不会再次调用千问VL或再提交一次计费的图像合成任务：
+    - 第一次请求执行视图，响应（状态码、响应体、Content-Type 以及视图写入 Session 的值）
+      按 IDEMPOTENCY_TTL 缓存；5xx、429、409 等可重试的响应以及截止时间到达前部分步骤被放弃的响应
+      不缓存，重试时重新执行
+    - 第一次请求仍在执行时，重复请求等待其完成（最多 IDEMPOTENCY_WAIT_TIMEOUT 秒），超时返回 409
+    - 同一个键用于内容不同的请求（图片、参数不同）返回 422
+    - 重放的响应带有 Idempotent-Replayed: true
+
+后端可选：
+    - memory：进程内有界 LRU（IDEMPOTENCY_MAX_ENTRIES），重试落到其他 worker 时不能命中
+    - redis：使用 REDIS_URL，所有 worker 共享，等待方轮询执行结果
+"""
+
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from utils.deadline import PARTIAL_HEADER
+
+logger = logging.getLogger(__name__)
+
+# 请求头
+KEY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# 幂等键最大长度
+MAX_KEY_LENGTH = 255
+
+# 需要幂等处理的视图
+IDEMPOTENT_ENDPOINTS = ('api.upload_image', 'api.try_on')
+
+# 等待进行中请求时的轮询间隔（秒）
+POLL_INTERVAL = 0.1
+
+# 记录状态
+PENDING = 'pending'
+DONE = 'done'
+
+
+def is_cacheable(status):
+    """响应是否可以缓存：5xx、限流（429）和冲突（409）由客户端重试，不缓存"""
+    return status < 500 and status not in (409, 429)
+
+
+def request_fingerprint(json_body=None, form_items=(), files=()):
+    """
+    计算请求内容的指纹，用于识别同一幂等键被用于不同请求
+
+    Args:
+        json_body: 解析后的JSON请求体
+        form_items: 表单字段 [(name, value)]
+        files: 上传文件 [(name, FileStorage)]，读取后会回到文件开头
+
+    Returns:
+        str: 十六进制SHA-256
+    """
+    digest = hashlib.sha256()
+    if json_body is not None:
+        digest.update(json.dumps(json_body, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    for name, value in sorted(form_items):
+        digest.update(f'{name}={value}\n'.encode('utf-8'))
+    for name, storage in sorted(files, key=lambda item: item[0]):
+        digest.update(f'file:{name}:{storage.filename}\n'.encode('utf-8'))
+        stream = storage.stream
+        position = stream.tell()
+        for chunk in iter(lambda: stream.read(64 * 1024), b''):
+            digest.update(chunk)
+        stream.seek(position)
+    return digest.hexdigest()
+
+
+class MemoryStore:
+    """进程内有界 LRU，进行中的请求用 Event 通知等待方"""
+
+    def __init__(self, max_entries=2000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint, pending_ttl):
+        """
+        尝试占用幂等键
+
+        Returns:
+            dict: 已有的记录；返回None表示由调用方执行
+        """
+        now = time.time()
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None and record['expires'] > now:
+                self._entries.move_to_end(key)
+                return record
+            self._entries[key] = {'state': PENDING, 'fingerprint': fingerprint, 'expires': now + pending_ttl}
+            self._entries.move_to_end(key)
+            self._events[key] = threading.Event()
+            self._evict()
+            return None
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._events.pop(evicted, None)
+
+    def get(self, key):
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None and record['expires'] <= time.time():
+                return None
+            return record
+
+    def wait(self, key, timeout):
+        """等待进行中的请求结束，返回结束后的记录（被放弃或超时返回None）"""
+        event = self._events.get(key)
+        if event is not None:
+            event.wait(timeout)
+        record = self.get(key)
+        return record if record is not None and record['state'] == DONE else None
+
+    def complete(self, key, record):
+        with self._lock:
+            record['expires'] = time.time() + self.ttl
+            self._entries[key] = record
+            self._entries.move_to_end(key)
+            self._evict()
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def abandon(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+class RedisStore:
+    """Redis 后端：SET NX 占用幂等键，完成后覆盖为响应记录"""
+
+    def __init__(self, url, ttl=24 * 3600, prefix='idempotency:'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def begin(self, key, fingerprint, pending_ttl):
+        marker = json.dumps({'state': PENDING, 'fingerprint': fingerprint})
+        if self._redis.set(self.prefix + key, marker, nx=True, ex=int(pending_ttl)):
+            return None
+        return self.get(key) or self.begin(key, fingerprint, pending_ttl)
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        if 'body' in record:
+            record['body'] = base64.b64decode(record['body'])
+        return record
+
+    def wait(self, key, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            record = self.get(key)
+            if record is None or record['state'] == DONE:
+                return record
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def complete(self, key, record):
+        stored = dict(record, body=base64.b64encode(record['body']).decode('ascii'))
+        self._redis.set(self.prefix + key, json.dumps(stored, ensure_ascii=False), ex=self.ttl)
+
+    def abandon(self, key):
+        self._redis.delete(self.prefix + key)
+
+
+class IdempotencyGuard:
+    """幂等键的判定逻辑，Flask 和 Quart 的请求钩子共用"""
+
+    def __init__(self, store, endpoints=IDEMPOTENT_ENDPOINTS, wait_timeout=120):
+        self.store = store
+        self.endpoints = tuple(endpoints)
+        self.wait_timeout = wait_timeout
+
+    @staticmethod
+    def scoped_key(endpoint, key):
+        # 幂等键按接口隔离，同一个键用于上传和试穿互不影响
+        return f'{endpoint}:{key}'
+
+    def start(self, scoped_key, fingerprint):
+        """
+        请求开始时调用
+
+        Returns:
+            tuple: (动作, 记录)，动作为 'execute'（执行视图）、'replay'（重放记录）、
+                   'mismatch'（内容不同）或 'pending'（等待进行中的请求）
+        """
+        # 进行中的标记最多保留到等待超时，执行进程异常退出时可以重新执行
+        record = self.store.begin(scoped_key, fingerprint, self.wait_timeout)
+        if record is None:
+            return 'execute', None
+        if record['fingerprint'] != fingerprint:
+            return 'mismatch', record
+        if record['state'] == DONE:
+            return 'replay', record
+        return 'pending', record
+
+    def wait(self, scoped_key):
+        """同步等待进行中的请求"""
+        return self.store.wait(scoped_key, self.wait_timeout)
+
+    async def wait_async(self, scoped_key):
+        """异步等待进行中的请求（轮询，不阻塞事件循环）"""
+        import asyncio
+
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            record = self.store.get(scoped_key)
+            if record is None or record['state'] == DONE:
+                return record
+            await asyncio.sleep(POLL_INTERVAL)
+        return None
+
+    def finish(self, scoped_key, fingerprint, status, body, content_type, session_updates, partial=False):
+        """
+        请求结束时调用：可缓存的响应写入记录，否则释放幂等键
+        （partial 为 True 表示截止时间到达前部分步骤被放弃，重试时应重新执行）
+        """
+        if partial or not is_cacheable(status):
+            self.store.abandon(scoped_key)
+            return
+        self.store.complete(scoped_key, {
+            'state': DONE,
+            'fingerprint': fingerprint,
+            'status': status,
+            'body': body,
+            'content_type': content_type,
+            'session': session_updates
+        })
+
+    def abandon(self, scoped_key):
+        self.store.abandon(scoped_key)
+
+
+def create_guard(config):
+    """
+    根据应用配置创建幂等处理器
+
+    Args:
+        config: Flask/Quart 应用配置
+
+    Returns:
+        IdempotencyGuard
+    """
+    ttl = config.get('IDEMPOTENCY_TTL', 24 * 3600)
+    if config.get('IDEMPOTENCY_BACKEND') == 'redis':
+        store = RedisStore(config['REDIS_URL'], ttl)
+    else:
+        store = MemoryStore(config.get('IDEMPOTENCY_MAX_ENTRIES', 2000), ttl)
+    return IdempotencyGuard(store, wait_timeout=config.get('IDEMPOTENCY_WAIT_TIMEOUT', 120))
+
+
+def valid_key(key):
+    """幂等键：1~255个可打印ASCII字符"""
+    return 0 < len(key) <= MAX_KEY_LENGTH and key.isascii() and key.isprintable()
+
+
+def error_body(action):
+    """键不合法、内容不一致或等待超时时的响应 (响应体, 状态码)"""
+    if action == 'invalid':
+        return {'success': False, 'error': f'{KEY_HEADER} must be 1-{MAX_KEY_LENGTH} printable ASCII characters'}, 400
+    if action == 'mismatch':
+        return {'success': False, 'error': f'{KEY_HEADER} was already used for a different request'}, 422
+    return {'success': False, 'error': f'A request with this {KEY_HEADER} is still in progress'}, 409
+
+
+def session_changes(before, after):
+    """视图写入 Session 的键值（重放时写回，保证重试拿到与第一次相同的 Session 状态）"""
+    return {k: v for k, v in after.items() if before.get(k, object()) != v}
+
+
+def init_app(app):
+    """
+    为Flask应用注册幂等处理（需在准入控制之前注册，重放的请求不再消耗限流令牌）
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request, session, g, jsonify
+
+    guard = create_guard(app.config)
+    app.extensions['idempotency'] = guard
+
+    def _replay(record):
+        for name, value in (record.get('session') or {}).items():
+            session[name] = value
+        response = app.response_class(record['body'], status=record['status'], content_type=record['content_type'])
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+    def _error(action):
+        body, status = error_body(action)
+        response = jsonify(body)
+        response.status_code = status
+        if status == 409:
+            response.headers['Retry-After'] = '1'
+        return response
+
+    @app.before_request
+    def _check_idempotency_key():
+        key = request.headers.get(KEY_HEADER)
+        if key is None or request.method != 'POST' or request.endpoint not in guard.endpoints:
+            return None
+        if not valid_key(key):
+            return _error('invalid')
+
+        fingerprint = request_fingerprint(
+            request.get_json(silent=True) if request.is_json else None,
+            request.form.items(multi=True),
+            request.files.items(multi=True)
+        )
+        scoped_key = guard.scoped_key(request.endpoint, key)
+        action, record = guard.start(scoped_key, fingerprint)
+        if action == 'pending':
+            record = guard.wait(scoped_key)
+            action = 'replay' if record is not None else 'pending'
+        if action == 'replay':
+            return _replay(record)
+        if action != 'execute':
+            return _error(action)
+
+        g._idempotency = (scoped_key, fingerprint, dict(session))
+        return None
+
+    @app.after_request
+    def _store_idempotent_response(response):
+        pending = g.pop('_idempotency', None)
+        if pending is not None:
+            scoped_key, fingerprint, session_before = pending
+            guard.finish(scoped_key, fingerprint, response.status_code, response.get_data(),
+                         response.content_type, session_changes(session_before, dict(session)),
+                         partial=PARTIAL_HEADER in response.headers)
+        return response
+
+    @app.teardown_request
+    def _abandon_idempotency_key(exc):
+        # 视图抛出未处理的异常时 after_request 不会执行，释放幂等键以便重试
+        pending = g.pop('_idempotency', None)
+        if pending is not None:
+            guard.abandon(pending[0])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+图片上传校验工具
+在保存文件、调用模型之前校验上传内容：通过文件头魔数识别真实类型，
+只解析图片头部读取尺寸和帧数（不解码像素），拒绝伪装文件和解压炸弹
+"""
+
+import io
+import warnings
+
+
+# 魔数与图片格式的对应关系
+MAGIC_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif')
+)
+
+# 识别魔数需要读取的字节数
+SNIFF_SIZE = 16
+
+
+class ImageValidationError(Exception):
+    """图片校验失败，携带对应的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_image_type(head: bytes):
+    """
+    根据文件开头的字节识别图片格式
+
+    Args:
+        head: 文件开头的字节（至少 SNIFF_SIZE 个字节更可靠）
+
+    Returns:
+        str: 'jpeg'、'png'、'gif'，无法识别时返回None
+    """
+    for signature, image_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    return None
+
+
+def validate_image_stream(stream, max_pixels: int, max_frames: int, partial: bool = False) -> dict:
+    """
+    校验图片流，校验结束后流的位置复原到开头
+
+    Args:
+        stream: 可seek的二进制流（如上传文件的 file.stream）
+        max_pixels: 允许的最大像素数（宽 × 高）
+        max_frames: 允许的最大帧数（动图）
+        partial: 流只包含文件开头部分时为True，此时无法统计的帧数不做检查
+
+    Returns:
+        dict: {'format': 格式, 'width': 宽, 'height': 高, 'frames': 帧数}
+
+    Raises:
+        ImageValidationError: 类型不支持（415）、尺寸或帧数超限（413）、文件头损坏（400）
+    """
+    # Pillow 在首次校验时才导入，应用启动时不加载
+    from PIL import Image
+
+    start = stream.tell()
+    try:
+        image_type = sniff_image_type(stream.read(SNIFF_SIZE))
+        if image_type is None:
+            raise ImageValidationError('Unsupported image type', 415)
+        stream.seek(start)
+
+        with warnings.catch_warnings():
+            # 超限由下面的检查给出明确错误，这里屏蔽Pillow的解压炸弹警告
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            try:
+                # Image.open 只解析文件头，不会解码像素数据
+                img = Image.open(stream, formats=[image_type.upper()])
+            except Image.DecompressionBombError:
+                raise ImageValidationError('Image dimensions too large', 413)
+            except Exception:
+                raise ImageValidationError('Corrupt image header', 400)
+
+        width, height = img.size
+        if width <= 0 or height <= 0:
+            raise ImageValidationError('Corrupt image header', 400)
+        if width * height > max_pixels:
+            raise ImageValidationError('Image dimensions too large', 413)
+
+        try:
+            frames = getattr(img, 'n_frames', 1)
+        except (EOFError, OSError, ValueError):
+            if not partial:
+                raise ImageValidationError('Corrupt image data', 400)
+            frames = 1
+        if frames > max_frames:
+            raise ImageValidationError('Too many image frames', 413)
+
+        return {'format': image_type, 'width': width, 'height': height, 'frames': frames}
+    finally:
+        stream.seek(start)
+
+
+def validate_image_bytes(data: bytes, max_pixels: int, max_frames: int) -> dict:
+    """
+    校验内存中的图片头部数据（如从OSS按范围读取的前若干字节）
+
+    Args:
+        data: 图片开头的字节
+        max_pixels: 允许的最大像素数
+        max_frames: 允许的最大帧数
+
+    Returns:
+        dict: 同 validate_image_stream
+    """
+    return validate_image_stream(io.BytesIO(data), max_pixels, max_frames, partial=True)
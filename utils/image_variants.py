@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+图片尺寸变体工具
+按固定宽度档位按需生成 WebP/JPEG 缩略图，并缓存在磁盘上，供页面预览使用
+"""
+
+import os
+import uuid
+import hashlib
+
+
+# 允许的宽度档位，请求的宽度会向上取整到最近的档位，避免生成任意尺寸撑满磁盘
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+
+# 输出格式与编码参数
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'mimetype': 'image/webp', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}}
+}
+
+
+def pick_variant_width(requested: int) -> int:
+    """
+    选择不小于请求宽度的最小档位
+
+    Args:
+        requested: 请求的宽度（像素）
+
+    Returns:
+        int: 实际使用的档位宽度，超过最大档位时返回最大档位
+    """
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def get_variant(source_path: str, cache_dir: str, width: int, fmt: str) -> str:
+    """
+    获取图片变体文件路径，缓存不存在或已过期时生成
+
+    Args:
+        source_path: 原图路径
+        cache_dir: 变体缓存根目录
+        width: 档位宽度（应来自 pick_variant_width）
+        fmt: 输出格式，'webp' 或 'jpeg'
+
+    Returns:
+        str: 变体文件路径
+    """
+    spec = VARIANT_FORMATS[fmt]
+    # 按原图的完整路径（含扩展名和子目录）命名，a.jpg 与 a.png、不同目录下的同名文件各有各的变体
+    name = hashlib.sha256(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:32]
+    variant_dir = os.path.join(cache_dir, str(width))
+    variant_path = os.path.join(variant_dir, f'{name}.{fmt}')
+
+    source_mtime = os.path.getmtime(source_path)
+    if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= source_mtime:
+        return variant_path
+
+    # Pillow 在首次生成变体时才导入，应用启动时不加载
+    from PIL import Image, ImageOps
+
+    os.makedirs(variant_dir, exist_ok=True)
+    with Image.open(source_path) as img:
+        # 按EXIF方向摆正，再等比缩放（只缩小不放大）
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img.thumbnail((width, width * 10), Image.LANCZOS)
+        if img.mode not in ('RGB', 'L') and spec['format'] == 'JPEG':
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+
+        # 先写临时文件再原子替换，避免并发请求读到写了一半的文件
+        tmp_path = f'{variant_path}.{uuid.uuid4().hex}.tmp'
+        img.save(tmp_path, spec['format'], **spec['options'])
+    os.replace(tmp_path, variant_path)
+    return variant_path
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+应用的 JSON Provider
+jsonify / request.get_json 使用 orjson 序列化和解析（比标准库 json 快数倍，直接输出UTF-8字节，
+不转义中文，分析结果等大响应体积更小）；orjson 为可选依赖，未安装或 JSON_PROVIDER=default 时使用 Flask/Quart
+自带的标准库实现。两种实现都能序列化 services/result_models.py 中的结果模型。
+
+与默认实现保持一致的行为：
+    - 按 sort_keys（默认开启）排序键，弱ETag和幂等键缓存在两种实现间保持稳定
+    - datetime/date 输出为HTTP日期，Decimal/UUID 输出为字符串，dataclass 转为字典
+    - 调试模式下缩进输出
+orjson 不支持的值（如超过64位的整数）退回标准库序列化
+"""
+
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _orjson():
+    """orjson 为可选依赖，未安装时返回None"""
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
+
+class ModelJSONMixin:
+    """default 钩子支持结果模型"""
+
+    @staticmethod
+    def default(o):
+        to_dict = getattr(o, 'to_dict', None)
+        if to_dict is not None:
+            return to_dict()
+        return ModelJSONMixin._fallback_default(o)
+
+    @staticmethod
+    def _fallback_default(o):
+        from flask.json.provider import _default
+        return _default(o)
+
+
+class OrjsonMixin:
+    """使用 orjson 的 dumps/loads/response"""
+
+    def _dumpb(self, obj, indent=False, sort_keys=None):
+        orjson = _orjson()
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            # orjson 不支持的值（如超大整数）交给标准库处理
+            layout = {'indent': 2} if indent else {'separators': (',', ':')}
+            return super().dumps(obj, sort_keys=bool(option & orjson.OPT_SORT_KEYS), ensure_ascii=False,
+                                 **layout).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        return self._dumpb(obj, bool(kwargs.get('indent')), kwargs.get('sort_keys')).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return _orjson().loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumpb(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+@lru_cache(maxsize=None)
+def provider_class(base, use_orjson):
+    """
+    在 Flask 或 Quart 的默认 Provider 上加入结果模型和 orjson 支持
+
+    Args:
+        base: flask.json.provider.DefaultJSONProvider 或 quart.json.provider.DefaultJSONProvider
+        use_orjson: 是否使用 orjson
+    """
+    mixins = (OrjsonMixin, ModelJSONMixin) if use_orjson else (ModelJSONMixin,)
+    name = ('Orjson' if use_orjson else 'Model') + base.__name__
+    return type(name, mixins + (base,), {'__module__': __name__})
+
+
+def init_app(app):
+    """
+    为应用设置 JSON Provider
+
+    Args:
+        app: Flask/Quart 应用实例
+    """
+    use_orjson = app.config.get('JSON_PROVIDER', 'auto') != 'default' and _orjson() is not None
+    if app.config.get('JSON_PROVIDER') == 'orjson' and not use_orjson:
+        logger.warning('JSON_PROVIDER=orjson 但未安装 orjson，使用标准库 json')
+    app.json = provider_class(type(app.json), use_orjson)(app)
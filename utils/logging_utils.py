@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+结构化日志工具
+    - 日志以JSON行输出（开发环境可切换为文本），每条带有请求关联ID
+    - 请求线程只把日志记录放入有界队列，由后台线程格式化并写出，不在请求路径上做同步I/O
+    - DEBUG 日志按请求采样（同一请求的调试日志要么全部保留要么全部丢弃）
+    - 写出前脱敏：配置中的密钥原文、key=/Authorization 等形式的凭证统一替换为 ***
+    - 关联ID从 X-Request-ID 请求头读取（没有则生成），写入响应头，并随上游请求一起发出
+"""
+
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import zlib
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+
+# 当前请求的关联ID（线程和协程各自独立）
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# 关联ID请求/响应头
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# 客户端传入的关联ID只接受安全字符，防止日志注入
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# 需要按原文脱敏的配置项
+SECRET_CONFIG_KEYS = (
+    'SECRET_KEY',
+    'DASHSCOPE_API_KEY',
+    'QWEATHER_API_KEY',
+    'ALIYUN_OSS_ACCESS_KEY_ID',
+    'ALIYUN_OSS_ACCESS_KEY_SECRET',
+    'PROFILER_SECRET'
+)
+
+# 按格式脱敏的凭证：key=xxx / 'key': 'xxx' / Authorization: Bearer xxx / OSS签名 / sk- 开头的密钥
+SECRET_PATTERNS = (
+    (re.compile(r'(?i)\b((?:api_?)?key|access_?key(?:_?(?:id|secret))?|secret|token|signature)=([^&\s\'"]+)'), r'\1=***'),
+    (re.compile(r'(?i)([\'"](?:(?:api_?)?key|access_?key(?:_?(?:id|secret))?|secret|token|signature)[\'"]\s*:\s*[\'"])[^\'"]+'), r'\1***'),
+    (re.compile(r'(?i)\b(Bearer)\s+[A-Za-z0-9._~+/=-]{8,}'), r'\1 ***'),
+    (re.compile(r'\bOSS\s+[A-Za-z0-9._-]+:[A-Za-z0-9+/=]+'), r'OSS ***'),
+    (re.compile(r'\bsk-[A-Za-z0-9]{8,}'), 'sk-***')
+)
+
+# LogRecord 自带的属性，其余属性视为 extra 字段输出
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_queue_handler = None
+
+
+def get_request_id():
+    """当前请求的关联ID，不在请求中时返回None"""
+    return request_id_var.get()
+
+
+def new_request_id(incoming=None):
+    """
+    确定请求的关联ID：合法的传入值原样使用，否则生成新的
+
+    Args:
+        incoming: 客户端传入的 X-Request-ID（可选）
+
+    Returns:
+        str: 关联ID
+    """
+    if incoming and REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def upstream_headers(headers=None):
+    """
+    为上游请求附加关联ID
+
+    Args:
+        headers: 原有请求头（可选，不会被修改）
+
+    Returns:
+        dict: 带 X-Request-ID 的请求头
+    """
+    headers = dict(headers or {})
+    request_id = request_id_var.get()
+    if request_id:
+        headers[REQUEST_ID_HEADER] = request_id
+    return headers
+
+
+class Redactor:
+    """日志脱敏：替换密钥原文和常见凭证格式"""
+
+    def __init__(self, secrets=()):
+        # 过短的值容易误伤正常文本，不按原文替换
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 6}, key=len, reverse=True)
+
+    def __call__(self, text):
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, '***')
+        for pattern, replacement in SECRET_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON行格式：时间、级别、logger、消息、关联ID以及 extra 字段"""
+
+    def __init__(self, redactor=None):
+        super().__init__()
+        self.redactor = redactor or Redactor()
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return self.redactor(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class TextFormatter(logging.Formatter):
+    """开发环境使用的单行文本格式，同样做脱敏"""
+
+    def __init__(self, redactor=None):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+        self.redactor = redactor or Redactor()
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return self.redactor(super().format(record))
+
+
+class ContextFilter(logging.Filter):
+    """在产生日志的线程/协程中记录关联ID（格式化在后台线程进行，届时已取不到上下文）"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    DEBUG 日志采样：高于 DEBUG 的日志全部保留；
+    DEBUG 日志按关联ID哈希决定去留，同一请求的调试日志保持完整
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if self.rate <= 0:
+            return False
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            return zlib.crc32(request_id.encode('utf-8')) % 10000 < self.rate * 10000
+        return random.random() < self.rate
+
+
+class StdoutHandler(logging.StreamHandler):
+    """始终写入当前的 sys.stdout（测试框架和部分运行环境会替换标准输出）"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """队列已满时直接丢弃日志并计数，请求线程不会因日志而阻塞"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # 在当前线程合并消息参数和异常堆栈，后台线程只负责序列化和写出
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def configure_logging(config):
+    """
+    配置根logger：队列处理器 + 后台写出线程。重复调用时只更新级别、采样率和脱敏列表
+
+    Args:
+        config: 应用配置（LOG_LEVEL、LOG_FORMAT、LOG_DEBUG_SAMPLE_RATE、LOG_QUEUE_SIZE 及各密钥）
+    """
+    global _listener, _queue_handler
+
+    redactor = Redactor([config.get(key) for key in SECRET_CONFIG_KEYS])
+    if config.get('LOG_FORMAT', 'json') == 'text':
+        formatter = TextFormatter(redactor)
+    else:
+        formatter = JsonFormatter(redactor)
+
+    root = logging.getLogger()
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+
+    if _queue_handler is not None:
+        _listener.handlers[0].setFormatter(formatter)
+        for f in _queue_handler.filters:
+            if isinstance(f, DebugSamplingFilter):
+                f.rate = config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)
+        return
+
+    stream_handler = StdoutHandler()
+    stream_handler.setFormatter(formatter)
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+    _queue_handler.addFilter(ContextFilter())
+    _queue_handler.addFilter(DebugSamplingFilter(config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)))
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_app(app):
+    """
+    为Flask应用配置日志并注册关联ID处理
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request, g
+
+    configure_logging(app.config)
+
+    @app.before_request
+    def _bind_request_id():
+        request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+        g._request_id_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def _add_request_id_header(response):
+        request_id = request_id_var.get()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc):
+        token = g.pop('_request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+指标采集工具
+记录上游接口（千问VL、虚拟试穿、和风天气、OSS）的延迟直方图、状态码和错误数、
+模型Token用量以及各路由的延迟，并以 Prometheus 文本格式输出（/metrics）
+
+写入路径不加锁：每个线程写自己的分片（普通dict），只有采集时才汇总所有分片。
+CPython 下单个线程对自己分片的读改写不会与其他线程冲突，采集时对分片做的 copy 是原子操作。
+注意：每个进程（如 gunicorn 的每个 worker）各自计数，Prometheus 按实例分别抓取后再聚合
+"""
+
+import time
+import bisect
+import threading
+
+
+# 所有已创建的指标，按创建顺序输出
+REGISTRY = []
+
+# 分片数超过该值时在注册新分片前回收已退出线程的分片（开发服务器每个请求一个线程）
+MAX_SHARDS = 64
+
+# 上游接口延迟的分桶（秒）：天气/OSS 在百毫秒级，模型调用在数秒到数十秒
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# 路由延迟的分桶（秒）
+ROUTE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _ShardedMetric:
+    """按线程分片存储的指标基类"""
+
+    type_name = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # [(所属线程, 分片)]，只在注册新分片和采集时加锁
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self):
+        """当前线程的分片，首次写入时创建"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                if len(self._shards) >= MAX_SHARDS:
+                    self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead_shards(self):
+        """把已退出线程的分片合并到 _retired（调用方持有 _shards_lock）"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._merge(self._retired, key, value)
+        self._shards = alive
+
+    def _snapshot(self):
+        """汇总所有分片，返回 {标签值元组: 值}"""
+        with self._shards_lock:
+            self._retire_dead_shards()
+            shards = [shard.copy() for _, shard in self._shards]
+            total = {key: self._copy(value) for key, value in self._retired.items()}
+        for shard in shards:
+            for key, value in shard.items():
+                self._merge(total, key, value)
+        return total
+
+    def _key(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return tuple(str(v) for v in labelvalues)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in pairs) + '}'
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def _merge(self, total, key, value):
+        raise NotImplementedError
+
+    def render(self):
+        """输出 Prometheus 文本格式的行"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for key, value in sorted(self._snapshot().items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+
+class Counter(_ShardedMetric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        """
+        计数加一（或加 amount）
+
+        Args:
+            labelvalues: 与 labelnames 一一对应的标签值
+            amount: 增量
+        """
+        key = self._key(labelvalues)
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def value(self, *labelvalues):
+        """当前计数（汇总所有线程），主要用于测试"""
+        return self._snapshot().get(self._key(labelvalues), 0)
+
+    def _merge(self, total, key, value):
+        total[key] = total.get(key, 0) + value
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{self._labels(key)} {_format(value)}']
+
+
+class Histogram(_ShardedMetric):
+    """分桶直方图，每个标签组合存储 [各桶计数..., 总和, 次数]"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=UPSTREAM_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        """
+        记录一次观测值
+
+        Args:
+            value: 观测值（秒）
+            labelvalues: 与 labelnames 一一对应的标签值
+        """
+        key = self._key(labelvalues)
+        shard = self._shard()
+        data = shard.get(key)
+        if data is None:
+            data = shard[key] = [0] * (len(self.buckets) + 3)
+        # 最后一个桶为 +Inf
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def count(self, *labelvalues):
+        """观测次数（汇总所有线程），主要用于测试"""
+        data = self._snapshot().get(self._key(labelvalues))
+        return data[-1] if data else 0
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    def _merge(self, total, key, value):
+        data = total.get(key)
+        if data is None:
+            total[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                data[i] += v
+
+    def _render_sample(self, key, data):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), data):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _format(bound)
+            lines.append(f'{self.name}_bucket{self._labels(key, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{self._labels(key)} {_format(data[-2])}')
+        lines.append(f'{self.name}_count{self._labels(key)} {data[-1]}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ------------------------------ 应用指标 ------------------------------
+
+UPSTREAM_LATENCY = Histogram(
+    'upstream_request_duration_seconds', 'Latency of upstream API calls.',
+    ('upstream', 'operation'), buckets=UPSTREAM_BUCKETS
+)
+UPSTREAM_REQUESTS = Counter(
+    'upstream_requests_total', 'Upstream API calls by response status.',
+    ('upstream', 'operation', 'status')
+)
+UPSTREAM_ERRORS = Counter(
+    'upstream_errors_total', 'Upstream API calls that raised or returned a non-2xx status.',
+    ('upstream', 'operation', 'reason')
+)
+LLM_TOKENS = Counter(
+    'llm_tokens_total', 'Token usage reported by the model API.',
+    ('model', 'type')
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latency of requests handled by this app, by route.',
+    ('route', 'method'), buckets=ROUTE_BUCKETS
+)
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'Requests handled by this app, by route and status.',
+    ('route', 'method', 'status')
+)
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total', 'Requests rejected by admission control with 429.',
+    ('endpoint', 'reason')
+)
+VL_ENDPOINT_ATTEMPTS = Counter(
+    'vl_endpoint_attempts_total', 'Attempts sent to each VL endpoint, by role and outcome.',
+    ('endpoint', 'role', 'outcome')
+)
+CIRCUIT_TRANSITIONS = Counter(
+    'circuit_breaker_transitions_total', 'Circuit breaker state changes, by upstream and new state.',
+    ('upstream', 'state')
+)
+CIRCUIT_REJECTED = Counter(
+    'circuit_breaker_rejected_total', 'Upstream calls short-circuited by an open breaker.',
+    ('upstream',)
+)
+VL_CASCADE_RESULTS = Counter(
+    'vl_cascade_results_total', 'Analyses answered (accepted) or escalated at each model cascade tier.',
+    ('tier', 'outcome')
+)
+VL_CASCADE_LATENCY = Histogram(
+    'vl_cascade_tier_duration_seconds', 'Time spent at each model cascade tier.',
+    ('tier',), buckets=UPSTREAM_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by namespace and result (l1_hit, l2_hit, negative_hit, miss).',
+    ('namespace', 'result')
+)
+RECOMMENDATIONS = Counter(
+    'recommendations_total', 'Outfit recommendations by source (model, local_fallback, local).',
+    ('source',)
+)
+
+
+class UpstreamCall:
+    """
+    记录一次上游调用的上下文管理器，同步和异步代码中都用普通 with 语句：
+
+        with track_upstream('qweather', 'now') as call:
+            response = requests.get(...)
+            call.status = response.status_code
+
+    未设置 status 且没有异常时按 200 记录；抛出异常时优先使用异常上的 status_code
+    """
+
+    __slots__ = ('upstream', 'operation', 'status', '_start')
+
+    def __init__(self, upstream, operation):
+        self.upstream = upstream
+        self.operation = operation
+        self.status = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        UPSTREAM_LATENCY.observe(elapsed, self.upstream, self.operation)
+
+        if exc is not None:
+            status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None) or 'error'
+            UPSTREAM_REQUESTS.inc(self.upstream, self.operation, status)
+            UPSTREAM_ERRORS.inc(self.upstream, self.operation, exc_type.__name__)
+            return False
+
+        status = self.status if self.status is not None else 200
+        UPSTREAM_REQUESTS.inc(self.upstream, self.operation, status)
+        if not 200 <= int(status) < 300:
+            UPSTREAM_ERRORS.inc(self.upstream, self.operation, f'http_{status}')
+        return False
+
+
+def track_upstream(upstream, operation):
+    """
+    创建上游调用记录器
+
+    Args:
+        upstream: 上游名称，如 'qwen_vl'、'dashscope_tryon'、'qweather'、'oss'
+        operation: 接口名称，如 'chat'、'submit'、'status'、'geo'、'now'、'put'
+
+    Returns:
+        UpstreamCall: 上下文管理器
+    """
+    return UpstreamCall(upstream, operation)
+
+
+def record_token_usage(model, usage):
+    """
+    记录模型返回的Token用量
+
+    Args:
+        model: 模型名称
+        usage: completion.usage（可能为None）
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if prompt_tokens:
+        LLM_TOKENS.inc(model, 'prompt', amount=prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.inc(model, 'completion', amount=completion_tokens)
+    # 命中上下文缓存的 prompt token（包含在 prompt_tokens 中），显式缓存还会返回本次新建缓存的 token 数
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', None)
+    cache_creation_tokens = getattr(details, 'cache_creation_input_tokens', None)
+    if cached_tokens:
+        LLM_TOKENS.inc(model, 'cached', amount=cached_tokens)
+    if cache_creation_tokens:
+        LLM_TOKENS.inc(model, 'cache_creation', amount=cache_creation_tokens)
+
+
+def record_cascade_tier(tier, escalation_reason, seconds):
+    """
+    记录模型级联中一个层级的结果：该层级的命中率为 accepted / 全部结果，
+    快速模型命中节省的时间约为两个层级的平均耗时之差
+
+    Args:
+        tier: 层级，'fast' 或 'plus'
+        escalation_reason: 升级原因（如 'low_confidence'），结果被采用时为None
+        seconds: 该层级耗时（秒）
+    """
+    VL_CASCADE_LATENCY.observe(seconds, tier)
+    VL_CASCADE_RESULTS.inc(tier, 'accepted' if escalation_reason is None else f'escalated_{escalation_reason}')
+
+
+def record_request(route, method, status, seconds):
+    """
+    记录一次路由请求
+
+    Args:
+        route: 路由规则（如 /api/try-on/status/<task_id>），未匹配时为 'unmatched'
+        method: HTTP方法
+        status: 响应状态码
+        seconds: 处理耗时（秒）
+    """
+    HTTP_LATENCY.observe(seconds, route, method)
+    HTTP_REQUESTS.inc(route, method, status)
+
+
+def render_prometheus():
+    """
+    以 Prometheus 文本格式输出所有指标
+
+    Returns:
+        str: text/plain; version=0.0.4 格式的指标文本
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """
+    为Flask应用注册路由延迟统计
+
+    Args:
+        app: Flask应用实例
+    """
+    from flask import request, g
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            record_request(route, request.method, response.status_code, time.perf_counter() - start)
+        return response
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+延后完成的结果
+请求截止时间内没有完成的步骤（如上传分析时的自动上传OSS）不会被取消，而是在后台继续执行：
+响应中返回一个 pending 令牌，客户端稍后通过 GET /api/pending/<token> 取回结果。
+结果中的 session 字段是该步骤本应写入 Session 的值，取回时写入取回请求的 Session。
+
+后端可选：
+    - memory：进程内有界字典，取回请求需由同一个进程处理
+    - redis：使用 REDIS_URL，所有 worker 共享
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import deadline
+
+logger = logging.getLogger(__name__)
+
+# 记录状态
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# 后台步骤的线程池（同步模式）
+MAX_BACKGROUND_WORKERS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _background_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_WORKERS, thread_name_prefix='pending')
+        return _executor
+
+
+def _run_detached(fn, args):
+    deadline.detach()
+    return fn(*args)
+
+
+def run_in_background(fn, *args):
+    """
+    在后台线程执行 fn(*args)，保留请求关联ID等上下文变量，但不受请求截止时间限制
+
+    Returns:
+        concurrent.futures.Future
+    """
+    context = contextvars.copy_context()
+    return _background_executor().submit(context.run, _run_detached, fn, args)
+
+
+def run_in_background_async(fn, *args):
+    """
+    run_in_background 的异步版本，fn 返回协程，在独立的任务中执行（请求返回后继续运行）
+
+    Returns:
+        asyncio.Task
+    """
+    async def detached():
+        deadline.detach()
+        return await fn(*args)
+    return asyncio.ensure_future(detached())
+
+
+class MemoryStore:
+    """进程内有界字典"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, token, record, ttl):
+        with self._lock:
+            self._entries[token] = (time.time() + ttl, record)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+
+class RedisStore:
+    """Redis 后端"""
+
+    def __init__(self, url, prefix='pending:'):
+        import redis
+
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def put(self, token, record, ttl):
+        self._redis.set(self.prefix + token, json.dumps(record, ensure_ascii=False), ex=int(ttl))
+
+    def get(self, token):
+        raw = self._redis.get(self.prefix + token)
+        return None if raw is None else json.loads(raw)
+
+
+class PendingResults:
+    """登记后台步骤并保存其结果"""
+
+    def __init__(self, store, ttl=3600):
+        self.store = store
+        self.ttl = ttl
+
+    def defer(self, future):
+        """
+        登记一个仍在执行的后台步骤，完成后保存其结果
+
+        Args:
+            future: run_in_background / run_in_background_async 的返回值，结果须为可JSON序列化的字典
+
+        Returns:
+            str: 取回结果用的令牌
+        """
+        token = uuid.uuid4().hex
+        self.store.put(token, {'state': PENDING}, self.ttl)
+
+        def _save(done):
+            try:
+                record = {'state': DONE, 'result': done.result()}
+            except BaseException as e:
+                logger.warning('后台步骤失败: %s', e)
+                record = {'state': FAILED, 'error': str(e) or type(e).__name__}
+            try:
+                self.store.put(token, record, self.ttl)
+            except Exception:
+                logger.exception('保存后台步骤结果失败')
+
+        future.add_done_callback(_save)
+        return token
+
+    def get(self, token):
+        """
+        查询后台步骤
+
+        Returns:
+            dict: {'state': 'pending'} / {'state': 'done', 'result': {...}} / {'state': 'failed', 'error': ...}，
+                  令牌不存在或已过期时返回None
+        """
+        return self.store.get(token)
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_pending_results(config):
+    """
+    进程内共享的 PendingResults（同一进程中的 Flask 和 Quart 应用使用同一个实例）
+
+    Args:
+        config: Flask/Quart 应用配置
+    """
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            if config.get('PENDING_RESULTS_BACKEND') == 'redis':
+                store = RedisStore(config['REDIS_URL'])
+            else:
+                store = MemoryStore()
+            _instance = PendingResults(store, config.get('PENDING_RESULTS_TTL', 3600))
+        return _instance
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+按需请求剖析工具
+PROFILER_ENABLED 开启后，带有效签名令牌的单个请求（上传分析、虚拟试穿）会被剖析：
+    - cProfile 统计结果保存为 .pstats（python -m pstats / snakeviz 查看）
+    - 后台线程按固定间隔采样请求线程的调用栈，保存为火焰图工具可直接读取的折叠栈 .collapsed
+      （flamegraph.pl / speedscope 均可打开）
+令牌放在 X-Profile-Token 请求头或 _profile 查询参数中，格式为 "过期时间戳.签名"，
+签名为 HMAC-SHA256(PROFILER_SECRET, 过期时间戳)。生成令牌：
+
+    PROFILER_SECRET=xxx python -m utils.profiler --ttl 600
+
+未开启时 init_app 不包装任何视图函数，请求路径上没有额外开销
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import uuid
+import hashlib
+import cProfile
+import threading
+from functools import wraps
+
+
+# 令牌请求头和查询参数
+TOKEN_HEADER = 'X-Profile-Token'
+TOKEN_QUERY_ARG = '_profile'
+
+# 剖析结果索引文件（每行一条JSON记录）
+INDEX_FILE = 'index.jsonl'
+
+# 默认被剖析的视图
+PROFILED_ENDPOINTS = ('api.upload_image', 'api.try_on')
+
+
+def make_token(secret, ttl=600, now=None):
+    """
+    生成剖析令牌
+
+    Args:
+        secret: PROFILER_SECRET
+        ttl: 有效期（秒）
+        now: 当前时间戳（测试用）
+
+    Returns:
+        str: "过期时间戳.签名"
+    """
+    expires = str(int((now or time.time()) + ttl))
+    signature = hmac.new(secret.encode('utf-8'), expires.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+
+def verify_token(secret, token, now=None):
+    """
+    校验剖析令牌：签名正确且未过期
+
+    Args:
+        secret: PROFILER_SECRET，为空时一律拒绝
+        token: 请求携带的令牌
+
+    Returns:
+        bool: 令牌是否有效
+    """
+    if not secret or not token or '.' not in token:
+        return False
+    expires, _, signature = token.partition('.')
+    if not expires.isdigit() or int(expires) < (now or time.time()):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), expires.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class StackSampler:
+    """后台线程定时采样目标线程的调用栈，输出折叠栈格式"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def collapsed(self):
+        """折叠栈文本：每行 "frame;frame;frame 次数\""""
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.counts.items()))
+
+
+class RequestProfiler:
+    """剖析单个请求并把结果写入剖析目录"""
+
+    def __init__(self, folder, sample_interval=0.005):
+        self.folder = folder
+        self.sample_interval = sample_interval
+        self._index_lock = threading.Lock()
+
+    def run(self, endpoint, path, func, *args, **kwargs):
+        """
+        剖析执行 func，返回 (func返回值, 剖析记录)
+
+        Args:
+            endpoint: 视图端点名
+            path: 请求路径
+            func: 视图函数
+        """
+        profile_id = time.strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        sampler = StackSampler(threading.get_ident(), self.sample_interval).start()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - started
+            sampler.stop()
+
+        os.makedirs(self.folder, exist_ok=True)
+        pstats_name = f'{profile_id}.pstats'
+        collapsed_name = f'{profile_id}.collapsed'
+        profile.dump_stats(os.path.join(self.folder, pstats_name))
+        with open(os.path.join(self.folder, collapsed_name), 'w', encoding='utf-8') as f:
+            f.write(sampler.collapsed())
+
+        entry = {
+            'id': profile_id,
+            'endpoint': endpoint,
+            'path': path,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duration_ms': round(duration * 1000, 1),
+            'samples': sum(sampler.counts.values()),
+            'files': [pstats_name, collapsed_name]
+        }
+        with self._index_lock, open(os.path.join(self.folder, INDEX_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return result, entry
+
+
+def read_index(folder, limit=100):
+    """
+    读取剖析索引，最新的在前
+
+    Args:
+        folder: 剖析目录
+        limit: 最多返回的条数
+
+    Returns:
+        list: 剖析记录
+    """
+    path = os.path.join(folder, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return entries[::-1][:limit]
+
+
+def request_token(request):
+    """从请求头或查询参数中读取剖析令牌"""
+    return request.headers.get(TOKEN_HEADER) or request.args.get(TOKEN_QUERY_ARG)
+
+
+def init_app(app, endpoints=PROFILED_ENDPOINTS):
+    """
+    开启时包装指定视图：带有效令牌的请求被剖析，响应头返回 X-Profile-Id
+
+    Args:
+        app: Flask应用实例（需在注册蓝图之后调用）
+        endpoints: 需要支持剖析的视图端点
+    """
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    from flask import request, make_response
+
+    profiler = RequestProfiler(app.config['PROFILE_FOLDER'], app.config.get('PROFILER_SAMPLE_INTERVAL', 0.005))
+    app.extensions['request_profiler'] = profiler
+
+    def wrap(endpoint, view):
+        @wraps(view)
+        def profiled_view(*args, **kwargs):
+            if not verify_token(app.config.get('PROFILER_SECRET'), request_token(request)):
+                return view(*args, **kwargs)
+            result, entry = profiler.run(endpoint, request.path, view, *args, **kwargs)
+            response = make_response(result)
+            response.headers['X-Profile-Id'] = entry['id']
+            return response
+        return profiled_view
+
+    for endpoint in endpoints:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = wrap(endpoint, app.view_functions[endpoint])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a request profiling token')
+    parser.add_argument('--ttl', type=int, default=600, help='token lifetime in seconds')
+    args = parser.parse_args()
+    secret = os.environ.get('PROFILER_SECRET')
+    if not secret:
+        sys.exit('PROFILER_SECRET is not set')
+    print(make_token(secret, args.ttl))
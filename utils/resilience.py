@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+上游调用的熔断、重试和超时
+每个上游（千问VL、虚拟试穿、和风天气、OSS）有一个进程内的熔断器和一组调用策略（UPSTREAM_POLICIES）：
+    - 超时：每次调用都带显式超时，不会因为上游无响应而一直占用 worker 线程
+    - 重试：连接失败、超时、429 和 5xx 最多重试 retries 次，等待时间为带随机抖动的指数退避
+    - 熔断：连续失败 failure_threshold 次后熔断 recovery_timeout 秒，期间直接抛出 CircuitOpenError，
+      不再等待超时；之后放行一个探测请求，成功则恢复，失败则继续熔断
+
+熔断时各服务返回各自的降级结果：上传分析不带天气、图像分析只使用最近的分析结果、
+OSS 上传失败时使用本地URL、试穿返回 503 和 Retry-After。
+请求设置了截止时间（utils/deadline.py）时，超时和重试等待不超过剩余时间，用完后抛出 DeadlineExceeded。
+注意：熔断状态按进程统计，每个 gunicorn worker 各自判断
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from utils import deadline
+from utils.deadline import DeadlineExceeded
+from utils.metrics import CIRCUIT_TRANSITIONS, CIRCUIT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+# 各上游的调用策略：
+#   timeout: 单次调用超时（秒）
+#   retries: 失败后的最大重试次数（不幂等的调用由调用方传入 retries=0）
+#   backoff / max_backoff: 指数退避的基数和上限（秒），实际等待时间在 [0, 退避时间] 内随机
+#   failure_threshold: 连续失败多少次后熔断
+#   recovery_timeout: 熔断持续时间（秒）
+UPSTREAM_POLICIES = {
+    'qwen_vl': {'timeout': 60, 'retries': 0, 'backoff': 0.5, 'max_backoff': 4, 'failure_threshold': 5, 'recovery_timeout': 30},
+    'dashscope_tryon': {'timeout': 15, 'retries': 2, 'backoff': 0.3, 'max_backoff': 2, 'failure_threshold': 5, 'recovery_timeout': 30},
+    'qweather': {'timeout': 3, 'retries': 1, 'backoff': 0.2, 'max_backoff': 1, 'failure_threshold': 5, 'recovery_timeout': 60},
+    'oss': {'timeout': 30, 'retries': 2, 'backoff': 0.3, 'max_backoff': 2, 'failure_threshold': 5, 'recovery_timeout': 30}
+}
+
+DEFAULT_POLICY = {'timeout': 10, 'retries': 1, 'backoff': 0.3, 'max_backoff': 2, 'failure_threshold': 5, 'recovery_timeout': 30}
+
+# 没有状态码的异常中，按类名识别的网络错误（httpx、openai SDK 的连接和超时错误不继承 OSError）
+TRANSIENT_ERROR_NAMES = ('TransportError', 'APIConnectionError', 'RequestError')
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """上游处于熔断状态，调用未发出"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f'{upstream} is temporarily unavailable')
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        """Retry-After 头的值（整数秒，至少1秒）"""
+        return str(max(1, int(self.retry_after + 0.999)))
+
+
+def policy(upstream):
+    """上游的调用策略"""
+    return UPSTREAM_POLICIES.get(upstream, DEFAULT_POLICY)
+
+
+def timeout(upstream):
+    """上游的单次调用超时（秒），请求设置了截止时间时不超过剩余时间（见 utils/deadline.py）"""
+    return deadline.clamp(policy(upstream)['timeout'])
+
+
+def _status(value):
+    status = getattr(value, 'status_code', None)
+    if status is None:
+        status = getattr(value, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient_status(status):
+    """429、5xx 以及 oss2 表示网络错误的负数状态码"""
+    return status == 429 or status >= 500 or status < 0
+
+
+def is_transient_error(exc):
+    """
+    异常是否为可重试的上游故障：带状态码的按状态码判断，
+    没有状态码的只有连接失败和超时算作上游故障（参数错误等不计入熔断）
+    """
+    status = _status(exc)
+    if status is not None:
+        return is_transient_status(status)
+    if isinstance(exc, (OSError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+def is_failed_response(response):
+    """返回的 HTTP 响应是否为上游故障（requests/httpx/oss2 的响应对象）"""
+    status = _status(response)
+    return status is not None and is_transient_status(status)
+
+
+class CircuitBreaker:
+    """连续失败计数的熔断器"""
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning('熔断器状态变化: %s %s -> %s', self.name, self.state, state)
+            CIRCUIT_TRANSITIONS.inc(self.name, state)
+            self.state = state
+
+    def before_call(self, now=None):
+        """
+        调用前检查，熔断中抛出 CircuitOpenError；熔断到期后只放行一个探测请求
+
+        Raises:
+            CircuitOpenError
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self.opened_at + self.recovery_timeout - now
+            if self.state == OPEN and remaining <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        CIRCUIT_REJECTED.inc(self.name)
+        raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self, now=None):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic() if now is None else now
+                self._transition(OPEN)
+
+    def release_probe(self):
+        """探测请求因与上游无关的原因结束（如参数错误）时释放探测资格"""
+        with self._lock:
+            self._probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream):
+    """上游对应的熔断器（进程内共享）"""
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            settings = policy(upstream)
+            breaker = _breakers[upstream] = CircuitBreaker(
+                upstream, settings['failure_threshold'], settings['recovery_timeout'])
+        return breaker
+
+
+def reset():
+    """清除所有熔断状态（测试使用）"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _backoff(settings, attempt):
+    """第 attempt 次重试前的等待时间：全随机抖动的指数退避"""
+    return random.uniform(0, min(settings['max_backoff'], settings['backoff'] * (2 ** attempt)))
+
+
+def _check_deadline(breaker, error):
+    """
+    请求的剩余时间用完后的超时是截止时间导致的，不计入上游的失败次数
+
+    Raises:
+        DeadlineExceeded
+    """
+    if deadline.expired():
+        breaker.release_probe()
+        raise DeadlineExceeded(f'{breaker.name} did not respond before the request deadline') from error
+
+
+def call(upstream, attempt, retries=None):
+    """
+    带熔断和重试调用上游
+
+    Args:
+        upstream: 上游名称，如 'qweather'
+        attempt: 无参函数，执行一次调用并返回结果（超时由调用方按 timeout(upstream) 设置）
+        retries: 最大重试次数，缺省使用策略中的值；不幂等的调用传入0
+
+    Returns:
+        最后一次调用的结果（5xx/429 响应在重试用尽后原样返回，由调用方按原有逻辑处理）
+
+    Raises:
+        CircuitOpenError: 上游处于熔断状态
+        DeadlineExceeded: 请求的剩余时间已用完
+        Exception: 最后一次调用抛出的异常
+    """
+    settings = policy(upstream)
+    breaker = get_breaker(upstream)
+    retries = settings['retries'] if retries is None else retries
+    for index in range(retries + 1):
+        deadline.check()
+        breaker.before_call()
+        try:
+            result = attempt()
+        except Exception as e:
+            if not is_transient_error(e):
+                breaker.release_probe()
+                raise
+            _check_deadline(breaker, e)
+            breaker.record_failure()
+            if index == retries:
+                raise
+            logger.warning('上游调用失败，准备重试: %s', upstream, extra={'error': str(e), 'attempt': index + 1})
+        else:
+            if not is_failed_response(result):
+                breaker.record_success()
+                return result
+            breaker.record_failure()
+            if index == retries:
+                return result
+            logger.warning('上游返回错误状态，准备重试: %s', upstream, extra={'status': _status(result), 'attempt': index + 1})
+        time.sleep(deadline.clamp(_backoff(settings, index)))
+
+
+async def call_async(upstream, attempt, retries=None):
+    """
+    call 的异步版本，attempt 为返回协程的无参函数
+
+    Args/Returns/Raises 同 call
+    """
+    settings = policy(upstream)
+    breaker = get_breaker(upstream)
+    retries = settings['retries'] if retries is None else retries
+    for index in range(retries + 1):
+        deadline.check()
+        breaker.before_call()
+        try:
+            result = await attempt()
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            if not is_transient_error(e):
+                breaker.release_probe()
+                raise
+            _check_deadline(breaker, e)
+            breaker.record_failure()
+            if index == retries:
+                raise
+            logger.warning('上游调用失败，准备重试: %s', upstream, extra={'error': str(e), 'attempt': index + 1})
+        else:
+            if not is_failed_response(result):
+                breaker.record_success()
+                return result
+            breaker.record_failure()
+            if index == retries:
+                return result
+            logger.warning('上游返回错误状态，准备重试: %s', upstream, extra={'status': _status(result), 'attempt': index + 1})
+        await asyncio.sleep(deadline.clamp(_backoff(settings, index)))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+断点续传工具
+实现 tus 风格的分片上传存储：创建上传、按偏移量追加分片、查询进度、完成合并。
+分片以流的方式写入磁盘上的暂存文件，每个上传占用的内存与文件大小无关
+"""
+
+import os
+import json
+import time
+import uuid
+
+try:
+    import fcntl  # 仅POSIX可用，用于同一上传的并发分片互斥
+except ImportError:  # pragma: no cover - Windows 开发环境
+    fcntl = None
+
+
+class ResumableUploadError(Exception):
+    """断点续传错误，携带对应的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ResumableUploadStore:
+    """
+    断点续传存储
+    每个上传在暂存目录下对应两个文件：<id>.json（元数据）和 <id>.part（已接收的数据）
+    """
+
+    # 上次清理时间的标记文件（以mtime记录，多进程共享）
+    SWEEP_MARKER = '.last_sweep'
+
+    def __init__(self, root_dir: str, max_size: int, expire_seconds: int = 24 * 3600,
+                 buffer_size: int = 64 * 1024, sweep_interval: int = 600):
+        """
+        Args:
+            root_dir: 暂存目录
+            max_size: 单个上传允许的最大字节数
+            expire_seconds: 未完成上传的保留时间（从最后一次收到分片算起），过期后清理
+            buffer_size: 写入分片时每次从请求流读取的字节数
+            sweep_interval: 两次清理过期上传之间的最小间隔（秒）
+        """
+        self.root_dir = root_dir
+        self.max_size = max_size
+        self.expire_seconds = expire_seconds
+        self.buffer_size = buffer_size
+        self.sweep_interval = sweep_interval
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.root_dir, f'{upload_id}.json')
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.root_dir, f'{upload_id}.part')
+
+    def create(self, length: int, metadata: dict = None) -> str:
+        """
+        创建一个新的上传
+
+        Args:
+            length: 文件总字节数
+            metadata: 客户端附带的元数据（如 filename）
+
+        Returns:
+            str: 上传ID
+        """
+        if length <= 0:
+            raise ResumableUploadError('Upload-Length must be positive', 400)
+        if length > self.max_size:
+            raise ResumableUploadError('Upload too large', 413)
+
+        self.maybe_cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        with open(self._part_path(upload_id), 'wb'):
+            pass
+        with open(self._meta_path(upload_id), 'w', encoding='utf-8') as f:
+            json.dump({
+                'length': length,
+                'metadata': metadata or {},
+                'created_at': time.time()
+            }, f)
+        return upload_id
+
+    def get_info(self, upload_id: str) -> dict:
+        """
+        查询上传进度
+
+        Args:
+            upload_id: 上传ID
+
+        Returns:
+            dict: 包含 length、offset、metadata 的字典
+        """
+        if not upload_id.isalnum():
+            raise ResumableUploadError('Upload not found', 404)
+        try:
+            with open(self._meta_path(upload_id), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            info['offset'] = os.path.getsize(self._part_path(upload_id))
+        except (OSError, ValueError):
+            raise ResumableUploadError('Upload not found', 404)
+        return info
+
+    def append(self, upload_id: str, offset: int, stream, content_length: int = None) -> int:
+        """
+        从请求流追加一个分片，客户端声明的偏移量必须等于已接收的字节数
+
+        Args:
+            upload_id: 上传ID
+            offset: 客户端声明的起始偏移量（Upload-Offset）
+            stream: 请求体输入流
+            content_length: 分片长度（可选），用于提前拒绝越界分片
+
+        Returns:
+            int: 写入后的偏移量
+        """
+        info = self.get_info(upload_id)
+        length = info['length']
+        if content_length is not None and offset + content_length > length:
+            raise ResumableUploadError('Chunk exceeds Upload-Length', 413)
+
+        with open(self._part_path(upload_id), 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = f.seek(0, os.SEEK_END)
+                if current != offset:
+                    raise ResumableUploadError('Upload-Offset mismatch', 409)
+
+                while True:
+                    chunk = stream.read(self.buffer_size)
+                    if not chunk:
+                        break
+                    if current + len(chunk) > length:
+                        # 丢弃越界部分之前已写入的数据，保持偏移量与声明一致
+                        f.truncate(offset)
+                        raise ResumableUploadError('Chunk exceeds Upload-Length', 413)
+                    f.write(chunk)
+                    current += len(chunk)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return current
+
+    def read_head(self, upload_id: str, size: int = 64 * 1024) -> bytes:
+        """
+        读取已接收数据的开头部分，用于尽早校验文件头
+
+        Args:
+            upload_id: 上传ID
+            size: 读取的最大字节数
+
+        Returns:
+            bytes: 文件开头的数据
+        """
+        self.get_info(upload_id)
+        with open(self._part_path(upload_id), 'rb') as f:
+            return f.read(size)
+
+    def discard(self, upload_id: str) -> None:
+        """删除上传及其暂存数据"""
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def finalize(self, upload_id: str, dest_path: str) -> dict:
+        """
+        完成上传，把暂存文件移动到目标路径
+
+        Args:
+            upload_id: 上传ID
+            dest_path: 目标文件路径
+
+        Returns:
+            dict: 上传元数据
+        """
+        info = self.get_info(upload_id)
+        if info['offset'] != info['length']:
+            raise ResumableUploadError('Upload is incomplete', 409)
+
+        os.replace(self._part_path(upload_id), dest_path)
+        os.remove(self._meta_path(upload_id))
+        return info
+
+    def maybe_cleanup_expired(self) -> bool:
+        """
+        距上次清理超过 sweep_interval 时才清理过期上传，避免每次创建上传都遍历暂存目录
+
+        Returns:
+            bool: 本次是否执行了清理
+        """
+        marker = os.path.join(self.root_dir, self.SWEEP_MARKER)
+        now = time.time()
+        try:
+            if now - os.path.getmtime(marker) < self.sweep_interval:
+                return False
+        except OSError:
+            pass
+        # 先更新标记，并发的其他请求不会重复清理
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, (now, now))
+        self.cleanup_expired()
+        return True
+
+    def cleanup_expired(self) -> None:
+        """
+        清理超过保留时间的未完成上传
+        按上传ID判断：以 .part 的修改时间（每次追加分片都会更新）为准，元数据和数据一起删除
+        """
+        deadline = time.time() - self.expire_seconds
+        upload_ids = set()
+        for name in os.listdir(self.root_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext in ('.json', '.part') and upload_id.isalnum():
+                upload_ids.add(upload_id)
+        for upload_id in upload_ids:
+            try:
+                last_active = os.path.getmtime(self._part_path(upload_id))
+            except OSError:
+                # 只剩元数据（数据已合并或丢失），按元数据时间判断
+                try:
+                    last_active = os.path.getmtime(self._meta_path(upload_id))
+                except OSError:
+                    continue
+            if last_active < deadline:
+                self.discard(upload_id)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+上游流量录制/回放工具
+UPSTREAM_CASSETTE_MODE=record 时，经 requests（和风天气、虚拟试穿、OSS）和 httpx
+（千问VL的 OpenAI SDK、异步服务模式的共享客户端）发出的上游请求都会被录制到
+UPSTREAM_CASSETTE_DIR 下的 JSON 行文件（每个进程一个文件）。录制内容已脱敏：
+    - 不保存请求头和请求体，只保存请求体的大小和哈希
+    - URL、响应头和响应体中的密钥原文、key=/Signature=/OSSAccessKeyId= 等凭证被替换为 ***
+    - 不保存 Set-Cookie 以及与传输编码相关的响应头
+
+UPSTREAM_CASSETTE_MODE=replay 时不再访问网络，按录制时的耗时（乘以 UPSTREAM_REPLAY_TIME_SCALE）
+返回录制的响应，用真实的响应大小离线压测解析、缓存和序列化的改动。匹配顺序：
+完整URL -> 主机+路径 -> 主机+上级路径 -> 路径 -> 上级路径（对象Key、任务ID每次不同），
+同一匹配键下的多条录制按顺序轮流返回
+"""
+
+import os
+import io
+import re
+import json
+import time
+import glob
+import base64
+import asyncio
+import hashlib
+import importlib
+import datetime
+import threading
+from urllib.parse import urlsplit
+
+from utils.logging_utils import Redactor, SECRET_CONFIG_KEYS
+
+
+# 录制时丢弃的响应头：Cookie 以及回放时由解码后的响应体决定的传输相关头
+DROPPED_RESPONSE_HEADERS = {'set-cookie', 'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+
+# 日志脱敏规则之外，URL中常见的OSS签名参数
+URL_SECRET_PATTERN = re.compile(r'(?i)\b(OSSAccessKeyId|x-oss-credential|x-oss-signature|security-token)=([^&\s\'"]+)')
+
+# 需要替换发送方法的 httpx 模块（新版 OpenAI SDK 使用接口相同的 httpx2）
+HTTPX_MODULES = ('httpx', 'httpx2')
+
+_active = None
+_originals = {}
+_patched = []
+_install_lock = threading.Lock()
+
+
+class Sanitizer:
+    """录制内容脱敏，回放时对请求URL做同样的处理以便匹配"""
+
+    def __init__(self, secrets=()):
+        self.redact = Redactor(secrets)
+
+    def __call__(self, text):
+        return URL_SECRET_PATTERN.sub(r'\1=***', self.redact(text))
+
+
+class CassetteRecorder:
+    """把上游响应追加写入当前进程的录制文件"""
+
+    def __init__(self, folder, sanitizer):
+        self.folder = folder
+        self.sanitize = sanitizer
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    @property
+    def path(self):
+        # gunicorn 的每个 worker 各写一个文件，避免多进程交错写入同一行
+        return os.path.join(self.folder, f'upstream-{os.getpid()}.jsonl')
+
+    def record(self, method, url, request_body, status, reason, headers, body, elapsed):
+        """
+        录制一次上游交互
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            request_body: 请求体（bytes/str/None，只记录大小和哈希）
+            status: 响应状态码
+            reason: 状态描述
+            headers: 响应头（键值对）
+            body: 响应体（bytes，已解码压缩）
+            elapsed: 从发出请求到读完响应体的耗时（秒）
+        """
+        if isinstance(request_body, str):
+            request_body = request_body.encode('utf-8')
+        elif not isinstance(request_body, (bytes, bytearray)):
+            request_body = None  # 文件对象、生成器等流式请求体不读取
+        try:
+            text = self.sanitize(body.decode('utf-8'))
+            body_encoding = 'utf-8'
+        except UnicodeDecodeError:
+            text = base64.b64encode(body).decode('ascii')
+            body_encoding = 'base64'
+
+        entry = {
+            'method': method.upper(),
+            'url': self.sanitize(url),
+            'request': {
+                'body_size': len(request_body or b''),
+                'body_sha256': hashlib.sha256(request_body).hexdigest() if request_body else None
+            },
+            'status': status,
+            'reason': reason,
+            'headers': {k: self.sanitize(v) for k, v in headers
+                        if k.lower() not in DROPPED_RESPONSE_HEADERS},
+            'body': text,
+            'body_encoding': body_encoding,
+            'elapsed': round(elapsed, 6),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+class CassettePlayer:
+    """加载录制文件，为请求返回匹配的录制响应"""
+
+    def __init__(self, folder, sanitizer, time_scale=1.0):
+        self.sanitize = sanitizer
+        self.time_scale = time_scale
+        self._index = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        for path in sorted(glob.glob(os.path.join(folder, '*.jsonl'))):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        for key in self._keys(entry['method'], entry['url']):
+                            self._index.setdefault(key, []).append(entry)
+        if not self._index:
+            raise ValueError(f'no cassettes found in {folder}')
+
+    @staticmethod
+    def _keys(method, url):
+        """按从精确到宽松的顺序生成匹配键"""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        parent = path.rsplit('/', 1)[0] or '/'
+        origin = f'{parts.scheme}://{parts.netloc}'
+        return [
+            (method, url),
+            (method, origin + path),
+            (method, origin + parent + '/*'),
+            (method, path),
+            (method, parent + '/*')
+        ]
+
+    def match(self, method, url):
+        """
+        查找录制响应
+
+        Returns:
+            dict: 录制条目，没有匹配时返回None
+        """
+        for key in self._keys(method.upper(), self.sanitize(str(url))):
+            entries = self._index.get(key)
+            if entries:
+                with self._lock:
+                    position = self._cursor.get(key, 0)
+                    self._cursor[key] = position + 1
+                return entries[position % len(entries)]
+        return None
+
+    def delay(self, entry):
+        """回放该条目前需要等待的时间（秒）"""
+        return entry['elapsed'] * self.time_scale
+
+
+def _entry_body(entry):
+    if entry.get('body_encoding') == 'base64':
+        return base64.b64decode(entry['body'])
+    return entry['body'].encode('utf-8')
+
+
+def _no_recording(method, url):
+    return f'no recorded upstream response for {method} {url}'
+
+
+def _requests_response(entry, request):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    body = _entry_body(entry)
+    response = requests.models.Response()
+    response.status_code = entry['status']
+    response.reason = entry.get('reason') or ''
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    response._content = body
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    response.elapsed = datetime.timedelta(seconds=entry['elapsed'])
+    return response
+
+
+def _httpx_response(httpx, entry, request):
+    response = httpx.Response(
+        entry['status'],
+        headers=entry['headers'],
+        content=_entry_body(entry),
+        request=request,
+        extensions={'reason_phrase': (entry.get('reason') or '').encode('ascii', 'ignore')}
+    )
+    response.elapsed = datetime.timedelta(seconds=entry['elapsed'])
+    return response
+
+
+def _patched_requests_send(self, request, **kwargs):
+    cassette = _active
+    if isinstance(cassette, CassettePlayer):
+        import requests
+
+        entry = cassette.match(request.method, request.url)
+        if entry is None:
+            raise requests.ConnectionError(_no_recording(request.method, request.url), request=request)
+        time.sleep(cassette.delay(entry))
+        return _requests_response(entry, request)
+
+    started = time.perf_counter()
+    response = _originals['requests'](self, request, **kwargs)
+    body = response.content  # stream=True（oss2）时读完响应体，之后仍可重复读取
+    if cassette is not None:
+        cassette.record(request.method, request.url, request.body, response.status_code, response.reason,
+                        response.headers.items(), body, time.perf_counter() - started)
+    return response
+
+
+def _httpx_send_patches(httpx):
+    """生成 httpx 模块 Client/AsyncClient 的替换发送方法，返回 [(类, 原方法, 新方法)]"""
+    original_send = httpx.Client.send
+    original_async_send = httpx.AsyncClient.send
+
+    def send(self, request, **kwargs):
+        cassette = _active
+        if isinstance(cassette, CassettePlayer):
+            entry = cassette.match(request.method, request.url)
+            if entry is None:
+                raise httpx.ConnectError(_no_recording(request.method, request.url), request=request)
+            time.sleep(cassette.delay(entry))
+            return _httpx_response(httpx, entry, request)
+
+        started = time.perf_counter()
+        response = original_send(self, request, **kwargs)
+        body = response.read()
+        if cassette is not None:
+            cassette.record(request.method, str(request.url), request.content, response.status_code,
+                            response.reason_phrase, response.headers.items(), body, time.perf_counter() - started)
+        return response
+
+    async def async_send(self, request, **kwargs):
+        cassette = _active
+        if isinstance(cassette, CassettePlayer):
+            entry = cassette.match(request.method, request.url)
+            if entry is None:
+                raise httpx.ConnectError(_no_recording(request.method, request.url), request=request)
+            await asyncio.sleep(cassette.delay(entry))
+            return _httpx_response(httpx, entry, request)
+
+        started = time.perf_counter()
+        response = await original_async_send(self, request, **kwargs)
+        body = await response.aread()
+        if cassette is not None:
+            cassette.record(request.method, str(request.url), request.content, response.status_code,
+                            response.reason_phrase, response.headers.items(), body, time.perf_counter() - started)
+        return response
+
+    return [(httpx.Client, original_send, send), (httpx.AsyncClient, original_async_send, async_send)]
+
+
+def install(mode, folder, time_scale=1.0, secrets=()):
+    """
+    开始录制或回放：替换 requests.Session.send 以及 httpx 的 Client.send / AsyncClient.send
+
+    Args:
+        mode: 'record' 或 'replay'
+        folder: 录制文件目录
+        time_scale: 回放时录制耗时的倍率（0 表示立即返回）
+        secrets: 需要脱敏的密钥原文
+
+    Returns:
+        CassetteRecorder 或 CassettePlayer
+    """
+    global _active
+
+    sanitizer = Sanitizer(secrets)
+    if mode == 'record':
+        cassette = CassetteRecorder(folder, sanitizer)
+    elif mode == 'replay':
+        cassette = CassettePlayer(folder, sanitizer, time_scale)
+    else:
+        raise ValueError(f'unknown cassette mode: {mode}')
+
+    import requests
+
+    with _install_lock:
+        if not _patched:
+            patches = [(requests.Session, requests.Session.send, _patched_requests_send)]
+            for name in HTTPX_MODULES:
+                try:
+                    patches.extend(_httpx_send_patches(importlib.import_module(name)))
+                except ImportError:
+                    continue
+            _originals['requests'] = requests.Session.send
+            for cls, original, patched in patches:
+                _patched.append((cls, original))
+                cls.send = patched
+        _active = cassette
+    return cassette
+
+
+def uninstall():
+    """恢复原始的发送方法"""
+    global _active
+
+    with _install_lock:
+        while _patched:
+            cls, original = _patched.pop()
+            cls.send = original
+        _originals.clear()
+        _active = None
+
+
+def init_app(app):
+    """
+    按配置开启录制或回放（同步、异步应用共用，重复调用时以最后一次为准）
+
+    Args:
+        app: Flask/Quart 应用实例
+    """
+    mode = app.config.get('UPSTREAM_CASSETTE_MODE')
+    if not mode:
+        return
+    cassette = install(mode, app.config['UPSTREAM_CASSETTE_DIR'],
+                       app.config.get('UPSTREAM_REPLAY_TIME_SCALE', 1.0),
+                       [app.config.get(key) for key in SECRET_CONFIG_KEYS])
+    app.logger.warning('Upstream traffic %s enabled: %s', 'recording' if mode == 'record' else 'replay',
+                       app.config['UPSTREAM_CASSETTE_DIR'])
+    return cassette